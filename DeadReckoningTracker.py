@@ -3,8 +3,18 @@ import numpy as np
 import csv
 import logging
 import time
-from utilsNeeded import load_model, initialize_video_capture, run_yolov8_inference, draw_predictions, cleanup, \
-    setup_csv_writer, check_and_alert, save_alert_times, check_proximity, check_nearness, beep_alert
+from functools import partial
+from utilsNeeded import load_model, initialize_video_capture, run_yolov8_inference, cleanup, \
+    setup_csv_writer, check_and_alert, save_alert_times, draw_trajectory, get_color_by_id
+from alertDispatcher import AlertDispatcher
+from trackingPipeline import TrackerPipeline
+from identityTracking import IdentityTracker, key_track_id, state_keys, stale_keys
+from trajectoryPrediction import extrapolate_trajectories
+from frameSinks import NullSink, make_sink
+from predictionMetrics import StreamingMetrics
+from detectionBatch import class_ids, class_names, resolve_class_ids
+from latencyProbe import NullProbe
+from frameAnnotator import FrameAnnotator, detection_labels, palette_colors
 
 class DeadReckoningTracker:
     """
@@ -21,88 +31,243 @@ class DeadReckoningTracker:
         cap (cv2.VideoCapture): Video capture object for frame acquisition.
         file (file object): File object for the CSV writer.
         start_time (float): Start time of the tracking to calculate elapsed time.
-        last_positions (dict): Dictionary storing last known positions of detected objects.
+        last_positions (dict): Dictionary storing last known positions of detected objects, keyed by track ID
+            (class-level key for detections without a track, see identityTracking.state_keys).
+        identity_tracker (IdentityTracker|None): BYTETracker/BOTSORT association giving every object its own state.
+        prediction_horizon_ms (float|None): Look-ahead of the predicted position in milliseconds, None extrapolates by
+            the last inter-frame time (one frame ahead).
+        trajectory_steps (int): Number of points of the drawn trajectory up to the horizon.
         alert_start_time (float|None): Start time of the current alert period.
         alert_times (list): List of times when alerts were issued.
+        alert_dispatcher (AlertDispatcher): Background dispatcher that plays alerts without blocking the frame loop.
+        sink (frameSinks.FrameSink): Output of the annotated frames, NullSink runs headless without any drawing.
+        annotator (frameAnnotator.FrameAnnotator): Draws the boxes and predictions of a frame in one pass.
+        metrics (predictionMetrics.StreamingMetrics): Live prediction accuracy, each prediction is scored against
+            the detection of its object at the predicted time.
+        metrics_file (str|None): JSON file the accuracy summary is written to on close().
+        classes (list|None): Class IDs the detector reports (target included), None for all classes.
+        episodes (alertEpisodes.AlertEpisodes|None): Per-pair alert episodes, None alerts on every frame.
+        probe (latencyProbe.LatencyProbe|NullProbe): Per-stage timestamps of every frame from capture to alert.
     """
-    def __init__(self, model_path, proximity_threshold, file_name_predict, file_name_alert, target, source=0):
+    def __init__(self, model_path, proximity_threshold, file_name_predict, file_name_alert, target, source=0,
+                 tracker_config="bytetrack.yaml", prediction_horizon_ms=None, trajectory_steps=1, sink="window",
+                 metrics_file=None, scheduler=None, classes=None, episodes=None, probe=None):
         """
         Initializes the object tracker with necessary parameters and setups.
+        Passing model_path=None and source=None builds a tracker without camera and model that is fed through
+        process_detections, e.g. by the multi-camera runner.
+        tracker_config ('bytetrack.yaml' or 'botsort.yaml') selects the ultralytics tracker that keeps a separate
+        position history per object, None keys the history by class ID as before.
+        prediction_horizon_ms fixes the look-ahead of the prediction (e.g. 500 for "where will it be in 500 ms"),
+        so the alert lead time no longer depends on the frame rate.
+        sink selects where the annotated frames go (see frameSinks.make_sink), 'none' runs headless and skips all
+        drawing, 'mjpeg:<port>' serves a reduced-rate preview and 'video:<path>' records to disk.
+        metrics_file names a JSON file for the prediction accuracy written on close(), the accuracy is always
+        available live as self.metrics.summary().
+        scheduler (adaptiveScheduler.AdaptiveScheduler) runs the detector only every few frames while nothing
+        approaches a hazard, the skipped frames are filled in by dead reckoning (see propagate_detections).
+        classes lists the class names monitored besides the target. They are handed to model.predict, so the
+        detector drops every other class in its NMS, None keeps all classes.
+        episodes (alertEpisodes.AlertEpisodes) beeps and logs each tracked person/object pair once per alert
+        episode instead of on every frame.
+        probe (latencyProbe.LatencyProbe) stamps every frame of run() from capture through detection, dead
+        reckoning and alert decision to the alert playback, for the photon-to-alert latency percentiles.
         """
         self.target = target
         self.filename_prediction = file_name_predict
         self.file_name_alert = file_name_alert
         self.proximity_threshold = proximity_threshold
-        self.model = load_model(model_path)
-        self.cap = initialize_video_capture(source)
-        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.model = load_model(model_path) if model_path else None
+        self.cap = initialize_video_capture(source) if source is not None else None
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap else 0
         self.file, self.writer = setup_csv_writer(self.filename_prediction)
         self.start_time = time.time()
         self.last_positions = {}
+        self.identity_tracker = IdentityTracker(tracker_config, self.fps) if tracker_config else None
+        self.prediction_horizon_ms = prediction_horizon_ms
+        self.trajectory_steps = trajectory_steps
         self.alert_start_time = None
         self.alert_times = []
-
+        self.alert_dispatcher = AlertDispatcher()
+        self.sink = make_sink(sink)
+        self.annotator = FrameAnnotator()
+        self.metrics = StreamingMetrics(prediction_horizon_ms / 1000 if prediction_horizon_ms is not None else None)
+        self.metrics_file = metrics_file
+        self.scheduler = scheduler
+        self.episodes = episodes
+        self.probe = probe if probe is not None else NullProbe()
+        self.probe.attach(self.alert_dispatcher)
+        self.last_detections, self.last_keys = None, []  # Detector output moved on the frames the scheduler skips
+        self.classes = resolve_class_ids([target, *classes], self.model.model.names) \
+            if self.model is not None and classes is not None else None
+        self.inference = partial(run_yolov8_inference, classes=self.classes)
 
 
     def run(self):
         """
         Captures frames from the video source, runs object detection, applies dead reckoning to predict future positions,
-        and logs the data to a CSV file.
+        and logs the data to a CSV file. Frames are only annotated when the sink wants them.
         """
         while True:
             ret, frame = self.cap.read()
+            # Capture time of the frame, the alerts count their response time from here, the detector included
+            captured, received_at = time.time(), time.perf_counter()
             if not ret:
                 logging.error("Failed to capture frame. Exiting...")
                 break
+            self.probe.begin()
 
-            detections = run_yolov8_inference(self.model, frame)
-            self.process_detections(detections, frame)
+            draw = self.sink.due()
+            if self.scheduler is None or self.scheduler.due(frame):
+                self.probe.mark("detect_in")
+                detections = self.inference(self.model, frame)
+                self.probe.mark("detect_out")
+                self.process_detections(detections, frame, timestamp=captured, draw=draw, received_at=received_at)
+            else:
+                self.propagate_detections(frame, timestamp=captured, draw=draw, received_at=received_at)
 
-            cv2.imshow("Frame", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if draw:
+                self.sink.write(frame)
+            if self.sink.poll():
                 break
 
+        self.close()
+
+    def run_pipelined(self, show=True):
+        """
+        Runs capture, inference, tracking and display as concurrent pipeline stages (see trackingPipeline)
+        and logs per-stage latencies on exit.
+        """
+        TrackerPipeline(self, self.inference, sink=self.sink if show else NullSink()).run()
+
+    def close(self):
+        """
+        Releases the video source, flushes and closes the prediction log and stops the alert dispatcher.
+        """
         cleanup(self.cap, self.file)
+        self.alert_dispatcher.close()
+        self.sink.close()
+        logging.info(f"Prediction accuracy: {self.metrics.summary()['overall']}")
+        if self.scheduler is not None:
+            self.scheduler.log_summary()
+        if self.episodes is not None:
+            self.episodes.close()
+            self.episodes.log_summary()
+        self.probe.log_summary()
+        if self.metrics_file:
+            self.metrics.dump(self.metrics_file)
 
 
 
-    def process_detections(self, detections, frame):
+    def process_detections(self, detections, frame, track_ids=None, timestamp=None, draw=True, received_at=None):
         """
         Processes each detection from YOLOv8, applies dead reckoning, predicts future positions, and logs data.
+        track_ids are assigned by the identity tracker unless the caller passes them, timestamp is the capture time
+        of the frame (defaults to now). draw=False skips the annotations (headless, or the sink skips this frame).
+        received_at is the time.perf_counter() of the capture (defaults to now), the saved response times count from
+        there so that they include the detector.
         """
-        timestamp = time.time()
-        for det in detections:
+        # Alert times add the time spent since received_at to the frame time
+        received_at = time.perf_counter() if received_at is None else received_at
+        timestamp = time.time() if timestamp is None else timestamp
+        draw = draw and frame is not None
+        if track_ids is None and self.identity_tracker is not None:
+            track_ids = self.identity_tracker.update(detections, frame)
+            for key in stale_keys(list(self.last_positions), self.identity_tracker.live_ids()):
+                del self.last_positions[key]
+                self.metrics.forget(key)
+        keys = state_keys(detections, track_ids)
+        positions = []
+        for det, key in zip(detections, keys):
             class_id = det[5]
-            current_x, current_y, future_x, future_y = self.apply_dead_reckoning(det, timestamp)
-            self.writer.writerow([timestamp, class_id, current_x, current_y, future_x, future_y, det[6]])
-            draw_predictions(frame, det, current_x, current_y, future_x, future_y)
-
-            # After processing the detection, check and alert if necessary
-            self.alert_start_time, self.alert_times = check_and_alert(
-                detections=detections,
-                target=self.target,
-                file_name=self.file_name_alert,
-                elapsed_time=timestamp - self.start_time,
-                alert_start_time=self.alert_start_time,
-                start_time=self.start_time,
-                alert_times=self.alert_times,
-                proximity_threshold=self.proximity_threshold,
-                save_alert_times_func=save_alert_times,
-                check_proximity_func=check_proximity,
-                check_nearness_func=check_nearness,
-                beep_alert_func=beep_alert
-            )
-
-
-
-    def apply_dead_reckoning(self, det, timestamp):
+            current_x, current_y, future_x, future_y = self.apply_dead_reckoning(det, timestamp, key)
+            self.writer.writerow([timestamp, class_id, current_x, current_y, future_x, future_y, det[6],
+                                  key_track_id(key)])
+            self.metrics.update(key, det[6], timestamp, (current_x, current_y), (future_x, future_y))
+            positions.append((current_x, current_y, future_x, future_y))
+        self.probe.mark("predict")
+        if draw:
+            positions = np.array(positions).reshape(-1, 4)
+            self.annotator.draw(frame, detections, positions[:, :2], positions[:, 2:],
+                                palette_colors(class_ids(detections)), detection_labels(detections))
+        if draw and self.prediction_horizon_ms is not None and self.trajectory_steps > 1:
+            for key, points in zip(keys, self.predict_trajectories(keys)):
+                draw_trajectory(frame, points, get_color_by_id(key))
+
+        # After processing the frame, check all person/object pairs at once and alert if necessary
+        self.alert_start_time, self.alert_times = check_and_alert(
+            detections=detections,
+            target=self.target,
+            file_name=self.file_name_alert,
+            elapsed_time=timestamp - self.start_time,
+            alert_start_time=self.alert_start_time,
+            start_time=self.start_time,
+            alert_times=self.alert_times,
+            proximity_threshold=self.proximity_threshold,
+            save_alert_times_func=save_alert_times,
+            beep_alert_func=self.alert_dispatcher.beep,
+            episodes=self.episodes,
+            keys=keys,
+            received_at=received_at
+        )
+        self.probe.mark("decision")
+        if self.scheduler is not None:
+            self.last_detections, self.last_keys = detections, keys
+            velocities = [self.last_positions[key][3:5] for key in keys]
+            self.scheduler.update(detections, velocities, class_names(detections) == self.target,
+                                  self.proximity_threshold)
+
+    def propagate_detections(self, frame, timestamp=None, draw=True, received_at=None):
+        """
+        Fills in a frame the scheduler skipped: the boxes of the last detector run are moved by their last
+        velocities and checked for alerts like detections, but neither logged nor used to update the velocities.
+        timestamp and received_at are the capture times of the frame as in process_detections.
+        """
+        # Alert times add the time spent since received_at to the frame time
+        received_at = time.perf_counter() if received_at is None else received_at
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.last_detections is None or not len(self.last_detections):
+            return
+        shifts = []
+        for key in self.last_keys:
+            x, y, last_time, velocity_x, velocity_y = self.last_positions[key]
+            shifts.append((velocity_x * (timestamp - last_time), velocity_y * (timestamp - last_time)))
+        detections = self.scheduler.shift_boxes(self.last_detections, shifts)
+        self.probe.mark("predict")
+        if draw and frame is not None:
+            centers = detections.centers  # Prediction markers on the moved centers
+            self.annotator.draw(frame, detections, centers, centers, palette_colors(detections.class_ids),
+                                detection_labels(detections))
+        self.alert_start_time, self.alert_times = check_and_alert(
+            detections=detections,
+            target=self.target,
+            file_name=self.file_name_alert,
+            elapsed_time=timestamp - self.start_time,
+            alert_start_time=self.alert_start_time,
+            start_time=self.start_time,
+            alert_times=self.alert_times,
+            proximity_threshold=self.proximity_threshold,
+            save_alert_times_func=save_alert_times,
+            beep_alert_func=self.alert_dispatcher.beep,
+            episodes=self.episodes,
+            keys=self.last_keys,
+            received_at=received_at
+        )
+        self.probe.mark("decision")
+
+
+
+    def apply_dead_reckoning(self, det, timestamp, key=None):
         """
         Applies dead reckoning to predict future positions based on the current and last known positions.
+        The position history is stored under key (see identityTracking.state_keys), by default the class ID.
+        The prediction looks prediction_horizon_ms ahead, or one inter-frame time if no horizon is set.
         """
         x1, y1, x2, y2, _, cls, _ = det
+        key = cls if key is None else key
         current_x = int((x1 + x2) / 2)
         current_y = int((y1 + y2) / 2)
-        last_info = self.last_positions.get(cls, (current_x, current_y, timestamp))
+        last_info = self.last_positions.get(key, (current_x, current_y, timestamp))
 
         # Calculate velocities
         time_delta = timestamp - last_info[2]
@@ -110,14 +275,33 @@ class DeadReckoningTracker:
         velocity_y = (current_y - last_info[1]) / time_delta if time_delta > 0 else 0
 
         # Predict future position
-        future_x = int(current_x + velocity_x * time_delta)
-        future_y = int(current_y + velocity_y * time_delta)
+        lookahead = time_delta if self.prediction_horizon_ms is None else self.prediction_horizon_ms / 1000
+        future_x = int(current_x + velocity_x * lookahead)
+        future_y = int(current_y + velocity_y * lookahead)
 
-        # Update last known positions
-        self.last_positions[cls] = (current_x, current_y, timestamp)
+        # Update last known positions and velocity
+        self.last_positions[key] = (current_x, current_y, timestamp, velocity_x, velocity_y)
 
         return current_x, current_y, future_x, future_y
 
+    def predict_trajectories(self, keys=None, horizon_ms=None, steps=None):
+        """
+        Extrapolates the last known positions of the given objects (all when keys is None) in one vectorized call.
+
+        Args:
+            keys (list|None): Position history keys, see identityTracking.state_keys.
+            horizon_ms (float|None): Horizon in milliseconds, defaults to prediction_horizon_ms.
+            steps (int|None): Number of trajectory points, defaults to trajectory_steps.
+
+        Returns:
+            np.ndarray: (N, steps, 2) predicted positions.
+        """
+        keys = list(self.last_positions) if keys is None else keys
+        states = np.array([self.last_positions[key] for key in keys], np.float64).reshape(-1, 5)
+        return extrapolate_trajectories(states[:, :2], states[:, 3:], horizon_ms or self.prediction_horizon_ms,
+                                        steps or self.trajectory_steps)
+
+
 
 if __name__ == "__main__":
     tracker = DeadReckoningTracker(
@@ -1,12 +1,20 @@
 import cv2 as cv
 import cv2
-import numpy as np
 import uuid
 import csv
 import logging
 import utilsNeeded
 import time  # Import time to work with timestamps
-from kalmanSetUp import KalmanFilterWrapper
+from functools import partial
+from kalmanSetUp import KalmanFilterBank
+from alertDispatcher import AlertDispatcher
+from trackingPipeline import TrackerPipeline
+from identityTracking import IdentityTracker, key_track_id, state_keys, stale_keys
+from detectionBatch import as_boxes, class_names, resolve_class_ids
+from frameSinks import NullSink, make_sink
+from predictionMetrics import StreamingMetrics
+from latencyProbe import NullProbe
+from frameAnnotator import FrameAnnotator, detection_labels, palette_colors
 # Authorship Information
 """
 Author: Koray Aman Arabzadeh
@@ -44,19 +52,40 @@ class ObjectTracker_Kalman:
         model (YOLO): The YOLOv8 model loaded for object detection.
         cap (cv2.VideoCapture): Video capture object for frame acquisition.
         fps (float): Frames per second of the video source.
-        kalman_filters (dict): Dictionary storing KalmanFilterWrapper instances by class ID.
+        kalman_filters (KalmanFilterBank): Vectorized Kalman filters of all tracked objects, keyed by track ID
+            (class-level key for detections without a track, see identityTracking.state_keys).
+        identity_tracker (IdentityTracker|None): BYTETracker/BOTSORT association giving every object its own filter.
+        prediction_horizon_ms (float|None): Look-ahead of the predicted position in milliseconds. None keeps the
+            one-frame prediction (dt = 1 frame).
+        trajectory_steps (int): Number of points of the drawn trajectory up to the horizon.
         file (file object): File object for the CSV writer.
         start_time (float): Start time of the tracking to calculate elapsed time.
         alert_times (list): List of times when alerts were issued.
         alert_start_time (float|None): Start time of the current alert period.
         last_positions (dict): Dictionary storing last known positions of detected objects.
+        alert_dispatcher (AlertDispatcher): Background dispatcher that plays alerts without blocking the frame loop.
+        sink (frameSinks.FrameSink): Output of the annotated frames, NullSink runs headless without any drawing.
+        annotator (frameAnnotator.FrameAnnotator): Draws the boxes and predictions of a frame in one pass.
+        metrics (predictionMetrics.StreamingMetrics): Live prediction accuracy, each prediction is scored against
+            the detection of its object at the predicted time.
+        metrics_file (str|None): JSON file the accuracy summary is written to on close().
+        scheduler (adaptiveScheduler.AdaptiveScheduler|None): Adaptive detector scheduling, None detects every frame.
+        classes (list|None): Class IDs the detector reports (target included), None for all classes.
+        episodes (alertEpisodes.AlertEpisodes|None): Per-pair alert episodes, None alerts on every frame.
+        probe (latencyProbe.LatencyProbe|NullProbe): Per-stage timestamps of every frame from capture to alert.
+        inference (function): inference(model, frame) -> detections, run_yolov8_inference restricted to the classes.
 
     Methods:
         run(): Main method to start the tracking and detection loop.
-        process_detections(detections, frame): Processes each detection per frame.
-        apply_kalman_filter(det): Applies Kalman filtering to smooth and predict object positions.
+        run_pipelined(): Same as run() with capture, inference, tracking and display in concurrent stages.
+        close(): Releases the video source and flushes the logs.
+        process_detections(detections, frame, track_ids=None, timestamp=None, draw=True): Processes each detection per frame.
+        propagate_detections(frame, timestamp=None, draw=True): Fills in a frame skipped by the scheduler.
+        apply_kalman_filter(detections, track_ids=None, timestamp=None): Applies Kalman filtering to smooth and predict object positions.
     """
-    def __init__(self, model_path, proximity_threshold, file_name_predict, file_name_alert, target, source=0):
+    def __init__(self, model_path, proximity_threshold, file_name_predict, file_name_alert, target, source=0,
+                 tracker_config="bytetrack.yaml", prediction_horizon_ms=None, trajectory_steps=1, sink="window",
+                 metrics_file=None, scheduler=None, classes=None, episodes=None, probe=None, motion_model="cv"):
         """
         Initializes the object tracker with necessary parameters and setups.
 
@@ -66,78 +95,229 @@ class ObjectTracker_Kalman:
             file_name_predict (str): Filename to save prediction data.
             file_name_alert (str): Filename to save alert data.
             target (str): Target object class name to monitor specifically.
-            source (int|str): Video source, default is the first camera.
+            source (int|str|None): Video source, default is the first camera. None (together with model_path=None)
+                builds a tracker without camera and model that is fed through process_detections,
+                e.g. by the multi-camera runner.
+            tracker_config (str|None): ultralytics tracker config ('bytetrack.yaml' or 'botsort.yaml') used to give
+                every object its own Kalman filter. None keys the filters by class ID as before.
+            prediction_horizon_ms (float|None): Predict the position this many milliseconds ahead. The filters are
+                then advanced by the real time between frames, so the lead time does not depend on the frame rate.
+            trajectory_steps (int): Number of trajectory points up to the horizon, drawn when larger than 1.
+            sink (str|FrameSink): Where the annotated frames go, see frameSinks.make_sink: 'window' (default),
+                'none' for headless operation, 'video:<path>' or 'mjpeg:<port>'.
+            metrics_file (str|None): Write the prediction accuracy (overall, per class and per track) to this JSON
+                file on close(). The accuracy is always available live as self.metrics.summary().
+            scheduler (AdaptiveScheduler|None): Runs the detector only every few frames while nothing approaches a
+                hazard and fills the other frames with the Kalman predictions (see adaptiveScheduler). None detects
+                every frame.
+            classes (list|None): Class names to monitor besides the target, e.g. ['cup', 'sports ball']. They are
+                passed to the detector, so every other class is dropped inside its NMS instead of being tracked,
+                logged and checked. None monitors every class.
+            episodes (AlertEpisodes|None): Groups the alerts into per-pair episodes with enter / exit hysteresis, so
+                a pair beeps and is logged once per episode instead of on every frame (see alertEpisodes). None
+                alerts on every frame.
+            probe (LatencyProbe|None): Stamps capture, detector, predictor, alert decision and alert playback of
+                every frame of run() for the latency percentiles (see latencyProbe). None records nothing.
+            motion_model (str|object): Motion model of the Kalman filters, 'cv' constant velocity, 'ca' constant
+                acceleration for thrown or falling objects, 'imm' mixing both, or a motionModels model instance.
         """
         self.writer = None
         self.target = target
         self.filename_prediction = file_name_predict
         self.file_name_alert = file_name_alert
         self.proximity_threshold = proximity_threshold
-        self.model = utilsNeeded.load_model(model_path)
-        self.cap = utilsNeeded.initialize_video_capture(source)
-        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-        self.kalman_filters = {}
+        self.model = utilsNeeded.load_model(model_path) if model_path else None
+        self.cap = utilsNeeded.initialize_video_capture(source) if source is not None else None
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap else 0
+        self.kalman_filters = KalmanFilterBank(model=motion_model)
+        self.identity_tracker = IdentityTracker(tracker_config, self.fps) if tracker_config else None
+        self.prediction_horizon_ms = prediction_horizon_ms
+        self.trajectory_steps = trajectory_steps
         self.file, self.writer = utilsNeeded.setup_csv_writer(self.filename_prediction)
         self.start_time = time.time()
         self.alert_times = []
         self.alert_start_time = None
         self.last_positions = {}
+        self.alert_dispatcher = AlertDispatcher()
+        self.sink = make_sink(sink)
+        self.annotator = FrameAnnotator()
+        self.metrics = StreamingMetrics(prediction_horizon_ms / 1000 if prediction_horizon_ms is not None else None)
+        self.metrics_file = metrics_file
+        self.scheduler = scheduler
+        self.episodes = episodes
+        self.probe = probe if probe is not None else NullProbe()
+        self.probe.attach(self.alert_dispatcher)
+        self.last_detections, self.last_keys = None, []  # Detector output moved on the frames the scheduler skips
+        self.last_anchor = None  # Filter positions of the last detector run
+        self.classes = resolve_class_ids([target, *classes], self.model.model.names) \
+            if self.model is not None and classes is not None else None
+        self.inference = partial(utilsNeeded.run_yolov8_inference, classes=self.classes)
 
     def run(self):
         """
-        Runs the main loop to capture frames and process detections. Displays the frame and checks for exit command.
+        Runs the main loop to capture frames and process detections. Frames are only annotated and handed to the
+        sink when it wants them, the loop stops when the source ends or the sink asks to stop ('q' in the window).
         """
         while True:
             ret, frame = self.cap.read()
+            # Capture time of the frame, the alerts count their response time from here, the detector included
+            captured, received_at = time.time(), time.perf_counter()
             if not ret:
                 logging.error("Failed to capture frame. Exiting...")
                 break
-            detections = utilsNeeded.run_yolov8_inference(self.model, frame)
-            self.process_detections(detections, frame)
-            cv2.imshow("Frame", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            self.probe.begin()
+            draw = self.sink.due()
+            if self.scheduler is None or self.scheduler.due(frame):
+                self.probe.mark("detect_in")
+                detections = self.inference(self.model, frame)
+                self.probe.mark("detect_out")
+                self.process_detections(detections, frame, timestamp=captured, draw=draw, received_at=received_at)
+            else:
+                self.propagate_detections(frame, timestamp=captured, draw=draw, received_at=received_at)
+            if draw:
+                self.sink.write(frame)
+            if self.sink.poll():
                 break
+        self.close()
+
+    def run_pipelined(self, show=True):
+        """
+        Runs capture, inference, tracking and display as concurrent pipeline stages (see trackingPipeline)
+        and logs per-stage latencies on exit.
+        """
+        TrackerPipeline(self, self.inference, sink=self.sink if show else NullSink()).run()
+
+    def close(self):
+        """
+        Releases the video source, flushes and closes the prediction log and stops the alert dispatcher.
+        """
         utilsNeeded.cleanup(self.cap, self.file)
+        self.alert_dispatcher.close()
+        self.sink.close()
+        logging.info(f"Prediction accuracy: {self.metrics.summary()['overall']}")
+        if self.scheduler is not None:
+            self.scheduler.log_summary()
+        if self.episodes is not None:
+            self.episodes.close()
+            self.episodes.log_summary()
+        self.probe.log_summary()
+        if self.metrics_file:
+            self.metrics.dump(self.metrics_file)
 
-    def process_detections(self, detections, frame):
+    def process_detections(self, detections, frame, track_ids=None, timestamp=None, draw=True, received_at=None):
         """
         Processes each detection from YOLOv8, applies Kalman filtering, predicts future positions, and logs data.
 
         Parameters:
-            detections (list): List of detections from the YOLOv8 model.
-            frame (np.array): Current frame from the video source.
+            detections (DetectionBatch|list): Detections from the YOLOv8 model.
+            frame (np.array|None): Current frame from the video source, None to skip drawing.
+            track_ids (array-like|None): Track ID per detection if the caller already tracked them,
+                otherwise the identity tracker assigns them.
+            timestamp (float|None): Capture time of the frame (time.time()), defaults to now.
+            draw (bool): Annotate the frame. False (headless or the sink skips this frame) still passes the frame
+                to the identity tracker.
+            received_at (float|None): time.perf_counter() at the capture of the frame, defaults to now. The saved
+                response times count from here, so the detector time is included when the caller passes it.
         """
-        for det in detections:
-            elapsed_time = time.time() - self.start_time
-            center_x, center_y, kf_wrapper = self.apply_kalman_filter(det)
-            future_x, future_y = kf_wrapper.predict()  # Get future position before correction
-            kf_wrapper.correct(np.array([[center_x], [center_y]], np.float32))
-            self.writer.writerow([elapsed_time, center_x, center_y, future_x, future_y, det[6]])
-            utilsNeeded.draw_predictions2(frame, det, center_x, center_y, future_x, future_y)
-            # Check and alert function usage
-            self.alert_start_time, self.alert_times = utilsNeeded.check_and_alert(
-                detections, self.target, self.file_name_alert, elapsed_time, self.alert_start_time, self.start_time,
-                self.alert_times, self.proximity_threshold ,
-                utilsNeeded.save_alert_times, utilsNeeded.check_proximity, utilsNeeded.check_nearness,
-                utilsNeeded.beep_alert)
-
-    def apply_kalman_filter(self, det):
+        # Alert times add the time spent since received_at to the frame time
+        received_at = time.perf_counter() if received_at is None else received_at
+        timestamp = time.time() if timestamp is None else timestamp
+        draw = draw and frame is not None
+        elapsed_time = timestamp - self.start_time
+        if track_ids is None and self.identity_tracker is not None:
+            track_ids = self.identity_tracker.update(detections, frame)
+            for key in stale_keys(list(self.kalman_filters.keys), self.identity_tracker.live_ids()):
+                self.kalman_filters.remove(key)  # The tracker removed the track, its filter is not needed anymore
+                self.metrics.forget(key)
+        keys = state_keys(detections, track_ids)
+        centers, futures = self.apply_kalman_filter(detections, track_ids, timestamp)
+        self.probe.mark("predict")
+        for det, key, (center_x, center_y), (future_x, future_y) in zip(detections, keys, centers, futures):
+            self.writer.writerow([elapsed_time, center_x, center_y, future_x, future_y, det[6], key_track_id(key)])
+            self.metrics.update(key, det[6], timestamp, (center_x, center_y), (future_x, future_y))
+        if draw:
+            self.annotator.draw(frame, detections, centers, futures, palette_colors(keys), detection_labels(detections))
+        if draw and self.prediction_horizon_ms is not None and self.trajectory_steps > 1:
+            trajectories = self.kalman_filters.trajectory(keys, self.prediction_horizon_ms, self.trajectory_steps)
+            for key, points in zip(keys, trajectories):
+                utilsNeeded.draw_trajectory(frame, points, utilsNeeded.get_color_by_id(key))
+        # Check all person/object pairs of the frame at once
+        self.alert_start_time, self.alert_times = utilsNeeded.check_and_alert(
+            detections, self.target, self.file_name_alert, elapsed_time, self.alert_start_time, self.start_time,
+            self.alert_times, self.proximity_threshold,
+            utilsNeeded.save_alert_times, self.alert_dispatcher.beep, episodes=self.episodes, keys=keys,
+            received_at=received_at)
+        self.probe.mark("decision")
+        if self.scheduler is not None:
+            self.last_detections, self.last_keys = detections, keys
+            self.last_anchor = self.kalman_filters.positions(list(dict.fromkeys(keys)))
+            self.scheduler.update(detections, self.kalman_filters.velocities(keys), class_names(detections) == self.target,
+                                  self.proximity_threshold, per_second=self.prediction_horizon_ms is not None)
+
+    def propagate_detections(self, frame, timestamp=None, draw=True, received_at=None):
+        """
+        Fills in a frame the scheduler skipped: the boxes of the last detector run are moved by the Kalman prediction
+        and checked for alerts like detections, but neither logged nor used to correct the filters.
+
+        Parameters:
+            frame (np.array|None): Current frame from the video source, None to skip drawing.
+            timestamp (float|None): Capture time of the frame (time.time()), defaults to now.
+            draw (bool): Annotate the frame with the moved boxes.
+            received_at (float|None): time.perf_counter() at the capture of the frame, defaults to now.
+        """
+        # Alert times add the time spent since received_at to the frame time
+        received_at = time.perf_counter() if received_at is None else received_at
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.last_detections is None or not len(self.last_detections):
+            return
+        keys = list(dict.fromkeys(self.last_keys))  # Detections sharing a class-level filter move together
+        if self.prediction_horizon_ms is None:
+            positions = self.kalman_filters.predict(keys)  # One frame ahead, corrected at the next detector run
+        else:
+            positions = self.kalman_filters.positions_at(keys, timestamp)
+        shifts = dict(zip(keys, positions - self.last_anchor))
+        detections = self.scheduler.shift_boxes(self.last_detections, [shifts[key] for key in self.last_keys])
+        self.probe.mark("predict")
+        if draw and frame is not None:
+            centers = detections.centers  # Prediction markers on the moved centers
+            self.annotator.draw(frame, detections, centers, centers, palette_colors(self.last_keys),
+                                detection_labels(detections))
+        elapsed_time = timestamp - self.start_time
+        self.alert_start_time, self.alert_times = utilsNeeded.check_and_alert(
+            detections, self.target, self.file_name_alert, elapsed_time, self.alert_start_time,
+            self.start_time, self.alert_times, self.proximity_threshold,
+            utilsNeeded.save_alert_times, self.alert_dispatcher.beep, episodes=self.episodes, keys=self.last_keys,
+            received_at=received_at)
+        self.probe.mark("decision")
+
+    def apply_kalman_filter(self, detections, track_ids=None, timestamp=None):
         """
-        Applies a Kalman Filter to the given detection to estimate and predict the object's position.
+        Applies the Kalman filter bank to all detections of a frame to estimate and predict the objects' positions.
+        New objects get a filter initialised at their first position, then every filter is predicted and corrected
+        in one vectorized call.
 
         Parameters:
-            det (list): Detection data including bounding box and class info.
+            detections (DetectionBatch|list): Detections of the frame, each including bounding box and class info.
+            track_ids (array-like|None): Track ID per detection, None keys the filters by class ID.
+            timestamp (float|None): Capture time of the frame, used when a prediction horizon is set.
 
         Returns:
-            tuple: Current estimated center position (x, y) and the Kalman filter wrapper instance.
+            tuple: (N, 2) int array of current center positions and (N, 2) int array of the predicted positions,
+            prediction_horizon_ms ahead of the corrected state or, without horizon, the one-frame prediction made
+            before the correction.
         """
-        x1, y1, x2, y2, _, cls, class_name = det
-        center_x = int((x1 + x2) / 2)
-        center_y = int((y1 + y2) / 2)
-        if cls not in self.kalman_filters:
-            self.kalman_filters[cls] = KalmanFilterWrapper()
-            self.kalman_filters[cls].initialize(center_x, center_y)
-        return center_x, center_y, self.kalman_filters[cls]
+        boxes = as_boxes(detections).astype(int)  # Integer pixels like the legacy detection lists
+        centers = ((boxes[:, :2] + boxes[:, 2:]) / 2).astype(int)
+        keys = state_keys(detections, track_ids)
+        for key, (center_x, center_y) in zip(keys, centers):
+            if key not in self.kalman_filters:
+                self.kalman_filters.add(key, center_x, center_y, timestamp=timestamp)
+        if self.prediction_horizon_ms is None:
+            futures = self.kalman_filters.predict_correct(keys, centers)
+        else:
+            self.kalman_filters.predict_correct(keys, centers, timestamp=time.time() if timestamp is None else timestamp)
+            futures = self.kalman_filters.trajectory(keys, self.prediction_horizon_ms)[:, -1]
+        return centers, futures.astype(int)
 
     
     
@@ -1,6 +1,25 @@
+import os
+import sys
+
+# The shared modules (bufferedLogging, alertDispatcher, ...) live in the repository root, one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import cv2
+import numpy as np
 import utilitiesHelper  # Helper utilities for model loading, video capture, etc.
 import time
+from functools import partial
+from alertDispatcher import AlertDispatcher
+from identityTracking import IdentityTracker, UNTRACKED, key_track_id, state_keys, stale_keys
+from hazardEngine import HazardEngine
+from hazardZones import ZoneMap, zone_bounds, zone_classes
+from trajectoryPrediction import extrapolate_trajectories, horizon_offsets
+from frameSinks import make_sink
+from predictionMetrics import StreamingMetrics
+from detectionBatch import resolve_class_ids
+from roiInference import RoiInference
+from alertEpisodes import gate_hazards
+from latencyProbe import NullProbe
 
 class DeadReckoningTracker:
     """
@@ -17,17 +36,45 @@ class DeadReckoningTracker:
         file_name_predict (str): File name for logging predictions.
         file_name_alert (str): File name for logging alert times.
         label_name (str): Label for detection.
-        source (int, optional): Video source index or path.
+        source (int, optional): Video source index or path. model_path=None and source=None build a tracker without
+            model and camera, fed through process_detection (e.g. by detectionRecording.replay).
         predefined_img_path (str, optional): Path to an image for overlay purposes.
+        tracker_config (str, optional): ultralytics tracker config ('bytetrack.yaml' or 'botsort.yaml') that keeps a
+            separate position history per object, None keys the history by class ID.
+        ttc_threshold (float, optional): Alert when an object's predicted path reaches any_area within this many
+            seconds, None only alerts on the current box.
+        zones (list, optional): hazardZones.HazardZone polygons with their own thresholds and severities, replacing
+            any_area. The predicted path is then sampled at ttc_steps points. Zones without a threshold use
+            proximity_threshold, and near means within it outside the zone (see hazardZones).
+        sink (str, optional): Where the annotated frames go (see frameSinks.make_sink), 'none' runs headless without
+            any drawing.
+        metrics_file (str, optional): JSON file the prediction accuracy (predictionMetrics.StreamingMetrics, live in
+            self.metrics) is written to when run() ends.
+        roi_margin (int, optional): Detect only in windows around any_area / the zones padded by this many pixels, with
+            a periodic low-resolution full-frame pass (see roiInference). None detects on the full frame.
+        classes (list, optional): Class names handed to model.predict, so the detector itself drops every other
+            class. Defaults to the union of the zone class policies, or all classes if a zone alerts on every class.
+        episodes (alertEpisodes.AlertEpisodes, optional): Per-object alert episodes with enter / exit hysteresis, an
+            object near an area beeps and is logged when its episode starts only. None alerts on every frame.
+        probe (latencyProbe.LatencyProbe, optional): Stamps every frame of run() from capture to alert playback for
+            the per-stage latency percentiles. None records nothing.
+        zone_cell_size (int, optional): Raster cell size in pixels of the zone lookup (hazardZones.ZoneMap), larger
+            cells use less memory, 1 tests the zones at full resolution.
     """
-    def __init__(self, model_path, frequency, duration, factor, proximity_threshold, file_name_predict, file_name_alert, label_name, source=0, predefined_img_path=None,any_area=None):
-        self.model = utilitiesHelper.load_model(model_path)
-        self.cap = utilitiesHelper.initialize_video_capture(source)
+    def __init__(self, model_path, frequency, duration, factor, proximity_threshold, file_name_predict, file_name_alert, label_name, source=0, predefined_img_path=None,any_area=None,
+                 tracker_config='bytetrack.yaml', ttc_threshold=1.0, zones=None, ttc_steps=10, sink='window',
+                 metrics_file=None, roi_margin=None, classes=None, episodes=None, probe=None, zone_cell_size=4):
+        self.model = utilitiesHelper.load_model(model_path) if model_path else None
+        self.cap = utilitiesHelper.initialize_video_capture(source) if source is not None else None
+        # (height, width) of the frames, taken from the frames themselves when they are passed in
+        self.frame_shape = (int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                            int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))) if self.cap else None
         self.factor = factor
         self.file, self.writer = utilitiesHelper.setup_csv_writer(file_name_predict)
         self.alert_file = file_name_alert
         self.proximity_threshold = proximity_threshold
-        self.last_positions = {}
+        self.last_positions = {}  # Last position per track ID (class-level key for untracked detections)
+        self.identity_tracker = IdentityTracker(tracker_config) if tracker_config else None
         self.alert_times = []
         self.label = label_name
         self.start_time = time.time()
@@ -35,6 +82,29 @@ class DeadReckoningTracker:
         self.frequency = frequency
         self.duration = duration
         self.any_area = any_area
+        self.hazard_engine = HazardEngine(any_area, proximity_threshold, ttc_threshold) if any_area and not zones else None
+        self.zones = zones
+        self.zone_map = None  # Rasterised on the first frame, when the frame size is known
+        self.zone_cell_size = zone_cell_size
+        self.ttc_threshold = ttc_threshold
+        self.ttc_steps = ttc_steps
+        # Alerts are played from a background thread so the frame loop never waits for the beep
+        self.alert_dispatcher = AlertDispatcher()
+        self.sink = make_sink(sink)
+        self.metrics = StreamingMetrics()  # Live accuracy of the next-frame predictions
+        self.metrics_file = metrics_file
+        self.episodes = episodes
+        self.probe = probe if probe is not None else NullProbe()
+        self.probe.attach(self.alert_dispatcher)
+        # Only the monitored classes leave the detector, by default those of the zone class policies
+        classes = classes if classes is not None else zone_classes(zones)
+        self.classes = resolve_class_ids(classes, self.model.model.names) if self.model is not None else None
+        # Inference on padded windows around the hazard regions instead of the full frame
+        regions = zones if zones else [any_area] if any_area else []
+        if roi_margin is not None and regions:
+            self.inference = RoiInference(regions, roi_margin, classes=self.classes)
+        else:
+            self.inference = partial(utilitiesHelper.run_yolov8_inference, classes=self.classes)
 
     def run(self):
         """
@@ -42,18 +112,44 @@ class DeadReckoningTracker:
         Uses a predefined image to overlay if provided and processes each frame until the 'q' key is pressed.
         """
         ret, frame = self.cap.read()  # Initial read to get frame dimensions
+        captured = time.time()  # Capture time of the frame, the hazard time of its alerts
+        self.probe.begin()
         while ret:
-            detections = utilitiesHelper.run_yolov8_inference(self.model, frame)
-            self.process_detection(detections, frame)
-            frame = utilitiesHelper.highlight_area(frame, self.any_area, self.label)
-            cv2.imshow("Frame", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            self.probe.mark("detect_in")
+            detections = self.inference(self.model, frame)
+            self.probe.mark("detect_out")
+            draw = self.sink.due()  # Only annotate the frames the sink actually shows
+            self.process_detection(detections, frame, draw, timestamp=captured)
+            if draw:
+                if self.zone_map is not None:
+                    frame = self.zone_map.draw(frame)
+                else:
+                    frame = utilitiesHelper.highlight_area(frame, self.any_area, self.label)
+                self.sink.write(frame)
+            if self.sink.poll():
                 break
             ret, frame = self.cap.read()
+            captured = time.time()
+            self.probe.begin()
 
+        self.close()
+
+    def close(self):
+        """
+        Releases the video source, closes the prediction log and the alert dispatcher, ends the open alert episodes
+        and writes the summaries. Also called by replays, which never enter run().
+        """
         utilitiesHelper.cleanup(self.cap, self.file)
+        self.alert_dispatcher.close()
+        self.sink.close()
+        if self.episodes is not None:
+            self.episodes.close()
+            self.episodes.log_summary()
+        self.probe.log_summary()
+        if self.metrics_file:
+            self.metrics.dump(self.metrics_file)
 
-    def process_detection(self, detections, frame):
+    def process_detection(self, detections, frame, draw=True, timestamp=None):
             """
             Processes each detection from a list of detections provided by the object detection model,
             applies necessary logic, and checks for proximity hazards.
@@ -61,66 +157,129 @@ class DeadReckoningTracker:
             Parameters:
             - detections (list of tuples): List of detection information from the object detection model.
             - frame (np.array): The current frame being processed.
+            - draw (bool): Annotate the frame, False when running headless.
+            - timestamp (float, optional): Capture time of the detections, defaults to now. Replayed recordings pass
+              the recorded time so the dead-reckoning velocities do not depend on the replay speed.
             """
-            for det in detections:
+            timestamp = time.time() if timestamp is None else timestamp
+            draw = draw and frame is not None
+            if self.identity_tracker:
+                track_ids = self.identity_tracker.update(detections, frame)
+                for key in stale_keys(list(self.last_positions), self.identity_tracker.live_ids()):
+                    del self.last_positions[key]
+                    self.metrics.forget(key)
+            else:
+                track_ids = [UNTRACKED] * len(detections)
+            if self.zones and self.zone_map is None:
+                self.zone_map = ZoneMap(self.zones, frame.shape if frame is not None else self.frame_shape,
+                                        self.zone_cell_size, self.proximity_threshold)
+            excluded = self.zone_map.excluded(detections) if self.zone_map is not None else [False] * len(detections)
+            kept, keys, predictions = [], [], []
+            for det, key, skip in zip(detections, state_keys(detections, track_ids), excluded):
                 x1, y1, x2, y2, _, object_id, class_name = det  # Assuming detections are structured this way
 
-                # If the detected object is within the 'any_area', skip further processing
-                if utilitiesHelper.is_area_excluded(x1, y1, x2, y2, self.any_area):
-                    continue
+                if self.zone_map is None:
+                    # If the detected object is within the 'any_area', skip further processing
+                    if utilitiesHelper.is_area_excluded(x1, y1, x2, y2, self.any_area):
+                        continue
 
-                # Check proximity to boundaries
-                if utilitiesHelper.is_object_near_boundary(det, 10, self.any_area):
-                    print("Alert: Object near the boundary detected!")
+                    # Check proximity to boundaries
+                    if utilitiesHelper.is_object_near_boundary(det, 10, self.any_area):
+                        print("Alert: Object near the boundary detected!")
+                elif skip:
+                    continue
 
-                color = utilitiesHelper.get_color_by_id(object_id)
+                kept.append(det)
+                keys.append(key)
+                predictions.append(self.apply_dead_reckoning(det, timestamp, key))
+                self.metrics.update(key, class_name, timestamp, predictions[-1][:2], predictions[-1][2:])
 
+            self.probe.mark("predict")
 
-                center_x, center_y, future_x, future_y = self.apply_dead_reckoning(det, time.time())
+            # Current boxes and predicted time-to-collision of all objects in one pass
+            hazards = self.assess_hazards(kept, keys)
+            # An open episode keeps its hazard on the frame, only the frame that starts it beeps and writes an alert row
+            if self.episodes is not None:
+                alerting = gate_hazards(self.episodes, timestamp, keys, hazards, [det[6] for det in kept])
+            else:
+                alerting = [condition is not None for condition, _ in hazards]
 
+            # Draw the current and predicted positions of all objects at once
+            if draw:
+                positions = np.array(predictions).reshape(-1, 4)
+                utilitiesHelper.draw_detections(frame, kept, positions[:, :2], positions[:, 2:],
+                                                [condition for condition, _ in hazards])
 
+            for det, key, (center_x, center_y, future_x, future_y), (condition, area), alert in zip(
+                    kept, keys, predictions, hazards, alerting):
+                class_name = det[6]
 
                 # Log the detection if it is not a person
                 if class_name.lower() != 'person':
-                    utilitiesHelper.log_detection(self.writer, time.time(), center_x, center_y, future_x, future_y,
-                                                  class_name)
+                    utilitiesHelper.log_detection(self.writer, timestamp, center_x, center_y, future_x, future_y,
+                                                  class_name, key_track_id(key))
                     utilitiesHelper.log_detection_data(det)
 
-                # Draw predictions on the frame
-                utilitiesHelper.draw_predictions(frame, det, center_x, center_y, future_x, future_y, color)
-
-                # Check proximity to the specified area and trigger alerts if necessary
-                if utilitiesHelper.is_object_near(det, self.any_area, self.proximity_threshold):
+                # Trigger alerts for objects near the specified area or about to reach it
+                if condition is not None and alert:
                     pre_alert_time = time.time()
-                    # Placeholder for alert triggering function
+                    self.alert_dispatcher.dispatch(key=class_name, frequency=self.frequency, duration=self.duration)
                     post_alert_time = time.time()
-                   # utilitiesHelper.trigger_proximity_alert(self.duration, self.frequency)
                     utilitiesHelper.handle_alert(self.alert_file, utilitiesHelper.save_alert_times, det, pre_alert_time,
                                                  post_alert_time, center_x, center_y, future_x, future_y,
                                                  self.start_time,
-                                                 self.any_area)
+                                                 area, condition, timestamp)
+            self.probe.mark("decision")
+
+    def assess_hazards(self, detections, keys):
+        """
+        Evaluates the current boxes and the time-to-collision along the dead-reckoning velocities with any_area
+        (or every zone) for all detections at once.
+
+        Parameters:
+        - detections (list): Detections of the frame, already passed through apply_dead_reckoning.
+        - keys (list): Position history key per detection.
+
+        Returns:
+        - list: (alert condition, area) per detection, the condition is 'center', 'Nearness', 'TTC' or None and
+          the area is the alerting zone's bounding rectangle.
+        """
+        states = np.array([self.last_positions[key] for key in keys], np.float64).reshape(-1, 5)
+        if self.zone_map is not None:
+            trajectories = offsets = None
+            if self.ttc_threshold is not None:
+                trajectories = extrapolate_trajectories(states[:, :2], states[:, 3:], self.ttc_threshold * 1000,
+                                                        self.ttc_steps)
+                offsets = horizon_offsets(self.ttc_threshold * 1000, self.ttc_steps)
+            result = self.zone_map.assess(detections, trajectories, offsets, self.ttc_threshold)
+            return [(c, zone_bounds(self.zones[z]) if z >= 0 else None) for c, z in zip(result.condition, result.zone)]
+        if self.hazard_engine is None:
+            return [(None, None)] * len(detections)
+        return [(c, self.any_area) for c in self.hazard_engine.evaluate(detections, states[:, 3:]).condition]
 
-    def apply_dead_reckoning(self, det, timestamp):
+    def apply_dead_reckoning(self, det, timestamp, key=None):
         """
         Applies dead reckoning to predict the future position of an object based on its current and last known positions.
 
         Parameters:
         - det (list): The detection data containing bounding box and class information.
         - timestamp (float): The current time used for calculating movement speed.
+        - key (hashable, optional): Key of the object's position history, defaults to the class ID.
 
         Returns:
         - tuple: Current and predicted future positions of the object.
         """
         x1, y1, x2, y2, _, cls, _ = det
+        key = cls if key is None else key
         current_x = int((x1 + x2) / 2)
         current_y = int((y1 + y2) / 2)
-        last_info = self.last_positions.get(cls, (current_x, current_y, timestamp))
+        last_info = self.last_positions.get(key, (current_x, current_y, timestamp))
         time_delta = timestamp - last_info[2]
         velocity_x = (current_x - last_info[0]) / time_delta if time_delta > 0 else 0
         velocity_y = (current_y - last_info[1]) / time_delta if time_delta > 0 else 0
         future_x = int(current_x + velocity_x * time_delta)
         future_y = int(current_y + velocity_y * time_delta)
-        self.last_positions[cls] = (current_x, current_y, timestamp)
+        self.last_positions[key] = (current_x, current_y, timestamp, velocity_x, velocity_y)
         return current_x, current_y, future_x, future_y
 
 
@@ -78,9 +78,11 @@ class KalmanFilterWrapper:
         corrected = self.kf.correct(np.array(measurement, dtype=np.float32))
         return corrected
 
-    def predict(self):
+    def predict(self, dt=None):
         """
         Predict the next state of the object using the current state estimate.
+        Args:
+            dt (float, optional): Time step in seconds since the last update. Defaults to one frame (dt = 1).
         Returns:
             tuple: Predicted future position (x, y) based on the model.
         """
@@ -88,9 +90,11 @@ class KalmanFilterWrapper:
         if not self.initialized:
             logging.error("Kalman filter must be initialized before prediction.")
             return None
+        # Use the real elapsed time in the transition model when it is known, one frame otherwise.
+        self.kf.transitionMatrix[0, 2] = self.kf.transitionMatrix[1, 3] = 1 if dt is None else dt
         # Calculate the predicted next state.
         prediction = self.kf.predict()
         # Extract the predicted position from the state vector.
-        self.future_x, self.future_y = int(prediction[0]), int(prediction[1])
-        logging.info(f"Predicted future position: ({self.future_x}, {self.future_y})")
+        self.future_x, self.future_y = int(prediction[0, 0]), int(prediction[1, 0])
+        logging.debug(f"Predicted future position: ({self.future_x}, {self.future_y})")
         return self.future_x, self.future_y
@@ -1,93 +1,253 @@
+import os
+import sys
+
+# The shared modules (bufferedLogging, alertDispatcher, ...) live in the repository root, one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import cv2
 import numpy as np
-import pygame
 import utilitiesHelper  # Import utilities as helper functions
 import time
-from kalman import KalmanFilterWrapper
+import logging
+from functools import partial
+from alertDispatcher import AlertDispatcher, PygameSink
+from kalmanSetUp import KalmanFilterBank
+from identityTracking import IdentityTracker, UNTRACKED, state_keys, stale_keys
+from hazardEngine import HazardEngine
+from hazardZones import ZoneMap, zone_bounds, zone_classes
+from trajectoryPrediction import extrapolate_trajectories, horizon_offsets
+from detectionBatch import as_boxes, resolve_class_ids
+from frameSinks import make_sink
+from predictionMetrics import StreamingMetrics
+from roiInference import RoiInference
+from alertEpisodes import gate_hazards
+from latencyProbe import NullProbe
 
 class ObjectTracker_Kalman:
     def __init__(self, model_path, frequency, duration, proximity_threshold, file_name_predict, file_name_alert,coordinate_threshold,
-                 label_name, source=0, any_area=None):
+                 label_name, source=0, any_area=None, sound_file='awesomefollow.mp3',
+                 tracker_config='bytetrack.yaml', ttc_threshold=1.0, zones=None, ttc_steps=10, sink='window',
+                 metrics_file=None, roi_margin=None, classes=None, episodes=None, probe=None, motion_model='cv',
+                 zone_cell_size=4):
         """
         Initializes the object tracker with specified parameters and manually set any_area.
+        tracker_config selects the ultralytics tracker ('bytetrack.yaml' or 'botsort.yaml') that gives every object
+        its own Kalman filter, None keys the filters by class ID.
+        ttc_threshold (seconds) raises an alert when an object's predicted path reaches any_area that soon,
+        None only alerts on the current box.
+        zones (list of hazardZones.HazardZone) replaces the any_area rectangle by polygon zones with their own
+        thresholds and severities, the predicted path is then sampled at ttc_steps points. Zones without a threshold
+        use proximity_threshold, and near means within it outside the zone (see hazardZones).
+        sink selects where the annotated frames go (see frameSinks.make_sink): 'window', 'none' for headless runs
+        without any drawing, 'video:<path>' or a reduced-rate 'mjpeg:<port>' preview.
+        metrics_file names a JSON file the prediction accuracy (predictionMetrics.StreamingMetrics, live in
+        self.metrics) is written to when run() ends.
+        roi_margin (pixels) runs the detector only on windows around any_area / the zones padded by this margin, with a
+        periodic low-resolution full-frame pass (see roiInference). None detects on the full frame.
+        classes lists the class names to detect, e.g. ['person', 'sports ball', 'cup', 'chair']. They are passed to
+        the detector so other classes are dropped in its NMS. None uses the union of the zone classes (see
+        hazardZones.HazardZone), or every class when a zone has no class policy.
+        episodes (alertEpisodes.AlertEpisodes) alerts once per episode of an object at an area, instead of on every
+        frame the object is near it. None alerts on every frame.
+        probe (latencyProbe.LatencyProbe) stamps capture, detection, filtering, alert decision and alert playback of
+        every frame of run(), None records nothing.
+        motion_model selects the motion model of the Kalman filters (see motionModels): 'cv' constant velocity,
+        'ca' constant acceleration for the parabolic and bouncing clips, or 'imm' mixing both.
+        zone_cell_size (pixels) is the raster cell size of the zone lookup (hazardZones.ZoneMap), larger cells use
+        less memory, 1 tests the zones at full resolution.
+        model_path=None and source=None build a tracker without model and camera, fed through process_detection,
+        e.g. by detectionRecording.replay.
         """
-        self.model = utilitiesHelper.load_model(model_path)
-        self.cap = utilitiesHelper.initialize_video_capture(source)
-        self.kalman_filters = {}
+        self.model = utilitiesHelper.load_model(model_path) if model_path else None
+        self.cap = utilitiesHelper.initialize_video_capture(source) if source is not None else None
+        # (height, width) of the frames, taken from the frames themselves when they are passed in
+        self.frame_shape = (int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                            int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))) if self.cap else None
         self.file, self.writer = utilitiesHelper.setup_csv_writer(file_name_predict)
         self.alert_file = file_name_alert
         self.proximity_threshold = proximity_threshold
         self.label = label_name
         self.any_area = any_area  # Manually set as ((x1, y1), (x2, y2))
         self.start_time = time.time()
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap else 0
+        if self.cap and not self.fps:
+            logging.warning("The source reports no frame rate, the time-to-collision uses the measured frame interval")
+        self.frame_interval = None  # Running mean of the time between frames in seconds
+        self.last_timestamp = None
+        self.hazard_engine = HazardEngine(any_area, proximity_threshold, ttc_threshold) if any_area and not zones else None
+        self.zones = zones
+        self.zone_map = None  # Rasterised on the first frame, when the frame size is known
+        self.zone_cell_size = zone_cell_size
+        self.ttc_threshold = ttc_threshold
+        self.ttc_steps = ttc_steps
         self.frequency = frequency
-        self.kalman_filters = {}
-        self.last_coordinates = {}  # Stores the last coordinates for each class
+        self.kalman_filters = KalmanFilterBank(model=motion_model)  # States of all tracked objects, keyed by track ID
+        self.identity_tracker = IdentityTracker(tracker_config) if tracker_config else None
+        self.last_coordinates = {}  # Stores the last coordinates for each key
         self.coordinate_threshold = coordinate_threshold  # Distance threshold to consider for reinitialization
         self.duration = duration
-        self.classNames = ["person", "sports ball", "cup", "chair"]
+        # Alerts are played from a background thread so the frame loop never waits for the sound
+        self.alert_dispatcher = AlertDispatcher(sinks=[PygameSink(sound_file)])
+        self.sink = make_sink(sink)
+        self.metrics = StreamingMetrics()  # Live accuracy of the next-frame predictions
+        self.metrics_file = metrics_file
+        self.episodes = episodes
+        self.probe = probe if probe is not None else NullProbe()
+        self.probe.attach(self.alert_dispatcher)
+        # Only the monitored classes leave the detector, by default those of the zone class policies
+        classes = classes if classes is not None else zone_classes(zones)
+        self.classes = resolve_class_ids(classes, self.model.model.names) if self.model is not None else None
+        # Inference on padded windows around the hazard regions instead of the full frame
+        regions = zones if zones else [any_area] if any_area else []
+        if roi_margin is not None and regions:
+            self.inference = RoiInference(regions, roi_margin, classes=self.classes)
+        else:
+            self.inference = partial(utilitiesHelper.run_yolov8_inference, classes=self.classes)
 
     def run(self):
         """
         Main execution loop to read video frames and process detections continuously.
         """
         ret, frame = self.cap.read()
+        captured = time.time()  # Capture time of the frame, the hazard time of its alerts
+        self.probe.begin()
         while ret:
-            detections = utilitiesHelper.run_yolov8_inference(self.model, frame)
-            self.process_detection(detections, frame)
-            frame = utilitiesHelper.highlight_area(frame, self.any_area, self.label)
-            cv2.imshow("Frame", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            self.probe.mark("detect_in")
+            detections = self.inference(self.model, frame)
+            self.probe.mark("detect_out")
+            draw = self.sink.due()  # Only annotate the frames the sink actually shows
+            self.process_detection(detections, frame, draw, timestamp=captured)
+            if draw:
+                if self.zone_map is not None:
+                    frame = self.zone_map.draw(frame)
+                else:
+                    frame = utilitiesHelper.highlight_area(frame, self.any_area, self.label)
+                self.sink.write(frame)
+            if self.sink.poll():
                 break
             ret, frame = self.cap.read()
-        utilitiesHelper.cleanup(self.cap, self.file)
+            captured = time.time()
+            self.probe.begin()
+        self.close()
 
-    def trigger_proximity_alert(self, duration=2000, sound_file='awesomefollow.mp3'):
+    def close(self):
         """
-        Triggers a sound to alert for proximity using a specified audio file.
+        Releases the video source, closes the prediction log and the alert dispatcher, ends the open alert episodes
+        and writes the summaries. Also called by replays, which never enter run().
         """
-        pygame.mixer.init()
-        try:
-            sound = pygame.mixer.Sound(sound_file)
-            sound.play()
-            pygame.time.delay(duration)
-            sound.stop()
-        except Exception as e:
-            print(f"Error playing sound: {str(e)}")
-        finally:
-            pygame.mixer.quit()
-
+        utilitiesHelper.cleanup(self.cap, self.file)
+        self.alert_dispatcher.close()
+        self.sink.close()
+        if self.episodes is not None:
+            self.episodes.close()
+            self.episodes.log_summary()
+        self.probe.log_summary()
+        if self.metrics_file:
+            self.metrics.dump(self.metrics_file)
 
+    def trigger_proximity_alert(self, duration=2000, key=None):
+        """
+        Queues a proximity alert sound on the background dispatcher and returns immediately.
+        """
+        self.alert_dispatcher.dispatch(key=key, frequency=self.frequency, duration=duration)
 
-    def process_detection(self, detections, frame):
+    def process_detection(self, detections, frame, draw=True, timestamp=None):
         """
         Processes detected objects, applies Kalman filters, logs detections, and checks for proximity hazards.
         Also checks for significant overlaps between detections to handle object identity management.
+        draw=False skips the annotations, e.g. when running headless. timestamp is the capture time of the
+        detections (defaults to now), frame may be None when the detections are replayed from a recording.
         """
-        for det in detections:
-            x1, y1, x2, y2, _, cls, class_name = det
-            #if class_name not in self.classNames:
-             #   continue
-            if utilitiesHelper.is_area_excluded(x1, y1, x2, y2,self.any_area):
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.last_timestamp is not None and timestamp > self.last_timestamp:
+            interval = timestamp - self.last_timestamp
+            self.frame_interval = interval if self.frame_interval is None else \
+                0.9 * self.frame_interval + 0.1 * interval
+        self.last_timestamp = timestamp
+        if self.identity_tracker:
+            track_ids = self.identity_tracker.update(detections, frame)
+            for key in stale_keys(list(self.kalman_filters.keys), self.identity_tracker.live_ids()):
+                self.kalman_filters.remove(key)
+                self.last_coordinates.pop(key, None)
+                self.metrics.forget(key)
+        else:
+            track_ids = [UNTRACKED] * len(detections)
+        if self.zones and self.zone_map is None:
+            self.zone_map = ZoneMap(self.zones, frame.shape if frame is not None else self.frame_shape,
+                                    self.zone_cell_size, self.proximity_threshold)
+        if self.zone_map is not None:
+            excluded = self.zone_map.excluded(detections)
+        else:
+            excluded = [utilitiesHelper.is_area_excluded(*det[:4], self.any_area) for det in detections]
+        kept, kept_ids = [], []
+        for det, track_id, skip in zip(detections, track_ids, excluded):
+            if skip:
                 continue
-            self.manage_detections(det, frame)
+            kept.append(det)
+            kept_ids.append(track_id)
+        centers, futures = self.apply_kalman_filter(kept, kept_ids)
+        self.probe.mark("predict")
+        hazards = self.assess_hazards(kept, kept_ids, centers)
+        keys = state_keys(kept, kept_ids)
+        # An open episode keeps its hazard on the frame, only the frame that starts it beeps and writes an alert row
+        if self.episodes is not None:
+            alerting = gate_hazards(self.episodes, timestamp, keys, hazards, [det[6] for det in kept])
+        else:
+            alerting = [condition is not None for condition, _ in hazards]
+        for det, key, center, future in zip(kept, keys, centers, futures):
+            self.metrics.update(key, det[6], timestamp, center, future)
+        for det, track_id, center, future, (condition, area), alert in zip(kept, kept_ids, centers, futures, hazards,
+                                                                            alerting):
+            self.manage_detections(det, center, future, condition, area, timestamp, track_id, alert)
+        self.probe.mark("decision")
+        if draw and frame is not None:
+            utilitiesHelper.draw_detections(frame, kept, centers, futures, [condition for condition, _ in hazards])
 
+    def assess_hazards(self, detections, track_ids, centers):
+        """
+        Evaluates the current boxes and the predicted time-to-collision with any_area (or every zone) for all
+        detections at once.
 
-    def manage_detections(self, det, frame):
+        Returns:
+        - list: (alert condition, area) per detection. The condition is 'center', 'Nearness', 'TTC' or None, the area
+          is the alerting zone's bounding rectangle in any_area format.
         """
-        Apply Kalman filter, log, draw, and handle proximity alerts for new and non-overlapping detections.
+        velocities = None
+        # Sources that report no frame rate (fps 0, e.g. some webcams and streams) use the measured frame interval
+        fps = self.fps or (1 / self.frame_interval if self.frame_interval else 0)
+        if self.ttc_threshold is not None and fps:
+            # The filters advance one frame per step, their velocities are in pixels per frame
+            velocities = self.kalman_filters.velocities(state_keys(detections, track_ids)) * fps
+        if self.zone_map is not None:
+            trajectories = offsets = None
+            if velocities is not None:
+                trajectories = extrapolate_trajectories(centers, velocities, self.ttc_threshold * 1000, self.ttc_steps)
+                offsets = horizon_offsets(self.ttc_threshold * 1000, self.ttc_steps)
+            result = self.zone_map.assess(detections, trajectories, offsets, self.ttc_threshold)
+            return [(c, zone_bounds(self.zones[z]) if z >= 0 else None) for c, z in zip(result.condition, result.zone)]
+        if self.hazard_engine is None:
+            return [(None, None)] * len(detections)
+        return [(c, self.any_area) for c in self.hazard_engine.evaluate(detections, velocities).condition]
+
+
+    def manage_detections(self, det, center, future, alert_condition=None, alert_area=None, timestamp=None,
+                          track_id=UNTRACKED, alert=True):
+        """
+        Log and handle proximity alerts for a detection whose current and predicted positions are known, the frame is
+        annotated for all detections at once by process_detection.
+        alert_condition and alert_area are the hazard found by assess_hazards, None means no hazard. alert is False
+        for a hazard whose alert episode is already open, it is then neither beeped nor logged again.
+        track_id is logged with the prediction so its accuracy can be scored per object.
         """
         x1, y1, x2, y2, _, cls, class_name = det
-        color = utilitiesHelper.get_color_by_id(cls)
-        center_x, center_y, kf_wrapper = self.apply_kalman_filter(det)
-        future_x, future_y = kf_wrapper.predict()
-        kf_wrapper.correct(np.array([[center_x], [center_y]]))
+        center_x, center_y = center
+        future_x, future_y = future
         if class_name.lower() != 'person':
-            utilitiesHelper.log_detection(self.writer, time.time(), center_x, center_y, future_x, future_y, class_name)
+            utilitiesHelper.log_detection(self.writer, timestamp or time.time(), center_x, center_y, future_x, future_y, class_name,
+                                          track_id)
             utilitiesHelper.log_detection_data(det)
-        utilitiesHelper.draw_predictions(frame, det, center_x, center_y, future_x, future_y, color)
-        if utilitiesHelper.is_object_near(det, self.any_area, self.proximity_threshold):
-            self.handle_proximity_alert(det, x1, y1, x2, y2)
+        if alert_condition is not None and alert:
+            self.handle_proximity_alert(det, x1, y1, x2, y2, alert_condition, alert_area, timestamp)
 
     def is_significant_movement(self, cls, current_coords):
         if cls in self.last_coordinates:
@@ -96,30 +256,38 @@ class ObjectTracker_Kalman:
             return distance > self.coordinate_threshold
         return True  # Assume significant movement if no previous coordinates
 
-    def apply_kalman_filter(self, det):
-        x1, y1, x2, y2, _, cls, class_name = det
-        center_x = int((x1 + x2) / 2)
-        center_y = int((y1 + y2) / 2)
-        current_coords = np.array([center_x, center_y])
-        # suggest that the Kalman filter should continue with its current state without reinitialization, assuming it already exists for this object.
-        if cls not in self.kalman_filters or self.is_significant_movement(cls, current_coords):
-            self.kalman_filters[cls] = KalmanFilterWrapper()
-            self.kalman_filters[cls].initialize(center_x, center_y)
-
-        self.last_coordinates[cls] = current_coords  # Update the last known coordinates
+    def apply_kalman_filter(self, detections, track_ids=None):
+        """
+        Predicts and corrects the filters of all detections of a frame in one vectorized call on the filter bank.
+        A filter is initialised when its object is new. Detections without a track ID share a class-level filter,
+        which is re-initialised when its centroid jumped more than coordinate_threshold (likely another object).
 
-        return center_x, center_y, self.kalman_filters[cls]
+        Returns:
+        - tuple: (N, 2) int arrays of the current centers and of the positions predicted before the correction.
+        """
+        boxes = as_boxes(detections).astype(int)  # Integer pixels like the legacy detection lists
+        centers = ((boxes[:, :2] + boxes[:, 2:]) / 2).astype(int)
+        keys = state_keys(detections, track_ids)
+        for key, current_coords in zip(keys, centers):
+            # A tracked object keeps its filter, only the class-level filters are reset on a jump
+            if key not in self.kalman_filters or (isinstance(key, tuple) and self.is_significant_movement(key, current_coords)):
+                self.kalman_filters.add(key, *current_coords)
+            self.last_coordinates[key] = current_coords  # Update the last known coordinates
+        futures = self.kalman_filters.predict_correct(keys, centers)
+        return centers, futures.astype(int)
 
 
-    def handle_proximity_alert(self, det, x1, y1, x2, y2):
+    def handle_proximity_alert(self, det, x1, y1, x2, y2, alert_condition=None, alert_area=None, timestamp=None):
         """
-        Handle proximity alerts for detected objects near any_area.
+        Handle proximity alerts for detected objects near any_area. timestamp is the capture time of the frame the
+        hazard was seen on, logged as its hazard time.
         """
         pre_alert_time = time.time()
-        #utilitiesHelper.trigger_proximity_alert(self.duration, self.frequency)
+        self.trigger_proximity_alert(self.duration, key=det[6])
         post_alert_time = time.time()
         utilitiesHelper.handle_alert(self.alert_file, utilitiesHelper.save_alert_times, det, pre_alert_time,
-                                     post_alert_time, x1, y1, x2, y2, self.start_time, self.any_area)
+                                     post_alert_time, x1, y1, x2, y2, self.start_time,
+                                     alert_area or self.any_area, alert_condition, timestamp)
 
 if __name__ == "__main__":
     tracker = ObjectTracker_Kalman(
@@ -1,3 +1,9 @@
+import os
+import sys
+
+# The shared modules (bufferedLogging, alertDispatcher, ...) live in the repository root, one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import cv2
 import numpy as np
 
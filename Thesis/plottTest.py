@@ -1,20 +1,12 @@
+import os
+import sys
+
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
-
-def mean_absolute_error(actual, predicted):
-    """Calculate the Mean Absolute Error using Euclidean distance between actual and predicted points."""
-    actual = np.array(actual)
-    predicted = np.array(predicted)
-    distances = np.sqrt(np.sum((actual - predicted) ** 2, axis=1))
-    return np.mean(distances)
-
-def mean_squared_error(actual, predicted):
-    """Calculate the Mean Squared Error using the squared Euclidean distance between actual and predicted points."""
-    actual = np.array(actual)
-    predicted = np.array(predicted)
-    squared_distances = np.sum((actual - predicted) ** 2, axis=1)
-    return np.mean(squared_distances)
+
+# The Euclidean MAE / MSE are shared with the parameter sweeps, see predictionMetrics in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from predictionMetrics import mean_absolute_error, mean_squared_error
 
 def plot_predictions(filename, title):
     # Load the data
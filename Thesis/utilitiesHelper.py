@@ -6,7 +6,7 @@ It includes functions for image processing, sound alerts, and data logging.
 
 Dependencies:
 - OpenCV (cv2)
-- hashlib, os, uuid: Standard Python libraries for hashing, operating system interaction, and unique identifier generation.
+- os, uuid: Standard Python libraries for operating system interaction and unique identifier generation.
 - csv: For CSV file operations.
 - logging: For logging status and error messages.
 - winsound: For playing sound on Windows.
@@ -37,14 +37,21 @@ It aims to reduce code duplication and foster reusability of common tasks such a
 """
 
 # Import necessary libraries
-import hashlib
-import os
 import cv2
-import csv
 import logging
-import winsound
 from ultralytics import YOLO
 
+# Shared modules of the repository root, the scripts in this directory put it on sys.path before importing this module
+import bufferedLogging
+from detectionBatch import DetectionBatch, class_ids
+from frameAnnotator import FrameAnnotator, detection_labels, palette_color, palette_colors
+from identityTracking import UNTRACKED
+
+try:
+    import winsound
+except ImportError:  # winsound only exists on Windows, see alertDispatcher for portable sinks
+    winsound = None
+
 # Place the function definitions below...
 
 
@@ -57,13 +64,9 @@ def get_color_by_id(class_id):
     - class_id (int): Class ID used to generate a unique color.
 
     Returns:
-    - list: A list of RGB color values.
+    - list: A list of RGB color values, hashed once per ID and then served from a cache (see frameAnnotator).
     """
-    hash_value = hashlib.sha256(str(class_id).encode()).hexdigest()
-    r = int(hash_value[:2], 16)  # Extract two characters for red
-    g = int(hash_value[2:4], 16)  # Extract two characters for green
-    b = int(hash_value[4:6], 16)  # Extract two characters for blue
-    return [r, g, b]
+    return list(palette_color(class_id))
 
 def trigger_proximity_alert(duration=2000, freq=1000):
     """
@@ -72,7 +75,12 @@ def trigger_proximity_alert(duration=2000, freq=1000):
     Parameters:
     - duration (int): Duration of the beep sound in milliseconds.
     - freq (int): Frequency of the beep sound in hertz.
+
+    Note: this blocks for the whole duration, the trackers use alertDispatcher.AlertDispatcher instead.
     """
+    if winsound is None:
+        print("\a", end="", flush=True)  # Terminal bell on platforms without winsound
+        return
     winsound.Beep(freq, duration)  # Play a beep sound
 
 
@@ -118,9 +126,14 @@ def is_object_near_boundary(det, proximity_threshold, area):
     return near_left or near_right or near_top or near_bottom
 
 
+# Box and current position in the object's color, label and predicted position in blue, without underlines
+ANNOTATOR = FrameAnnotator(future_color=(255, 0, 0), label_color=(255, 0, 0), underline=False)
+
+
 def draw_predictions(frame, det, current_x, current_y, future_x, future_y, color):
     """
-    Draws the current and predicted positions of detected objects on the frame.
+    Draws the current and predicted positions of a detected object on the frame. The trackers draw all detections
+    of a frame at once with ANNOTATOR.draw.
 
     Parameters:
     - frame (np.array): The current video frame.
@@ -133,31 +146,55 @@ def draw_predictions(frame, det, current_x, current_y, future_x, future_y, color
     - np.array: The frame with drawings.
     """
     x1, y1, x2, y2, _, cls, class_name = det
-    cv2.circle(frame, (int(current_x), int(current_y)), 10, color, -1)  # Draw circle at current position
-    cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)  # Draw bounding box
-    label = f"{class_name} ({cls})"  # Label format
-    color = (255, 0, 0)  # Blue
+    ANNOTATOR.draw(frame, [(x1, y1, x2, y2)], [(current_x, current_y)], [(future_x, future_y)], [color],
+                   [f"{class_name} ({cls})"])
+    return frame
+
 
-    cv2.putText(frame, label, (int(x1), int(y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)  # Draw label
-    cv2.circle(frame, (int(future_x), int(future_y)), 10, color, -1)  # Draw circle at predicted position
+def draw_detections(frame, detections, centers, futures, conditions=None):
+    """
+    Draws all detections of a frame like draw_predictions, colored by class ID, in one pass.
+
+    Parameters:
+    - frame (np.array): The current video frame.
+    - detections (DetectionBatch or list): Detections of the frame.
+    - centers (array-like): (N, 2) current center coordinates.
+    - futures (array-like): (N, 2) predicted center coordinates.
+    - conditions (list, optional): Hazard condition per detection ('center', 'Nearness', 'TTC' or None). Hazardous
+      detections are drawn in red with their condition in the label.
+
+    Returns:
+    - np.array: The frame with drawings.
+    """
+    colors = palette_colors(class_ids(detections))
+    labels = detection_labels(detections)
+    if conditions is not None:
+        for i, condition in enumerate(conditions):
+            if condition is not None:
+                colors[i] = (0, 0, 255)
+                labels[i] = f"{labels[i]} {condition}"
+    return ANNOTATOR.draw(frame, detections, centers, futures, colors, labels)
 
 
 def setup_csv_writer(filename='tracking_and_predictions.csv'):
     """
-    Sets up a CSV writer for logging detection and prediction data.
+    Sets up a buffered writer for logging detection and prediction data.
+    Rows are kept in memory and written in batches by a background thread (see bufferedLogging),
+    the file extension selects the format (.csv, .parquet, .arrow or .ring).
 
     Parameters:
     - filename (str): Path to the CSV file.
 
     Returns:
-    - tuple: A file object and a csv.writer object or (None, None) if an error occurs.
+    - tuple: The BufferedRowWriter twice (it is both the file and the writer) or (None, None) if an error occurs.
     """
     try:
-        file = open(filename, 'w', newline='')  # Open the file for writing
-        writer = csv.writer(file)  # Create a CSV writer object
-        writer.writerow(['timestamp', 'det_x', 'det_y', 'pred_x', 'pred_y', 'class_name'])  # Write header row
-        return file, writer
-    except IOError as e:
+        writer = bufferedLogging.BufferedRowWriter(filename, ['timestamp', 'det_x', 'det_y', 'pred_x', 'pred_y', 'class_name', 'track_id'],
+                                                   types={'timestamp': 'float64', 'det_x': 'float64', 'det_y': 'float64',
+                                                          'pred_x': 'float64', 'pred_y': 'float64', 'class_name': 'string',
+                                                          'track_id': 'int64'})
+        return writer, writer
+    except (IOError, ImportError, ValueError) as e:
         logging.error(f"File operations failed: {str(e)}")
         return None, None
 
@@ -173,7 +210,7 @@ def highlight_area(frame, area, label="Excluded Area"):
     cv2.putText(frame, label, (label_x, label_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1, cv2.LINE_AA)
     return frame
 
-def log_detection(writer, timestamp, center_x, center_y, future_x, future_y, object_class):
+def log_detection(writer, timestamp, center_x, center_y, future_x, future_y, object_class, track_id=UNTRACKED):
     """
     Logs the detection and prediction data to a CSV file.
 
@@ -183,8 +220,9 @@ def log_detection(writer, timestamp, center_x, center_y, future_x, future_y, obj
     - center_x, center_y (int): Current center coordinates of the object.
     - future_x, future_y (int): Predicted future coordinates of the object.
     - object_class (str): Class of the detected object.
+    - track_id (int): Track ID of the object, UNTRACKED (-1) if it has none.
     """
-    writer.writerow([timestamp, center_x, center_y, future_x, future_y, object_class])
+    writer.writerow([timestamp, center_x, center_y, future_x, future_y, object_class, int(track_id)])
 
 def is_object_near(det, center_area, proximity_threshold):
     """
@@ -200,7 +238,7 @@ def is_object_near(det, center_area, proximity_threshold):
     """
     return is_object_within_bounds(det, center_area) or is_object_near_boundary(det, proximity_threshold, center_area)
 
-def handle_alert(alert_file, save_alert_times, det, pre_alert_time, post_alert_time, center_x, center_y, future_x, future_y, start_time, center_area):
+def handle_alert(alert_file, save_alert_times, det, pre_alert_time, post_alert_time, center_x, center_y, future_x, future_y, start_time, center_area, alert_condition=None, capture_time=None):
     """
     Handles the alert process by logging the alert details based on the object's proximity to the center area.
 
@@ -212,11 +250,36 @@ def handle_alert(alert_file, save_alert_times, det, pre_alert_time, post_alert_t
     - center_x, center_y, future_x, future_y (int): Current and future coordinates of the object.
     - start_time (float): Start time of the tracking process.
     - center_area (tuple): Central area of interest.
+    - alert_condition (str, optional): Reason of the alert, e.g. 'TTC' from hazardEngine. Derived from the box if omitted.
+    - capture_time (float, optional): Capture time of the frame the hazard was seen on. The logged hazard time is taken
+      from it instead of from the alert, the end-to-end latency itself is measured by latencyProbe.
     """
-    hazard_time = post_alert_time - start_time
-    alert_condition = "center" if is_object_within_bounds(det, center_area) else "Nearness"
+    hazard_time = (capture_time if capture_time is not None else post_alert_time) - start_time
+    if alert_condition is None:
+        alert_condition = "center" if is_object_within_bounds(det, center_area) else "Nearness"
     save_alert_times(alert_file, pre_alert_time, post_alert_time, det[6], center_x, center_y, future_x, future_y, hazard_time, alert_condition, center_area)
 
+# Column names of the alert CSV written by save_alert_times
+ALERT_HEADER = [
+    'Pre-alert DateTime UTC',
+    'Post-alert DateTime UTC',
+    'Alert Duration (seconds)',
+    'Detected Object Type',
+    'Object Location detected X1 ',
+    'Object Location detected Y1 ',
+    'Object Location detected X2 ',
+    'Object Location detected Y2 ',
+    'Total time (seconds)',
+    'Alert Type',
+    'Area Robotic Arm Top-Left X ',
+    'Area Robotic Arm Top-Left Y ',
+    'Area Robotic Arm Bottom-Right X ',
+    'Area Robotic Arm Bottom-Right Y '
+]
+# Declared column types of the alert log, used by the Arrow/Parquet formats
+ALERT_TYPES = {name: 'float64' for name in ALERT_HEADER}
+ALERT_TYPES.update({'Detected Object Type': 'string', 'Alert Type': 'string'})
+
 def save_alert_times(alert_file, pre_alert_time, post_alert_time, object_class, location_x, location_y, future_pos_x, future_pos_y, hazard_time, alert_condition, center_area):
     """
     Saves detailed alert times and conditions to a CSV file.
@@ -227,37 +290,18 @@ def save_alert_times(alert_file, pre_alert_time, post_alert_time, object_class,
     - object_class (str): Class of the detected object.
     - location_x, location_y, future_pos_x, future_pos_y (int): Current and predicted locations of the object.
     - hazard_time (float): Time since the start of the tracking to the hazard occurrence.
-    - alert_condition (str): Type of alert condition ('center' or 'Nearness').
+    - alert_condition (str): Type of alert condition ('center', 'Nearness' or 'TTC').
     - center_area (tuple): Coordinates of the center area where alerts are monitored.
     """
     alert_duration = post_alert_time - pre_alert_time  # Calculate the duration of the alert
     try:
-        # Check if file exists and needs a header
-        needs_header = not os.path.exists(alert_file) or os.stat(alert_file).st_size == 0
-        with open(alert_file, 'a', newline='') as file:
-            writer = csv.writer(file)
-            if needs_header:
-                writer.writerow([
-                    'Pre-alert DateTime UTC',
-                    'Post-alert DateTime UTC',
-                    'Alert Duration (seconds)',
-                    'Detected Object Type',
-                    'Object Location detected X1 ',
-                    'Object Location detected Y1 ',
-                    'Object Location detected X2 ',
-                    'Object Location detected Y2 ',
-                    'Total time (seconds)',
-                    'Alert Type',
-                    'Area Robotic Arm Top-Left X ',
-                    'Area Robotic Arm Top-Left Y ',
-                    'Area Robotic Arm Bottom-Right X ',
-                    'Area Robotic Arm Bottom-Right Y '
-                ])
-            writer.writerow([
-                pre_alert_time, post_alert_time, alert_duration, object_class, location_x, location_y, future_pos_x, future_pos_y, hazard_time, alert_condition,
-                center_area[0][0], center_area[0][1], center_area[1][0], center_area[1][1]
-            ])
-    except IOError as e:
+        # The shared writer keeps the file open and writes the rows in batches
+        writer = bufferedLogging.get_shared_writer(alert_file, ALERT_HEADER, types=ALERT_TYPES)
+        writer.writerow([
+            pre_alert_time, post_alert_time, alert_duration, object_class, location_x, location_y, future_pos_x, future_pos_y, hazard_time, alert_condition,
+            center_area[0][0], center_area[0][1], center_area[1][0], center_area[1][1]
+        ])
+    except (IOError, ImportError, ValueError) as e:
         logging.error(f"Failed to save alert time: {str(e)}")
 
 
@@ -275,7 +319,10 @@ def cleanup(cap, file):
     """
     if cap:
         cap.release()  # Release the video capture object to free up system resources
-    cv2.destroyAllWindows()  # Close all OpenCV windows to ensure no GUI remnants are left
+    try:
+        cv2.destroyAllWindows()  # Close all OpenCV windows to ensure no GUI remnants are left
+    except cv2.error:
+        pass  # Headless OpenCV build (e.g. on the edge boxes), there are no windows to close
     if file:
         file.close()  # Ensure the file is closed properly to prevent data corruption or loss
 
@@ -316,39 +363,27 @@ def initialize_video_capture(source):
     return cap  # Return the video capture object
 
 
-def run_yolov8_inference(model, frame):
+def run_yolov8_inference(model, frame, classes=None):
     """
     Performs object detection on the given frame using the YOLOv8 model.
 
     Parameters:
     - model (YOLO): The YOLO model used for performing inference.
     - frame (np.array): The video frame to be processed.
+    - classes (list, optional): Class IDs the model reports, None for all. The filtering happens in the model's NMS,
+      so unwanted classes never reach the tracker.
 
     Returns:
-    - detections (list): A list of detections, each detection is a list containing bounding box coordinates,
-      confidence score, class ID, and class name.
+    - detections (DetectionBatch): The detections of the frame as column views over the result boxes. Indexing and
+      iterating it yields lists containing bounding box coordinates, confidence score, class ID, and class name.
     """
     # Perform inference with the YOLOv8 model
-    results = model.predict(frame)
-    detections = []  # Initialize an empty list to store detections
-
-    # Process the results of the inference
-    if results:
-        detection_result = results[0]  # Assuming the first item in results contains the detection information
-        xyxy = detection_result.boxes.xyxy.numpy()  # Extract bounding box coordinates
-        confidence = detection_result.boxes.conf.numpy()  # Extract confidence scores
-        class_ids = detection_result.boxes.cls.numpy().astype(int)  # Extract class IDs
-        class_names = [model.model.names[cls_id] for cls_id in class_ids]  # Map class IDs to their respective names
-
-        # Create a list of detections from the results
-        for i in range(len(xyxy)):
-            x1, y1, x2, y2 = map(int, xyxy[i])  # Convert bounding box coordinates to integers
-            conf = confidence[i]  # Confidence score for this detection
-            cls_id = class_ids[i]  # Class ID for this detection
-            class_name = class_names[i]  # Class name for this detection
-            detections.append([x1, y1, x2, y2, conf, cls_id, class_name])
-
-    return detections  # Return the list of detections
+    results = model.predict(frame, classes=classes)
+
+    # Wrap the boxes of the first result without building a list per detection
+    if not results:
+        return DetectionBatch.from_list([], model.model.names)
+    return DetectionBatch.from_result(results[0], model.model.names)
 
 def is_area_excluded(x1, y1, x2, y2,any_area):
     """
@@ -365,13 +400,5 @@ def log_detection_data(det, file_path='yolo_data.csv'):
         det (list or tuple): A list or tuple where det[4] is the confidence score and det[6] is the class name.
         file_path (str): The path to the CSV file where data will be logged.
     """
-    # Check if the file already exists and has content
-    if not os.path.exists(file_path) or os.stat(file_path).st_size == 0:
-        # Open the file for writing and write headers
-        with open(file_path, 'w') as file:
-            file.write('Confidence Score,Class Name\n')  # Write the column headers
-
-    # Now, write the detection data
-    with open(file_path, 'a') as file:
-        # Write the confidence score and class name from the detection data
-        file.write(f"{det[4]},{det[6]}\n")
\ No newline at end of file
+    # The shared writer writes the header once and appends the rows in batches
+    bufferedLogging.get_shared_writer(file_path, ['Confidence Score', 'Class Name']).writerow([det[4], det[6]])
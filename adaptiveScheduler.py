@@ -0,0 +1,180 @@
+# adaptiveScheduler.py
+"""
+Adaptive detector scheduling for the safety trackers.
+
+The run() loops pay a full YOLO inference on every frame, even when nothing in the cell moves. AdaptiveScheduler
+runs the detector only every `interval` frames and fills the frames in between with predicted boxes:
+
+    - the interval follows the scene motion: it is the number of frames the fastest object needs to move
+      motion_budget pixels, capped at max_interval. It grows by one frame per detector run and drops at once,
+    - as soon as an object approaches a hazard (a target/object pair closer than hazard_margin times the
+      proximity threshold, now or after the next interval at the current velocities) the detector runs on every
+      frame again,
+    - optionally the camera motion is estimated on every frame with the global motion compensation of the
+      ultralytics trackers (ultralytics.trackers.utils.gmc.GMC, sparse optical flow on a downscaled image). The
+      predicted boxes are warped by it, and a camera move larger than motion_budget forces a detector run.
+
+On a skipped frame the tracker moves the boxes of the last detector run by its own prediction (Kalman filter or dead
+reckoning, see propagate_detections of the trackers) and checks the alerts on them, so a pair closing in between two
+detector runs is still reported. The saved inference time lets one CPU box serve several cameras.
+"""
+
+import logging
+import time
+
+import numpy as np
+
+import proximityEngine
+from detectionBatch import DetectionBatch, as_boxes
+
+
+def approaching(boxes, target_mask, proximity_threshold, velocities=None, frames=1, margin=2.0):
+    """
+    Returns True if any target/object pair is near (within margin * proximity_threshold) or overlapping, now or
+    after `frames` frames at the given velocities.
+
+    Args:
+        boxes (np.ndarray): (N, >=4) boxes [x1, y1, x2, y2, ...].
+        target_mask (np.ndarray): (N,) bool mask of the targets (e.g. persons).
+        proximity_threshold (float): Proximity threshold of the alerts in pixels.
+        velocities (np.ndarray | None): (N, 2) velocities in pixels per frame.
+        frames (int): Look-ahead in frames for the velocity check.
+        margin (float): Multiple of the proximity threshold that counts as approaching.
+    """
+    boxes = as_boxes(boxes)
+    if not len(boxes) or not np.any(target_mask) or np.all(target_mask):
+        return False
+    threshold = proximity_threshold * margin
+    if len(proximityEngine.hazard_pairs(proximityEngine.pairwise_proximity(boxes, target_mask, threshold))):
+        return True
+    if velocities is None:
+        return False
+    shift = np.tile(np.asarray(velocities, np.float32).reshape(-1, 2) * frames, 2)
+    ahead = proximityEngine.pairwise_proximity(boxes + shift, target_mask, threshold)
+    return bool(len(proximityEngine.hazard_pairs(ahead)))
+
+
+class AdaptiveScheduler:
+    """
+    Decides per frame whether the detector runs.
+
+    Attributes:
+        interval (int): Current number of frames per detector run, 1 runs the detector on every frame.
+        skipped (int): Frames since the last detector run.
+        hazard (bool): An object approached a hazard at the last detector run.
+        detector_frames (int): Frames with a detector run.
+        skipped_frames (int): Frames filled in by prediction.
+        warp (np.ndarray): 3x3 camera motion since the last detector run (identity without GMC).
+
+    Methods:
+        due(frame, timestamp=None): Called on every frame, True if the detector must run on it.
+        update(boxes, velocities, target_mask, proximity_threshold): Adapts the interval after a detector run.
+        shift_boxes(detections, shifts): The last detections moved by their predicted motion.
+    """
+
+    def __init__(self, max_interval=6, motion_budget=6.0, hazard_margin=2.0, gmc=None, gmc_downscale=4):
+        """
+        Args:
+            max_interval (int): Largest number of frames per detector run.
+            motion_budget (float): Pixels an object (or the camera) may move before the detector runs again.
+            hazard_margin (float): Multiple of the proximity threshold below which every frame is detected.
+            gmc (str | None): GMC method for the camera motion, e.g. 'sparseOptFlow' or 'ecc'. None assumes a
+                fixed camera and skips the estimation.
+            gmc_downscale (int): Downscale factor of the frames for the GMC.
+        """
+        self.max_interval = max(int(max_interval), 1)
+        self.motion_budget = motion_budget
+        self.hazard_margin = hazard_margin
+        self.interval = 1
+        self.skipped = 0
+        self.hazard = False
+        self.detector_frames = 0
+        self.skipped_frames = 0
+        self.frame_dt = None  # Smoothed time between frames in seconds
+        self._last_time = None
+        self.warp = np.eye(3)
+        self.gmc = None
+        if gmc:
+            from ultralytics.trackers.utils.gmc import GMC
+
+            self.gmc = GMC(method=gmc, downscale=gmc_downscale)
+
+    def due(self, frame, timestamp=None):
+        """
+        Registers a frame and returns True if the detector has to run on it.
+
+        Args:
+            frame (np.ndarray | None): The captured frame, used for the camera motion estimation.
+            timestamp (float | None): Capture time, defaults to now.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._last_time is not None and timestamp > self._last_time:
+            dt = timestamp - self._last_time
+            self.frame_dt = dt if self.frame_dt is None else 0.9 * self.frame_dt + 0.1 * dt
+        self._last_time = timestamp
+        if self.gmc is not None and frame is not None:
+            H = np.vstack((self.gmc.apply(frame), (0, 0, 1)))
+            self.warp = H @ self.warp
+        camera_moved = np.hypot(*self.warp[:2, 2]) > self.motion_budget
+        if self.skipped + 1 >= self.interval or camera_moved:
+            self.skipped = 0
+            self.warp = np.eye(3)
+            self.detector_frames += 1
+            return True
+        self.skipped += 1
+        self.skipped_frames += 1
+        return False
+
+    def update(self, boxes, velocities, target_mask, proximity_threshold, per_second=True):
+        """
+        Adapts the interval to the detections of a detector run.
+
+        Args:
+            boxes (np.ndarray | DetectionBatch | list): Detections of the frame.
+            velocities (np.ndarray): (N, 2) velocities of the detections.
+            target_mask (np.ndarray): (N,) bool mask of the targets.
+            proximity_threshold (float): Proximity threshold of the alerts in pixels.
+            per_second (bool): Velocities are in pixels per second (timestamped predictors), False for pixels
+                per frame.
+
+        Returns:
+            int: The new interval.
+        """
+        velocities = np.asarray(velocities, np.float64).reshape(-1, 2)
+        if per_second:
+            velocities = velocities * (self.frame_dt or 1 / 30)
+        speed = float(np.hypot(*velocities.T).max()) if len(velocities) else 0.0
+        self.hazard = approaching(boxes, target_mask, proximity_threshold, velocities, self.max_interval,
+                                  self.hazard_margin)
+        if self.hazard:
+            self.interval = 1
+        else:
+            target = int(np.clip(self.motion_budget / speed, 1, self.max_interval)) if speed > 0 else self.max_interval
+            self.interval = min(self.interval + 1, target)  # Grow slowly, drop at once
+        return self.interval
+
+    def shift_boxes(self, detections, shifts):
+        """
+        Moves the detections of the last detector run by their predicted motion and by the camera motion since.
+
+        Args:
+            detections (DetectionBatch | list): Detections of the last detector run.
+            shifts (np.ndarray): (N, 2) predicted motion of every detection since the detector run.
+
+        Returns:
+            DetectionBatch: The moved detections.
+        """
+        batch = detections if isinstance(detections, DetectionBatch) else DetectionBatch.from_list(detections)
+        data = batch.data.copy()
+        data[:, :4] += np.tile(np.asarray(shifts, np.float32).reshape(-1, 2), 2)
+        if self.gmc is not None:
+            corners = data[:, :4].reshape(-1, 2)
+            data[:, :4] = (corners @ self.warp[:2, :2].T + self.warp[:2, 2]).reshape(-1, 4)
+        return DetectionBatch(data, batch.names)
+
+    def log_summary(self):
+        """Logs the share of frames the detector ran on."""
+        total = self.detector_frames + self.skipped_frames
+        if total:
+            logging.info(f"Adaptive scheduling: detector ran on {self.detector_frames}/{total} frames "
+                         f"({100 * self.detector_frames / total:.0f}%), current interval {self.interval}")
@@ -0,0 +1,214 @@
+# alertDispatcher.py
+"""
+Non-blocking alert dispatching for the safety trackers.
+
+Playing an alert sound (winsound.Beep, pygame.time.delay) blocks for the full duration of the sound, which used to
+stall frame capture and inference exactly when a hazard was in view. The AlertDispatcher puts alerts on a queue and
+plays them from a background worker thread, so the tracker loop only pays for a queue put.
+
+Alerts are de-duplicated and rate limited per key, typically the (person, object) pair that caused the alert, so a
+pair that stays in a hazardous position does not flood the sinks with one alert per frame.
+
+Sinks are small objects with a play(alert) method. WinsoundSink (Windows), PygameSink (any platform with an audio
+device), BellSink (terminal bell, works on headless Linux boxes) and NullSink are provided.
+"""
+
+import logging
+import queue
+import sys
+import threading
+import time
+from collections import namedtuple
+
+Alert = namedtuple("Alert", ["key", "frequency", "duration", "created", "info"])
+Alert.__doc__ = """
+A single alert request.
+
+Attributes:
+    key (hashable): Identity of the alert, e.g. the (person, object) pair. Used for de-duplication and rate limiting.
+    frequency (int): Beep frequency in Hertz (ignored by sinks that play a sound file).
+    duration (int): Duration of the alert in milliseconds.
+    created (float): time.time() at which the alert was dispatched.
+    info (dict): Free-form context passed through to the sinks.
+"""
+
+
+class NullSink:
+    """Sink that discards every alert. Useful for headless benchmarks and replays."""
+
+    def play(self, alert):
+        """Ignores the alert."""
+
+
+class LoggingSink:
+    """Sink that logs every alert at WARNING level."""
+
+    def play(self, alert):
+        """Logs the alert key and context."""
+        logging.warning(f"Proximity alert {alert.key} {alert.info}")
+
+
+class BellSink:
+    """Sink that rings the terminal bell. Works on any platform, including headless Linux boxes."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def play(self, alert):
+        """Writes the BEL character to the stream."""
+        self.stream.write("\a")
+        self.stream.flush()
+
+
+class WinsoundSink:
+    """Sink that plays a beep through winsound (Windows only)."""
+
+    def __init__(self):
+        import winsound  # Imported here so that the module stays importable on Linux
+
+        self.winsound = winsound
+
+    def play(self, alert):
+        """Plays a beep with the alert frequency and duration."""
+        self.winsound.Beep(alert.frequency, alert.duration)
+
+
+class PygameSink:
+    """
+    Sink that plays a sound file through pygame.
+
+    The mixer is initialised and the sound is loaded once, on the first alert, instead of on every alert.
+    Playback is asynchronous in pygame, so play() returns immediately and the sound is cut after alert.duration.
+    """
+
+    def __init__(self, sound_file="awesomefollow.mp3"):
+        self.sound_file = sound_file
+        self.sound = None
+
+    def play(self, alert):
+        """Plays the preloaded sound for the alert duration."""
+        if self.sound is None:
+            import pygame
+
+            pygame.mixer.init()
+            self.sound = pygame.mixer.Sound(self.sound_file)
+        self.sound.play(maxtime=int(alert.duration))
+
+
+def default_sink():
+    """
+    Picks the best available audio sink for the current platform.
+
+    Returns:
+        WinsoundSink on Windows, otherwise a BellSink.
+    """
+    try:
+        return WinsoundSink()
+    except ImportError:
+        return BellSink()
+
+
+class AlertDispatcher:
+    """
+    Background alert dispatcher with a bounded queue, a worker thread, per-key de-duplication and rate limiting.
+
+    Attributes:
+        sinks (list): Sinks that every accepted alert is played on, in order.
+        min_interval (float): Minimum time in seconds between two alerts with the same key.
+        alert_queue (queue.Queue): Bounded queue between the tracker loop and the worker thread.
+        dropped (int): Number of alerts that were rejected (duplicate, rate limited or queue full).
+        context (function | None): Called on every dispatch, returns extra info merged into the alert.
+        on_play (function | None): Called with every alert by the worker thread right before the sinks play it.
+
+    Methods:
+        dispatch(key, ...): Enqueues an alert without blocking. Returns True if the alert was accepted.
+        beep(frequency, duration, key): Drop-in replacement for utilsNeeded.beep_alert.
+        close(): Stops the worker thread after the queued alerts have been played.
+    """
+
+    def __init__(self, sinks=None, min_interval=1.0, max_queue=32, context=None, on_play=None):
+        """
+        Initializes the dispatcher and starts the worker thread.
+
+        Args:
+            sinks (list | None): Sinks to play alerts on. Defaults to [default_sink()].
+            min_interval (float): Minimum time in seconds between two alerts with the same key.
+            max_queue (int): Maximum number of pending alerts before new ones are dropped.
+            context (function | None): Returns a dict of extra info for every alert, e.g. the frame it was raised
+                on (see latencyProbe.LatencyProbe.attach).
+            on_play (function | None): on_play(alert) is called when the worker starts playing an alert.
+        """
+        self.sinks = list(sinks) if sinks is not None else [default_sink()]
+        self.min_interval = min_interval
+        self.alert_queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.context = context
+        self.on_play = on_play
+        self._lock = threading.Lock()
+        self._pending = set()  # Keys that are queued but not played yet
+        self._last_sent = {}  # Last accepted time per key
+        self._worker = threading.Thread(target=self._run, name="AlertDispatcher", daemon=True)
+        self._worker.start()
+
+    def dispatch(self, key=None, frequency=3000, duration=500, **info):
+        """
+        Enqueues an alert without blocking the caller.
+
+        Args:
+            key (hashable): Identity of the alert, e.g. (person_class, object_class).
+            frequency (int): Beep frequency in Hertz.
+            duration (int): Alert duration in milliseconds.
+            **info: Extra context handed to the sinks.
+
+        Returns:
+            bool: True if the alert was queued, False if it was de-duplicated, rate limited or the queue was full.
+        """
+        now = time.time()
+        if self.context is not None:
+            info = {**self.context(), **info}
+        with self._lock:
+            if key in self._pending or now - self._last_sent.get(key, float("-inf")) < self.min_interval:
+                self.dropped += 1
+                return False
+            try:
+                self.alert_queue.put_nowait(Alert(key, frequency, duration, now, info))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._pending.add(key)
+            self._last_sent[key] = now
+        return True
+
+    def beep(self, frequency=2500, duration=1000, key=None):
+        """Same signature as utilsNeeded.beep_alert, so it can be passed as beep_alert_func."""
+        self.dispatch(key=key, frequency=frequency, duration=duration)
+
+    def close(self, timeout=5.0):
+        """
+        Stops the worker thread once the queued alerts have been played.
+
+        Args:
+            timeout (float): Maximum time in seconds to wait for the worker.
+        """
+        if self._worker.is_alive():
+            self.alert_queue.put(None)  # Sentinel
+            self._worker.join(timeout)
+
+    def _run(self):
+        """Worker loop playing queued alerts on every sink."""
+        while True:
+            alert = self.alert_queue.get()
+            if alert is None:
+                break
+            if self.on_play is not None:
+                try:
+                    self.on_play(alert)
+                except Exception as e:
+                    logging.error(f"Alert on_play callback failed: {str(e)}")
+            for sink in self.sinks:
+                try:
+                    sink.play(alert)
+                except Exception as e:
+                    logging.error(f"Alert sink {type(sink).__name__} failed: {str(e)}")
+            with self._lock:
+                self._pending.discard(alert.key)
@@ -0,0 +1,271 @@
+# alertEpisodes.py
+"""
+Per-pair alert episodes with hysteresis and debouncing.
+
+check_and_alert beeps and appends an alert row on every frame in which any person/object pair is close, and its
+alert_start_time / alert_times bookkeeping is one global episode shared by all pairs. The thesis trackers log a row
+for every frame an object is near the area. A person leaning next to a table for ten seconds at 30 fps therefore
+produces 300 rows and as many beeps, and the "response time" of later rows says nothing.
+
+AlertEpisodes groups the per-frame hazard observations by key (a person/object pair, or an object and a zone) into
+episodes:
+
+    - enter hysteresis: an episode starts after enter_frames consecutive frames meeting the enter condition.
+      check_and_alert additionally holds an open episode while the pair is within exit_margin times the
+      proximity threshold, so a pair hovering at the threshold does not flicker,
+    - exit debounce: an episode ends only when its key was not observed for more than exit_s seconds,
+    - one start event per episode (one beep, one alert row) and one end event with the episode summary:
+      first observation, alert start, end, peak severity, response time (alert start - first observation) and lead
+      time (first contact - alert start, for episodes that escalated to contact).
+
+Finished episodes can be appended to a CSV file (any bufferedLogging format) and are aggregated by summary().
+gate_hazards decides which per-detection (condition, area) hazards of the thesis trackers raise a new alert.
+"""
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+import bufferedLogging
+
+EPISODE_HEADER = ["Key", "Label", "First Seen", "Start", "End", "Duration", "Peak Severity", "Frames",
+                  "Response Time", "Lead Time"]
+# Declared column types of the episode log, used by the Arrow/Parquet formats
+EPISODE_TYPES = dict.fromkeys(EPISODE_HEADER, "float64")
+EPISODE_TYPES.update({"Key": "string", "Label": "string", "Frames": "int64"})
+
+# Severity rank of the hazard conditions of hazardEngine / hazardZones, contact ('center') is the most severe
+CONDITION_SEVERITY = {"TTC": 1, "Nearness": 2, "center": 3}
+
+AlertEpisode = namedtuple("AlertEpisode", ["key", "label", "first_seen", "start", "end", "peak_severity", "frames",
+                                           "contact", "response_time", "lead_time"])
+AlertEpisode.__doc__ = """
+One alert episode of a key.
+
+Attributes:
+    key: Episode key, e.g. (person track key, object track key) or (object key, zone name).
+    label: Description stored with the first observation, e.g. the (person class, object class) names.
+    first_seen (float): Time of the first observation meeting the enter condition.
+    start (float): Time the episode was entered, i.e. the alert was raised.
+    end (float | None): Time of the last observation, None while the episode is open.
+    peak_severity (float): Highest severity observed during the episode.
+    frames (int): Number of frames the key was observed.
+    contact (float | None): Time of the first contact observation, None if none.
+    response_time (float): start - first_seen, the delay added by the enter hysteresis.
+    lead_time (float | None): contact - start, how long the alert preceded the contact.
+"""
+
+
+class _OpenEpisode:
+    """Mutable state of a candidate or active episode."""
+
+    __slots__ = ("label", "first_seen", "start", "last_seen", "peak", "frames", "streak", "contact")
+
+    def __init__(self, label, timestamp):
+        self.label = label
+        self.first_seen = timestamp
+        self.start = None  # Set when the episode is entered
+        self.last_seen = timestamp
+        self.peak = -np.inf
+        self.frames = 0
+        self.streak = 0
+        self.contact = None
+
+    def freeze(self, key, end=None):
+        """Returns the AlertEpisode of an entered episode."""
+        lead = self.contact - self.start if self.contact is not None else None
+        return AlertEpisode(key, self.label, self.first_seen, self.start, end, self.peak, self.frames, self.contact,
+                            self.start - self.first_seen, lead)
+
+
+class AlertEpisodes:
+    """
+    Turns per-frame hazard observations into per-key alert episodes.
+
+    Attributes:
+        enter_frames (int): Consecutive entering frames needed to start an episode.
+        exit_s (float): Seconds without observation after which an episode ends.
+        exit_margin (float): Multiple of the proximity threshold that holds an open episode (see check_and_alert).
+        file_name (str | None): Episode log, one row per finished episode.
+        episodes (int): Number of started episodes.
+        observations (int): Number of per-frame observations, i.e. the rows / beeps of per-frame alerting.
+        active (list): Keys of the open episodes.
+        active_since (float | None): First observation of the earliest open episode.
+
+    Methods:
+        update(timestamp, keys, entering=None, severities=None, contact=None, labels=None): Feeds one frame.
+        close(): Ends all open episodes.
+        summary(): Episode counts, response and lead times.
+    """
+
+    def __init__(self, enter_frames=1, exit_s=0.5, exit_margin=1.5, file_name=None):
+        """
+        Args:
+            enter_frames (int): Number of consecutive frames a key must meet the enter condition before its episode
+                starts and the alert is raised. 1 alerts on the first frame, larger values suppress single-frame
+                detector glitches at the cost of (enter_frames - 1) frames of response time.
+            exit_s (float): An episode ends when its key was not observed for longer than this many seconds, so
+                short detection dropouts do not split it.
+            exit_margin (float): Pairs stay in an open episode while within exit_margin times the proximity
+                threshold (check_and_alert), 1 disables the spatial hysteresis.
+            file_name (str | None): File the finished episodes are appended to, see EPISODE_HEADER.
+        """
+        self.enter_frames = max(int(enter_frames), 1)
+        self.exit_s = exit_s
+        self.exit_margin = exit_margin
+        self.file_name = file_name
+        self._open = {}  # Key -> _OpenEpisode, candidates and active episodes
+        self.episodes = 0
+        self.observations = 0
+        self.finished = 0
+        self._response = []
+        self._lead = []  # Lead times of the episodes that escalated to contact, negative if contact came first
+
+    @property
+    def active(self):
+        """Keys of the open (alerted) episodes."""
+        return [key for key, e in self._open.items() if e.start is not None]
+
+    @property
+    def active_since(self):
+        """First observation of the earliest open episode, None if no episode is open."""
+        starts = [e.first_seen for e in self._open.values() if e.start is not None]
+        return min(starts) if starts else None
+
+    def update(self, timestamp, keys, entering=None, severities=None, contact=None, labels=None):
+        """
+        Feeds the hazard observations of one frame.
+
+        Args:
+            timestamp (float): Time of the frame.
+            keys (list): Keys observed in the frame, repeated keys are merged. Open episodes whose key is missing
+                end once it has been missing for more than exit_s.
+            entering (array-like | None): Per key, True if the enter condition holds (a missing or False entry only
+                holds an open episode), None for all True.
+            severities (array-like | None): Severity per key, e.g. 2 for overlap and 1 for near.
+            contact (array-like | None): Per key, True when the observation is an actual contact.
+            labels (list | None): Description per key, kept from the first observation of an episode.
+
+        Returns:
+            tuple: (started, ended) lists of AlertEpisode, the episodes entered in this frame (end None) and the
+                episodes that ended before it.
+        """
+        n = len(keys)
+        entering = np.ones(n, bool) if entering is None else np.asarray(entering, bool)
+        severities = np.ones(n) if severities is None else np.asarray(severities, np.float64)
+        contact = np.zeros(n, bool) if contact is None else np.asarray(contact, bool)
+        observed = {}  # Key -> (entering, severity, contact, label), repeated keys of a frame are merged
+        for i, key in enumerate(keys):
+            e, sev, c, label = observed.get(key, (False, -np.inf, False, labels[i] if labels is not None else None))
+            observed[key] = (e or entering[i], max(sev, severities[i]), c or contact[i], label)
+        started = []
+        for key, (e, sev, c, label) in observed.items():
+            episode = self._open.get(key)
+            if episode is None:
+                if not e:
+                    continue  # Within the exit margin only, no episode to hold
+                episode = self._open[key] = _OpenEpisode(label, timestamp)
+            self.observations += 1
+            episode.last_seen = timestamp
+            episode.frames += 1
+            episode.peak = max(episode.peak, sev)
+            if c and episode.contact is None:
+                episode.contact = timestamp
+            if episode.start is None:
+                episode.streak = episode.streak + 1 if e else 0
+                if episode.streak >= self.enter_frames:
+                    episode.start = timestamp
+                    self.episodes += 1
+                    started.append(episode.freeze(key))
+        ended = []
+        for key in [key for key in self._open if key not in observed]:
+            episode = self._open[key]
+            if episode.start is None:
+                del self._open[key]  # The enter condition did not hold for enter_frames consecutive frames
+            elif timestamp - episode.last_seen > self.exit_s:
+                ended.append(self._finish(key))
+        return started, ended
+
+    def _finish(self, key):
+        state = self._open.pop(key)
+        episode = state.freeze(key, state.last_seen)
+        self.finished += 1
+        self._response.append(episode.response_time)
+        if episode.lead_time is not None:
+            self._lead.append(episode.lead_time)
+        if self.file_name:
+            try:
+                writer = bufferedLogging.get_shared_writer(self.file_name, EPISODE_HEADER, types=EPISODE_TYPES)
+                writer.writerow([str(episode.key), str(episode.label), episode.first_seen, episode.start, episode.end,
+                                 episode.end - episode.start, episode.peak_severity, episode.frames,
+                                 episode.response_time, episode.lead_time])
+            except (IOError, ImportError, ValueError) as e:
+                logging.error(f"Failed to save alert episode: {str(e)}")
+        return episode
+
+    def close(self):
+        """Ends all open episodes (e.g. when the source ends) and returns them, candidates are dropped."""
+        ended = [self._finish(key) for key, e in list(self._open.items()) if e.start is not None]
+        self._open.clear()
+        return ended
+
+    def summary(self):
+        """
+        Returns:
+            dict: episodes, finished, observations, mean / max response time, mean lead time of the finished episodes
+                that escalated to contact and contacts_before_alert (contact seen before the alert was raised).
+        """
+        return {
+            "episodes": self.episodes,
+            "finished": self.finished,
+            "observations": self.observations,
+            "mean_response_s": float(np.mean(self._response)) if self._response else float("nan"),
+            "max_response_s": float(np.max(self._response)) if self._response else float("nan"),
+            "mean_lead_s": float(np.mean(self._lead)) if self._lead else float("nan"),
+            "contacts_before_alert": int(np.sum(np.asarray(self._lead) < 0)),
+        }
+
+    def log_summary(self):
+        """Logs the episode statistics."""
+        s = self.summary()
+        logging.info(f"Alert episodes: {s['episodes']} from {s['observations']} hazard observations, "
+                     f"mean response {s['mean_response_s']:.3f} s, mean lead {s['mean_lead_s']:.3f} s")
+
+
+def gate_hazards(episodes, timestamp, keys, hazards, labels=None):
+    """
+    Feeds the (condition, area) hazards of a frame (assess_hazards of the thesis trackers) to the alert episodes,
+    keyed by (object key, area), and tells which of them start an episode in this frame. Only those beep and write
+    an alert row; the hazards themselves stay as they are, so the annotation and the logs still show every hazard
+    of an open episode.
+
+    Args:
+        episodes (AlertEpisodes): Episodes of the tracker.
+        timestamp (float): Capture time of the frame.
+        keys (list): identityTracking.state_keys of the detections.
+        hazards (list): (condition, area) per detection, condition None for no hazard.
+        labels (list | None): Description per detection, e.g. the class names.
+
+    Returns:
+        list: True per detection whose hazard raises a new alert.
+    """
+    rows = [i for i, (condition, _) in enumerate(hazards) if condition is not None]
+    episode_keys = [(keys[i], _hashable(hazards[i][1])) for i in rows]
+    conditions = [hazards[i][0] for i in rows]
+    started, _ = episodes.update(timestamp, episode_keys,
+                                 severities=[CONDITION_SEVERITY.get(c, 0) for c in conditions],
+                                 contact=[c == "center" for c in conditions],
+                                 labels=[labels[i] for i in rows] if labels is not None else None)
+    started = {episode.key for episode in started}
+    alerting = [False] * len(hazards)
+    for i, key in zip(rows, episode_keys):
+        if key in started:
+            started.discard(key)  # Detections sharing a class-level key alert once
+            alerting[i] = True
+    return alerting
+
+
+def _hashable(area):
+    """any_area / zone bounds as nested tuples, so they can be part of an episode key."""
+    return tuple(tuple(point) for point in area) if area is not None else None
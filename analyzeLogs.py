@@ -0,0 +1,485 @@
+# analyzeLogs.py
+"""
+Out-of-core analysis of the tracking and alert logs.
+
+plottDIffer.py, GraphOpenCV.py, kalmanGraphPlot.py, Thesis/plottAlerts.py and Thesis/plotPrediction.py each load a
+whole log with pd.read_csv, filter a hardcoded class and plt.show() the result. This CLI streams every log in chunks
+(CSV through pandas, or the columnar .parquet / .arrow / .ring files of bufferedLogging) and keeps only bounded
+aggregates while doing so:
+
+    - per-class counts,
+    - fixed-bin histograms of the response times and running means per class,
+    - quantile sketches of the thesis hazard times per alert type (see predictionMetrics.QuantileSketch),
+    - next-observation prediction errors per class, as in Thesis/plottTest.py,
+    - trajectories downsampled with a doubling stride, so at most max_points points per class are kept.
+
+The kind of a log is recognised from its columns:
+
+    predictions     timestamp, det_x, det_y, pred_x, pred_y, class_name[, track_id] (setup_csv_writer, log_detection;
+                    the root dead-reckoning tracker writes an extra class ID column after the timestamp)
+    alerts          Hazard Time, Alert Time, Person Class, Object Class, Response Time (utilsNeeded.save_alert_times)
+    thesis_alerts   the 14 columns of utilitiesHelper.ALERT_HEADER
+
+The plots of the old scripts are rendered headless (matplotlib Agg) to PNG files, one set per log, and the aggregates
+of all logs are written to summary.json. Several logs are processed in parallel, one worker process per file.
+
+Usage:
+    python analyzeLogs.py tracking_and_predictions.csv alert_times.csv Thesis/alert_times_DR.csv --out plots
+    python analyzeLogs.py logs/*.parquet --classes "sports ball,cup" --workers 4
+"""
+
+import argparse
+import csv
+import json
+import logging
+import multiprocessing as mp
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+matplotlib.use("Agg")  # Render to files, no display needed
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import bufferedLogging
+from predictionMetrics import QuantileSketch, RunningError
+
+# Normalised column names per log kind, the logs are read by position because the headers changed over time
+KIND_COLUMNS = {
+    "predictions": ["timestamp", "det_x", "det_y", "pred_x", "pred_y", "class_name"],
+    "alerts": ["hazard_time", "alert_time", "person_class", "object_class", "response_time"],
+    "thesis_alerts": ["pre_alert", "post_alert", "duration", "object_class", "x", "y", "future_x", "future_y",
+                      "hazard_time", "alert_type", "area_x1", "area_y1", "area_x2", "area_y2"],
+}
+
+
+def detect_kind(columns):
+    """Returns the log kind of a header, see KIND_COLUMNS."""
+    first = str(columns[0]).strip() if len(columns) else ""
+    if first == "timestamp":
+        return "predictions"
+    if first == "Hazard Time":
+        return "alerts"
+    if first == "Pre-alert DateTime UTC":
+        return "thesis_alerts"
+    raise ValueError(f"Unknown log layout with columns {list(columns)}")
+
+
+def _normalise(frame, kind, width=None):
+    """
+    Renames the columns of a chunk by position. Rows wider than the header (width columns) are dead-reckoning rows,
+    their class ID column is dropped.
+    """
+    names = KIND_COLUMNS[kind]
+    if kind == "predictions" and width is not None and frame.shape[1] > width:
+        frame = frame.drop(columns=frame.columns[1])
+    frame = frame.iloc[:, :len(names)]
+    frame.columns = names
+    return frame
+
+
+def read_chunks(path, chunksize=100_000):
+    """
+    Streams a log as DataFrames of at most chunksize rows with the normalised KIND_COLUMNS names.
+
+    Args:
+        path (str): .csv, .parquet, .arrow / .feather or .ring log.
+        chunksize (int): Rows per chunk.
+
+    Returns:
+        tuple: (kind, iterator of DataFrames).
+    """
+    fmt = bufferedLogging.format_from_path(path)
+    if fmt == "csv":
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            first = next(reader, [])
+        kind = detect_kind(header)
+        # Rows may have one field more than the header (dead reckoning), so read without header by position
+        names = [f"c{i}" for i in range(max(len(header), len(first)))]
+        chunks = pd.read_csv(path, header=None, skiprows=1, names=names, chunksize=chunksize)
+        return kind, (_normalise(chunk, kind, len(header)) for chunk in chunks)
+    if fmt == "ring":
+        rows, columns, categories = bufferedLogging.read_ring(path)
+        kind = detect_kind(columns)
+
+        def ring_chunks():
+            for start in range(0, len(rows), chunksize):
+                chunk = pd.DataFrame(rows[start:start + chunksize], columns=columns)
+                for column, codes in categories.items():  # String columns are stored as category codes
+                    chunk[column] = chunk[column].map({code: value for value, code in codes.items()})
+                yield _normalise(chunk, kind)
+
+        return kind, ring_chunks()
+    import pyarrow as pa
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        kind = detect_kind(parquet.schema_arrow.names)
+        batches = parquet.iter_batches(batch_size=chunksize)
+    else:
+        stream = pa.ipc.open_stream(path)
+        kind = detect_kind(stream.schema.names)
+        batches = stream
+    return kind, (_normalise(batch.to_pandas(), kind) for batch in batches)
+
+
+class Histogram:
+    """Fixed-bin histogram filled chunk by chunk, values above the last edge go to an overflow count."""
+
+    def __init__(self, bin_width=0.05, max_value=10.0):
+        self.edges = np.arange(0, max_value + bin_width / 2, bin_width)
+        self.counts = np.zeros(len(self.edges) - 1, np.int64)
+        self.overflow = 0
+
+    def add(self, values):
+        values = np.asarray(values, np.float64)
+        values = values[np.isfinite(values)]
+        self.counts += np.histogram(values, self.edges)[0]
+        self.overflow += int((values > self.edges[-1]).sum())
+
+    def summary(self):
+        used = np.flatnonzero(self.counts)
+        end = used[-1] + 1 if len(used) else 0
+        return {"edges": np.round(self.edges[:end + 1], 6).tolist(), "counts": self.counts[:end].tolist(),
+                "overflow": self.overflow}
+
+
+class TrajectorySampler:
+    """
+    Bounded downsampling of per-group point streams.
+
+    Every stride-th point of a group is kept, starting with the first. When more than max_points are kept, every
+    other point is dropped and the stride doubles, so the kept points stay evenly spread over the whole log.
+    """
+
+    def __init__(self, columns, max_points=5000):
+        self.columns = list(columns)
+        self.max_points = max_points
+        self.points = {}  # group -> (K, C) array
+        self.seen = Counter()
+        self.stride = {}
+
+    def add(self, group, values):
+        """Offers the (M, C) rows of one group in log order."""
+        values = np.asarray(values, np.float64).reshape(-1, len(self.columns))
+        stride = self.stride.get(group, 1)
+        index = self.seen[group] + np.arange(len(values))
+        self.seen[group] += len(values)
+        kept = values[index % stride == 0]
+        points = np.concatenate((self.points[group], kept)) if group in self.points else kept
+        while len(points) > self.max_points:
+            points = points[::2]
+            stride *= 2
+        self.points[group] = points
+        self.stride[group] = stride
+
+    def get(self, group):
+        """Returns the kept points of a group as a dict of columns."""
+        points = self.points.get(group, np.zeros((0, len(self.columns))))
+        return dict(zip(self.columns, points.T))
+
+
+class PredictionLogStats:
+    """Aggregates of a prediction log: counts, next-observation errors and downsampled trajectories per class."""
+
+    def __init__(self, max_points=5000):
+        self.counts = Counter()
+        self.errors = {}  # class name -> RunningError
+        self.last_prediction = {}  # class name -> predicted (x, y) of the previous row of the class
+        self.trajectories = TrajectorySampler(("timestamp", "det_x", "det_y", "pred_x", "pred_y"), max_points)
+
+    def add(self, chunk):
+        for name, rows in chunk.groupby("class_name", sort=False):
+            values = rows[["timestamp", "det_x", "det_y", "pred_x", "pred_y"]].to_numpy(np.float64)
+            self.counts[name] += len(values)
+            # Each prediction is compared with the next detection of the same class, as in Thesis/plottTest.py
+            predicted = values[:-1, 3:5]
+            if name in self.last_prediction:
+                predicted = np.concatenate(([self.last_prediction[name]], predicted))
+            actual = values[len(values) - len(predicted):, 1:3]
+            self.errors.setdefault(name, RunningError(sketch=True)).extend(np.hypot(*(predicted - actual).T))
+            self.last_prediction[name] = values[-1, 3:5]
+            self.trajectories.add(name, values)
+
+    def summary(self):
+        return {"rows": sum(self.counts.values()), "class_counts": dict(self.counts),
+                "errors": {name: acc.summary() for name, acc in self.errors.items()}}
+
+    def plot(self, prefix, classes=None):
+        """Class counts and, per class, the 2-D and 3-D (over time) detected and predicted positions."""
+        paths = [_bar(f"{prefix}_class_counts.png", self.counts, "Detections per Class", "Class", "Detections")]
+        for name in self.counts:
+            if classes and name not in classes:
+                continue
+            points, count = self.trajectories.get(name), self.counts[name]
+            stem = f"{prefix}_trajectory_{_slug(name)}"
+            fig, ax = plt.subplots(figsize=(12, 8))
+            ax.scatter(points["det_x"], points["det_y"], c="blue", label=f"Detected Positions - {count}", zorder=2,
+                       alpha=0.6)
+            ax.scatter(points["pred_x"], points["pred_y"], c="red", marker="x", label=f"Predicted Positions - {count}",
+                       zorder=1, alpha=0.6)
+            shown = f" ({len(points['det_x'])} shown)" if len(points["det_x"]) < count else ""
+            ax.set_title(f'Tracking and Prediction for "{name}" | Detected: {count}, Predicted: {count}{shown}', pad=20)
+            ax.set_xlabel("X Position", labelpad=10)
+            ax.set_ylabel("Y Position", labelpad=10)
+            ax.legend(loc="upper left", bbox_to_anchor=(1.02, 1), borderaxespad=0.)
+            ax.grid(True, linestyle="--", alpha=0.5)
+            ax.invert_yaxis()  # Image coordinates
+            paths.append(_save(fig, f"{stem}.png"))
+
+            fig = plt.figure(figsize=(12, 8))
+            ax = fig.add_subplot(111, projection="3d")
+            ax.scatter(points["timestamp"], points["det_x"], points["det_y"], c="blue", label="Detected Path",
+                       alpha=0.7, s=50)
+            ax.scatter(points["timestamp"], points["pred_x"], points["pred_y"], c="red", marker="x",
+                       label="Predicted Future Path", alpha=0.7, s=50)
+            ax.set_title(f"3D Trajectory and Prediction for {name}")
+            ax.set_xlabel("Time (seconds)")
+            ax.set_ylabel("X Position")
+            ax.set_zlabel("Y Position")
+            ax.legend()
+            paths.append(_save(fig, f"{stem}_3d.png"))
+        return paths
+
+
+class AlertLogStats:
+    """Aggregates of a root alert log: response-time histogram, mean response per object class, time line."""
+
+    def __init__(self, max_points=5000, bin_width=0.05):
+        self.counts = Counter()
+        self.response = Histogram(bin_width)
+        self.per_class = {}  # object class -> RunningError of the response times
+        self.records = 0
+        self.timeline = TrajectorySampler(("record", "hazard_time", "alert_time"), max_points)
+
+    def add(self, chunk):
+        response = chunk["response_time"].to_numpy(np.float64)
+        self.response.add(response)
+        self.counts.update(chunk["object_class"].value_counts().to_dict())
+        for name, rows in chunk.groupby("object_class", sort=False):
+            values = rows["response_time"].to_numpy(np.float64)
+            self.per_class.setdefault(name, RunningError()).extend(values[np.isfinite(values)])
+        records = self.records + np.arange(len(chunk))
+        self.records += len(chunk)
+        self.timeline.add(None, np.column_stack((records, chunk[["hazard_time", "alert_time"]].to_numpy(np.float64))))
+
+    def summary(self):
+        return {"rows": self.records, "class_counts": dict(self.counts), "response_time": self.response.summary(),
+                "per_class": {name: _mean_summary(acc) for name, acc in self.per_class.items()}}
+
+    def plot(self, prefix, classes=None):
+        """The plots of plottDIffer.py."""
+        summary = self.response.summary()
+        fig, ax = plt.subplots(figsize=(10, 5))
+        if summary["counts"]:
+            ax.stairs(summary["counts"], summary["edges"], fill=True, color="skyblue", edgecolor="black")
+        ax.set_title("Histogram of Response Times")
+        ax.set_xlabel("Response Time (seconds)")
+        ax.set_ylabel("Frequency")
+        paths = [_save(fig, f"{prefix}_response_times.png")]
+
+        means = {name: acc.total / acc.count for name, acc in self.per_class.items()
+                 if acc.count and (not classes or name in classes)}
+        paths.append(_bar(f"{prefix}_response_by_class.png", dict(sorted(means.items(), key=lambda kv: kv[1])),
+                          "Average Response Time by Object Class", "Object Class", "Average Response Time (seconds)",
+                          color="lightgreen"))
+
+        points = self.timeline.get(None)
+        fig, ax = plt.subplots(figsize=(12, 6))
+        ax.plot(points["record"], points["hazard_time"], label="Hazard Time", marker="o", linestyle="-",
+                color="orange")
+        ax.plot(points["record"], points["alert_time"], label="Alert Time", marker="x", linestyle="--", color="blue")
+        ax.set_title("Hazard Time and Alert Time Over Records")
+        ax.set_xlabel("Record Number")
+        ax.set_ylabel("Time (seconds)")
+        ax.legend()
+        paths.append(_save(fig, f"{prefix}_hazard_vs_alert.png"))
+        return paths
+
+
+class ThesisAlertLogStats:
+    """Aggregates of a thesis alert log: alert durations per class, hazard times per alert type, movements."""
+
+    def __init__(self, max_points=5000):
+        self.counts = Counter()
+        self.durations = {}  # object class -> RunningError of the alert durations
+        self.hazard_times = {}  # alert type -> QuantileSketch of the hazard times since start
+        self.type_counts = Counter()
+        self.area = None
+        self.movements = TrajectorySampler(("x", "y", "future_x", "future_y"), max_points)
+
+    def add(self, chunk):
+        if self.area is None and len(chunk):
+            self.area = chunk[["area_x1", "area_y1", "area_x2", "area_y2"]].iloc[0].astype(float).tolist()
+        self.counts.update(chunk["object_class"].value_counts().to_dict())
+        self.type_counts.update(chunk["alert_type"].value_counts().to_dict())
+        for name, rows in chunk.groupby("object_class", sort=False):
+            self.durations.setdefault(name, RunningError()).extend(rows["duration"].to_numpy(np.float64))
+            self.movements.add(name, rows[["x", "y", "future_x", "future_y"]].to_numpy(np.float64))
+        for alert_type, rows in chunk.groupby("alert_type", sort=False):
+            sketch = self.hazard_times.setdefault(alert_type, QuantileSketch())
+            sketch.extend(rows["hazard_time"].to_numpy(np.float64))
+
+    def summary(self):
+        return {
+            "rows": sum(self.counts.values()), "class_counts": dict(self.counts),
+            "alert_types": dict(self.type_counts),
+            "durations": {name: _mean_summary(acc) for name, acc in self.durations.items()},
+            "hazard_time": {alert_type: {f"p{int(q * 100)}": sketch.quantile(q) for q in (0.05, 0.25, 0.5, 0.75, 0.95)}
+                            for alert_type, sketch in self.hazard_times.items()},
+        }
+
+    def plot(self, prefix, classes=None):
+        """The plots of Thesis/plottAlerts.py."""
+        means = {name: acc.total / acc.count for name, acc in self.durations.items() if acc.count}
+        paths = [_bar(f"{prefix}_duration_by_class.png", means, "Alert Duration by Object Type", "Object Type",
+                      "Duration (seconds)")]
+
+        fig, ax = plt.subplots(figsize=(12, 8))
+        shown = [name for name in self.counts if not classes or name in classes]
+        for i, name in enumerate(shown):
+            points = self.movements.get(name)
+            xs = np.stack((points["x"], points["future_x"]))
+            ys = np.stack((points["y"], points["future_y"]))
+            lines = ax.plot(xs, ys, marker="o", markersize=5, color=f"C{i % 10}")
+            lines[0].set_label(f"{name} ({self.counts[name]})")
+        if self.area is not None:
+            x1, y1, x2, y2 = self.area
+            ax.add_patch(plt.Rectangle((x1, y1), x2 - x1, y2 - y1, fill=False, edgecolor="red", linewidth=2))
+            ax.text(x1, y1 - 10, "Robotic Arm Area", color="red", fontsize=12, ha="left")
+        ax.set_title("Object Movement from Current to Predicted Future Location with the Area of the Robotic Arm")
+        ax.set_xlabel("X Coordinate (px)")
+        ax.set_ylabel("Y Coordinate (px)")
+        ax.legend(title="Object Type")
+        ax.grid(True)
+        ax.invert_yaxis()
+        paths.append(_save(fig, f"{prefix}_movements.png"))
+
+        # Box plot drawn from the sketched quantiles, the whiskers span the 5th to 95th percentile
+        stats = [{"label": str(alert_type), "whislo": sketch.quantile(0.05), "q1": sketch.quantile(0.25),
+                  "med": sketch.quantile(0.5), "q3": sketch.quantile(0.75), "whishi": sketch.quantile(0.95)}
+                 for alert_type, sketch in self.hazard_times.items()]
+        fig, ax = plt.subplots(figsize=(10, 6))
+        if stats:
+            ax.bxp(stats, showfliers=False)
+        ax.set_title("Hazard Time Distribution by Alert Type")
+        ax.set_xlabel("Alert Type")
+        ax.set_ylabel("Hazard Time Since Start (seconds)")
+        paths.append(_save(fig, f"{prefix}_hazard_time_by_type.png"))
+        return paths
+
+
+STATS = {"predictions": PredictionLogStats, "alerts": AlertLogStats, "thesis_alerts": ThesisAlertLogStats}
+
+
+def _mean_summary(acc):
+    """Count, mean and maximum of a RunningError used for durations instead of errors."""
+    return {"count": acc.count, "mean": acc.total / acc.count if acc.count else float("nan"), "max": acc.max}
+
+
+def _slug(name):
+    return "".join(c if c.isalnum() else "_" for c in str(name))
+
+
+def _save(fig, path):
+    fig.tight_layout(pad=2)
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def _bar(path, values, title, xlabel, ylabel, color="skyblue"):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar([str(k) for k in values], list(values.values()), color=color, edgecolor="black")
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.tick_params(axis="x", rotation=45)
+    return _save(fig, path)
+
+
+def analyze_file(path, out_dir, classes=None, chunksize=100_000, max_points=5000, plot=True):
+    """
+    Streams one log, renders its plots and returns its aggregates. Runs in the worker processes.
+
+    Args:
+        path (str): Log file, see read_chunks.
+        out_dir (str): Directory of the PNG files, named after the log.
+        classes (list | None): Classes to plot trajectories / movements for, None for all.
+        chunksize (int): Rows read at a time.
+        max_points (int): Points kept per class for the trajectory plots.
+        plot (bool): Render the plots, False only computes the aggregates.
+
+    Returns:
+        dict: path, kind, the aggregates of the log and the written plot files.
+    """
+    kind, chunks = read_chunks(path, chunksize)
+    stats = STATS[kind](max_points=max_points)
+    for chunk in chunks:
+        stats.add(chunk)
+    result = {"path": path, "kind": kind, **stats.summary()}
+    if plot:
+        os.makedirs(out_dir, exist_ok=True)
+        prefix = os.path.join(out_dir, _slug(os.path.splitext(os.path.basename(path))[0]))
+        result["plots"] = stats.plot(prefix, classes)
+    return result
+
+
+def analyze(paths, out_dir="analysis", classes=None, workers=None, chunksize=100_000, max_points=5000, plot=True):
+    """
+    Analyzes several logs in a process pool, one log per task, and writes summary.json to out_dir.
+
+    A log that cannot be analyzed (empty, e.g. left by a thesis tracker that was not closed, or of an unknown
+    layout) does not stop the others, its entry only holds the path and the error.
+
+    Returns:
+        list: The result of analyze_file per log, in the order of paths.
+    """
+    ctx = mp.get_context("spawn")  # Same start method as the parameter sweep and the multi-camera runner
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(analyze_file, path, out_dir, classes, chunksize, max_points, plot) for path in paths]
+        results = []
+        for path, future in zip(paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:  # Raised in the worker, one broken log must not lose the summary of the others
+                logging.error(f"Failed to analyze {path}: {str(e)}")
+                results.append({"path": path, "error": str(e)})
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(results, f, indent=2, default=_json_default)
+    return results
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate and plot tracking and alert logs without loading them.")
+    parser.add_argument("logs", nargs="+", help=".csv, .parquet, .arrow or .ring logs")
+    parser.add_argument("--out", default="analysis", help="directory of the plots and summary.json")
+    parser.add_argument("--classes", default=None, help="comma separated classes to plot trajectories for")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=100_000, help="rows read at a time")
+    parser.add_argument("--max-points", type=int, default=5000, help="trajectory points kept per class")
+    parser.add_argument("--no-plots", action="store_true", help="only write summary.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    classes = [name.strip() for name in args.classes.split(",")] if args.classes else None
+    for result in analyze(args.logs, args.out, classes, args.workers, args.chunksize, args.max_points,
+                          not args.no_plots):
+        if "error" in result:
+            continue
+        logging.info(f"{result['path']}: {result['kind']}, {result['rows']} rows, "
+                     f"{len(result.get('plots', []))} plots")
@@ -0,0 +1,420 @@
+# benchmark.py
+"""
+Headless benchmark of the safety pipeline on synthetic motion.
+
+Thesis/ballparabolic.py animates an apple in a Tk window and the Thesis/*.mp4 clips are run by hand through the
+trackers, so neither gives numbers that can be compared between two commits. This suite generates deterministic
+trajectories and drives the project's own code with them, without camera or model:
+
+    linear      every object moves at constant velocity between two random points of the frame
+    parabolic   objects are thrown upwards and fall back under gravity, then thrown again (appleParabolic.mp4)
+    bouncing    objects bounce elastically on the floor and the side walls (bouncingbalLinear.mp4)
+    crossing    persons walk top to bottom while objects cross left to right, so their paths meet near the middle
+
+Boxes get Gaussian measurement noise, the errors are measured against the noise-free centers. The benchmarks are:
+
+    kalman_wrapper    one KalmanFilterWrapper (cv2.KalmanFilter) per object, predict / correct every frame
+    kalman_bank       the vectorized KalmanFilterBank of the trackers
+    motion_<model>    the bank with each motion model (cv, ca, imm) fed with timestamps, also scored on the position
+                      predicted horizon_frames ahead (horizon_mae_px)
+    dead_reckoning    DeadReckoningTracker.apply_dead_reckoning per detection
+    proximity         proximityEngine.pairwise_proximity and hazard_pairs of every frame
+    logging_<fmt>     BufferedRowWriter with the prediction log rows (csv, ring, parquet / arrow with pyarrow)
+    tracker_<name>    the full process_detections path of a tracker, replayed from a synthetic recording
+
+Every result reports the throughput in frames per second, the per-frame latency percentiles and, for the predictors,
+the Euclidean error of the one-frame-ahead prediction. Results can be stored as JSON and compared with a baseline,
+the command exits with status 1 when a benchmark got slower or less accurate than the tolerance allows.
+
+Usage:
+    python benchmark.py --scenarios linear bouncing --objects 1 8 32 --out bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.25
+    python benchmark.py --record recordings/synthetic --scenarios crossing  # Recordings for replay / sweeps
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import bufferedLogging
+import proximityEngine
+from bufferedLogging import BufferedRowWriter
+from detectionBatch import DetectionBatch
+from detectionRecording import DetectionRecorder, DetectionRecording, build_replay_tracker, replay
+from kalmanSetUp import KalmanFilterBank, KalmanFilterWrapper
+from motionModels import MOTION_MODELS
+from parameterSweep import DEFAULT_KWARGS, TRACKERS, format_table
+
+SCENARIOS = ("linear", "parabolic", "bouncing", "crossing")
+BENCHMARKS = ("kalman_wrapper", "kalman_bank", "motion_models", "dead_reckoning", "proximity", "logging", "trackers")
+NAMES = {0: "person", 32: "sports ball"}  # COCO IDs, so the trackers' defaults (target 'person') apply
+GRAVITY = 600.0  # Pixels per second squared
+
+# Result columns compared with a baseline: (column, higher is better)
+REGRESSION_COLUMNS = (("fps", True), ("p95_ms", False), ("mae_px", False), ("horizon_mae_px", False))
+
+
+def synthetic_trajectories(scenario, objects=4, frames=300, fps=30.0, frame_shape=(480, 640), seed=0):
+    """
+    Generates the noise-free centers of a scenario.
+
+    Args:
+        scenario (str): One of SCENARIOS.
+        objects (int): Number of objects.
+        frames (int): Number of frames.
+        fps (float): Frame rate, the timestamps are 1 / fps apart.
+        frame_shape (tuple): (height, width) of the frame the objects move in.
+        seed (int): Seed of the random start points and velocities.
+
+    Returns:
+        tuple: (F,) timestamps in seconds and (F, N, 2) centers in pixels.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = frame_shape[:2]
+    t = np.arange(frames, dtype=np.float64)[:, None] / fps  # (F, 1)
+    duration = max(frames - 1, 1) / fps
+    low, high = np.array([0.1 * width, 0.1 * height]), np.array([0.9 * width, 0.9 * height])
+    if scenario == "linear":
+        start, end = rng.uniform(low, high, (2, objects, 2))
+        centers = start + (end - start) * (t / duration)[..., None]
+    elif scenario == "parabolic":
+        x0 = rng.uniform(low[0], high[0] / 2, objects)
+        vx = rng.uniform(20, 120, objects)
+        apex = rng.uniform(0.3, 0.7, objects) * (high[1] - low[1])  # Height of the throw
+        vy = np.sqrt(2 * GRAVITY * apex)
+        phase = (t + rng.uniform(0, 1, objects)) % (2 * vy / GRAVITY)  # Time since the last throw
+        centers = np.stack((x0 + vx * phase, high[1] - vy * phase + 0.5 * GRAVITY * phase ** 2), axis=-1)
+    elif scenario == "bouncing":
+        x0 = rng.uniform(low[0], high[0], objects)
+        vx = rng.uniform(-200, 200, objects)
+        drop = rng.uniform(0.3, 0.8, objects) * (high[1] - low[1])
+        period = 2 * np.sqrt(2 * drop / GRAVITY)
+        phase = (t + rng.uniform(0, 1, objects) * period) % period - period / 2  # 0 at the top of a bounce
+        span = high[0] - low[0]
+        x = (x0 - low[0] + vx * t) % (2 * span)
+        x = low[0] + np.where(x > span, 2 * span - x, x)  # Reflected at the side walls
+        centers = np.stack((x, high[1] - drop + 0.5 * GRAVITY * phase ** 2), axis=-1)
+    elif scenario == "crossing":
+        persons = max(objects // 2, 1)
+        lane = np.arange(objects) - np.where(np.arange(objects) < persons, 0, persons)
+        offset = (lane - lane.max() / 2) * 30  # Lanes 30 pixels apart around the middle
+        delay = rng.uniform(0, 0.3, objects) * duration
+        progress = np.clip((t - delay) / (0.7 * duration), 0, 1)
+        vertical = np.arange(objects) < persons
+        along = np.where(vertical, low[1] + progress * (high[1] - low[1]), low[0] + progress * (high[0] - low[0]))
+        across = np.where(vertical, width / 2 + offset, height / 2 + offset)
+        centers = np.stack((np.where(vertical, across, along), np.where(vertical, along, across)), axis=-1)
+    else:
+        raise ValueError(f"Unknown scenario '{scenario}'")
+    return t[:, 0], np.broadcast_to(centers, (frames, objects, 2)).astype(np.float64)
+
+
+def synthetic_detections(scenario, centers, size=40, noise_px=1.0, seed=0):
+    """
+    Turns centers into per-frame detections with noisy boxes.
+
+    Args:
+        scenario (str): Scenario of the centers, 'crossing' makes the first half of the objects persons, the other
+            scenarios only the first object.
+        centers (np.ndarray): (F, N, 2) centers.
+        size (float): Box width and height in pixels.
+        noise_px (float): Standard deviation of the box corner noise in pixels.
+        seed (int): Seed of the noise.
+
+    Returns:
+        list: DetectionBatch per frame, rows in object order.
+    """
+    rng = np.random.default_rng(seed + 1)
+    frames, objects = centers.shape[:2]
+    persons = max(objects // 2, 1) if scenario == "crossing" else 1
+    classes = np.where(np.arange(objects) < persons, 0, 32).astype(np.float32)
+    half = size / 2
+    boxes = np.concatenate((centers - half, centers + half), axis=-1)
+    boxes = boxes + rng.normal(0, noise_px, boxes.shape)
+    data = np.zeros((frames, objects, 6), np.float32)
+    data[..., :4] = boxes
+    data[..., 4] = 0.9
+    data[..., 5] = classes
+    return [DetectionBatch(frame, NAMES) for frame in data]
+
+
+def write_recording(path, timestamps, detections, fps=30.0, frame_shape=(480, 640), source="synthetic"):
+    """Stores synthetic detections as a detectionRecording directory, for replay and parameterSweep."""
+    with DetectionRecorder(path, NAMES, fps, frame_shape, source) as recorder:
+        for timestamp, batch in zip(timestamps, detections):
+            recorder.record(batch, timestamp)
+    return path
+
+
+def _result(name, latencies, errors=None, **extra):
+    """Result row: throughput and latency percentiles of the per-frame times, error statistics if given."""
+    ms = np.asarray(latencies, np.float64) * 1000
+    row = {"benchmark": name, **extra, "fps": float(len(ms) / max(ms.sum() / 1000, 1e-12)),
+           "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+           "p99_ms": float(np.percentile(ms, 99))}
+    if errors is not None:
+        errors = np.asarray(errors, np.float64)
+        row["mae_px"] = float(errors.mean()) if len(errors) else float("nan")
+        row["p90_px"] = float(np.percentile(errors, 90)) if len(errors) else float("nan")
+    return row
+
+
+def bench_kalman_wrapper(timestamps, centers, detections):
+    """One cv2 Kalman filter per object, the setup of the original trackers (dt = 1 frame)."""
+    filters = [KalmanFilterWrapper() for _ in range(centers.shape[1])]
+    latencies, errors = [], []
+    for index, batch in enumerate(detections):
+        measured = batch.centers
+        t0 = time.perf_counter()
+        predicted = []
+        for kf, (x, y) in zip(filters, measured):
+            if not kf.initialized:
+                kf.initialize(x, y)
+            predicted.append(kf.predict())  # Prediction for this frame from the earlier ones
+            kf.correct([[x], [y]])
+        latencies.append(time.perf_counter() - t0)
+        if index:
+            errors.extend(np.hypot(*(np.array(predicted, np.float64) - centers[index]).T))
+    return _result("kalman_wrapper", latencies, errors)
+
+
+def bench_kalman_bank(timestamps, centers, detections):
+    """The vectorized filter bank, all objects in one predict_correct call."""
+    bank = KalmanFilterBank()
+    keys = list(range(centers.shape[1]))
+    latencies, errors = [], []
+    for index, batch in enumerate(detections):
+        measured = batch.centers
+        t0 = time.perf_counter()
+        for key in keys:
+            if key not in bank:
+                bank.add(key, *measured[key])
+        predicted = bank.predict_correct(keys, measured)
+        latencies.append(time.perf_counter() - t0)
+        if index:
+            errors.extend(np.hypot(*(predicted - centers[index]).T))
+    return _result("kalman_bank", latencies, errors)
+
+
+def bench_motion_model(timestamps, centers, detections, model, horizon_frames=15):
+    """The filter bank with a motion model and real time steps, scored one frame and horizon_frames ahead."""
+    bank = KalmanFilterBank(model=model)
+    keys = list(range(centers.shape[1]))
+    latencies, errors, horizon_errors = [], [], []
+    for index, (timestamp, batch) in enumerate(zip(timestamps, detections)):
+        measured = batch.centers
+        ahead = min(index + horizon_frames, len(timestamps) - 1)
+        t0 = time.perf_counter()
+        for key in keys:
+            if key not in bank:
+                bank.add(key, *measured[key], timestamp=timestamp)
+        predicted = bank.predict_correct(keys, measured, timestamp)
+        future = bank.trajectory(keys, (timestamps[ahead] - timestamp) * 1000)[:, -1]
+        latencies.append(time.perf_counter() - t0)
+        if index:
+            errors.extend(np.hypot(*(predicted - centers[index]).T))
+        if ahead > index:
+            horizon_errors.extend(np.hypot(*(future - centers[ahead]).T))
+    return _result(f"motion_{model}", latencies, errors, horizon_mae_px=float(np.mean(horizon_errors)))
+
+
+def bench_dead_reckoning(timestamps, centers, detections, workdir):
+    """DeadReckoningTracker.apply_dead_reckoning of every detection, one-frame lookahead."""
+    tracker = build_replay_tracker("dead_reckoning", tracker_config=None,
+                                   file_name_predict=os.path.join(workdir, "dr_predictions.csv"),
+                                   file_name_alert=os.path.join(workdir, "dr_alerts.csv"),
+                                   **DEFAULT_KWARGS["dead_reckoning"])
+    latencies, errors = [], []
+    try:
+        for index, (timestamp, batch) in enumerate(zip(timestamps, detections)):
+            t0 = time.perf_counter()
+            futures = [tracker.apply_dead_reckoning(det, timestamp, key)[2:] for key, det in enumerate(batch)]
+            latencies.append(time.perf_counter() - t0)
+            if 0 < index < len(centers) - 1:  # The first frame has no velocity, the last no next frame
+                errors.extend(np.hypot(*(np.array(futures, np.float64) - centers[index + 1]).T))
+    finally:
+        tracker.close()
+    return _result("dead_reckoning", latencies, errors)
+
+
+def bench_proximity(timestamps, centers, detections, proximity_threshold=20):
+    """Pairwise proximity of all target/object pairs of every frame."""
+    latencies, hazard_frames = [], 0
+    for batch in detections:
+        t0 = time.perf_counter()
+        boxes = proximityEngine.detections_to_array(batch)
+        pairs = proximityEngine.hazard_pairs(proximityEngine.pairwise_proximity(
+            boxes, batch.class_ids == 0, proximity_threshold))
+        latencies.append(time.perf_counter() - t0)
+        hazard_frames += bool(len(pairs))
+    return _result("proximity", latencies, hazard_frames=hazard_frames)
+
+
+def bench_logging(timestamps, centers, detections, workdir, fmt):
+    """Prediction log rows of every frame through a BufferedRowWriter, the final flush included in the throughput."""
+    header = ["timestamp", "det_x", "det_y", "pred_x", "pred_y", "class_name"]
+    rows = [[[float(timestamp), float(x), float(y), float(x), float(y), name]
+             for (x, y), name in zip(batch.centers, batch.class_names)]
+            for timestamp, batch in zip(timestamps, detections)]
+    writer = BufferedRowWriter(os.path.join(workdir, f"bench_log.{fmt}"), header, fmt=fmt)
+    latencies = []
+    for frame_rows in rows:
+        t0 = time.perf_counter()
+        for row in frame_rows:
+            writer.writerow(row)
+        latencies.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    writer.close()
+    latencies[-1] += time.perf_counter() - t0
+    return _result(f"logging_{fmt}", latencies, rows=writer.rows_written)
+
+
+def bench_tracker(name, recording, workdir):
+    """A camera- and model-less tracker replaying a synthetic recording, errors from its StreamingMetrics."""
+    tracker = build_replay_tracker(name, file_name_predict=os.path.join(workdir, f"{name}_predictions.csv"),
+                                   file_name_alert=os.path.join(workdir, f"{name}_alerts.csv"),
+                                   **DEFAULT_KWARGS[name])
+    stamps = []
+    cwd = os.getcwd()
+    os.chdir(workdir)  # The thesis trackers log to yolo_data.csv in the working directory
+    try:
+        replay(recording, tracker, on_frame=lambda index, timestamp: stamps.append(time.perf_counter()))
+    finally:
+        os.chdir(cwd)
+    stamps.append(time.perf_counter())
+    overall = tracker.metrics.summary()["overall"]
+    tracker.close()
+    row = _result(f"tracker_{name}", np.diff(stamps))
+    row["mae_px"], row["p90_px"] = overall.get("mae", float("nan")), overall.get("p90", float("nan"))
+    return row
+
+
+def run_benchmarks(scenarios=SCENARIOS, object_counts=(1, 8, 32), frames=300, fps=30.0, noise_px=1.0, seed=0,
+                   benchmarks=BENCHMARKS, record_dir=None):
+    """
+    Runs the selected benchmarks on every scenario and object count.
+
+    Args:
+        scenarios (tuple): Scenario names, see SCENARIOS.
+        object_counts (tuple): Numbers of objects per frame.
+        frames (int): Frames per run.
+        fps (float): Frame rate of the synthetic timestamps.
+        noise_px (float): Standard deviation of the box noise in pixels.
+        seed (int): Seed of the trajectories and noise.
+        benchmarks (tuple): Benchmark names, see BENCHMARKS.
+        record_dir (str | None): Keep the synthetic recordings in <record_dir>/<scenario>_<objects>.
+
+    Returns:
+        list: Result dicts, one per benchmark, scenario and object count.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scenario in scenarios:
+            for objects in object_counts:
+                timestamps, centers = synthetic_trajectories(scenario, objects, frames, fps, seed=seed)
+                detections = synthetic_detections(scenario, centers, noise_px=noise_px, seed=seed)
+                runs = []
+                if "kalman_wrapper" in benchmarks:
+                    runs.append(lambda: bench_kalman_wrapper(timestamps, centers, detections))
+                if "kalman_bank" in benchmarks:
+                    runs.append(lambda: bench_kalman_bank(timestamps, centers, detections))
+                if "motion_models" in benchmarks:
+                    for model in MOTION_MODELS:
+                        runs.append(lambda model=model: bench_motion_model(timestamps, centers, detections, model))
+                if "dead_reckoning" in benchmarks:
+                    runs.append(lambda: bench_dead_reckoning(timestamps, centers, detections, workdir))
+                if "proximity" in benchmarks:
+                    runs.append(lambda: bench_proximity(timestamps, centers, detections))
+                if "logging" in benchmarks:
+                    for fmt in ("csv", "ring", "parquet", "arrow"):
+                        runs.append(lambda fmt=fmt: bench_logging(timestamps, centers, detections, workdir, fmt))
+                if "trackers" in benchmarks or record_dir:
+                    base = record_dir or workdir
+                    path = write_recording(os.path.join(base, f"{scenario}_{objects}"), timestamps, detections, fps)
+                    if "trackers" in benchmarks:
+                        recording = DetectionRecording(path)
+                        for name in TRACKERS:
+                            runs.append(lambda name=name: bench_tracker(name, recording, workdir))
+                for run in runs:
+                    try:
+                        row = run()
+                    except ImportError as e:  # parquet / arrow without pyarrow
+                        logging.warning(f"Benchmark skipped: {str(e)}")
+                        continue
+                    results.append({"benchmark": row.pop("benchmark"), "scenario": scenario, "objects": objects,
+                                    **row})
+        bufferedLogging.close_shared_writers()  # Alert logs of the trackers, before the directory is removed
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, error_slack_px=0.5):
+    """
+    Compares results with a baseline of the same benchmarks.
+
+    Args:
+        results (list): Output of run_benchmarks.
+        baseline (list): Earlier output of run_benchmarks, e.g. loaded from the JSON written by --out.
+        tolerance (float): Allowed relative loss of throughput and p95 latency and increase of the error.
+        error_slack_px (float): Absolute error increase that is always accepted, so tiny errors do not flap.
+
+    Returns:
+        list: Messages describing the regressions, empty if there are none.
+    """
+    reference = {(r["benchmark"], r["scenario"], r["objects"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = reference.get((result["benchmark"], result["scenario"], result["objects"]))
+        if old is None:
+            continue
+        for column, higher_is_better in REGRESSION_COLUMNS:
+            new_value, old_value = result.get(column), old.get(column)
+            if new_value is None or old_value is None or np.isnan(new_value) or np.isnan(old_value):
+                continue
+            if higher_is_better:
+                worse = new_value < old_value * (1 - tolerance)
+            else:
+                slack = error_slack_px if column.endswith("_px") else 0.0
+                worse = new_value > old_value * (1 + tolerance) + slack
+            if worse:
+                regressions.append(f"{result['benchmark']} {result['scenario']} x{result['objects']}: "
+                                   f"{column} {old_value:.4g} -> {new_value:.4g}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the predictors, proximity checks, logging and trackers "
+                                                 "on synthetic motion.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--objects", nargs="+", type=int, default=[1, 8, 32], help="objects per frame")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--noise", type=float, default=1.0, help="box noise in pixels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--record", default=None, help="directory to keep the synthetic recordings in")
+    parser.add_argument("--out", default=None, help="JSON file for the results")
+    parser.add_argument("--baseline", default=None, help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative regression tolerance")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(logging.WARNING)  # kalmanSetUp configures INFO on import
+
+    results = run_benchmarks(args.scenarios, args.objects, args.frames, args.fps, args.noise, args.seed,
+                             args.benchmarks, args.record)
+    print(format_table(results, ["benchmark", "scenario", "objects", "fps", "p50_ms", "p95_ms", "p99_ms", "mae_px",
+                                 "p90_px", "horizon_mae_px"]))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,347 @@
+# bufferedLogging.py
+"""
+Buffered, batched logging for the tracking/prediction and alert files.
+
+The trackers used to write every detection and every alert straight to disk, and the alert helpers re-opened and
+stat'ed the CSV for every single row. BufferedRowWriter keeps the file open, collects rows in memory and writes them
+in batches, either when max_rows rows are buffered or every flush_interval seconds from a background thread.
+A writerow() call on the hot path is therefore only a list append.
+
+The output format is chosen from the file extension:
+    .csv (default)          plain CSV through csv.writer
+    .parquet                Apache Parquet through pyarrow (optional dependency)
+    .arrow / .feather       Arrow IPC stream through pyarrow (optional dependency)
+    .ring                   fixed-size binary ring file (memory-mapped .npy of float64 rows) with a JSON sidecar,
+                            keeping only the newest `capacity` rows. String columns are stored as category codes.
+
+BufferedRowWriter has the writerow()/close() interface of a csv.writer and its file, so it is a drop-in
+replacement for the (file, writer) pair returned by setup_csv_writer.
+"""
+
+import atexit
+import csv
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+
+def format_from_path(path):
+    """Returns the logging format implied by the file extension."""
+    ext = os.path.splitext(str(path))[1].lower()
+    return {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ring": "ring"}.get(ext, "csv")
+
+
+class _CsvBackend:
+    """Appends row batches to a CSV file that stays open."""
+
+    def __init__(self, path, header, append):
+        needs_header = not append or not os.path.exists(path) or os.stat(path).st_size == 0
+        self.file = open(path, "a" if append else "w", newline="")
+        self.writer = csv.writer(self.file)
+        if header and needs_header:
+            self.writer.writerow(header)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class _ArrowBackend:
+    """
+    Writes row batches as Parquet row groups or Arrow IPC record batches (requires pyarrow).
+
+    The schema is fixed before the first batch: the column types given to BufferedRowWriter, and for the other
+    columns the type of their first non-null value in the first batch (float64 for any number, bool, or string;
+    string as well for a column that is still all None). Every batch is converted to that schema value by value,
+    so a column that starts out empty or later changes type keeps its rows. Values that cannot be converted are
+    written as null.
+    """
+
+    TYPES = ("float64", "int64", "bool", "string")
+
+    def __init__(self, path, header, parquet, types=None):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError(f"pyarrow is required to log to '{path}', install it with 'pip install pyarrow'") from e
+        self.pa = pa
+        self.path = path
+        self.header = list(header) if header else None
+        self.parquet = parquet
+        self.types = dict(types or {})
+        unknown = set(self.types.values()) - set(self.TYPES)
+        if unknown:
+            raise ValueError(f"Unsupported column types {sorted(unknown)}, expected one of {self.TYPES}")
+        self.schema = None
+        self.kinds = None  # Type name per column once the schema is fixed
+        self.writer = None
+        self._failed = set()  # Columns already reported for unconvertible values
+
+    @staticmethod
+    def _infer(column):
+        """Type name of the first non-null value of a column."""
+        for value in column:
+            if value is None:
+                continue
+            if isinstance(value, (bool, np.bool_)):
+                return "bool"
+            if isinstance(value, (int, float, np.number)):
+                return "float64"
+            return "string"
+        return "string"
+
+    def _convert(self, name, kind, column):
+        """Converts the values of one column to its schema type, unconvertible values become None."""
+        cast = {"float64": float, "int64": int, "bool": bool, "string": str}[kind]
+        values = []
+        for value in column:
+            try:
+                values.append(None if value is None else cast(value))
+            except (TypeError, ValueError):
+                values.append(None)
+                if name not in self._failed:
+                    self._failed.add(name)
+                    logging.warning(f"{self.path}: value {value!r} of column '{name}' is not {kind}, written as null")
+        return values
+
+    def write(self, rows):
+        pa = self.pa
+        names = self.header or [f"col{i}" for i in range(len(rows[0]))]
+        columns = [[row[i] if i < len(row) else None for row in rows] for i in range(len(names))]
+        if self.writer is None:
+            self.kinds = [self.types.get(name) or self._infer(col) for name, col in zip(names, columns)]
+            arrow_types = {"float64": pa.float64(), "int64": pa.int64(), "bool": pa.bool_(), "string": pa.string()}
+            self.schema = pa.schema([(name, arrow_types[kind]) for name, kind in zip(names, self.kinds)])
+            if self.parquet:
+                import pyarrow.parquet as pq
+
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                self.writer = pa.ipc.new_stream(self.path, self.schema)
+        arrays = [pa.array(self._convert(field.name, kind, col), type=field.type)
+                  for field, kind, col in zip(self.schema, self.kinds, columns)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _RingBackend:
+    """Keeps the newest `capacity` rows in a memory-mapped float64 .npy file, see read_ring()."""
+
+    def __init__(self, path, header, capacity):
+        if not header:
+            raise ValueError("A header is required for ring files")
+        self.path = path
+        self.header = list(header)
+        self.capacity = int(capacity)
+        self.count = 0  # Total number of rows ever written
+        self.categories = {}  # column name -> {string value: code}
+        self._meta = None  # Last sidecar contents written
+        self.data = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(self.capacity, len(header)))
+
+    def _encode(self, i, value):
+        if isinstance(value, (str, bytes)):
+            codes = self.categories.setdefault(self.header[i], {})
+            return codes.setdefault(value, len(codes))
+        return np.nan if value is None else value
+
+    def write(self, rows):
+        block = np.array([[self._encode(i, v) for i, v in enumerate(row)] for row in rows], dtype=np.float64)
+        skipped = max(len(block) - self.capacity, 0)  # Only the newest rows survive anyway
+        block = block[skipped:]
+        start = (self.count + skipped) % self.capacity  # Row k of the stream lives in slot k % capacity
+        first = min(len(block), self.capacity - start)
+        self.data[start:start + first] = block[:first]
+        self.data[:len(block) - first] = block[first:]  # Wrap around
+        self.count += len(rows)
+        self.data.flush()
+        self._write_meta()
+
+    def _write_meta(self):
+        """Rewrites the JSON sidecar, only when the row count or the category tables changed since the last time."""
+        meta = json.dumps({"columns": self.header, "capacity": self.capacity, "count": self.count,
+                           "categories": self.categories})
+        if meta != self._meta:
+            with open(self.path + ".json", "w") as f:
+                f.write(meta)
+            self._meta = meta
+
+    def close(self):
+        self.data.flush()
+        del self.data
+
+
+def read_ring(path):
+    """
+    Reads a ring file written by BufferedRowWriter in chronological order.
+
+    Args:
+        path (str): Path of the .ring file.
+
+    Returns:
+        tuple: (rows, columns, categories) where rows is an (M, C) float64 array, columns the header and categories
+            maps each string column to its {value: code} table.
+    """
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    data = np.load(path, mmap_mode="r")
+    count, capacity = meta["count"], meta["capacity"]
+    if count <= capacity:
+        rows = np.asarray(data[:count])
+    else:
+        start = count % capacity
+        rows = np.concatenate((data[start:], data[:start]))
+    return rows, meta["columns"], meta["categories"]
+
+
+class BufferedRowWriter:
+    """
+    Row writer that buffers rows in memory and writes them in batches from a background thread.
+
+    Attributes:
+        path (str): Output file path.
+        fmt (str): Output format, one of 'csv', 'parquet', 'arrow' or 'ring'.
+        max_rows (int): Number of buffered rows that wakes the background thread for an early flush.
+        flush_interval (float): Maximum time in seconds rows stay in memory before the background flush.
+        rows_written (int): Number of rows handed to the backend so far.
+
+    Methods:
+        writerow(row): Buffers one row, same interface as csv.writer.writerow.
+        writerows(rows): Buffers several rows.
+        flush(): Writes all buffered rows now.
+        close(): Flushes, stops the background thread and closes the file.
+    """
+
+    def __init__(self, path, header=None, append=False, max_rows=1024, flush_interval=1.0, fmt=None,
+                 ring_capacity=100000, types=None):
+        """
+        Opens the output file and starts the background flush thread.
+
+        Args:
+            path (str): Output file path. The extension selects the format unless fmt is given.
+            header (list | None): Column names. Written once for CSV, used as schema names for Arrow/Parquet/ring.
+            append (bool): Append to an existing CSV instead of truncating it. The header is only written if the
+                file is new or empty.
+            max_rows (int): Number of buffered rows that wakes the background thread for an early flush.
+            flush_interval (float): Time in seconds between background flushes.
+            fmt (str | None): Explicit output format, overrides the extension.
+            ring_capacity (int): Number of rows kept by the 'ring' format.
+            types (dict | None): Column name -> 'float64', 'int64', 'bool' or 'string', the declared schema of
+                Arrow/Parquet files. Columns not listed are typed from their first value (see _ArrowBackend).
+        """
+        self.path = str(path)
+        self.fmt = fmt or format_from_path(self.path)
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        if self.fmt == "csv":
+            self._backend = _CsvBackend(self.path, header, append)
+        elif self.fmt in {"parquet", "arrow"}:
+            self._backend = _ArrowBackend(self.path, header, parquet=self.fmt == "parquet", types=types)
+        elif self.fmt == "ring":
+            self._backend = _RingBackend(self.path, header, ring_capacity)
+        else:
+            raise ValueError(f"Unsupported log format '{self.fmt}'")
+        self._buffer = []
+        self._lock = threading.Lock()  # Guards the buffer
+        self._io_lock = threading.Lock()  # Serialises backend writes
+        self._closed = threading.Event()
+        self._wake = threading.Event()  # Set when the buffer is full or the writer is closing
+        self._thread = threading.Thread(target=self._flush_loop, name=f"BufferedRowWriter({self.path})", daemon=True)
+        self._thread.start()
+
+    def writerow(self, row):
+        """Buffers a single row. Wakes the background thread when max_rows rows are pending."""
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.max_rows
+        if full:
+            self._wake.set()
+
+    def writerows(self, rows):
+        """Buffers several rows at once."""
+        with self._lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.max_rows
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Writes all buffered rows to the backend."""
+        with self._io_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if rows:
+                try:
+                    self._backend.write(rows)
+                    self.rows_written += len(rows)
+                except Exception as e:  # Logged rather than raised, the flush thread must keep running
+                    logging.exception(f"Failed to write {len(rows)} rows to {self.path}: {str(e)}")
+
+    def close(self):
+        """Flushes the remaining rows, stops the background thread and closes the file."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._backend.close()
+
+    @property
+    def closed(self):
+        """True once close() has been called."""
+        return self._closed.is_set()
+
+    def _flush_loop(self):
+        """Background thread flushing the buffer every flush_interval seconds or when it is full."""
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+_shared_writers = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_writer(path, header=None, **kwargs):
+    """
+    Returns a process-wide BufferedRowWriter appending to `path`, creating it on first use.
+
+    Used by the alert helpers that are called with a file path on every alert instead of holding a writer.
+    All shared writers are flushed and closed at interpreter exit.
+
+    Args:
+        path (str): Output file path.
+        header (list | None): Header written if the file is new or empty.
+        **kwargs: Extra BufferedRowWriter arguments, only used when the writer is created.
+
+    Returns:
+        BufferedRowWriter: The shared writer for this path.
+    """
+    key = os.path.abspath(str(path))
+    with _shared_lock:
+        writer = _shared_writers.get(key)
+        if writer is None or writer.closed:
+            writer = BufferedRowWriter(path, header, append=True, **kwargs)
+            _shared_writers[key] = writer
+        return writer
+
+
+@atexit.register
+def close_shared_writers():
+    """Flushes and closes every writer created by get_shared_writer."""
+    with _shared_lock:
+        writers = list(_shared_writers.values())
+        _shared_writers.clear()
+    for writer in writers:
+        writer.close()
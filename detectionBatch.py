@@ -0,0 +1,196 @@
+# detectionBatch.py
+"""
+Structured detection batch coming straight out of YOLOv8 inference.
+
+run_yolov8_inference used to call .numpy() three times on Results.boxes, build a Python list per box with int()
+casts and a model.model.names lookup, and every consumer unpacked those 7-element lists again. DetectionBatch keeps
+the single (N, 6|7) array of Boxes.data (moved to the CPU once, which is a view for CPU tensors) and exposes its
+columns as NumPy views, using the ultralytics layout:
+
+    [x1, y1, x2, y2, conf, cls]             untracked
+    [x1, y1, x2, y2, track_id, conf, cls]   after model.track()
+
+Vectorized consumers (proximityEngine, hazardEngine, hazardZones, KalmanFilterBank, identityTracking) read the
+columns directly. For the remaining per-detection code the batch still behaves like the old list: len(), indexing and
+iteration yield [x1, y1, x2, y2, conf, class ID, class name] lists with integer coordinates, built in one pass.
+
+The module level helpers (as_boxes, class_ids, class_names) accept a DetectionBatch or a legacy list, so callers do
+not need to know which one they got. resolve_class_ids maps class names to the IDs model.predict(classes=...) expects.
+"""
+
+import numpy as np
+
+
+class DetectionBatch:
+    """
+    Detections of one frame as column views over a single float32 array.
+
+    Attributes:
+        data (np.ndarray): (N, 6) or (N, 7) array in the ultralytics Boxes.data layout.
+        names (dict): Class ID to class name mapping of the model.
+
+    Properties:
+        xyxy, conf, cls, class_ids, track_ids, centers, class_names
+    """
+
+    __slots__ = ("data", "names", "_name_table")
+
+    def __init__(self, data, names):
+        """
+        Args:
+            data (np.ndarray): (N, 6) or (N, 7) array in the ultralytics Boxes.data layout.
+            names (dict): Class ID to class name mapping of the model.
+        """
+        data = np.asarray(data, dtype=np.float32)
+        self.data = data if data.ndim == 2 else data.reshape(-1, 6)
+        self.names = names
+        self._name_table = None
+
+    @classmethod
+    def from_result(cls, result, names=None):
+        """
+        Wraps the boxes of one ultralytics Results object without per-box Python work.
+
+        Args:
+            result: Results object, e.g. one element of model.predict() or model.track().
+            names (dict | None): Class names, defaults to result.names.
+        """
+        data = result.boxes.data
+        if hasattr(data, "cpu"):
+            data = data.cpu().numpy()  # One device-to-host copy, a view for tensors already on the CPU
+        return cls(data, result.names if names is None else names)
+
+    @classmethod
+    def from_list(cls, detections, names=None):
+        """
+        Builds a batch from legacy [x1, y1, x2, y2, conf, class ID, class name] lists.
+
+        Args:
+            detections (list): Legacy detection lists.
+            names (dict | None): Class names, collected from the lists when omitted.
+        """
+        data = np.array([det[:6] for det in detections], np.float32).reshape(-1, 6)
+        if names is None:
+            names = {int(det[5]): det[6] for det in detections}
+        return cls(data, names)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def is_track(self):
+        """True if the batch carries track IDs (7 columns)."""
+        return self.data.shape[1] == 7
+
+    @property
+    def xyxy(self):
+        """(N, 4) box corners, a view."""
+        return self.data[:, :4]
+
+    @property
+    def conf(self):
+        """(N,) confidences, a view."""
+        return self.data[:, -2]
+
+    @property
+    def cls(self):
+        """(N,) class IDs as float32, a view."""
+        return self.data[:, -1]
+
+    @property
+    def class_ids(self):
+        """(N,) class IDs as ints."""
+        return self.cls.astype(int)
+
+    @property
+    def track_ids(self):
+        """(N,) track IDs as ints, None if the batch is untracked."""
+        return self.data[:, 4].astype(int) if self.is_track else None
+
+    @property
+    def centers(self):
+        """(N, 2) box centers."""
+        return (self.data[:, :2] + self.data[:, 2:4]) / 2
+
+    @property
+    def class_names(self):
+        """(N,) object array of class names, looked up through a table built once per batch."""
+        ids = self.class_ids
+        if self._name_table is None:
+            size = max(max(self.names, default=-1), ids.max(initial=-1)) + 1  # Unknown IDs are named by number
+            self._name_table = np.array([self.names.get(i, str(i)) for i in range(size)], dtype=object)
+        return self._name_table[ids]
+
+    def class_mask(self, name):
+        """Returns the (N,) bool mask of detections of the given class name."""
+        return self.class_names == name
+
+    def tolist(self):
+        """Returns the detections as legacy [x1, y1, x2, y2, conf, class ID, class name] lists."""
+        return [[*box, conf, cls, name] for box, conf, cls, name in
+                zip(self.xyxy.astype(int).tolist(), self.conf.tolist(), self.class_ids.tolist(), self.class_names)]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, index):
+        """An int returns the legacy list of one detection, a slice, mask or index array returns a sub-batch."""
+        if isinstance(index, (int, np.integer)):
+            x1, y1, x2, y2 = self.xyxy[index].astype(int).tolist()
+            cls = int(self.cls[index])
+            return [x1, y1, x2, y2, float(self.conf[index]), cls, self.names.get(cls, str(cls))]
+        return DetectionBatch(self.data[index], self.names)
+
+    def __repr__(self):
+        return f"DetectionBatch({len(self)} detections{', tracked' if self.is_track else ''})"
+
+
+def as_boxes(detections):
+    """
+    Returns the (N, 4) float32 box corners of a DetectionBatch (a view), a legacy detection list or an array.
+    """
+    if isinstance(detections, DetectionBatch):
+        return detections.xyxy
+    if isinstance(detections, np.ndarray):
+        boxes = detections.astype(np.float32, copy=False)
+        return boxes[:, :4] if boxes.ndim == 2 else boxes.reshape(-1, 4)
+    return np.array([det[:4] for det in detections], np.float32).reshape(-1, 4)
+
+
+def class_ids(detections):
+    """Returns the (N,) int class IDs of a DetectionBatch or a legacy detection list."""
+    if isinstance(detections, DetectionBatch):
+        return detections.class_ids
+    return np.fromiter((det[5] for det in detections), dtype=int, count=len(detections))
+
+
+def class_names(detections):
+    """Returns the (N,) class names of a DetectionBatch or a legacy detection list."""
+    if isinstance(detections, DetectionBatch):
+        return detections.class_names
+    return np.array([det[6] for det in detections], dtype=object)
+
+
+def resolve_class_ids(classes, names):
+    """
+    Translates class names into the sorted class IDs of a model, e.g. for model.predict(classes=...).
+
+    Args:
+        classes (iterable | None): Class names (or IDs), None for all classes.
+        names (dict): Class ID to class name mapping of the model.
+
+    Returns:
+        list | None: Sorted class IDs, None if classes is None.
+    """
+    if classes is None:
+        return None
+    lookup = {name: i for i, name in names.items()}
+    ids = set()
+    for c in classes:
+        if isinstance(c, (int, np.integer)) and c in names:
+            ids.add(int(c))
+        elif c in lookup:
+            ids.add(lookup[c])
+        else:
+            raise ValueError(f"Unknown class '{c}', the model knows {sorted(lookup)}")
+    return sorted(ids)
@@ -0,0 +1,356 @@
+# detectionRecording.py
+"""
+Recording and offline replay of per-frame detections.
+
+Comparing the Kalman and dead-reckoning predictors used to mean running every live tracker separately on the webcam,
+so the runs never saw the same detections and every experiment paid for YOLO inference again. A recording stores the
+output of run_yolov8_inference once; the replay driver feeds it into ObjectTracker_Kalman, DeadReckoningTracker or
+the thesis trackers as fast as they can process it (or paced at a chosen speed), with the recorded timestamps.
+
+A recording is a directory with three files:
+
+    frames.bin  one record per frame: timestamp (float64), index of the first box (int64), number of boxes (int32)
+    boxes.bin   float32 rows [x1, y1, x2, y2, conf, cls], the ultralytics Boxes.data layout
+    meta.json   class names, frame rate and frame size of the source, number of frames and boxes
+
+Both binary files are appended while recording and opened with np.memmap for replay, so a recording of any length
+opens instantly and every frame is returned as a DetectionBatch over a view of the mapped boxes, without copying.
+
+Usage:
+    python detectionRecording.py record --source 0 --out recordings/cell1
+    python detectionRecording.py replay recordings/cell1 --tracker kalman
+    python detectionRecording.py replay recordings/cell1 --tracker thesis_kalman --area 150,150,300,300
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import utilsNeeded
+from alertDispatcher import AlertDispatcher, NullSink
+from detectionBatch import DetectionBatch
+
+FRAME_DTYPE = np.dtype([("timestamp", "<f8"), ("start", "<i8"), ("count", "<i4")])
+BOX_COLUMNS = 6  # x1, y1, x2, y2, conf, cls
+FORMAT_VERSION = 1
+
+
+class DetectionRecorder:
+    """
+    Appends the detections of every frame to a recording directory.
+
+    Attributes:
+        path (str): Recording directory.
+        names (dict): Class ID to class name mapping, completed from the recorded detections.
+        fps (float): Frame rate of the source, 0 if unknown.
+        frame_shape (tuple | None): (height, width) of the source frames.
+        frames (int): Number of recorded frames.
+        boxes (int): Number of recorded boxes.
+
+    Methods:
+        record(detections, timestamp=None): Appends one frame.
+        close(): Flushes the data files and writes meta.json.
+    """
+
+    def __init__(self, path, names=None, fps=0, frame_shape=None, source=None):
+        """
+        Args:
+            path (str): Recording directory, created if needed. Existing recordings in it are overwritten.
+            names (dict | None): Class names of the model.
+            fps (float): Frame rate of the source.
+            frame_shape (tuple | None): Frame shape of the source, (height, width[, channels]).
+            source (str | None): Description of the source, stored in meta.json.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.names = dict(names or {})
+        self.fps = float(fps or 0)
+        self.frame_shape = tuple(frame_shape[:2]) if frame_shape is not None else None
+        self.source = None if source is None else str(source)
+        self.frames = 0
+        self.boxes = 0
+        self._frames_file = open(os.path.join(path, "frames.bin"), "wb")
+        self._boxes_file = open(os.path.join(path, "boxes.bin"), "wb")
+
+    def record(self, detections, timestamp=None):
+        """
+        Appends the detections of one frame.
+
+        Args:
+            detections (DetectionBatch | list): Detections as returned by run_yolov8_inference. Track IDs of tracked
+                batches are not stored, the replayed trackers assign their own.
+            timestamp (float | None): Capture time of the frame (time.time()), defaults to now.
+        """
+        if isinstance(detections, DetectionBatch):
+            data = detections.data[:, [0, 1, 2, 3, -2, -1]]
+            self.names.update(detections.names)
+        else:
+            data = np.array([det[:BOX_COLUMNS] for det in detections], np.float32).reshape(-1, BOX_COLUMNS)
+            self.names.update({int(det[5]): det[6] for det in detections})
+        frame = np.array([(time.time() if timestamp is None else timestamp, self.boxes, len(data))], FRAME_DTYPE)
+        self._boxes_file.write(np.ascontiguousarray(data, "<f4").tobytes())
+        self._frames_file.write(frame.tobytes())
+        self.frames += 1
+        self.boxes += len(data)
+
+    def close(self):
+        """Closes the data files and writes meta.json."""
+        self._frames_file.close()
+        self._boxes_file.close()
+        meta = {"version": FORMAT_VERSION, "names": {str(k): v for k, v in sorted(self.names.items())},
+                "fps": self.fps, "frame_shape": self.frame_shape, "source": self.source,
+                "frames": self.frames, "boxes": self.boxes}
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DetectionRecording:
+    """
+    Memory-mapped read access to a recording.
+
+    Attributes:
+        path (str): Recording directory.
+        names (dict): Class ID to class name mapping.
+        fps (float): Frame rate of the recorded source, 0 if unknown.
+        frame_shape (tuple | None): (height, width) of the recorded frames.
+        frames (np.ndarray): (F,) FRAME_DTYPE records, memory-mapped.
+        boxes (np.ndarray): (B, 6) float32 boxes, memory-mapped.
+
+    Indexing a recording returns (timestamp, DetectionBatch) of one frame, iterating it yields all frames in order.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Recording directory written by DetectionRecorder.
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recording version {meta.get('version')} in {path}")
+        self.path = path
+        self.names = {int(k): v for k, v in meta["names"].items()}
+        self.fps = meta.get("fps") or 0
+        self.frame_shape = tuple(meta["frame_shape"]) if meta.get("frame_shape") else None
+        self.source = meta.get("source")
+        self.frames = self._map("frames.bin", FRAME_DTYPE, meta["frames"])
+        self.boxes = self._map("boxes.bin", np.dtype("<f4"), meta["boxes"] * BOX_COLUMNS).reshape(-1, BOX_COLUMNS)
+
+    def _map(self, name, dtype, count):
+        """Maps the first count items of a data file, np.memmap cannot map empty files."""
+        if count == 0:
+            return np.zeros(0, dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=(count,))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        timestamp, start, count = self.frames[index]
+        return float(timestamp), DetectionBatch(self.boxes[start:start + count], self.names)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def timestamps(self):
+        """(F,) capture times of the frames."""
+        return self.frames["timestamp"]
+
+    @property
+    def duration(self):
+        """Recorded time span in seconds."""
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+
+def recording_inference(inference_func, recorder):
+    """
+    Wraps an inference function so that every result is recorded, e.g. to record while a tracker runs live:
+    TrackerPipeline(tracker, recording_inference(utilsNeeded.run_yolov8_inference, recorder)).
+
+    Args:
+        inference_func (function): inference_func(model, frame) -> detections.
+        recorder (DetectionRecorder): Recording the detections are appended to, with the time of the call.
+
+    Returns:
+        function: inference_func with recording.
+    """
+    def infer(model, frame):
+        timestamp = time.time()
+        detections = inference_func(model, frame)
+        if recorder.frame_shape is None:
+            recorder.frame_shape = frame.shape[:2]
+        recorder.record(detections, timestamp)
+        return detections
+
+    return infer
+
+
+def record_source(model_path, source, path, max_frames=None):
+    """
+    Runs YOLOv8 over a video source and records the detections of every frame.
+
+    Args:
+        model_path (str): Path to the YOLOv8 model.
+        source (int | str): Camera index, video file or stream URL.
+        path (str): Recording directory.
+        max_frames (int | None): Stop after this many frames, None records until the source ends.
+
+    Returns:
+        int: Number of recorded frames.
+    """
+    model = utilsNeeded.load_model(model_path)
+    cap = utilsNeeded.initialize_video_capture(source)
+    shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    with DetectionRecorder(path, model.model.names, cap.get(cv2.CAP_PROP_FPS), shape, source) as recorder:
+        while max_frames is None or recorder.frames < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = time.time()
+            recorder.record(utilsNeeded.run_yolov8_inference(model, frame), timestamp)
+    cap.release()
+    logging.info(f"Recorded {recorder.frames} frames with {recorder.boxes} detections to {path}")
+    return recorder.frames
+
+
+def replay(recording, tracker, speed=None, start=0, stop=None, on_frame=None):
+    """
+    Feeds the recorded detections into a tracker without frames, so nothing is drawn.
+
+    Works with every tracker whose process_detections / process_detection accepts frame=None and the timestamp and
+    draw keywords: ObjectTracker_Kalman, DeadReckoningTracker and the thesis kalman_pred / deadReckoning_pred trackers
+    built with model_path=None and source=None. A camera-less tracker takes over the frame rate and frame size of
+    the recorded source, and the trackers log their elapsed and hazard times from the first replayed frame.
+
+    Args:
+        recording (DetectionRecording | str): Recording or its directory.
+        tracker: Tracker instance.
+        speed (float | None): Replay speed relative to the recording (2.0 = twice real time), None replays as fast
+            as the tracker can process the frames.
+        start (int): First frame.
+        stop (int | None): Frame to stop before, None replays to the end.
+        on_frame (function | None): Called as on_frame(index, timestamp) before every frame is processed, e.g. to
+            give collected alerts the recorded time.
+
+    Returns:
+        int: Number of replayed frames.
+    """
+    if isinstance(recording, str):
+        recording = DetectionRecording(recording)
+    if not getattr(tracker, "fps", 0) and recording.fps:
+        tracker.fps = recording.fps
+    if getattr(tracker, "frame_shape", ()) is None:
+        tracker.frame_shape = recording.frame_shape
+    stop = len(recording) if stop is None else min(stop, len(recording))
+    if start >= stop:
+        return 0
+    wall_start, rec_start = time.perf_counter(), float(recording.timestamps[start])
+    if hasattr(tracker, "start_time"):
+        tracker.start_time = rec_start  # Elapsed times in the logs are relative to the recording
+    process = getattr(tracker, "process_detections", None) or tracker.process_detection
+    for index in range(start, stop):
+        timestamp, detections = recording[index]
+        if speed:
+            delay = (timestamp - rec_start) / speed - (time.perf_counter() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+        if on_frame is not None:
+            on_frame(index, timestamp)
+        process(detections, None, timestamp=timestamp, draw=False)
+    elapsed = time.perf_counter() - wall_start
+    logging.info(f"Replayed {stop - start} frames in {elapsed:.2f} s "
+                 f"({(stop - start) / max(elapsed, 1e-9):.0f} frames/s)")
+    return stop - start
+
+
+def build_replay_tracker(tracker, **kwargs):
+    """
+    Creates a camera- and model-less tracker for replay. Its alerts go to a NullSink: a replay runs as fast as
+    possible and would otherwise play an alert sound for every alerting frame.
+
+    Args:
+        tracker (str): 'kalman', 'dead_reckoning' (root trackers), 'thesis_kalman' or 'thesis_dead_reckoning'.
+        **kwargs: Constructor arguments of the tracker, model_path and source are set to None.
+    """
+    if tracker == "kalman":
+        from ObjectPrediction_kalman_SetUP import ObjectTracker_Kalman as tracker_class
+    elif tracker == "dead_reckoning":
+        from DeadReckoningTracker import DeadReckoningTracker as tracker_class
+    elif tracker in ("thesis_kalman", "thesis_dead_reckoning"):
+        # The thesis scripts import their helpers as top-level modules from the Thesis directory
+        thesis_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Thesis")
+        if thesis_dir not in sys.path:
+            sys.path.insert(0, thesis_dir)
+        if tracker == "thesis_kalman":
+            from kalman_pred import ObjectTracker_Kalman as tracker_class
+        else:
+            from deadReckoning_pred import DeadReckoningTracker as tracker_class
+    else:
+        raise ValueError(f"Unknown tracker '{tracker}'")
+    instance = tracker_class(model_path=None, source=None, sink="none", **kwargs)
+    instance.alert_dispatcher.close()
+    instance.alert_dispatcher = instance.probe.attach(AlertDispatcher(sinks=[NullSink()]))
+    return instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record detections once and replay them into the trackers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rec = commands.add_parser("record", help="run YOLOv8 over a source and record the detections")
+    rec.add_argument("--model", default="yolov8n.pt", help="YOLOv8 model path")
+    rec.add_argument("--source", default="0", help="camera index, video file or stream URL")
+    rec.add_argument("--out", required=True, help="recording directory")
+    rec.add_argument("--max-frames", type=int, default=None)
+    rep = commands.add_parser("replay", help="replay a recording into a tracker")
+    rep.add_argument("recording", help="recording directory")
+    rep.add_argument("--tracker", choices=("kalman", "dead_reckoning", "thesis_kalman", "thesis_dead_reckoning"),
+                     default="kalman")
+    rep.add_argument("--speed", type=float, default=None, help="replay speed, default as fast as possible")
+    rep.add_argument("--target", default="person", help="target class of the root trackers")
+    rep.add_argument("--proximity-threshold", type=int, default=None,
+                     help="default: the setting of the tracker's __main__ block")
+    rep.add_argument("--horizon-ms", type=float, default=None,
+                     help="prediction horizon in milliseconds of the root trackers")
+    rep.add_argument("--area", default=None, help="robotic arm area x1,y1,x2,y2 of the thesis trackers")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "record":
+        record_source(args.model, int(args.source) if args.source.isdigit() else args.source, args.out,
+                      args.max_frames)
+    else:
+        from parameterSweep import DEFAULT_KWARGS  # The __main__ settings of every tracker
+
+        tracker_kwargs = dict(DEFAULT_KWARGS[args.tracker])
+        if args.proximity_threshold is not None:
+            tracker_kwargs["proximity_threshold"] = args.proximity_threshold
+        if args.tracker.startswith("thesis"):
+            if args.area:
+                x1, y1, x2, y2 = (int(v) for v in args.area.split(","))
+                tracker_kwargs["any_area"] = ((x1, y1), (x2, y2))
+        else:
+            tracker_kwargs.update(target=args.target, prediction_horizon_ms=args.horizon_ms)
+        replay_tracker = build_replay_tracker(
+            args.tracker,
+            file_name_predict=f"tracking_and_predictions_replay_{args.tracker}.csv",
+            file_name_alert=f"alert_times_replay_{args.tracker}.csv",
+            **tracker_kwargs,
+        )
+        try:
+            replay(args.recording, replay_tracker, args.speed)
+        finally:
+            replay_tracker.close()
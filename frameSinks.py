@@ -0,0 +1,250 @@
+# frameSinks.py
+"""
+Pluggable outputs for the annotated frames of the safety trackers.
+
+The trackers used to draw the annotations and call cv2.imshow / cv2.waitKey(1) on every frame. On headless edge boxes
+this costs milliseconds per frame (or fails because OpenCV was built without GUI support), although nobody looks at the
+picture. A sink decides whether and how often a frame is shown:
+
+    NullSink        headless, nothing is drawn at all
+    WindowSink      cv2.imshow window, the previous behaviour
+    VideoWriterSink cv2.VideoWriter to a file on disk
+    MJPEGSink       multipart JPEG preview on a local HTTP port, e.g. http://127.0.0.1:8080/
+
+The tracker asks the sink with due() before it annotates a frame and only draws and hands the frame over when the
+sink wants it. Every sink takes a max_fps, so a 5 fps preview of a 30 fps detector skips the drawing and encoding of
+five out of six frames, and the MJPEG preview draws nothing while no client is connected. The render cost is
+therefore independent of the detection rate, detection, prediction and alerting still run on every frame.
+"""
+
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+
+class FrameSink(ABC):
+    """
+    Base class of the frame outputs.
+
+    Attributes:
+        interval (float): Minimum time between two frames in seconds, 0 for every frame.
+
+    Methods:
+        due(): True if the sink wants the current frame, the caller then draws and calls write().
+        write(frame): Outputs an annotated frame.
+        poll(): True if the user asked to stop (the 'q' key of the window).
+        close(): Releases the output.
+    """
+
+    def __init__(self, max_fps=None):
+        """
+        Args:
+            max_fps (float | None): Maximum output frame rate, None for every frame.
+        """
+        self.interval = 1 / max_fps if max_fps else 0
+        self._next = 0.0
+
+    def active(self):
+        """True if the sink currently has a consumer."""
+        return True
+
+    def due(self):
+        """Returns True if the sink has a consumer and the next frame is due at the configured rate."""
+        if not self.active():
+            return False
+        now = time.perf_counter()
+        if now < self._next:
+            return False
+        self._next = now + self.interval
+        return True
+
+    @abstractmethod
+    def write(self, frame):
+        """Outputs an annotated frame."""
+
+    def poll(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class NullSink(FrameSink):
+    """Headless mode: never wants a frame, so the trackers skip all drawing."""
+
+    def active(self):
+        return False
+
+    def write(self, frame):
+        pass
+
+
+class WindowSink(FrameSink):
+    """Shows the frames in a cv2 window, 'q' stops the tracker."""
+
+    def __init__(self, window_name="Frame", max_fps=None):
+        """
+        Args:
+            window_name (str): Name of the cv2 window.
+            max_fps (float | None): Maximum display rate, None for every frame.
+        """
+        super().__init__(max_fps)
+        self.window_name = window_name
+        self._quit = False
+
+    def write(self, frame):
+        cv2.imshow(self.window_name, frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            self._quit = True
+
+    def poll(self):
+        return self._quit
+
+    def close(self):
+        try:
+            cv2.destroyWindow(self.window_name)
+        except cv2.error:  # The window was never opened
+            pass
+
+
+class VideoWriterSink(FrameSink):
+    """Writes the frames to a video file, the writer is opened with the size of the first frame."""
+
+    def __init__(self, path, fps=None, fourcc="mp4v", max_fps=None):
+        """
+        Args:
+            path (str): Output video file.
+            fps (float | None): Frame rate stored in the file, defaults to max_fps or 30.
+            fourcc (str): Codec of the cv2.VideoWriter.
+            max_fps (float | None): Maximum number of frames written per second, None for every frame.
+        """
+        super().__init__(max_fps)
+        self.path = path
+        self.fps = fps or max_fps or 30
+        self.fourcc = fourcc
+        self.writer = None
+
+    def write(self, frame):
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+            if not self.writer.isOpened():
+                logging.error(f"Could not open video writer for {self.path}")
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+class MJPEGSink(FrameSink):
+    """
+    Serves the frames as a multipart JPEG stream (viewable in any browser) from a background HTTP server.
+
+    Attributes:
+        clients (int): Number of connected viewers. Without viewers the sink wants no frames.
+        server (ThreadingHTTPServer): The preview server, one thread per viewer.
+    """
+
+    def __init__(self, port=8080, host="127.0.0.1", max_fps=5, quality=75):
+        """
+        Args:
+            port (int): HTTP port of the preview.
+            host (str): Interface to bind, the default only accepts local connections.
+            max_fps (float | None): Maximum preview rate.
+            quality (int): JPEG quality 0-100.
+        """
+        super().__init__(max_fps)
+        self.quality = int(quality)
+        self.clients = 0
+        self._jpeg = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="mjpeg", daemon=True).start()
+        logging.info(f"MJPEG preview on http://{host}:{self.server.server_port}/")
+
+    def _handler(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                with sink._cond:
+                    sink.clients += 1
+                    seq = sink._seq  # Wait for the first frame written after connecting
+                try:
+                    while True:
+                        jpeg, seq = sink._next_jpeg(seq)
+                        if jpeg is None:
+                            break
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+                                         % len(jpeg) + jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with sink._cond:
+                        sink.clients -= 1
+
+            def log_message(self, format, *args):  # Keep the tracker output free of access logs
+                pass
+
+        return Handler
+
+    def _next_jpeg(self, seq):
+        """Blocks until a frame newer than seq is available, returns (jpeg, seq) or (None, seq) on close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq != seq)
+            return (None, seq) if self._closed else (self._jpeg, self._seq)
+
+    def active(self):
+        return self.clients > 0
+
+    def write(self, frame):
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if ok:
+            with self._cond:
+                self._jpeg, self._seq = jpeg.tobytes(), self._seq + 1
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_sink(spec="window", max_fps=None):
+    """
+    Creates a sink from a short specification, e.g. a command line option.
+
+    Args:
+        spec (str | FrameSink | None): 'window', 'none' (headless), 'video:<path>', 'mjpeg' or 'mjpeg:<port>'.
+            A FrameSink is returned unchanged, None means 'window'.
+        max_fps (float | None): Maximum output rate, the MJPEG preview defaults to 5 fps.
+
+    Returns:
+        FrameSink: The sink.
+    """
+    if isinstance(spec, FrameSink):
+        return spec
+    kind, _, arg = (spec or "window").partition(":")
+    if kind == "window":
+        return WindowSink(max_fps=max_fps)
+    if kind in ("none", "headless"):
+        return NullSink()
+    if kind == "video":
+        return VideoWriterSink(arg or "tracking.mp4", max_fps=max_fps)
+    if kind == "mjpeg":
+        return MJPEGSink(int(arg or 8080), max_fps=max_fps or 5)
+    raise ValueError(f"Unknown frame sink '{spec}', expected window, none, video:<path> or mjpeg[:<port>]")
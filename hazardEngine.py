@@ -0,0 +1,185 @@
+# hazardEngine.py
+"""
+Predictive hazard evaluation against the robotic arm zone.
+
+Thesis/utilitiesHelper.is_object_near only looks at the *current* box: it fires when the box touches the
+any_area rectangle (is_object_within_bounds) or lies inside it close to an edge (is_object_near_boundary).
+The predicted positions of the Kalman / dead-reckoning trackers were only logged and drawn.
+
+This module evaluates all objects of a frame at once:
+    - zone_contact: vectorized is_object_within_bounds / is_object_near_boundary,
+    - time_to_collision: moves every box along its predicted velocity and returns when it first touches the zone
+      (slab intersection of the linear trajectory with the rectangle, inf if it never does),
+    - trajectory_time_to_collision: the same for sampled multi-step trajectories (e.g. KalmanFilterBank.trajectory),
+    - HazardEngine.evaluate: combines both and raises an alert when the time-to-collision (TTC) drops below a threshold,
+      so objects heading for the arm are reported before they reach it, without lowering the proximity threshold.
+
+Boxes are (N, >=4) arrays [x1, y1, x2, y2, ...] (see proximityEngine.detections_to_array), zones use the
+any_area format ((x1, y1), (x2, y2)) and velocities are in pixels per second.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from detectionBatch import as_boxes
+
+HazardAssessment = namedtuple("HazardAssessment", ["within", "near_boundary", "ttc", "alert", "condition"])
+HazardAssessment.__doc__ = """
+Hazard state of every object of a frame.
+
+Attributes:
+    within (np.ndarray): (N,) bool, the box touches the zone (is_object_within_bounds).
+    near_boundary (np.ndarray): (N,) bool, the box is inside the zone close to an edge (is_object_near_boundary).
+    ttc (np.ndarray): (N,) seconds until the box touches the zone, 0 if it already does, inf if never.
+    alert (np.ndarray): (N,) bool, within, near the boundary or TTC below the threshold.
+    condition (list): Per object 'center', 'Nearness', 'TTC' or None, the reason of the alert.
+"""
+
+
+def zone_array(area):
+    """Converts an area ((x1, y1), (x2, y2)) into a float32 array [x1, y1, x2, y2]."""
+    (x1, y1), (x2, y2) = area
+    return np.array([x1, y1, x2, y2], np.float32)
+
+
+def zone_contact(boxes, area, proximity_threshold):
+    """
+    Vectorized utilitiesHelper.is_object_within_bounds and is_object_near_boundary for all boxes.
+
+    Args:
+        boxes (np.ndarray): (N, >=4) boxes [x1, y1, x2, y2, ...].
+        area (tuple): Zone ((x1, y1), (x2, y2)).
+        proximity_threshold (float): Distance to the zone edges that counts as near.
+
+    Returns:
+        tuple: (within, near_boundary) (N,) bool arrays.
+    """
+    b = np.asarray(boxes, np.float32)[:, :4]
+    z = zone_array(area)
+    within = ~((b[:, 2] < z[0]) | (b[:, 0] > z[2]) | (b[:, 3] < z[1]) | (b[:, 1] > z[3]))
+    # Inner distance of the box edges to the zone edges: left, top, right, bottom
+    inner = np.stack((b[:, 0] - z[0], b[:, 1] - z[1], z[2] - b[:, 2], z[3] - b[:, 3]), axis=1)
+    near_boundary = ((inner > 0) & (inner <= proximity_threshold)).any(axis=1)
+    return within, near_boundary
+
+
+def time_to_collision(boxes, velocities, area, margin=0.0):
+    """
+    Time until each box, moving with constant velocity, first touches the (optionally enlarged) zone.
+
+    Per axis the box [a1, a2] overlaps the zone [z1, z2] while a1 + v t <= z2 and a2 + v t >= z1. Intersecting
+    these intervals of both axes gives the contact interval, its start is the time-to-collision.
+
+    Args:
+        boxes (np.ndarray): (N, >=4) boxes [x1, y1, x2, y2, ...].
+        velocities (np.ndarray): (N, 2) velocities in pixels per second.
+        area (tuple): Zone ((x1, y1), (x2, y2)).
+        margin (float): Pixels by which the zone is enlarged on every side.
+
+    Returns:
+        np.ndarray: (N,) TTC in seconds, 0 for boxes that already touch the zone and inf if they never will.
+    """
+    b = np.asarray(boxes, np.float32)[:, :4].reshape(-1, 2, 2)  # (N, corner, axis)
+    v = np.asarray(velocities, np.float32).reshape(-1, 2)
+    z = zone_array(area).reshape(2, 2) + np.array([[-margin], [margin]], np.float32)
+    lo, hi = b[:, 0], b[:, 1]  # (N, 2) min and max coordinate per axis
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t1 = (z[0] - hi) / v  # Time the leading edge reaches the near zone edge
+        t2 = (z[1] - lo) / v  # Time the trailing edge leaves the far zone edge
+    enter = np.where(v > 0, t1, t2)
+    leave = np.where(v > 0, t2, t1)
+    # A still axis overlaps for all time or never
+    still = v == 0
+    overlapping = (lo <= z[1]) & (hi >= z[0])
+    enter = np.where(still, np.where(overlapping, -np.inf, np.inf), enter)
+    leave = np.where(still, np.where(overlapping, np.inf, -np.inf), leave)
+    t_enter, t_leave = enter.max(axis=1), leave.min(axis=1)
+    hit = (t_enter <= t_leave) & (t_leave >= 0)
+    return np.where(hit, np.maximum(t_enter, 0), np.inf)
+
+
+def trajectory_time_to_collision(boxes, trajectories, offsets, area, margin=0.0):
+    """
+    Time-to-collision along sampled trajectories, e.g. from KalmanFilterBank.trajectory().
+
+    The box keeps its size and is moved so that its center follows the trajectory points. This handles predictions
+    that are not straight lines.
+
+    Args:
+        boxes (np.ndarray): (N, >=4) current boxes.
+        trajectories (np.ndarray): (N, steps, 2) predicted centers.
+        offsets (np.ndarray): (steps,) look-ahead time of every trajectory point in seconds
+            (trajectoryPrediction.horizon_offsets).
+        area (tuple): Zone ((x1, y1), (x2, y2)).
+        margin (float): Pixels by which the zone is enlarged on every side.
+
+    Returns:
+        np.ndarray: (N,) time of the first trajectory point whose box touches the zone, 0 if the current box already
+            does, inf if no point within the horizon does.
+    """
+    b = np.asarray(boxes, np.float32)[:, :4]
+    z = zone_array(area) + np.array([-margin, -margin, margin, margin], np.float32)
+    half = (b[:, 2:] - b[:, :2])[:, None, :] / 2
+    points = np.asarray(trajectories, np.float32)
+    lo, hi = points - half, points + half  # (N, steps, 2)
+    touching = ((lo <= z[2:]) & (hi >= z[:2])).all(axis=2)
+    first = np.where(touching.any(axis=1), np.asarray(offsets, np.float32)[touching.argmax(axis=1)], np.inf)
+    now = ((b[:, :2] <= z[2:]) & (b[:, 2:] >= z[:2])).all(axis=1)
+    return np.where(now, 0, first)
+
+
+class HazardEngine:
+    """
+    Per-frame hazard evaluation of all objects against one zone.
+
+    Attributes:
+        area (tuple): Zone ((x1, y1), (x2, y2)).
+        proximity_threshold (float): Edge distance for the near-boundary check.
+        ttc_threshold (float | None): Alert when an object reaches the zone within this many seconds, None disables
+            the predictive alert.
+        margin (float): Safety margin in pixels added around the zone for the TTC.
+
+    Methods:
+        evaluate(boxes, velocities=None, trajectories=None, offsets=None): Returns a HazardAssessment.
+    """
+
+    def __init__(self, area, proximity_threshold, ttc_threshold=1.0, margin=0.0):
+        """
+        Args:
+            area (tuple): Zone ((x1, y1), (x2, y2)), e.g. the any_area of the thesis trackers.
+            proximity_threshold (float): Edge distance in pixels for the near-boundary check.
+            ttc_threshold (float | None): Time-to-collision in seconds below which an alert is raised.
+            margin (float): Safety margin in pixels added around the zone for the TTC.
+        """
+        self.area = area
+        self.proximity_threshold = proximity_threshold
+        self.ttc_threshold = ttc_threshold
+        self.margin = margin
+
+    def evaluate(self, boxes, velocities=None, trajectories=None, offsets=None):
+        """
+        Evaluates the current contact and the predicted time-to-collision of all boxes of a frame.
+
+        Args:
+            boxes (np.ndarray | DetectionBatch | list): (N, >=4) boxes or detections [x1, y1, x2, y2, ...].
+            velocities (np.ndarray | None): (N, 2) velocities in pixels per second for the linear TTC.
+            trajectories (np.ndarray | None): (N, steps, 2) predicted centers, used instead of velocities if given.
+            offsets (np.ndarray | None): (steps,) look-ahead times of the trajectory points in seconds.
+
+        Returns:
+            HazardAssessment: Contact, TTC and alert state per box.
+        """
+        boxes = as_boxes(boxes)
+        within, near_boundary = zone_contact(boxes, self.area, self.proximity_threshold)
+        if trajectories is not None:
+            ttc = trajectory_time_to_collision(boxes, trajectories, offsets, self.area, self.margin)
+        elif velocities is not None:
+            ttc = time_to_collision(boxes, velocities, self.area, self.margin)
+        else:
+            ttc = np.where(within, 0, np.inf).astype(np.float32)
+        predicted = ttc <= self.ttc_threshold if self.ttc_threshold is not None else np.zeros_like(within)
+        alert = within | near_boundary | predicted
+        condition = ["center" if w else "Nearness" if n else "TTC" if p else None
+                     for w, n, p in zip(within, near_boundary, predicted)]
+        return HazardAssessment(within, near_boundary, ttc, alert, condition)
@@ -0,0 +1,269 @@
+# hazardZones.py
+"""
+Polygon hazard zones backed by a rasterised lookup.
+
+The thesis trackers model the hazard area as one axis-aligned rectangle any_area=((x1, y1), (x2, y2)) and test every
+box against it with Python comparisons (is_area_excluded, is_object_near_boundary). A real cell has several arms and
+conveyor lanes with irregular footprints, each with its own safety distance.
+
+ZoneMap rasterises every zone polygon once into a mask of the frame, plus a "near" band obtained by dilating the mask
+by the zone's proximity threshold, and keeps the integral images (summed-area tables) of both. Whether a box touches,
+is contained in or is near a zone is then a sum over the box read from four table entries, so all boxes of a frame are
+tested against all zones with a handful of vectorized lookups, independent of the polygon complexity.
+
+The raster has one cell per cell_size x cell_size pixels (4 by default). Each zone keeps two int32 tables of
+(height / cell_size + 1) x (width / cell_size + 1) entries, about 4 MB per zone for a 4K frame at the default instead
+of 66 MB at full resolution. Boxes and zones are snapped to the cells, so the touching and near tests are accurate
+to one cell.
+
+"Near" differs from the any_area rectangle of the thesis trackers: there is_object_near_boundary (and
+hazardEngine.zone_contact) fires when an edge of the box lies inside the rectangle within the threshold of the
+corresponding rectangle edge. For a zone it means that the box does not touch the polygon but reaches into the band
+of proximity_threshold pixels around it, i.e. a safety distance outside the zone. A rectangle_zone of any_area
+therefore raises 'Nearness' for boxes approaching the area from outside, where the rectangle check raises nothing.
+
+Zones use pixel coordinates of the full frame, boxes are (N, >=4) arrays or detections [x1, y1, x2, y2, ...].
+
+Every zone can restrict the classes it alerts on (e.g. persons near the arm, but also forklifts in the conveyor lane).
+zone_classes() gives the union of those class sets, which the trackers pass to model.predict(classes=...) so the
+other classes are dropped inside the detector's NMS instead of being filtered in Python afterwards.
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from detectionBatch import as_boxes, class_names
+
+HazardZone = namedtuple("HazardZone",
+                        ["name", "polygon", "proximity_threshold", "severity", "exclude_contained", "classes"],
+                        defaults=(False, None))
+HazardZone.__doc__ = """
+One hazard region of the cell.
+
+Attributes:
+    name (str): Zone name used in logs and alert keys, e.g. 'arm_1' or 'conveyor'.
+    polygon (list): Corner points [(x, y), ...] of the zone in frame pixels.
+    proximity_threshold (float | None): Distance in pixels around the zone that counts as near, None for the proximity
+        threshold of the tracker (the default_threshold of ZoneMap).
+    severity (int): Priority of the zone, the most severe zone wins when a box hits several.
+    exclude_contained (bool): Ignore boxes lying completely inside the zone, e.g. the detected robotic arm itself
+        (like is_area_excluded for any_area). Defaults to False.
+    classes (tuple | None): Class names the zone alerts on, e.g. ('person',). Defaults to None, every class.
+"""
+
+ZoneAssessment = namedtuple("ZoneAssessment", ["zone", "severity", "condition", "touching", "near", "ttc"])
+ZoneAssessment.__doc__ = """
+Hazard state of every box of a frame against all zones.
+
+Attributes:
+    zone (np.ndarray): (N,) index of the most severe alerting zone per box, -1 if none.
+    severity (np.ndarray): (N,) severity of that zone, -1 if none.
+    condition (list): Per box 'center' (touches the zone), 'Nearness' (within its threshold), 'TTC' (predicted to
+        reach it within the TTC threshold) or None.
+    touching (np.ndarray): (Z, N) bool, the box overlaps the zone.
+    near (np.ndarray): (Z, N) bool, the box does not overlap but lies within the zone's proximity threshold.
+    ttc (np.ndarray | None): (Z, N) predicted time-to-collision in seconds (inf if none), None without trajectories.
+"""
+
+
+def rectangle_zone(area, name="area", proximity_threshold=None, severity=1, exclude_contained=True, classes=None):
+    """
+    Creates a HazardZone from the any_area rectangle format ((x1, y1), (x2, y2)) of the thesis trackers.
+    Boxes inside the rectangle are excluded by default, as is_area_excluded does for any_area. The proximity threshold
+    defaults to the one of the tracker the zone is passed to.
+    """
+    (x1, y1), (x2, y2) = area
+    return HazardZone(name, [(x1, y1), (x2, y1), (x2, y2), (x1, y2)], proximity_threshold, severity,
+                      exclude_contained, classes)
+
+
+def zone_classes(zones, extra=()):
+    """
+    Returns the set of class names any of the zones alerts on plus `extra`, None if a zone alerts on every class.
+    """
+    if not zones or any(zone.classes is None for zone in zones):
+        return None
+    return set(extra).union(*(zone.classes for zone in zones))
+
+
+def zone_bounds(zone):
+    """Returns the bounding rectangle ((x1, y1), (x2, y2)) of a zone, e.g. for logging in the any_area format."""
+    points = np.asarray(zone.polygon)
+    (x1, y1), (x2, y2) = points.min(axis=0), points.max(axis=0)
+    return (int(x1), int(y1)), (int(x2), int(y2))
+
+
+class ZoneMap:
+    """
+    Rasterised lookup of several hazard zones.
+
+    Attributes:
+        zones (list): The HazardZone definitions, the row order of every (Z, N) result.
+        frame_shape (tuple): (height, width) of the frames in pixels.
+        cell_size (int): Size of a raster cell in pixels. Larger cells use less memory at a coarser resolution.
+        thresholds (np.ndarray): (Z,) proximity threshold per zone in pixels.
+        severities (np.ndarray): (Z,) severity per zone.
+
+    Methods:
+        touching(boxes), contained(boxes), near(boxes): (Z, N) box/zone relations.
+        applies(boxes): (Z, N) mask of the zones whose class policy covers each detection.
+        excluded(boxes): (N,) boxes inside a zone with exclude_contained set.
+        trajectory_ttc(boxes, trajectories, offsets): (Z, N) predicted time until each box reaches each zone.
+        assess(boxes, trajectories=None, offsets=None, ttc_threshold=None): ZoneAssessment of a frame.
+        draw(frame): Draws the zone outlines.
+    """
+
+    def __init__(self, zones, frame_shape, cell_size=4, default_threshold=0):
+        """
+        Rasterises the zones and their near bands and builds the integral images.
+
+        Args:
+            zones (list): HazardZone definitions.
+            frame_shape (tuple): Frame shape, (height, width) or (height, width, channels).
+            cell_size (int): Raster cell size in pixels, 1 tests at full resolution.
+            default_threshold (float): Proximity threshold of the zones that leave it at None, the trackers pass
+                their own proximity_threshold.
+        """
+        if not zones:
+            raise ValueError("ZoneMap needs at least one zone")
+        self.zones = list(zones)
+        self.frame_shape = tuple(frame_shape[:2])
+        self.cell_size = int(cell_size)
+        self.severities = np.array([z.severity for z in self.zones])
+        self.thresholds = np.array([default_threshold if z.proximity_threshold is None else z.proximity_threshold
+                                    for z in self.zones], np.float64)
+        self.exclusions = np.array([z.exclude_contained for z in self.zones], bool)
+        self._classes = [None if z.classes is None else np.array(list(z.classes), dtype=object) for z in self.zones]
+        rows = -(-self.frame_shape[0] // self.cell_size)
+        cols = -(-self.frame_shape[1] // self.cell_size)
+        self._inside = np.empty((len(self.zones), rows + 1, cols + 1), np.int32)
+        self._band = np.empty_like(self._inside)
+        for i, (zone, threshold) in enumerate(zip(self.zones, self.thresholds)):
+            mask = np.zeros((rows, cols), np.uint8)
+            polygon = np.floor(np.asarray(zone.polygon, np.float32) / self.cell_size).astype(np.int32)
+            cv2.fillPoly(mask, [polygon], 1)
+            radius = int(np.ceil(threshold / self.cell_size))
+            if radius > 0:
+                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+                band = cv2.dilate(mask, kernel) - mask
+            else:
+                band = np.zeros_like(mask)
+            self._inside[i] = cv2.integral(mask)
+            self._band[i] = cv2.integral(band)
+
+    def _cells(self, boxes):
+        """Converts boxes into clipped half-open cell ranges (c1, r1, c2, r2) of the integral images."""
+        b = as_boxes(boxes)
+        cells = np.floor(b[:, :4] / self.cell_size).astype(np.intp)
+        cells[:, 2:] += 1  # Include the cell of the far edge
+        cells[:, 0::2] = np.clip(cells[:, 0::2], 0, self._inside.shape[2] - 1)
+        cells[:, 1::2] = np.clip(cells[:, 1::2], 0, self._inside.shape[1] - 1)
+        return cells
+
+    @staticmethod
+    def _box_sums(table, cells):
+        """(Z, N) number of set cells of every zone table inside every box."""
+        c1, r1, c2, r2 = cells.T
+        return table[:, r2, c2] - table[:, r1, c2] - table[:, r2, c1] + table[:, r1, c1]
+
+    def touching(self, boxes):
+        """Returns the (Z, N) mask of boxes that overlap each zone."""
+        return self._box_sums(self._inside, self._cells(boxes)) > 0
+
+    def contained(self, boxes):
+        """Returns the (Z, N) mask of boxes lying completely inside each zone (like is_area_excluded)."""
+        cells = self._cells(boxes)
+        area = (cells[:, 2] - cells[:, 0]) * (cells[:, 3] - cells[:, 1])
+        return (self._box_sums(self._inside, cells) == area) & (area > 0)
+
+    def excluded(self, boxes):
+        """Returns the (N,) mask of boxes contained in any zone with exclude_contained set."""
+        return (self.contained(boxes) & self.exclusions[:, None]).any(axis=0)
+
+    def applies(self, boxes):
+        """
+        Returns the (Z, N) mask of the zones whose class policy covers each detection. Plain box arrays carry no
+        class, they are covered by every zone.
+        """
+        applies = np.ones((len(self.zones), len(as_boxes(boxes))), bool)
+        if isinstance(boxes, np.ndarray) or all(c is None for c in self._classes):
+            return applies
+        names = class_names(boxes)
+        for i, classes in enumerate(self._classes):
+            if classes is not None:
+                applies[i] = np.isin(names, classes)
+        return applies
+
+    def near(self, boxes):
+        """Returns the (Z, N) mask of boxes that do not overlap a zone but reach into its proximity band."""
+        cells = self._cells(boxes)
+        return (self._box_sums(self._band, cells) > 0) & (self._box_sums(self._inside, cells) == 0)
+
+    def trajectory_ttc(self, boxes, trajectories, offsets):
+        """
+        Predicted time until every box reaches every zone when its center follows the trajectory.
+
+        Args:
+            boxes (np.ndarray | DetectionBatch | list): (N, >=4) current boxes.
+            trajectories (np.ndarray): (N, steps, 2) predicted centers, e.g. from KalmanFilterBank.trajectory().
+            offsets (np.ndarray): (steps,) look-ahead time of every point in seconds (trajectoryPrediction.horizon_offsets).
+
+        Returns:
+            np.ndarray: (Z, N) seconds until the first contact, 0 if the box already touches the zone, inf if it
+                does not reach it within the horizon.
+        """
+        b = as_boxes(boxes)
+        if not len(b):
+            return np.zeros((len(self.zones), 0), np.float32)
+        points = np.asarray(trajectories, np.float32).reshape(len(b), -1, 2)
+        half = (b[:, 2:] - b[:, :2])[:, None, :] / 2
+        moved = np.concatenate((points - half, points + half), axis=2).reshape(-1, 4)  # (N * steps, 4)
+        hits = self.touching(moved).reshape(len(self.zones), len(b), -1)
+        first = np.asarray(offsets, np.float32)[hits.argmax(axis=2)]
+        ttc = np.where(hits.any(axis=2), first, np.inf)
+        return np.where(self.touching(b), 0, ttc)
+
+    def assess(self, boxes, trajectories=None, offsets=None, ttc_threshold=None):
+        """
+        Evaluates all boxes of a frame against all zones and picks the most severe alerting zone per box.
+        Zones only alert on the detections of their classes.
+
+        Args:
+            boxes (np.ndarray | DetectionBatch | list): (N, >=4) boxes or detections.
+            trajectories (np.ndarray | None): (N, steps, 2) predicted centers for the time-to-collision check.
+            offsets (np.ndarray | None): (steps,) look-ahead times of the trajectory points in seconds.
+            ttc_threshold (float | None): Alert when a box is predicted to reach a zone within this many seconds.
+
+        Returns:
+            ZoneAssessment: Per-box alert zone, severity and condition plus the (Z, N) relation matrices.
+        """
+        applies = self.applies(boxes)
+        touching, near = self.touching(boxes) & applies, self.near(boxes) & applies
+        ttc = None
+        predicted = np.zeros_like(touching)
+        if trajectories is not None and ttc_threshold is not None:
+            ttc = self.trajectory_ttc(boxes, trajectories, offsets)
+            predicted = (ttc <= ttc_threshold) & applies
+        alerting = touching | near | predicted
+        ranked = np.where(alerting, self.severities[:, None], -1)  # (Z, N)
+        zone = np.where(alerting.any(axis=0), ranked.argmax(axis=0), -1)
+        severity = ranked.max(axis=0, initial=-1)
+        condition = []
+        for n, z in enumerate(zone):
+            if z < 0:
+                condition.append(None)
+            else:
+                condition.append("center" if touching[z, n] else "Nearness" if near[z, n] else "TTC")
+        return ZoneAssessment(zone, severity, condition, touching, near, ttc)
+
+    def draw(self, frame, color=(0, 0, 255)):
+        """Draws the outline and name of every zone on the frame and returns it."""
+        for zone in self.zones:
+            points = np.asarray(zone.polygon, np.int32)
+            cv2.polylines(frame, [points], True, color, 2)
+            x, y = points.min(axis=0)
+            cv2.putText(frame, zone.name, (int(x), max(int(y) - 10, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1,
+                        cv2.LINE_AA)
+        return frame
@@ -0,0 +1,123 @@
+# identityTracking.py
+"""
+Per-object identities for the Kalman and dead-reckoning predictors.
+
+The predictors used to key their state on the class ID, so two people in the frame shared one filter and the
+filter was thrashed (and in the thesis tracker re-initialised) whenever the class-level centroid jumped between
+them. IdentityTracker runs the ultralytics BYTETracker / BOTSORT association on the detection lists the trackers
+already produce and returns one track ID per detection, so each physical object keeps its own filter across frames.
+
+It works on plain detection lists instead of going through model.track(), so it can run anywhere the detections
+are available: in the single-camera loop, in the tracking stage of the pipeline and inside the per-camera worker
+processes of the multi-camera runner (model.track() over a batch of camera images would share one tracker).
+"""
+
+import numpy as np
+
+from ultralytics.engine.results import Boxes
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+from detectionBatch import DetectionBatch, class_ids
+
+UNTRACKED = -1  # Track ID of detections the tracker did not confirm (yet)
+
+
+def state_keys(detections, track_ids=None):
+    """
+    Returns the key under which the predictor state of every detection is stored.
+
+    Tracked detections use their track ID, the others fall back to the class-level key ('class', class ID) used
+    before identity tracking, so untracked objects are still predicted.
+
+    Args:
+        detections (DetectionBatch | list): Detections [x1, y1, x2, y2, conf, class ID, class name].
+        track_ids (array-like | None): Track ID per detection, UNTRACKED for none. None keys everything by class.
+
+    Returns:
+        list: One hashable key per detection.
+    """
+    classes = class_ids(detections).tolist()
+    if track_ids is None:
+        return [("class", cls) for cls in classes]
+    return [int(tid) if tid != UNTRACKED else ("class", cls) for cls, tid in zip(classes, track_ids)]
+
+
+def key_track_id(key):
+    """Returns the track ID of a state key for the logs, UNTRACKED for the class-level keys."""
+    return key if isinstance(key, int) else UNTRACKED
+
+
+def stale_keys(keys, live_ids):
+    """
+    Returns the track-ID keys whose track was removed by the tracker, class-level keys are never stale.
+
+    Args:
+        keys (iterable): Keys of the predictor state, see state_keys().
+        live_ids (set): Result of IdentityTracker.live_ids().
+
+    Returns:
+        list: Keys whose state can be dropped.
+    """
+    return [key for key in keys if not isinstance(key, tuple) and key not in live_ids]
+
+
+class IdentityTracker:
+    """
+    Assigns persistent track IDs to per-frame detection lists with BYTETracker or BOTSORT.
+
+    Attributes:
+        tracker: The underlying ultralytics BYTETracker / BOTSORT instance.
+
+    Methods:
+        update(detections, frame=None): Returns the track ID of every detection of the frame.
+        live_ids(): IDs of the tracks that are tracked or temporarily lost, i.e. whose state is worth keeping.
+        reset(): Forgets all tracks, e.g. when the video source changes.
+    """
+
+    def __init__(self, tracker="bytetrack.yaml", frame_rate=30):
+        """
+        Args:
+            tracker (str): Tracker config, 'bytetrack.yaml', 'botsort.yaml' or the path of a custom YAML file.
+            frame_rate (int | float): Frame rate of the source, scales how long lost tracks are kept.
+        """
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker)))
+        if cfg.tracker_type not in TRACKER_MAP:
+            raise ValueError(f"Unsupported tracker type '{cfg.tracker_type}', expected one of {tuple(TRACKER_MAP)}")
+        self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=int(frame_rate or 30))
+
+    def update(self, detections, frame=None):
+        """
+        Associates the detections of one frame with the existing tracks.
+
+        Args:
+            detections (DetectionBatch | list): Detections [x1, y1, x2, y2, conf, class ID, class name] of the frame.
+            frame (np.array | None): The frame, only used by BOTSORT's camera motion compensation (skipped if None).
+
+        Returns:
+            np.ndarray: (N,) int array with the track ID of every detection, UNTRACKED for low-confidence
+                detections that did not match or start a track.
+        """
+        track_ids = np.full(len(detections), UNTRACKED, dtype=int)
+        if isinstance(detections, DetectionBatch):
+            data = detections.data[:, [0, 1, 2, 3, -2, -1]]  # Drop the track ID column of model.track() batches
+        else:
+            data = np.array([det[:6] for det in detections], dtype=np.float32).reshape(-1, 6)
+        shape = frame.shape[:2] if frame is not None else (0, 0)
+        tracks = self.tracker.update(Boxes(data, shape), frame)
+        if len(tracks):
+            # Rows are [x1, y1, x2, y2, track_id, score, cls, detection index]
+            track_ids[tracks[:, -1].astype(int)] = tracks[:, 4].astype(int)
+        return track_ids
+
+    def live_ids(self):
+        """
+        Returns:
+            set: IDs of the tracked and lost tracks. State of any other ID can be dropped.
+        """
+        return {t.track_id for t in self.tracker.tracked_stracks + self.tracker.lost_stracks}
+
+    def reset(self):
+        """Removes all tracks and restarts the ID counter."""
+        self.tracker.reset()
@@ -2,6 +2,9 @@ import cv2
 import numpy as np
 import logging
 
+from motionModels import build_motion_model
+from trajectoryPrediction import horizon_offsets
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -32,12 +35,211 @@ class KalmanFilterWrapper:
         corrected = self.kf.correct(np.array(measurement, dtype=np.float32))
         return corrected
 
-    def predict(self):
-        """Predict the next state of the object using the Kalman filter."""
+    def predict(self, dt=None):
+        """Predict the next state of the object using the Kalman filter, dt seconds ahead if given (else one frame)."""
         if not self.initialized:
             logging.error("Kalman filter must be initialized before prediction.")
             return None
+        self.kf.transitionMatrix[0, 2] = self.kf.transitionMatrix[1, 3] = 1 if dt is None else dt
         prediction = self.kf.predict()
-        self.future_x, self.future_y = int(prediction[0]), int(prediction[1])
-        logging.info(f"Predicted future position: ({self.future_x}, {self.future_y})")
+        self.future_x, self.future_y = int(prediction[0, 0]), int(prediction[1, 0])
+        logging.debug(f"Predicted future position: ({self.future_x}, {self.future_y})")
         return self.future_x, self.future_y
+
+
+class KalmanFilterBank:
+    """
+    Kalman filters for many objects at once.
+
+    Instead of one cv2.KalmanFilter per object, the states and covariances of all tracked objects live in contiguous
+    (N, d) and (N, d, d) arrays and predict/correct run as single vectorized NumPy calls over all rows. The motion
+    model is pluggable (see motionModels): the default constant-velocity model matches cv2.KalmanFilter as used by
+    KalmanFilterWrapper (Q = I, R = I, P0 = 0, dt = 1), 'ca' estimates the acceleration as well and 'imm' mixes both.
+
+    Rows are addressed by a hashable key (class ID or track ID). Removing a key moves the last row into its slot,
+    so the active rows always stay contiguous.
+
+    Without timestamps every predict() advances by one frame (dt = 1, velocities in pixels per frame). When
+    predict_correct() gets the frame timestamp, each row is advanced by the real time since its last update
+    (velocities in pixels per second, white-noise acceleration Q) and trajectory() extrapolates over a horizon in milliseconds.
+    """
+
+    def __init__(self, capacity=64, process_noise=1.0, measurement_noise=1.0, acceleration_noise=500.0, model="cv",
+                 **model_kwargs):
+        """
+        Args:
+            capacity (int): Initial number of preallocated rows, the arrays grow by doubling.
+            process_noise (float): Scale of the process noise covariance Q per frame (cv2 default 1).
+            measurement_noise (float): Scale of the measurement noise covariance R (cv2 default 1).
+            acceleration_noise (float): Standard deviation of the unmodelled acceleration in pixels/s^2, gives Q
+                when the filters are advanced by real time steps.
+            model (str | object): Motion model, a name of motionModels.MOTION_MODELS ('cv', 'ca' or 'imm') built
+                with the noise settings above, or a model instance.
+            **model_kwargs: Further settings of motionModels.build_motion_model for a named model, e.g. jerk_noise
+                of 'ca' and 'imm' or switch_prob of 'imm'.
+        """
+        if isinstance(model, str):
+            model = build_motion_model(model, process_noise=process_noise, acceleration_noise=acceleration_noise,
+                                       **model_kwargs)
+        elif model_kwargs:
+            raise ValueError(f"{', '.join(model_kwargs)} only apply to a motion model given by name")
+        self.model = model
+        self.R = np.eye(2, dtype=np.float32) * measurement_noise
+        self.state = self.model.allocate(capacity)  # Name -> per-row array, 'x' and 'P' are the estimates
+        self.t = np.full(capacity, np.nan)  # Time of the last update per row, NaN if unknown
+        self.keys = []  # Row -> key
+        self.index = {}  # Key -> row
+
+    @property
+    def x(self):
+        """(capacity, d) states, [x, y, vx, vy, ...] per row."""
+        return self.state["x"]
+
+    @property
+    def P(self):
+        """(capacity, d, d) state covariances."""
+        return self.state["P"]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def add(self, key, x, y, dx=0, dy=0, timestamp=None):
+        """Adds a filter for `key` (or resets it if it exists) with the given position, velocity and time."""
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.t):  # Grow the preallocated arrays
+                self.state = {name: np.concatenate((a, np.zeros_like(a))) for name, a in self.state.items()}
+                self.t = np.concatenate((self.t, np.full_like(self.t, np.nan)))
+            self.keys.append(key)
+            self.index[key] = row
+        self.model.initialize(self.state, row, x, y, dx, dy)
+        self.t[row] = np.nan if timestamp is None else timestamp
+        return row
+
+    def remove(self, key):
+        """Removes the filter of `key`, moving the last row into the freed slot."""
+        row = self.index.pop(key)
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            for a in self.state.values():
+                a[row] = a[last]
+            self.t[row] = self.t[last]
+            self.keys[row] = moved
+            self.index[moved] = row
+        self.keys.pop()
+
+    def rows(self, keys=None):
+        """Returns the row indices of the given keys, or of every active row when keys is None."""
+        if keys is None:
+            return np.arange(len(self.keys))
+        return np.fromiter((self.index[k] for k in keys), dtype=np.intp, count=len(keys))
+
+    def _rows_state(self, r):
+        return {name: a[r] for name, a in self.state.items()}
+
+    def _store(self, r, state):
+        for name, a in state.items():
+            self.state[name][r] = a
+
+    def predict(self, keys=None, dt=None):
+        """
+        Advances the given filters (all when keys is None) by one time step.
+
+        Args:
+            keys (list | None): Keys of the filters to advance.
+            dt (float | np.ndarray | None): Time step in seconds, scalar or one per filter. None advances by one frame.
+
+        Returns:
+            np.ndarray: (M, 2) predicted positions.
+        """
+        r = self.rows(keys)
+        if dt is not None:
+            dt = np.broadcast_to(np.asarray(dt, np.float32), r.shape)
+        self._store(r, self.model.predict(self._rows_state(r), dt))
+        return self.x[r, :2].copy()
+
+    def correct(self, keys, measurements):
+        """
+        Updates the given filters with measured (x, y) positions.
+
+        Args:
+            keys (list): Keys of the filters to correct, unique within the call.
+            measurements (np.ndarray): (M, 2) measured positions.
+
+        Returns:
+            np.ndarray: (M, d) corrected states.
+        """
+        r = self.rows(keys)
+        self._store(r, self.model.correct(self._rows_state(r), measurements, self.R))
+        return self.x[r].copy()
+
+    def predict_correct(self, keys, measurements, timestamp=None):
+        """
+        Predicts and then corrects the filters of a frame's detections, like calling predict() and correct() on one
+        KalmanFilterWrapper per detection. Keys that occur several times are processed in consecutive rounds.
+
+        Args:
+            keys (list): Filter key per detection, all keys must have been added.
+            measurements (np.ndarray): (M, 2) measured positions per detection.
+            timestamp (float | None): Capture time of the frame in seconds. Each filter is then advanced by the time
+                since its own last update instead of one frame.
+
+        Returns:
+            np.ndarray: (M, 2) positions predicted before each correction.
+        """
+        measurements = np.asarray(measurements, np.float32).reshape(-1, 2)
+        predictions = np.empty_like(measurements)
+        pending = list(range(len(keys)))
+        while pending:
+            seen, batch, rest = set(), [], []
+            for i in pending:
+                (rest if keys[i] in seen else batch).append(i)
+                seen.add(keys[i])
+            batch_keys = [keys[i] for i in batch]
+            if timestamp is None:
+                predictions[batch] = self.predict(batch_keys)
+            else:
+                r = self.rows(batch_keys)
+                dt = np.nan_to_num(timestamp - self.t[r])  # 0 for filters without a previous update
+                self.t[r] = timestamp
+                predictions[batch] = self.predict(batch_keys, dt)
+            self.correct(batch_keys, measurements[batch])
+            pending = rest
+        return predictions
+
+    def positions(self, keys=None):
+        """Returns the (M, 2) estimated positions of the given filters (all when keys is None)."""
+        return self.x[self.rows(keys), :2].copy()
+
+    def positions_at(self, keys, timestamp):
+        """
+        Extrapolates the positions of the given filters to a time without changing their states
+        (the filters must be fed with timestamps).
+        """
+        r = self.rows(keys)
+        dt = np.nan_to_num(timestamp - self.t[r])[:, None]
+        return self.model.extrapolate(self._rows_state(r), dt)[:, 0]
+
+    def velocities(self, keys=None):
+        """Returns the (M, 2) estimated velocities of the given filters (all when keys is None)."""
+        return self.x[self.rows(keys), 2:4].copy()
+
+    def trajectory(self, keys=None, horizon_ms=500, steps=1):
+        """
+        Extrapolates the current states over a time horizon without changing them.
+
+        Args:
+            keys (list | None): Keys of the filters, all when None.
+            horizon_ms (float): Prediction horizon in milliseconds (the filters must be fed with timestamps).
+            steps (int): Number of trajectory points per filter.
+
+        Returns:
+            np.ndarray: (M, steps, 2) predicted positions, [:, -1] is the position at the horizon.
+        """
+        r = self.rows(keys)
+        return self.model.extrapolate(self._rows_state(r), horizon_offsets(horizon_ms, steps))
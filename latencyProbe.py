@@ -0,0 +1,224 @@
+# latencyProbe.py
+"""
+End-to-end latency instrumentation from frame capture to alert playback.
+
+The "Response Time" of the alert logs only relates two timestamps of the same frame, and the thesis alert log times
+the queue put of the dispatcher, so neither says how long a hazard in front of the camera takes to become a sound.
+LatencyProbe stamps every frame at fixed points of the tracker loop:
+
+    capture      the frame was returned by the camera (cap.read())
+    detect_in    the frame is handed to the detector
+    detect_out   the detections are back
+    predict      the predictors (Kalman filters / dead reckoning) are updated
+    decision     the first alert of the frame is dispatched, or the hazard check is done when there is none
+    ack          an alert raised on the frame starts playing on the dispatcher's sinks
+
+The stamps go into a preallocated ring buffer of the last `capacity` frames (one row per frame, one float per stage),
+so a mark is a single array store and the probe can stay enabled in production. summary() reports p50 / p95 / p99 of
+every stage (time since the previous stamped stage) and of the end-to-end spans capture -> decision and
+capture -> ack, dump() writes them together with log-spaced histograms to JSON.
+
+run() stamps every stage in the tracker loop. Under run_pipelined the stages run in different threads, so
+trackingPipeline.TrackerPipeline stamps capture and detection per frame and hands the frame ID over to the tracking
+stage. Its StageStats keep rolling per-stage durations for the log, the probe keeps the per-frame stamps and
+the end-to-end spans. Trackers without a probe use NullProbe, whose methods do nothing.
+
+capture -> ack is the photon-to-alert latency minus what happens before cap.read() returns (exposure, readout, USB /
+network transport and driver buffering). That part cannot be seen from software; measure it once for a camera, e.g.
+by filming an LED that is switched by the same machine, and pass it as capture_offset_s to have it added to the
+end-to-end figures.
+"""
+
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+STAGES = ("capture", "detect_in", "detect_out", "predict", "decision", "ack")
+
+
+class LatencyProbe:
+    """
+    Ring buffer of per-frame stage timestamps.
+
+    Attributes:
+        stages (tuple): Stage names in pipeline order, the columns of the buffer.
+        capacity (int): Number of most recent frames kept.
+        capture_offset_s (float): Latency before the capture stamp (camera exposure to cap.read()), added to the
+            end-to-end spans.
+        current (int | None): ID of the frame begun last, the default frame of mark().
+        frames (int): Number of frames begun.
+
+    Methods:
+        begin(timestamp=None): Starts a frame with its capture stamp and returns its ID.
+        mark(stage, frame_id=None, timestamp=None): Stamps a stage of a frame.
+        attach(dispatcher): Stamps 'ack' when the dispatcher plays an alert raised on a frame.
+        summary(): Percentiles per stage and end to end, in milliseconds.
+        histograms(bins=40): Log-spaced latency histograms per stage and end to end.
+        dump(path): Writes summary and histograms to a JSON file.
+    """
+
+    def __init__(self, capacity=4096, stages=STAGES, capture_offset_s=0.0, clock=time.perf_counter):
+        """
+        Args:
+            capacity (int): Number of frames kept, older frames are overwritten.
+            stages (tuple): Stage names in pipeline order, the first one is stamped by begin().
+            capture_offset_s (float): Measured latency from the photons to cap.read() returning, in seconds.
+            clock (function): Monotonic clock of the stamps in seconds.
+        """
+        self.stages = tuple(stages)
+        self.capacity = int(capacity)
+        self.capture_offset_s = capture_offset_s
+        self.clock = clock
+        self._index = {stage: i for i, stage in enumerate(self.stages)}
+        self._stamps = np.full((self.capacity, len(self.stages)), np.nan)
+        self._lock = threading.Lock()  # Only taken by begin(), marks are single array stores
+        self.current = None
+        self.frames = 0
+
+    def begin(self, timestamp=None, current=True):
+        """
+        Starts a new frame, stamps its first stage and makes it the current frame.
+
+        Args:
+            timestamp (float | None): Capture time on the probe clock, defaults to now.
+            current (bool): Make the frame the default of mark(). trackingPipeline captures ahead of the tracking
+                stage, so it passes False and sets `current` when the tracking stage takes the frame.
+
+        Returns:
+            int: The frame ID.
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            frame_id = self.frames
+            self.frames += 1
+            row = self._stamps[frame_id % self.capacity]
+            row[:] = np.nan
+            row[0] = timestamp
+            if current:
+                self.current = frame_id
+        return frame_id
+
+    def mark(self, stage, frame_id=None, timestamp=None):
+        """
+        Stamps a stage of a frame, a stage already stamped keeps its first stamp (e.g. the first alert of a frame).
+
+        Args:
+            stage (str): One of the stages.
+            frame_id (int | None): Frame to stamp, defaults to the current frame.
+            timestamp (float | None): Time on the probe clock, defaults to now.
+        """
+        frame_id = self.current if frame_id is None else frame_id
+        if frame_id is None or self.frames - frame_id > self.capacity:
+            return  # No frame begun yet, or the frame's row was already reused
+        row = self._stamps[frame_id % self.capacity]
+        column = self._index[stage]
+        if np.isnan(row[column]):
+            row[column] = self.clock() if timestamp is None else timestamp
+
+    def attach(self, dispatcher):
+        """
+        Instruments an alertDispatcher.AlertDispatcher: the first alert dispatched on a frame stamps its 'decision'
+        (the alert may be played before the tracker is done with the frame), every alert carries the current frame ID
+        and stamps 'ack' of that frame when the dispatcher's worker hands it to the sinks.
+        """
+        dispatcher.context = self._context
+        dispatcher.on_play = self._on_play
+        return dispatcher
+
+    def _context(self):
+        self.mark("decision")
+        return {"frame_id": self.current}
+
+    def _on_play(self, alert):
+        frame_id = alert.info.get("frame_id")
+        if frame_id is not None:
+            self.mark("ack", frame_id)
+
+    def _spans(self):
+        """Returns {name: latencies in seconds} of the stages and the end-to-end spans over the buffered frames."""
+        with self._lock:
+            stamps = self._stamps[:min(self.frames, self.capacity)].copy()
+        spans = {}
+        for i, stage in enumerate(self.stages[1:], 1):
+            previous = stamps[:, :i]
+            # Time since the last stamped earlier stage, so a skipped stage does not drop the next one
+            last = np.full(len(stamps), np.nan)
+            for j in range(i):
+                last = np.where(np.isnan(previous[:, j]), last, previous[:, j])
+            spans[stage] = stamps[:, i] - last
+        first = stamps[:, 0]
+        for stage in ("decision", "ack"):
+            if stage in self._index:
+                spans[f"{self.stages[0]}_to_{stage}"] = stamps[:, self._index[stage]] - first + self.capture_offset_s
+        return {name: values[~np.isnan(values)] for name, values in spans.items()}
+
+    def summary(self):
+        """
+        Returns:
+            dict: Per stage and end-to-end span: count, mean_ms, p50_ms, p95_ms, p99_ms and max_ms over the
+                buffered frames. Stages without samples only have a count.
+        """
+        result = {}
+        for name, values in self._spans().items():
+            if not len(values):
+                result[name] = {"count": 0}
+                continue
+            ms = values * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            result[name] = {"count": int(len(ms)), "mean_ms": round(float(ms.mean()), 3),
+                            "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+                            "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3)}
+        return result
+
+    def histograms(self, bins=40, min_ms=0.01, max_ms=10000.0):
+        """
+        Log-spaced latency histograms.
+
+        Args:
+            bins (int): Number of bins between min_ms and max_ms, values outside are clipped into the edge bins.
+            min_ms (float): Lower edge of the first bin in milliseconds.
+            max_ms (float): Upper edge of the last bin in milliseconds.
+
+        Returns:
+            dict: {'edges_ms': bin edges, name: counts per stage and end-to-end span}.
+        """
+        edges = np.geomspace(min_ms, max_ms, bins + 1)
+        result = {"edges_ms": np.round(edges, 4).tolist()}
+        for name, values in self._spans().items():
+            result[name] = np.histogram(np.clip(values * 1000, min_ms, max_ms), edges)[0].tolist()
+        return result
+
+    def dump(self, path):
+        """Writes summary() and histograms() to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"frames": self.frames, "capture_offset_s": self.capture_offset_s, "summary": self.summary(),
+                       "histograms": self.histograms()}, f, indent=2)
+
+    def log_summary(self):
+        """Logs the p50 / p95 / p99 of the end-to-end spans."""
+        for name, s in self.summary().items():
+            if "_to_" in name and s["count"]:
+                logging.info(f"Latency {name}: p50 {s['p50_ms']:.1f} ms, p95 {s['p95_ms']:.1f} ms, "
+                             f"p99 {s['p99_ms']:.1f} ms over {s['count']} frames")
+
+
+class NullProbe:
+    """Probe that records nothing, used by the trackers when no LatencyProbe is passed."""
+
+    current = None
+
+    def begin(self, timestamp=None, current=True):
+        """Ignores the frame."""
+
+    def mark(self, stage, frame_id=None, timestamp=None):
+        """Ignores the stamp."""
+
+    def attach(self, dispatcher):
+        """Leaves the dispatcher as it is."""
+        return dispatcher
+
+    def log_summary(self):
+        """Logs nothing."""
@@ -0,0 +1,378 @@
+# motionModels.py
+"""
+Pluggable motion models of KalmanFilterBank, batched over all tracked objects.
+
+KalmanFilterBank used to hard-code a constant-velocity model, which lags behind every thrown or falling object
+(Thesis/ballparabolic.py, appleParabolic.mp4) and overshoots after every bounce. examples/KalmanFilter.py carries a
+known acceleration as a control input u (B u with std_acc as process noise), but the acceleration of a thrown object
+is not known in advance, so here it is part of the estimated state instead. The models are:
+
+    ConstantVelocity      state [x, y, vx, vy], white-noise acceleration, the original maths of KalmanFilterBank
+    ConstantAcceleration  state [x, y, vx, vy, ax, ay], white-noise jerk, predicts the curve of a parabola
+    InteractingMultipleModel
+                          runs several models per object and mixes them with a Markov chain of mode probabilities,
+                          so an object follows the acceleration model while it flies and the velocity model while it
+                          rolls, and switches after a bounce
+
+A model owns the per-row arrays of its state (allocate()) and updates any subset of rows in one vectorized call:
+(M, d) states, (M, d, d) covariances and, for the IMM, (M, r, d) mode states and (M, r) mode probabilities. The IMM
+loops over its r models (2 by default), never over the objects, so the cost per object stays that of a few small
+matrix products regardless of how far ahead the trajectories are extrapolated.
+
+Every state starts with [x, y, vx, vy], so positions and velocities of all models are state[:, :2] and
+state[:, 2:4].
+"""
+
+import numpy as np
+
+H_DIM = 2  # The measurements are (x, y) positions, the first two state components
+
+
+class ConstantVelocity:
+    """
+    Constant-velocity model, [x, y, vx, vy] driven by white-noise acceleration.
+
+    Attributes:
+        dim (int): State dimension.
+        process_noise (float): Scale of the process noise covariance per frame.
+        acceleration_noise (float): Standard deviation of the unmodelled acceleration in pixels/s^2.
+
+    Methods:
+        allocate(capacity): Zeroed per-row state arrays.
+        initialize(state, row, x, y, dx=0, dy=0): Resets one row.
+        predict(state, dt=None): Advances rows by one frame or by dt seconds.
+        correct(state, measurements, R): Updates rows with measured positions.
+        extrapolate(state, offsets): Positions at future times without changing the state.
+    """
+
+    dim = 4
+
+    def __init__(self, process_noise=1.0, acceleration_noise=500.0, initial_std=None):
+        """
+        Args:
+            process_noise (float): Scale of the process noise covariance Q per frame (cv2 default 1).
+            acceleration_noise (float): Standard deviation of the unmodelled acceleration in pixels/s^2, gives Q
+                when the filters are advanced by real time steps.
+            initial_std (tuple | None): Standard deviations of the initial (position, velocity) of a new row,
+                None starts with zero covariance like cv2.KalmanFilter.
+        """
+        self.process_noise = process_noise
+        self.acceleration_noise = acceleration_noise
+        self.P0 = self.initial_covariance(initial_std)
+        self.F = self.transition(np.ones(1, np.float32))[0]
+        self.Q = np.eye(self.dim, dtype=np.float32) * process_noise
+
+    def allocate(self, capacity):
+        """Returns {name: zeroed (capacity, ...) array} of the per-row state, 'x' and 'P' are the estimate."""
+        return {"x": np.zeros((capacity, self.dim), np.float32),
+                "P": np.zeros((capacity, self.dim, self.dim), np.float32)}
+
+    def initial_covariance(self, initial_std):
+        """(d, d) diagonal covariance of a new row, with one standard deviation per derivative (both axes)."""
+        if initial_std is None:
+            return np.zeros((self.dim, self.dim), np.float32)
+        return np.diag(np.repeat(np.asarray(initial_std, np.float32), 2) ** 2)
+
+    def initialize(self, state, row, x, y, dx=0, dy=0):
+        """Sets a row to the given position and velocity with the initial covariance."""
+        state["x"][row] = 0
+        state["x"][row, :4] = (x, y, dx, dy)
+        state["P"][row] = self.P0
+
+    def transition(self, dt):
+        """
+        Args:
+            dt (np.ndarray): (M,) time steps.
+
+        Returns:
+            np.ndarray: (M, d, d) state transition matrices.
+        """
+        F = np.broadcast_to(np.eye(self.dim, dtype=np.float32), (len(dt), self.dim, self.dim)).copy()
+        F[:, 0, 2] = F[:, 1, 3] = dt
+        return F
+
+    def noise(self, dt):
+        """
+        Returns the process noise of white-noise acceleration, G q G^T with G = [dt^2 / 2, dt] per axis.
+
+        Args:
+            dt (np.ndarray): (M,) time steps in seconds.
+
+        Returns:
+            np.ndarray: (M, 4, 4) process noise covariances.
+        """
+        q = np.float32(self.acceleration_noise) ** 2
+        Q = np.zeros((len(dt), self.dim, self.dim), np.float32)
+        for pos, vel in ((0, 2), (1, 3)):
+            Q[:, pos, pos] = dt ** 4 / 4 * q
+            Q[:, pos, vel] = Q[:, vel, pos] = dt ** 3 / 2 * q
+            Q[:, vel, vel] = dt ** 2 * q
+        return Q
+
+    def predict(self, state, dt=None):
+        """
+        Advances rows of the state.
+
+        Args:
+            state (dict): 'x' (M, d) and 'P' (M, d, d) of the rows to advance.
+            dt (np.ndarray | None): (M,) time steps in seconds, None advances by one frame with the per-frame Q.
+
+        Returns:
+            dict: The advanced 'x' and 'P'.
+        """
+        if dt is None:
+            F, Q = self.F, self.Q
+        else:
+            F, Q = self.transition(dt), self.noise(dt)
+        return {"x": (F @ state["x"][:, :, None])[:, :, 0], "P": F @ state["P"] @ np.swapaxes(F, -1, -2) + Q}
+
+    def correct(self, state, measurements, R):
+        """
+        Args:
+            state (dict): 'x' (M, d) and 'P' (M, d, d) of the rows to correct.
+            measurements (np.ndarray): (M, 2) measured positions.
+            R (np.ndarray): (2, 2) measurement noise covariance.
+
+        Returns:
+            dict: The corrected 'x' and 'P'.
+        """
+        x, P, _, _ = kalman_update(state["x"], state["P"], measurements, R)
+        return {"x": x, "P": P}
+
+    def extrapolate(self, state, offsets):
+        """
+        Args:
+            state (dict): 'x' (M, d) of the rows.
+            offsets (np.ndarray): (S,) times ahead shared by all rows or (M, S) per row, in seconds (in frames for
+                filters fed without timestamps).
+
+        Returns:
+            np.ndarray: (M, S, 2) positions at the given times.
+        """
+        x = state["x"]
+        return x[:, None, :2] + x[:, None, 2:4] * _time_axis(offsets)
+
+
+class ConstantAcceleration(ConstantVelocity):
+    """
+    Constant-acceleration model, [x, y, vx, vy, ax, ay] driven by white-noise jerk.
+
+    Attributes:
+        dim (int): State dimension.
+        process_noise (float): Scale of the process noise covariance per frame.
+        jerk_noise (float): Standard deviation of the unmodelled jerk (change of acceleration) in pixels/s^3.
+    """
+
+    dim = 6
+
+    def __init__(self, process_noise=1.0, jerk_noise=2000.0, initial_std=(1.0, 500.0, 1000.0)):
+        """
+        Args:
+            process_noise (float): Scale of the process noise covariance Q per frame.
+            jerk_noise (float): Standard deviation of the unmodelled jerk in pixels/s^3, gives Q when the filters
+                are advanced by real time steps. Larger values follow changing accelerations (bounces) faster,
+                smaller values smooth the estimated acceleration of a free fall.
+            initial_std (tuple | None): Standard deviations of the initial (position, velocity, acceleration) in
+                pixels, pixels/s and pixels/s^2. Unlike velocity, the acceleration of a new object is never
+                given, with zero initial covariance its estimate would only grow by the jerk noise.
+        """
+        self.jerk_noise = jerk_noise
+        super().__init__(process_noise, initial_std=initial_std)
+
+    def transition(self, dt):
+        F = super().transition(dt)
+        F[:, 2, 4] = F[:, 3, 5] = dt
+        F[:, 0, 4] = F[:, 1, 5] = dt ** 2 / 2
+        return F
+
+    def noise(self, dt):
+        """Returns the (M, 6, 6) process noise of white-noise jerk, G q G^T with G = [dt^3 / 6, dt^2 / 2, dt] per axis."""
+        q = np.float32(self.jerk_noise) ** 2
+        G = np.stack((dt ** 3 / 6, dt ** 2 / 2, dt), axis=1).astype(np.float32)  # (M, 3) pos, vel, acc of one axis
+        block = G[:, :, None] * G[:, None, :] * q
+        Q = np.zeros((len(dt), self.dim, self.dim), np.float32)
+        for axis in (0, 1):
+            index = np.array([axis, axis + 2, axis + 4])
+            Q[:, index[:, None], index[None, :]] = block
+        return Q
+
+    def extrapolate(self, state, offsets):
+        x = state["x"]
+        t = _time_axis(offsets)
+        return x[:, None, :2] + x[:, None, 2:4] * t + x[:, None, 4:6] * (t * t / 2)
+
+
+class InteractingMultipleModel:
+    """
+    Interacting multiple model (IMM) filter over several motion models.
+
+    All models share the state layout of the largest one, the components a smaller model does not have (e.g. the
+    acceleration of ConstantVelocity) are held at zero by it. Each row keeps one state per model ('mode_x',
+    'mode_P') and the probability of every model ('mu'), 'x' and 'P' are the probability-weighted combination.
+
+    Attributes:
+        models (list): The motion models.
+        dim (int): Common state dimension.
+        transition_matrix (np.ndarray): (r, r) Markov matrix, [i, j] the probability to switch from model i to j
+            between two updates.
+        initial (np.ndarray): (r,) model probabilities of a new row.
+    """
+
+    def __init__(self, models=None, switch_prob=0.05, transition_matrix=None, initial=None):
+        """
+        Args:
+            models (list | None): Motion models, defaults to [ConstantVelocity(), ConstantAcceleration()].
+            switch_prob (float): Probability to leave a model between two updates, spread evenly over the others.
+            transition_matrix (array-like | None): (r, r) Markov matrix replacing switch_prob, rows sum to 1.
+            initial (array-like | None): (r,) probabilities of a new row, uniform by default.
+        """
+        self.models = list(models) if models is not None else [ConstantVelocity(), ConstantAcceleration()]
+        r = len(self.models)
+        self.dim = max(model.dim for model in self.models)
+        if transition_matrix is None:
+            transition_matrix = np.full((r, r), switch_prob / max(r - 1, 1))
+            np.fill_diagonal(transition_matrix, 1 - switch_prob if r > 1 else 1.0)
+        self.transition_matrix = np.asarray(transition_matrix, np.float64)
+        self.initial = np.full(r, 1 / r) if initial is None else np.asarray(initial, np.float64) / np.sum(initial)
+
+    def allocate(self, capacity):
+        r, d = len(self.models), self.dim
+        return {"x": np.zeros((capacity, d), np.float32), "P": np.zeros((capacity, d, d), np.float32),
+                "mode_x": np.zeros((capacity, r, d), np.float32),
+                "mode_P": np.zeros((capacity, r, d, d), np.float32),
+                "mu": np.zeros((capacity, len(self.models)), np.float64)}
+
+    def initialize(self, state, row, x, y, dx=0, dy=0):
+        """Sets every model of a row to the given position and velocity with its initial covariance."""
+        state["x"][row] = 0
+        state["x"][row, :4] = (x, y, dx, dy)
+        state["mode_x"][row] = state["x"][row]
+        state["mode_P"][row] = 0
+        for j, model in enumerate(self.models):
+            state["mode_P"][row, j, :model.dim, :model.dim] = model.P0
+        state["mu"][row] = self.initial
+        state["P"][row] = np.einsum("j,jde->de", self.initial.astype(np.float32), state["mode_P"][row])
+
+    def predict(self, state, dt=None):
+        """
+        Mixes the model states by the Markov transition probabilities and advances every model.
+
+        Args:
+            state (dict): The row arrays of allocate(), (M, ...) each.
+            dt (np.ndarray | None): (M,) time steps in seconds, None advances by one frame.
+
+        Returns:
+            dict: The advanced arrays, 'mu' holds the predicted model probabilities.
+        """
+        mu, mode_x, mode_P = state["mu"], state["mode_x"], state["mode_P"]
+        predicted_mu = mu @ self.transition_matrix  # (M, r), c_j = sum_i T_ij mu_i
+        weights = mu[:, :, None] * self.transition_matrix[None] / np.maximum(predicted_mu[:, None, :], 1e-300)
+        weights = weights.astype(np.float32)  # (M, r_from, r_to)
+        mixed_x = np.einsum("mij,mid->mjd", weights, mode_x)
+        spread = mode_x[:, :, None, :] - mixed_x[:, None, :, :]  # (M, r_from, r_to, d)
+        mixed_P = np.einsum("mij,mijde->mjde", weights,
+                            mode_P[:, :, None] + spread[..., :, None] * spread[..., None, :])
+        new_x, new_P = np.zeros_like(mode_x), np.zeros_like(mode_P)
+        for j, model in enumerate(self.models):
+            d = model.dim
+            advanced = model.predict({"x": mixed_x[:, j, :d], "P": mixed_P[:, j, :d, :d]}, dt)
+            new_x[:, j, :d], new_P[:, j, :d, :d] = advanced["x"], advanced["P"]
+        return self._combine(new_x, new_P, predicted_mu)
+
+    def correct(self, state, measurements, R):
+        """
+        Corrects every model and reweights the models by the likelihood of the measurements.
+
+        Args:
+            state (dict): The row arrays of allocate(), (M, ...) each.
+            measurements (np.ndarray): (M, 2) measured positions.
+            R (np.ndarray): (2, 2) measurement noise covariance.
+
+        Returns:
+            dict: The corrected arrays.
+        """
+        mode_x, mode_P = state["mode_x"], state["mode_P"]
+        new_x, new_P = np.empty_like(mode_x), np.empty_like(mode_P)
+        log_likelihood = np.empty(state["mu"].shape)
+        for j in range(len(self.models)):
+            new_x[:, j], new_P[:, j], innovation, S = kalman_update(mode_x[:, j], mode_P[:, j], measurements, R)
+            S = S.astype(np.float64)
+            innovation = innovation.astype(np.float64)
+            mahalanobis = (innovation[:, None, :] @ np.linalg.solve(S, innovation[:, :, None]))[:, 0, 0]
+            log_likelihood[:, j] = -0.5 * (mahalanobis + np.log(np.linalg.det(S)) + H_DIM * np.log(2 * np.pi))
+        # Normalised in the log domain, a far-off measurement would underflow every likelihood to 0
+        log_mu = np.log(np.maximum(state["mu"], 1e-300)) + log_likelihood
+        mu = np.exp(log_mu - log_mu.max(axis=1, keepdims=True))
+        return self._combine(new_x, new_P, mu / mu.sum(axis=1, keepdims=True))
+
+    @staticmethod
+    def _combine(mode_x, mode_P, mu):
+        """Probability-weighted estimate and covariance (spread of the modes included) of the model states."""
+        w = mu.astype(np.float32)
+        x = np.einsum("mj,mjd->md", w, mode_x)
+        spread = mode_x - x[:, None, :]
+        P = np.einsum("mj,mjde->mde", w, mode_P + spread[..., :, None] * spread[..., None, :])
+        return {"x": x, "P": P, "mode_x": mode_x, "mode_P": mode_P, "mu": mu}
+
+    def extrapolate(self, state, offsets):
+        """Probability-weighted extrapolations of the models, (M, S, 2)."""
+        paths = 0
+        for j, model in enumerate(self.models):
+            path = model.extrapolate({"x": state["mode_x"][:, j, :model.dim]}, offsets)
+            paths = paths + path * state["mu"][:, j, None, None].astype(np.float32)
+        return paths
+
+
+def _time_axis(offsets):
+    """(S,) or (M, S) offsets as a (1 | M, S, 1) array that broadcasts against (M, 1, 2) positions."""
+    offsets = np.asarray(offsets)
+    return offsets.reshape((1,) * (2 - offsets.ndim) + offsets.shape + (1,))
+
+
+def kalman_update(x, P, measurements, R):
+    """
+    Batched Kalman measurement update with H selecting the (x, y) position.
+
+    Args:
+        x (np.ndarray): (M, d) states.
+        P (np.ndarray): (M, d, d) covariances.
+        measurements (np.ndarray): (M, 2) measured positions.
+        R (np.ndarray): (2, 2) measurement noise covariance.
+
+    Returns:
+        tuple: Corrected x and P, the (M, 2) innovations and the (M, 2, 2) innovation covariances S.
+    """
+    S = P[:, :H_DIM, :H_DIM] + R  # H P H^T + R
+    K = np.linalg.solve(S, P[:, :H_DIM, :]).transpose(0, 2, 1)  # P H^T S^-1 (S is symmetric)
+    innovation = np.asarray(measurements, np.float32).reshape(-1, H_DIM) - x[:, :H_DIM]
+    x = x + (K @ innovation[:, :, None])[:, :, 0]
+    P = P - K @ P[:, :H_DIM, :]  # (I - K H) P
+    return x, P, innovation, S
+
+
+MOTION_MODELS = ("cv", "ca", "imm")
+
+
+def build_motion_model(name="cv", process_noise=1.0, acceleration_noise=500.0, jerk_noise=2000.0,
+                       switch_prob=0.05):
+    """
+    Builds a motion model by name.
+
+    Args:
+        name (str): 'cv' constant velocity, 'ca' constant acceleration or 'imm' for an IMM of both.
+        process_noise (float): Scale of the per-frame process noise of every model.
+        acceleration_noise (float): Acceleration noise of the constant-velocity model in pixels/s^2.
+        jerk_noise (float): Jerk noise of the constant-acceleration model in pixels/s^3.
+        switch_prob (float): Model switching probability of the IMM.
+
+    Returns:
+        ConstantVelocity | ConstantAcceleration | InteractingMultipleModel: The model.
+    """
+    if name == "cv":
+        return ConstantVelocity(process_noise, acceleration_noise)
+    if name == "ca":
+        return ConstantAcceleration(process_noise, jerk_noise)
+    if name == "imm":
+        return InteractingMultipleModel([ConstantVelocity(process_noise, acceleration_noise),
+                                         ConstantAcceleration(process_noise, jerk_noise)], switch_prob)
+    raise ValueError(f"Unknown motion model {name!r}, expected one of {MOTION_MODELS}")
@@ -0,0 +1,196 @@
+# multiCameraRunner.py
+"""
+Multi-camera runner for the safety trackers.
+
+ObjectTracker_Kalman and DeadReckoningTracker each own one cv2.VideoCapture and run capture, inference and
+post-processing serially. A robotic cell is watched by several cameras, so this runner:
+
+- reads all cameras with ultralytics.data.loaders.LoadStreams (one capture thread per camera),
+- runs a single batched model.predict() call over the latest frame of every camera,
+- hands each camera's detections to a worker process that owns the Kalman / dead-reckoning state, the prediction
+  log and the alert state of that camera, so the per-camera post-processing runs on separate cores.
+
+Each camera keeps fully independent tracker state, including its own BYTETracker/BOTSORT identities (see
+identityTracking); the prediction and alert files get a "_cam<i>" suffix.
+
+Usage:
+    python multiCameraRunner.py --sources 0 rtsp://cell1/cam2 rtsp://cell1/cam3 --tracker kalman
+"""
+
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import cv2
+
+import utilsNeeded
+from detectionBatch import resolve_class_ids
+
+TRACKERS = ("kalman", "dead_reckoning")
+
+
+def _stream_file_name(file_name, stream_idx):
+    """Adds a per-camera suffix to a log file name, e.g. alert_times.csv -> alert_times_cam2.csv."""
+    root, ext = os.path.splitext(file_name)
+    return f"{root}_cam{stream_idx}{ext}"
+
+
+def _build_tracker(tracker, stream_idx, tracker_kwargs):
+    """Creates a camera- and model-less tracker instance for one stream (runs inside the worker process)."""
+    kwargs = dict(tracker_kwargs)
+    kwargs["file_name_predict"] = _stream_file_name(kwargs["file_name_predict"], stream_idx)
+    kwargs["file_name_alert"] = _stream_file_name(kwargs["file_name_alert"], stream_idx)
+    if tracker == "kalman":
+        from ObjectPrediction_kalman_SetUP import ObjectTracker_Kalman
+
+        return ObjectTracker_Kalman(model_path=None, source=None, **kwargs)
+    from DeadReckoningTracker import DeadReckoningTracker
+
+    return DeadReckoningTracker(model_path=None, source=None, **kwargs)
+
+
+def stream_worker(stream_ids, tracker, tracker_kwargs, task_queue):
+    """
+    Worker process entry point. Owns the trackers of the given streams and processes their detections.
+
+    Args:
+        stream_ids (list): Indices of the streams handled by this worker.
+        tracker (str): 'kalman' or 'dead_reckoning'.
+        tracker_kwargs (dict): Keyword arguments for the tracker (proximity_threshold, file names, target).
+        task_queue (mp.Queue): Queue of (stream_idx, detections, timestamp) tuples, None stops the worker.
+    """
+    trackers = {i: _build_tracker(tracker, i, tracker_kwargs) for i in stream_ids}
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            stream_idx, detections, timestamp = task
+            trackers[stream_idx].process_detections(detections, None, timestamp=timestamp)
+    finally:
+        for t in trackers.values():
+            t.close()
+
+
+class MultiCameraRunner:
+    """
+    Runs one tracker per camera with batched inference and per-camera worker processes.
+
+    Attributes:
+        sources (list): Camera indices, video files or stream URLs.
+        model: YOLO model shared by all cameras.
+        tracker (str): 'kalman' or 'dead_reckoning'.
+        tracker_kwargs (dict): Keyword arguments passed to every tracker.
+        workers (int): Number of worker processes, streams are assigned round-robin.
+        show (bool): Display the annotated frame of every camera.
+
+    Methods:
+        run(): Main loop, returns when a stream ends or 'q' is pressed.
+    """
+
+    def __init__(self, model_path, sources, tracker="kalman", workers=None, show=False, vid_stride=1, **tracker_kwargs):
+        """
+        Initializes the runner.
+
+        Args:
+            model_path (str): Path to the YOLOv8 model.
+            sources (list): Camera indices, video files or stream URLs, one per camera.
+            tracker (str): 'kalman' (ObjectTracker_Kalman) or 'dead_reckoning' (DeadReckoningTracker).
+            workers (int | None): Number of worker processes, defaults to min(len(sources), cpu count).
+            show (bool): Display the annotated frame of every camera.
+            vid_stride (int): Frame-rate stride passed to LoadStreams.
+            **tracker_kwargs: proximity_threshold, file_name_predict, file_name_alert, target, tracker_config,
+                prediction_horizon_ms and classes for the trackers. The classes (plus the target) are passed to
+                the batched predict call.
+        """
+        if tracker not in TRACKERS:
+            raise ValueError(f"Unknown tracker '{tracker}', expected one of {TRACKERS}")
+        self.sources = [str(s) for s in sources]
+        self.model = utilsNeeded.load_model(model_path)
+        self.tracker = tracker
+        self.tracker_kwargs = tracker_kwargs
+        classes = tracker_kwargs.get("classes")
+        self.classes = resolve_class_ids([tracker_kwargs["target"], *classes], self.model.model.names) \
+            if classes is not None else None
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(self.sources)))
+        self.show = show
+        self.vid_stride = vid_stride
+
+    def run(self):
+        """
+        Batches the latest frame of every camera into one predict call and fans the detections out to the workers.
+        """
+        from ultralytics.data.loaders import LoadStreams
+
+        # LoadStreams reads multiple sources from a *.streams text file
+        with tempfile.NamedTemporaryFile("w", suffix=".streams", delete=False) as f:
+            f.write("\n".join(self.sources))
+        streams = LoadStreams(f.name, vid_stride=self.vid_stride)
+        os.unlink(f.name)
+
+        ctx = mp.get_context("spawn")  # CUDA and cv2 are not fork-safe
+        queues, processes, owner = [], [], {}
+        for w in range(self.workers):
+            stream_ids = list(range(w, len(self.sources), self.workers))
+            q = ctx.Queue(maxsize=8 * len(stream_ids))
+            p = ctx.Process(target=stream_worker, args=(stream_ids, self.tracker, self.tracker_kwargs, q), daemon=True)
+            p.start()
+            queues.append(q)
+            processes.append(p)
+            owner.update({i: q for i in stream_ids})
+
+        names = self.model.model.names
+        frames, start = 0, time.time()
+        try:
+            for _, images, _ in streams:
+                timestamp = time.time()
+                results = self.model.predict(images, classes=self.classes, verbose=False)  # One batched call for all cameras
+                for i, result in enumerate(results):
+                    owner[i].put((i, utilsNeeded.detections_from_result(result, names), timestamp))
+                    if self.show:
+                        cv2.imshow(f"Camera {i}", result.plot())
+                frames += 1
+                if self.show and cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+        finally:
+            streams.close()
+            for q in queues:
+                q.put(None)
+            for p in processes:
+                p.join()
+            elapsed = time.time() - start
+            logging.info(f"Processed {frames} batches of {len(self.sources)} cameras "
+                         f"({frames * len(self.sources) / max(elapsed, 1e-9):.1f} frames/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the safety trackers on several cameras at once.")
+    parser.add_argument("--model", default="yolov8n.pt", help="YOLOv8 model path")
+    parser.add_argument("--sources", nargs="+", default=["0"], help="camera indices, video files or stream URLs")
+    parser.add_argument("--tracker", choices=TRACKERS, default="kalman")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--target", default="person")
+    parser.add_argument("--proximity-threshold", type=int, default=20)
+    parser.add_argument("--tracker-config", default="bytetrack.yaml", help="bytetrack.yaml or botsort.yaml")
+    parser.add_argument("--classes", nargs="+", default=None, help="class names to monitor besides the target")
+    parser.add_argument("--horizon-ms", type=float, default=None, help="prediction horizon in milliseconds")
+    parser.add_argument("--show", action="store_true", help="display every camera")
+    args = parser.parse_args()
+
+    MultiCameraRunner(
+        args.model,
+        args.sources,
+        tracker=args.tracker,
+        workers=args.workers,
+        show=args.show,
+        proximity_threshold=args.proximity_threshold,
+        file_name_predict="tracking_and_predictions.csv",
+        file_name_alert="alert_times.csv",
+        target=args.target,
+        tracker_config=args.tracker_config,
+        prediction_horizon_ms=args.horizon_ms,
+        classes=args.classes,
+    ).run()
@@ -0,0 +1,385 @@
+# parameterSweep.py
+"""
+Parallel parameter sweeps of the predictors and alert thresholds over recorded detections.
+
+proximity_threshold, coordinate_threshold, the Kalman noise covariances and the prediction horizon are hand-picked
+constants in the __main__ blocks of the trackers. This harness evaluates a grid or a random sample of such parameters
+by replaying detection recordings (see detectionRecording) into fresh trackers in a process pool, one trial per
+parameter set, and ranks the trials by:
+
+    mae / mse           Euclidean prediction error as in Thesis/plottTest.py (see predictionMetrics)
+    mean_lead_s         how long before an actual hazard the first alert was raised
+    miss_rate           hazards without an alert within max_lead_s before them
+    false_alert_rate    alert episodes not followed by a hazard within max_lead_s
+
+The hazards used as ground truth come from the recorded boxes themselves: a box touching the robotic arm area
+(any_area / zones, boxes lying inside it are the arm itself) for the thesis trackers, an overlapping target/object
+pair for the root trackers.
+
+Constructor arguments of the tracker are swept by name, e.g. motion_model=cv,ca,imm of the Kalman trackers;
+process_noise, measurement_noise, acceleration_noise, jerk_noise (motion models ca and imm) and switch_prob (imm)
+are applied to the tracker's KalmanFilterBank and are rejected for the dead-reckoning trackers, which have none.
+
+Grid axes list their values (NAME=V1,V2,...). Ranges (NAME=LOW:HIGH) are only sampled by a random search, so they
+need --random N.
+
+Usage:
+    python parameterSweep.py recordings/cell1 --tracker thesis_kalman \\
+        --grid proximity_threshold=20,30,40 coordinate_threshold=10,20 process_noise=0.03,0.3,1
+    python parameterSweep.py recordings/cell1 --tracker dead_reckoning --random 50 \\
+        --axes prediction_horizon_ms=100:800 proximity_threshold=20,40,60
+"""
+
+import argparse
+import csv
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import bufferedLogging
+import predictionMetrics
+import proximityEngine
+from detectionRecording import DetectionRecording, build_replay_tracker, replay
+from hazardEngine import zone_contact
+from hazardZones import ZoneMap
+from kalmanSetUp import KalmanFilterBank
+
+TRACKERS = ("kalman", "dead_reckoning", "thesis_kalman", "thesis_dead_reckoning")
+
+# Columns (time, center x, class name, track ID) of the prediction log rows, center y and the predicted x/y follow
+# center x
+ROW_LAYOUTS = {
+    "kalman": (0, 1, 5, 6),  # [elapsed_time, center_x, center_y, future_x, future_y, class_name, track_id]
+    "dead_reckoning": (0, 2, 6, 7),  # [timestamp, class_id, current_x, current_y, future_x, future_y, class_name, track_id]
+    "thesis_kalman": (0, 1, 5, 6),  # utilitiesHelper.log_detection
+    "thesis_dead_reckoning": (0, 1, 5, 6),
+}
+
+# Settings of the __main__ blocks, used for everything that is not swept
+DEFAULT_KWARGS = {
+    "kalman": {"proximity_threshold": 20, "target": "person"},
+    "dead_reckoning": {"proximity_threshold": 40, "target": "person"},
+    "thesis_kalman": {"frequency": 2500, "duration": 3000, "proximity_threshold": 30, "coordinate_threshold": 20,
+                      "label_name": "Robotic Arm", "any_area": ((150, 150), (300, 300))},
+    "thesis_dead_reckoning": {"frequency": 2500, "duration": 1000, "factor": 4, "proximity_threshold": 70,
+                              "label_name": "robotic arm", "any_area": ((100, 100), (350, 350))},
+}
+
+# Swept parameters that configure the KalmanFilterBank instead of the tracker constructor
+BANK_PARAMS = ("process_noise", "measurement_noise", "acceleration_noise", "jerk_noise", "switch_prob")
+# Bank parameters that only some motion models use
+MODEL_PARAMS = {"jerk_noise": ("ca", "imm"), "switch_prob": ("imm",)}
+# Trackers with a KalmanFilterBank, the only ones BANK_PARAMS apply to
+KALMAN_TRACKERS = ("kalman", "thesis_kalman")
+
+
+def check_params(tracker, candidates):
+    """
+    Rejects parameter sets the tracker would silently ignore, they would only repeat other trials.
+
+    Raises:
+        ValueError: If the tracker is unknown, a KalmanFilterBank parameter is swept for a tracker without one or a
+            motion model parameter for a motion model without it.
+    """
+    if tracker not in TRACKERS:
+        raise ValueError(f"Unknown tracker '{tracker}', expected one of {TRACKERS}")
+    if tracker not in KALMAN_TRACKERS:
+        ignored = sorted({name for params in candidates for name in params if name in BANK_PARAMS})
+        if ignored:
+            raise ValueError(f"The KalmanFilterBank parameters {', '.join(ignored)} only apply to the trackers "
+                             f"{KALMAN_TRACKERS}, '{tracker}' has no Kalman filters")
+    default_model = DEFAULT_KWARGS[tracker].get("motion_model", "cv")
+    for params in candidates:
+        model = params.get("motion_model", default_model)
+        for name, models in MODEL_PARAMS.items():
+            if name in params and model not in models:
+                raise ValueError(f"{name} only applies to the motion models {models}, not '{model}'")
+
+
+def grid(**axes):
+    """
+    Returns every combination of the given parameter values.
+
+    Example:
+        grid(proximity_threshold=[20, 30], process_noise=[0.03, 1.0]) -> 4 parameter dicts
+    """
+    return [dict(zip(axes, values)) for values in itertools.product(*axes.values())]
+
+
+def random_search(n, seed=0, **axes):
+    """
+    Returns n random parameter sets.
+
+    Args:
+        n (int): Number of parameter sets.
+        seed (int): Seed of the random generator, the same seed gives the same sets.
+        **axes: Per parameter a (low, high) tuple sampled uniformly (integers if both bounds are ints) or a list of
+            values to choose from.
+    """
+    rng = random.Random(seed)
+
+    def sample(spec):
+        if isinstance(spec, tuple):
+            low, high = spec
+            return rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+        return rng.choice(spec)
+
+    return [{name: sample(spec) for name, spec in axes.items()} for _ in range(n)]
+
+
+class _RowCollector:
+    """Stands in for the prediction CSV writer and keeps the rows in memory."""
+
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+    def close(self):
+        pass
+
+
+class _AlertCollector:
+    """Stands in for the AlertDispatcher and records the (replayed) time of every alert."""
+
+    def __init__(self):
+        self.now = None
+        self.times = []
+
+    def beep(self, frequency=None, duration=None, key=None):
+        self.times.append(self.now)
+
+    dispatch = beep
+
+    def close(self):
+        pass
+
+
+def hazard_times(recording, tracker, kwargs):
+    """
+    Ground truth of a recording: the timestamps of the frames with an actual hazard.
+
+    Args:
+        recording (DetectionRecording): The recording.
+        tracker (str): Tracker name, selects the hazard definition (zone contact or target/object overlap).
+        kwargs (dict): Tracker arguments (any_area, zones, target).
+
+    Returns:
+        np.ndarray: Timestamps of the hazard frames.
+    """
+    zones, area = kwargs.get("zones"), kwargs.get("any_area")
+    # Full resolution, the ground truth is computed once per recording
+    zone_map = ZoneMap(zones, recording.frame_shape, cell_size=1) if tracker.startswith("thesis") and zones else None
+    hazard = np.zeros(len(recording), bool)
+    for index, (_, detections) in enumerate(recording):
+        if not len(detections):
+            continue
+        boxes = detections.xyxy
+        if zone_map is not None:
+            hazard[index] = (zone_map.touching(boxes).any(axis=0) & ~zone_map.excluded(boxes)).any()
+        elif tracker.startswith("thesis"):
+            if area:
+                (x1, y1), (x2, y2) = area
+                inside = (boxes[:, 0] >= x1) & (boxes[:, 2] <= x2) & (boxes[:, 1] >= y1) & (boxes[:, 3] <= y2)
+                hazard[index] = (zone_contact(boxes, area, 0)[0] & ~inside).any()
+        else:
+            result = proximityEngine.pairwise_proximity(boxes, detections.class_mask(kwargs["target"]), 0)
+            hazard[index] = result.overlap.any()
+    return recording.timestamps[hazard]
+
+
+def evaluate(recordings, tracker, params, base_kwargs=None, max_lead_s=2.0, gap_s=0.5):
+    """
+    Runs one trial: replays every recording into a fresh tracker built with the parameters and scores it.
+    Runs in the worker processes; the log files of the trial go to a temporary directory.
+
+    Args:
+        recordings (list): Absolute paths of the recording directories.
+        tracker (str): One of TRACKERS.
+        params (dict): The swept parameters of this trial.
+        base_kwargs (dict | None): Tracker arguments that are not swept, defaults to DEFAULT_KWARGS.
+        max_lead_s (float): Longest alert lead time that counts as announcing a hazard.
+        gap_s (float): Gap separating two alert or hazard episodes.
+
+    Returns:
+        dict: The parameters plus mae, mse, predictions, mean_lead_s, miss_rate, false_alert_rate, alerts, hazards
+            and the run time of the trial in seconds.
+    """
+    start = time.perf_counter()
+    check_params(tracker, [params])
+    kwargs = dict(DEFAULT_KWARGS[tracker] if base_kwargs is None else base_kwargs)
+    kwargs.update({k: v for k, v in params.items() if k not in BANK_PARAMS})
+    bank = {k: v for k, v in params.items() if k in BANK_PARAMS}
+    horizon_ms = kwargs.get("prediction_horizon_ms")
+    time_col, x_col, class_col, track_col = ROW_LAYOUTS[tracker]
+    errors, alerts, hazards = [], [], []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # The thesis helpers also write fixed file names into the working directory
+        try:
+            for path in recordings:
+                recording = DetectionRecording(path)
+                instance = build_replay_tracker(tracker, file_name_predict="predictions.csv",
+                                                file_name_alert="alerts.csv", **kwargs)
+                if bank:
+                    instance.kalman_filters = KalmanFilterBank(model=kwargs.get("motion_model", "cv"), **bank)
+                instance.alert_dispatcher.close()
+                instance.alert_dispatcher = collector = _AlertCollector()
+                instance.writer = rows = _RowCollector()
+                replay(recording, instance, on_frame=lambda index, timestamp: setattr(collector, "now", timestamp))
+                instance.close()
+                if rows.rows:
+                    data = np.array([row[x_col:x_col + 4] for row in rows.rows], np.float64)
+                    # One group per tracked object, untracked detections share the class-level key of the trackers
+                    errors.append(predictionMetrics.prediction_errors(
+                        [row[time_col] for row in rows.rows], data[:, :2], data[:, 2:],
+                        [f"{row[class_col]}/{row[track_col]}" for row in rows.rows],
+                        horizon_ms / 1000 if horizon_ms else None))
+                # The root trackers log relative times, alerts and hazards are compared in recording time
+                alerts.append(np.asarray(collector.times, np.float64))
+                hazards.append(hazard_times(recording, tracker, kwargs))
+        finally:
+            bufferedLogging.close_shared_writers()
+            os.chdir(cwd)
+    errors = np.concatenate(errors) if errors else np.zeros(0)
+    timing = predictionMetrics.alert_timing(np.concatenate(alerts), np.concatenate(hazards), max_lead_s, gap_s)
+    return {
+        **params,
+        "mae": float(errors.mean()) if len(errors) else float("nan"),
+        "mse": float((errors ** 2).mean()) if len(errors) else float("nan"),
+        "predictions": len(errors),
+        "mean_lead_s": timing["mean_lead_s"],
+        "miss_rate": timing["miss_rate"],
+        "false_alert_rate": timing["false_alert_rate"],
+        "alerts": timing["alerts"],
+        "hazards": timing["hazards"],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def rank(results, rank_by="mae"):
+    """
+    Sorts trial results by one column, NaN last. A leading '-' sorts descending, e.g. '-mean_lead_s'.
+    """
+    descending = rank_by.startswith("-")
+    column = rank_by.lstrip("-")
+
+    def key(result):
+        value = result.get(column, float("nan"))
+        missing = value is None or (isinstance(value, float) and math.isnan(value))
+        return (missing, 0 if missing else -value if descending else value)
+
+    return sorted(results, key=key)
+
+
+def run_sweep(recordings, tracker, candidates, base_kwargs=None, workers=None, rank_by="mae", max_lead_s=2.0,
+              gap_s=0.5):
+    """
+    Evaluates all parameter sets in a process pool and returns the ranked results.
+
+    Args:
+        recordings (list): Recording directories (see detectionRecording), every trial replays all of them.
+        tracker (str): One of TRACKERS.
+        candidates (list): Parameter dicts, e.g. from grid() or random_search().
+        base_kwargs (dict | None): Tracker arguments that are not swept, defaults to DEFAULT_KWARGS[tracker].
+        workers (int | None): Number of worker processes, defaults to the CPU count.
+        rank_by (str): Result column to sort by, '-' prefix for descending.
+        max_lead_s (float): Longest alert lead time that counts as announcing a hazard.
+        gap_s (float): Gap separating two alert or hazard episodes.
+
+    Returns:
+        list: One result dict per parameter set, best first.
+    """
+    check_params(tracker, candidates)  # Fails before any worker starts
+    recordings = [os.path.abspath(path) for path in recordings]
+    ctx = mp.get_context("spawn")  # Same start method as the multi-camera runner, cv2 is not fork-safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(evaluate, recordings, tracker, params, base_kwargs, max_lead_s, gap_s)
+                   for params in candidates]
+        results = [future.result() for future in futures]
+    return rank(results, rank_by)
+
+
+def format_table(results, columns=None):
+    """Formats sweep results as an aligned text table."""
+    if not results:
+        return ""
+    columns = columns or list(results[0])
+
+    def cell(value):
+        return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+    rows = [[cell(result.get(c)) for c in columns] for result in results]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.rjust(w) for v, w in zip(row, widths)) for row in rows]
+    return "\n".join(lines)
+
+
+def _parse_value(text):
+    """Parses a command line value: int, float, None or string."""
+    if text == "None":
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep tracker parameters over detection recordings.")
+    parser.add_argument("recordings", nargs="+", help="recording directories written by detectionRecording")
+    parser.add_argument("--tracker", choices=TRACKERS, default="kalman")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="NAME=V1,V2",
+                        help="grid axes, NAME=LOW:HIGH ranges need --random")
+    parser.add_argument("--random", type=int, default=0, metavar="N",
+                        help="sample N sets instead of the grid, axes as NAME=LOW:HIGH or NAME=V1,V2")
+    parser.add_argument("--axes", nargs="*", default=[], metavar="NAME=LOW:HIGH", help="random search axes")
+    parser.add_argument("--area", default=None, help="robotic arm area x1,y1,x2,y2 of the thesis trackers")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rank-by", default="mae", help="result column, '-' prefix sorts descending")
+    parser.add_argument("--max-lead", type=float, default=2.0, help="longest lead time in seconds")
+    parser.add_argument("--out", default="sweep_results.csv", help="CSV file for the ranked results")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    axes = {}
+    for spec in args.grid + args.axes:
+        name, _, values = spec.partition("=")
+        if ":" in values and not args.random:
+            parser.error(f"{spec}: a LOW:HIGH range is only sampled with --random N, list grid values as NAME=V1,V2")
+        if ":" in values:
+            low, high = (_parse_value(v) for v in values.split(":"))
+            axes[name] = (low, high)
+        else:
+            axes[name] = [_parse_value(v) for v in values.split(",")]
+    if args.random:
+        sets = random_search(args.random, **axes)
+    else:
+        sets = grid(**{name: list(spec) for name, spec in axes.items()})
+    try:
+        check_params(args.tracker, sets)
+    except ValueError as e:
+        parser.error(str(e))
+    base = dict(DEFAULT_KWARGS[args.tracker])
+    if args.area:
+        x1, y1, x2, y2 = (int(v) for v in args.area.split(","))
+        base["any_area"] = ((x1, y1), (x2, y2))
+
+    ranked = run_sweep(args.recordings, args.tracker, sets, base, args.workers, args.rank_by, args.max_lead)
+    print(format_table(ranked))
+    with open(args.out, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(ranked[0]) if ranked else [])
+        writer.writeheader()
+        writer.writerows(ranked)
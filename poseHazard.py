@@ -0,0 +1,281 @@
+# poseHazard.py
+"""
+Pose-aware hazard detection on hand and wrist keypoints.
+
+check_proximity / check_nearness and the zone checks treat a person as one axis-aligned box, so a person standing
+next to the cell and an arm reaching into it look the same, and the proximity threshold has to be wide enough for
+the reaching arm. PoseHazardTracker instead runs a YOLOv8 pose model (ultralytics.models.yolo.pose) and tests only
+the keypoints that actually reach into a machine:
+
+    - the persons get track IDs from the identity tracker, and every selected keypoint of a tracked person (the
+      wrists by default) gets its own constant-velocity filter in one KalmanFilterBank, keyed (track ID, keypoint),
+    - all visible keypoints of a frame are predicted and corrected in one vectorized call, and their trajectories
+      up to the horizon are extrapolated in one call,
+    - a small box around every keypoint is tested with the ZoneMap lookups against all zones, now and along its
+      trajectory (time-to-collision), in one assess() call per frame,
+    - the per-keypoint results are reduced to the most severe zone per person.
+
+The zones are hazardZones.HazardZone polygons (or an any_area rectangle) with their own proximity thresholds, which
+can be much tighter than for whole-person boxes. Zones with a class policy must include 'person'.
+
+Run as a script to monitor a camera:
+
+    python poseHazard.py --model yolov8n-pose.pt --source 0 --area 200 100 500 400 --threshold 20
+"""
+
+import argparse
+import logging
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from alertDispatcher import AlertDispatcher
+from alertEpisodes import CONDITION_SEVERITY
+from detectionBatch import DetectionBatch
+from frameSinks import make_sink
+from hazardZones import ZoneMap, rectangle_zone
+from identityTracking import IdentityTracker, UNTRACKED
+from kalmanSetUp import KalmanFilterBank
+from trajectoryPrediction import horizon_offsets
+
+
+# COCO keypoint indices of the pose models
+KEYPOINT_NAMES = {5: "left_shoulder", 6: "right_shoulder", 7: "left_elbow", 8: "right_elbow", 9: "left_wrist",
+                  10: "right_wrist"}
+WRISTS = (9, 10)
+ARMS = (7, 8, 9, 10)
+
+PoseAssessment = namedtuple("PoseAssessment", ["track_ids", "zone", "severity", "condition", "points", "person",
+                                               "point_zone", "trajectories"])
+PoseAssessment.__doc__ = """
+Hazard state of the persons of a frame, judged by their keypoints.
+
+Attributes:
+    track_ids (np.ndarray): (N,) track ID per person, UNTRACKED if none.
+    zone (np.ndarray): (N,) index of the most severe zone any keypoint of the person alerts on, -1 if none.
+    severity (np.ndarray): (N,) severity of that zone, -1 if none.
+    condition (list): Per person 'center', 'Nearness', 'TTC' or None, the condition of the most severe keypoint.
+    points (np.ndarray): (M, 3) visible keypoints [x, y, keypoint index].
+    person (np.ndarray): (M,) person index of every keypoint.
+    point_zone (np.ndarray): (M,) alerting zone per keypoint, -1 if none.
+    trajectories (np.ndarray): (M, steps, 2) predicted keypoint positions up to the horizon.
+"""
+
+
+def pose_from_result(result, names=None):
+    """
+    Splits one pose Results object into the person detections and their keypoints.
+
+    Args:
+        result: Results object of a pose model, e.g. model.predict(frame)[0].
+        names (dict | None): Class names, defaults to result.names.
+
+    Returns:
+        tuple: (DetectionBatch of the persons, (N, K, 3) float32 keypoints [x, y, confidence]).
+    """
+    persons = DetectionBatch.from_result(result, names)
+    keypoints = result.keypoints.data if result.keypoints is not None else np.zeros((0, 17, 3), np.float32)
+    if hasattr(keypoints, "cpu"):
+        keypoints = keypoints.cpu().numpy()
+    keypoints = np.asarray(keypoints, np.float32)
+    if keypoints.shape[-1] == 2:  # Models without keypoint confidence
+        keypoints = np.concatenate((keypoints, np.ones(keypoints.shape[:-1] + (1,), np.float32)), axis=-1)
+    if not len(persons):
+        return persons, np.zeros((0, 17, 3), np.float32)
+    return persons, keypoints.reshape(len(persons), -1, 3)
+
+
+class PoseHazardTracker:
+    """
+    Tracks the hand and wrist keypoints of every person and checks their predicted positions against hazard zones.
+
+    Attributes:
+        zones (list): HazardZone definitions.
+        zone_map (ZoneMap | None): Rasterised zones, built on the first frame.
+        keypoints (tuple): Keypoint indices that are tracked and tested.
+        filters (KalmanFilterBank): Keypoint filters keyed (track ID, keypoint index).
+        identity_tracker (IdentityTracker | None): Track IDs of the persons.
+
+    Methods:
+        detect(model, frame): Runs the pose model, returns the persons and their keypoints.
+        update(persons, keypoints, timestamp=None, frame=None): PoseAssessment of a frame.
+        draw(frame, assessment): Draws the zones, keypoints and their trajectories.
+    """
+
+    def __init__(self, zones, frame_shape=None, keypoints=WRISTS, keypoint_conf=0.5, point_radius=15,
+                 horizon_ms=500, steps=5, ttc_threshold=0.5, tracker_config="bytetrack.yaml", frame_rate=30,
+                 cell_size=4):
+        """
+        Args:
+            zones (list | tuple): HazardZone polygons, or an any_area rectangle ((x1, y1), (x2, y2)).
+            frame_shape (tuple | None): (height, width) of the frames, taken from the first frame when None.
+            keypoints (tuple): COCO keypoint indices to check, the wrists by default (ARMS adds the elbows).
+            keypoint_conf (float): Minimum keypoint confidence, less visible keypoints are ignored.
+            point_radius (float): Half size in pixels of the box around a keypoint that is tested, about a hand.
+            horizon_ms (float): Prediction horizon of the keypoint trajectories in milliseconds.
+            steps (int): Number of trajectory points up to the horizon.
+            ttc_threshold (float | None): Alert when a keypoint is predicted to reach a zone within this many
+                seconds, None only checks the current positions.
+            tracker_config (str | None): Identity tracker of the persons ('bytetrack.yaml' or 'botsort.yaml').
+                Without it the keypoints are only checked at their current position.
+            frame_rate (float): Frame rate of the source for the identity tracker.
+            cell_size (int): Raster cell size in pixels of the zone lookup (hazardZones.ZoneMap).
+        """
+        if zones and not hasattr(zones[0], "polygon"):
+            zones = [rectangle_zone(zones, exclude_contained=False)]
+        self.zones = list(zones)
+        self.cell_size = cell_size
+        self.zone_map = ZoneMap(self.zones, frame_shape, cell_size) if frame_shape is not None else None
+        self.keypoints = tuple(keypoints)
+        self.keypoint_conf = keypoint_conf
+        self.point_radius = point_radius
+        self.horizon_ms = horizon_ms
+        self.steps = steps
+        self.ttc_threshold = ttc_threshold
+        self.offsets = horizon_offsets(horizon_ms, steps)
+        self.filters = KalmanFilterBank()
+        self.identity_tracker = IdentityTracker(tracker_config, frame_rate) if tracker_config else None
+
+    def detect(self, model, frame):
+        """Runs the pose model on a frame and returns (persons, keypoints), see pose_from_result."""
+        results = model.predict(frame, verbose=False)
+        if not results:
+            return DetectionBatch.from_list([], model.model.names), np.zeros((0, 17, 3), np.float32)
+        return pose_from_result(results[0], model.model.names)
+
+    def update(self, persons, keypoints, timestamp=None, frame=None):
+        """
+        Updates the keypoint filters with a frame and assesses the hazard of every person.
+
+        Args:
+            persons (DetectionBatch | list): Person detections of the frame.
+            keypoints (np.ndarray): (N, K, 3) keypoints [x, y, confidence] of the persons.
+            timestamp (float | None): Capture time of the frame, defaults to now.
+            frame (np.ndarray | None): The frame, for the zone raster size and the identity tracker.
+
+        Returns:
+            PoseAssessment: Per-person zone, severity and condition plus the per-keypoint results.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.zone_map is None:
+            self.zone_map = ZoneMap(self.zones, frame.shape, self.cell_size)
+        n = len(persons)
+        track_ids = np.full(n, UNTRACKED, dtype=int)
+        if self.identity_tracker is not None:
+            track_ids = self.identity_tracker.update(persons, frame)
+            live = self.identity_tracker.live_ids()
+            for key in [key for key in self.filters.keys if key[0] not in live]:
+                self.filters.remove(key)
+
+        selected = np.asarray(keypoints, np.float32)[:, self.keypoints]  # (N, K, 3)
+        visible = (selected[..., 2] >= self.keypoint_conf) & (selected[..., :2] > 0).any(axis=-1)
+        person, k = np.nonzero(visible)
+        xy = selected[person, k, :2]
+        points = np.column_stack((xy, np.asarray(self.keypoints)[k])) if len(xy) else np.zeros((0, 3), np.float32)
+
+        # Tracked keypoints move along their filter velocities, untracked ones are only checked where they are
+        trajectories = np.repeat(xy[:, None, :], self.steps, axis=1)
+        tracked = track_ids[person] != UNTRACKED
+        if tracked.any():
+            keys = [(int(t), int(i)) for t, i in zip(track_ids[person[tracked]], points[tracked, 2])]
+            for key, (x, y) in zip(keys, xy[tracked]):
+                if key not in self.filters:
+                    self.filters.add(key, x, y, timestamp=timestamp)
+            self.filters.predict_correct(keys, xy[tracked], timestamp=timestamp)
+            trajectories[tracked] = self.filters.trajectory(keys, self.horizon_ms, self.steps)
+
+        r = self.point_radius
+        boxes = np.column_stack((xy - r, xy + r, np.ones(len(xy)), np.zeros(len(xy)))).astype(np.float32)
+        points_batch = DetectionBatch(boxes.reshape(-1, 6), {0: "person"})  # Zone class policies see persons
+        ttc_threshold = self.ttc_threshold if self.identity_tracker is not None else None
+        result = self.zone_map.assess(points_batch, trajectories, self.offsets, ttc_threshold)
+
+        # Most severe keypoint per person
+        severity = np.full(n, -1)
+        np.maximum.at(severity, person, result.severity)
+        zone = np.full(n, -1)
+        condition = [None] * n
+        # Ascending by zone severity, then by condition ('center' over 'Nearness' over 'TTC'), so the worst point of
+        # a person is written last
+        rank = [CONDITION_SEVERITY.get(c, -1) for c in result.condition]
+        for m in np.lexsort((rank, result.severity)):
+            if result.zone[m] >= 0:
+                zone[person[m]] = result.zone[m]
+                condition[person[m]] = result.condition[m]
+        return PoseAssessment(track_ids, zone, severity, condition, points, person, result.zone, trajectories)
+
+    def draw(self, frame, assessment):
+        """Draws the zones, the checked keypoints (red when alerting) and their predicted trajectories."""
+        self.zone_map.draw(frame)
+        for (x, y, _), point_zone, trajectory in zip(assessment.points, assessment.point_zone,
+                                                     assessment.trajectories):
+            color = (0, 0, 255) if point_zone >= 0 else (0, 255, 0)
+            cv2.polylines(frame, [np.vstack(([x, y], trajectory)).astype(np.int32).reshape(-1, 1, 2)], False,
+                          color, 2)
+            cv2.circle(frame, (int(x), int(y)), int(self.point_radius), color, 2)
+        return frame
+
+
+def run(model_path, source, zones, sink="window", frequency=2500, duration=500, **kwargs):
+    """
+    Monitors a video source with the pose model until it ends or the sink asks to stop.
+
+    Args:
+        model_path (str): YOLOv8 pose model, e.g. 'yolov8n-pose.pt'.
+        source (int | str): Camera index, video file or stream URL.
+        zones (list | tuple): HazardZone polygons or an any_area rectangle.
+        sink (str): Output of the annotated frames, see frameSinks.make_sink.
+        frequency (int), duration (int): Alert sound.
+        **kwargs: Further PoseHazardTracker arguments.
+    """
+    import utilsNeeded
+
+    model = utilsNeeded.load_model(model_path)
+    cap = utilsNeeded.initialize_video_capture(source)
+    tracker = PoseHazardTracker(zones, frame_rate=cap.get(cv2.CAP_PROP_FPS) or 30, **kwargs)
+    dispatcher = AlertDispatcher()
+    frame_sink = make_sink(sink)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = time.time()
+            persons, keypoints = tracker.detect(model, frame)
+            assessment = tracker.update(persons, keypoints, timestamp, frame)
+            for track_id, zone, condition in zip(assessment.track_ids, assessment.zone, assessment.condition):
+                if zone >= 0:
+                    name = tracker.zones[zone].name
+                    dispatcher.dispatch(key=(name, int(track_id)), frequency=frequency, duration=duration,
+                                        zone=name, condition=condition)
+            if frame_sink.due():
+                frame_sink.write(tracker.draw(frame, assessment))
+            if frame_sink.poll():
+                break
+    finally:
+        cap.release()
+        dispatcher.close()
+        frame_sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hazard alerts on the predicted hand positions of a pose model.")
+    parser.add_argument("--model", default="yolov8n-pose.pt", help="YOLOv8 pose model path")
+    parser.add_argument("--source", default="0", help="camera index, video file or stream URL")
+    parser.add_argument("--area", type=int, nargs=4, default=[200, 100, 500, 400], metavar=("X1", "Y1", "X2", "Y2"),
+                        help="hazard rectangle in pixels")
+    parser.add_argument("--threshold", type=float, default=20, help="proximity threshold of the hands in pixels")
+    parser.add_argument("--keypoints", choices=["wrists", "arms"], default="wrists")
+    parser.add_argument("--horizon-ms", type=float, default=500)
+    parser.add_argument("--ttc", type=float, default=0.5, help="time-to-collision threshold in seconds")
+    parser.add_argument("--sink", default="window", help="window, none, video:<path> or mjpeg:<port>")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    x1, y1, x2, y2 = args.area
+    run(args.model, int(args.source) if args.source.isdigit() else args.source,
+        [rectangle_zone(((x1, y1), (x2, y2)), proximity_threshold=args.threshold, exclude_contained=False)],
+        sink=args.sink, keypoints=WRISTS if args.keypoints == "wrists" else ARMS, horizon_ms=args.horizon_ms,
+        ttc_threshold=args.ttc)
@@ -0,0 +1,373 @@
+# predictionMetrics.py
+"""
+Accuracy and alerting metrics of the position predictors.
+
+Thesis/plottTest.py scores a prediction log by the Euclidean distance between every predicted point and the next
+detected point (MAE is the mean distance, MSE the mean squared distance), Thesis/simulate.py computes the same per
+axis on numbers copied out of such logs. This module holds those definitions for code that evaluates many runs, e.g.
+parameterSweep:
+
+    - mean_absolute_error / mean_squared_error: the Euclidean definitions of plottTest,
+    - prediction_errors: distance of every prediction to where the same object actually was at the predicted time,
+      grouped per object instead of comparing consecutive rows of different objects,
+    - alert_timing: lead time of the alerts before the hazards they announce, missed hazards and false alerts,
+    - StreamingMetrics: the same prediction errors computed online while a tracker runs, overall, per class and per
+      track, with quantile sketches, so a shift is scored without reloading its prediction log.
+"""
+
+import json
+import logging
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+
+def mean_absolute_error(actual, predicted):
+    """Mean Euclidean distance between actual and predicted points, as in Thesis/plottTest.py."""
+    actual = np.asarray(actual, np.float64).reshape(-1, 2)
+    predicted = np.asarray(predicted, np.float64).reshape(-1, 2)
+    return float(np.sqrt(((actual - predicted) ** 2).sum(axis=1)).mean()) if len(actual) else float("nan")
+
+
+def mean_squared_error(actual, predicted):
+    """Mean squared Euclidean distance between actual and predicted points, as in Thesis/plottTest.py."""
+    actual = np.asarray(actual, np.float64).reshape(-1, 2)
+    predicted = np.asarray(predicted, np.float64).reshape(-1, 2)
+    return float(((actual - predicted) ** 2).sum(axis=1).mean()) if len(actual) else float("nan")
+
+
+def prediction_errors(times, actual, predicted, groups, horizon_s=None):
+    """
+    Distance between every prediction and the actual position of the same object at the predicted time.
+
+    Without a horizon a prediction targets the next observation of its object (the one-frame predictors, like the
+    row shift in plottTest). With a horizon the actual position at time + horizon is interpolated from the object's
+    observations, predictions whose target time lies after the last observation are skipped.
+
+    Args:
+        times (array-like): (M,) time of every logged prediction.
+        actual (array-like): (M, 2) detected position at that time.
+        predicted (array-like): (M, 2) predicted position.
+        groups (array-like): (M,) object key of every row, e.g. the class name and track ID of the prediction logs.
+        horizon_s (float | None): Prediction horizon in seconds, None for next-observation predictions.
+
+    Returns:
+        np.ndarray: Euclidean errors of all scored predictions.
+
+    Rows of a group that share their time belong to several objects under one key (e.g. two untracked cups keyed by
+    their class). They cannot be told apart, so they are skipped instead of being scored against each other.
+    """
+    times = np.asarray(times, np.float64)
+    actual = np.asarray(actual, np.float64).reshape(-1, 2)
+    predicted = np.asarray(predicted, np.float64).reshape(-1, 2)
+    groups = np.asarray(groups)
+    errors = []
+    ambiguous = 0
+    for group in np.unique(groups):
+        rows = np.flatnonzero(groups == group)
+        rows = rows[np.argsort(times[rows], kind="stable")]
+        equal = times[rows][1:] == times[rows][:-1]
+        if equal.any():
+            shared = np.concatenate((equal, [False])) | np.concatenate(([False], equal))
+            ambiguous += int(shared.sum())
+            rows = rows[~shared]
+            if not len(rows):
+                continue
+        t, a, p = times[rows], actual[rows], predicted[rows]
+        if horizon_s is None:
+            errors.append(np.linalg.norm(p[:-1] - a[1:], axis=1))
+            continue
+        target = t + horizon_s
+        valid = target <= t[-1]
+        truth = np.stack([np.interp(target[valid], t, a[:, 0]), np.interp(target[valid], t, a[:, 1])], axis=1)
+        errors.append(np.linalg.norm(p[valid] - truth, axis=1))
+    if ambiguous:
+        logging.warning(f"Skipped {ambiguous} predictions of objects sharing a key with another object in the same frame")
+    return np.concatenate(errors) if errors else np.zeros(0)
+
+
+def episode_starts(times, gap_s):
+    """Returns the start times of the episodes of sorted event times, a new episode starts after a gap > gap_s."""
+    times = np.sort(np.asarray(times, np.float64))
+    if not len(times):
+        return times
+    return times[np.concatenate(([True], np.diff(times) > gap_s))]
+
+
+def alert_timing(alert_times, hazard_times, max_lead_s=2.0, gap_s=0.5):
+    """
+    Scores when the alerts were raised relative to the hazards they should announce.
+
+    Alerts and hazard frames are grouped into episodes (events closer than gap_s belong together). A hazard episode
+    is announced by the first alert within max_lead_s before its start, the lead time is the difference (0 for an
+    alert in the very frame the hazard starts). An alert episode is false if no hazard starts or lasts within
+    max_lead_s after it.
+
+    Args:
+        alert_times (array-like): Times at which alerts were dispatched.
+        hazard_times (array-like): Times of the frames with an actual hazard (ground truth, e.g. a box touching
+            the robotic arm zone).
+        max_lead_s (float): Longest lead time that still counts as announcing the hazard.
+        gap_s (float): Gap that separates two episodes.
+
+    Returns:
+        dict: lead_times (list), hazards, missed, alerts, false_alerts, mean_lead_s, false_alert_rate and miss_rate.
+    """
+    alerts = episode_starts(alert_times, gap_s)
+    hazard_frames = np.sort(np.asarray(hazard_times, np.float64))
+    hazards = episode_starts(hazard_frames, gap_s)
+    all_alerts = np.sort(np.asarray(alert_times, np.float64))
+    lead_times = []
+    for start in hazards:
+        i = np.searchsorted(all_alerts, start - max_lead_s)
+        if i < len(all_alerts) and all_alerts[i] <= start:
+            lead_times.append(float(start - all_alerts[i]))
+    # An alert is justified by any hazard frame within max_lead_s after it
+    j = np.searchsorted(hazard_frames, alerts)
+    justified = (j < len(hazard_frames)) & (hazard_frames[np.minimum(j, len(hazard_frames) - 1)] <= alerts + max_lead_s)
+    false_alerts = int((~justified).sum()) if len(hazard_frames) else len(alerts)
+    return {
+        "lead_times": lead_times,
+        "hazards": len(hazards),
+        "missed": len(hazards) - len(lead_times),
+        "alerts": len(alerts),
+        "false_alerts": false_alerts,
+        "mean_lead_s": float(np.mean(lead_times)) if lead_times else float("nan"),
+        "false_alert_rate": false_alerts / len(alerts) if len(alerts) else 0.0,
+        "miss_rate": (len(hazards) - len(lead_times)) / len(hazards) if len(hazards) else 0.0,
+    }
+
+
+class QuantileSketch:
+    """
+    Fixed-memory quantile sketch of non-negative errors with logarithmic buckets.
+
+    Values between min_value and max_value fall into buckets whose bounds grow by a factor (1 + a) / (1 - a), so every
+    quantile is returned with a relative error of at most a = relative_accuracy. Smaller values share a zero bucket,
+    larger ones the last bucket. add() is O(1), quantile() walks the buckets once.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=0.01, max_value=1e5):
+        """
+        Args:
+            relative_accuracy (float): Relative error bound of the quantiles.
+            min_value (float): Smallest value with its own bucket, e.g. 0.01 pixels.
+            max_value (float): Largest value with its own bucket.
+        """
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self._offset = math.floor(math.log(min_value) / self._log_gamma)
+        self.counts = np.zeros(math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 2, np.int64)
+        self.count = 0
+
+    def add(self, value):
+        if value < self.min_value:
+            index = 0
+        else:
+            index = min(math.ceil(math.log(value) / self._log_gamma) - self._offset, len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+
+    def extend(self, values):
+        """Adds an array of values at once."""
+        values = np.asarray(values, np.float64).ravel()
+        index = np.zeros(len(values), np.int64)
+        big = values >= self.min_value
+        index[big] = np.minimum(np.ceil(np.log(values[big]) / self._log_gamma) - self._offset, len(self.counts) - 1)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+        self.count += len(values)
+
+    def quantile(self, q):
+        """Returns the q-quantile (0 <= q <= 1), NaN while empty."""
+        if not self.count:
+            return float("nan")
+        index = int(np.searchsorted(np.cumsum(self.counts), q * (self.count - 1), side="right"))
+        if index == 0:
+            return 0.0
+        # Midpoint of the bucket (gamma^(i-1), gamma^i] in the relative sense
+        return 2 * self.gamma ** (index + self._offset) / (self.gamma + 1)
+
+
+class RunningError:
+    """Running count, MAE, MSE and maximum of Euclidean errors, optionally with a QuantileSketch."""
+
+    __slots__ = ("count", "total", "total_sq", "max", "sketch")
+
+    def __init__(self, sketch=False):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.max = 0.0
+        self.sketch = QuantileSketch() if sketch else None
+
+    def add(self, error):
+        self.count += 1
+        self.total += error
+        self.total_sq += error * error
+        self.max = max(self.max, error)
+        if self.sketch is not None:
+            self.sketch.add(error)
+
+    def extend(self, errors):
+        """Adds an array of errors at once."""
+        errors = np.asarray(errors, np.float64).ravel()
+        if not len(errors):
+            return
+        self.count += len(errors)
+        self.total += float(errors.sum())
+        self.total_sq += float((errors * errors).sum())
+        self.max = max(self.max, float(errors.max()))
+        if self.sketch is not None:
+            self.sketch.extend(errors)
+
+    def summary(self):
+        """Returns count, mae, mse, rmse, max and, with a sketch, p50/p90/p99."""
+        if not self.count:
+            return {"count": 0}
+        mse = self.total_sq / self.count
+        result = {"count": self.count, "mae": self.total / self.count, "mse": mse, "rmse": math.sqrt(mse),
+                  "max": self.max}
+        if self.sketch is not None:
+            result.update({f"p{int(q * 100)}": self.sketch.quantile(q) for q in (0.5, 0.9, 0.99)})
+        return result
+
+
+class StreamingMetrics:
+    """
+    Online prediction accuracy, updated by the trackers in O(1) per prediction.
+
+    Every prediction waits until its object is observed at (or after) the predicted time. Its error is then the
+    Euclidean distance to the actual position at that time, interpolated between the two observations around it
+    (the same definition as prediction_errors). Without a horizon a prediction targets the next observation of its
+    object, like the one-frame predictors and plottTest. Errors are accumulated overall and per class with
+    quantile sketches, and per live track as running MAE/MSE. forget() drops the entry of an ended track (its errors
+    stay in the overall and per-class totals), so the memory stays bounded on a live camera whose track IDs keep
+    increasing.
+
+    All methods are thread-safe, so summary() can be read live (e.g. from a monitoring thread) while the tracker runs.
+
+    Attributes:
+        horizon_s (float | None): Look-ahead of the predictions in seconds, None for next-observation predictions.
+        overall (RunningError): Errors of all predictions.
+        per_class (dict): Class name -> RunningError.
+        per_track (dict): State key (see identityTracking.state_keys) -> RunningError of the tracks not forgotten.
+        expired (int): Predictions dropped because their object was not seen again.
+
+    Methods:
+        update(key, group, timestamp, position, predicted): Observation and new prediction of one object.
+        forget(key): Drops the pending predictions of a track that ended.
+        summary(): Current metrics as a dict.
+        dump(path): Writes summary() as JSON.
+    """
+
+    def __init__(self, horizon_s=None):
+        """
+        Args:
+            horizon_s (float | None): Prediction horizon in seconds, None if predictions target the next observation.
+        """
+        self.horizon_s = horizon_s
+        self.overall = RunningError(sketch=True)
+        self.per_class = {}
+        self.per_track = {}
+        self.expired = 0
+        self._pending = {}  # key -> deque of (target time, x, y, class)
+        self._last = {}  # key -> (time, x, y) of the last observation
+        self._lock = threading.Lock()
+
+    def observe(self, key, timestamp, position):
+        """
+        Scores the pending predictions of an object that are due at this observation.
+
+        Args:
+            key: State key of the object.
+            timestamp (float): Time of the observation.
+            position (tuple): Observed (x, y).
+        """
+        with self._lock:
+            self._observe(key, timestamp, position)
+
+    def _observe(self, key, timestamp, position):
+        x, y = float(position[0]), float(position[1])
+        pending = self._pending.get(key)
+        last = self._last.get(key)
+        while pending and (pending[0][0] is None or pending[0][0] <= timestamp):
+            target, px, py, group = pending.popleft()
+            if target is None or last is None or timestamp <= last[0]:
+                ax, ay = x, y
+            else:
+                w = (target - last[0]) / (timestamp - last[0])  # Interpolate between the observations around target
+                w = min(max(w, 0.0), 1.0)
+                ax, ay = last[1] + w * (x - last[1]), last[2] + w * (y - last[2])
+            self._add(key, group, math.hypot(px - ax, py - ay))
+        self._last[key] = (timestamp, x, y)
+
+    def _add(self, key, group, error):
+        self.overall.add(error)
+        if group not in self.per_class:
+            self.per_class[group] = RunningError(sketch=True)
+        self.per_class[group].add(error)
+        if key not in self.per_track:
+            self.per_track[key] = RunningError()
+        self.per_track[key].add(error)
+
+    def predict(self, key, group, timestamp, predicted):
+        """
+        Registers a prediction to be scored when its object is observed at the target time.
+
+        Args:
+            key: State key of the object.
+            group (str): Class name of the object.
+            timestamp (float): Time the prediction was made.
+            predicted (tuple): Predicted (x, y) at timestamp + horizon_s (or at the next observation).
+        """
+        with self._lock:
+            self._predict(key, group, timestamp, predicted)
+
+    def _predict(self, key, group, timestamp, predicted):
+        target = None if self.horizon_s is None else timestamp + self.horizon_s
+        if key not in self._pending:
+            self._pending[key] = deque()
+        self._pending[key].append((target, float(predicted[0]), float(predicted[1]), group))
+
+    def update(self, key, group, timestamp, position, predicted):
+        """observe() followed by predict(), the usual per-detection call of a tracker."""
+        with self._lock:
+            self._observe(key, timestamp, position)
+            self._predict(key, group, timestamp, predicted)
+
+    def forget(self, key):
+        """
+        Drops the pending predictions, last observation and per-track errors of a track that ended, its errors stay
+        in the overall and per-class totals.
+        """
+        with self._lock:
+            self.expired += len(self._pending.pop(key, ()))
+            self._last.pop(key, None)
+            self.per_track.pop(key, None)
+
+    def summary(self, tracks=False):
+        """
+        Returns:
+            dict: overall and per_class error summaries (count, mae, mse, rmse, max, p50, p90, p99), the number of
+                pending and expired predictions and, with tracks=True, per_track summaries.
+        """
+        with self._lock:
+            result = {
+                "horizon_s": self.horizon_s,
+                "overall": self.overall.summary(),
+                "per_class": {str(group): acc.summary() for group, acc in self.per_class.items()},
+                "tracks": len(self.per_track),
+                "pending": sum(len(p) for p in self._pending.values()),
+                "expired": self.expired,
+            }
+            if tracks:
+                result["per_track"] = {str(key): acc.summary() for key, acc in self.per_track.items()}
+            return result
+
+    def dump(self, path, tracks=True):
+        """Writes the summary (with per-track metrics by default) to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.summary(tracks), f, indent=2)
@@ -0,0 +1,126 @@
+# proximityEngine.py
+"""
+Vectorized proximity checks between the detections of a single frame.
+
+The helpers in utilsNeeded (check_proximity / check_nearness) compare one target box against one object box
+at a time. This module evaluates every target/object pair of a frame in a single NumPy pass, so the trackers
+only need to call it once per frame no matter how many people and objects are in view.
+
+Detections are handled as one (N, 7) float array with the columns:
+    [x1, y1, x2, y2, confidence, class_id, track_id]
+where track_id is -1 when no tracker is attached.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from detectionBatch import DetectionBatch
+
+# Column indices of the (N, 7) detection array
+X1, Y1, X2, Y2, CONF, CLS, TRACK_ID = range(7)
+
+ProximityResult = namedtuple("ProximityResult", ["target_idx", "object_idx", "overlap", "near", "gap"])
+ProximityResult.__doc__ = """
+Result of a pairwise proximity pass.
+
+Attributes:
+    target_idx (np.ndarray): (P,) row indices of the target detections in the input array.
+    object_idx (np.ndarray): (O,) row indices of the other detections in the input array.
+    overlap (np.ndarray): (P, O) bool mask, True where the boxes intersect.
+    near (np.ndarray): (P, O) bool mask, True where the boxes do not overlap but an edge gap is within the threshold.
+    gap (np.ndarray): (P, O) smallest positive edge gap in pixels (inf when the boxes overlap on every axis).
+"""
+
+
+def detections_to_array(detections, track_ids=None):
+    """
+    Packs a list of detections [x1, y1, x2, y2, conf, class_id, class_name] into an (N, 7) float array.
+
+    Args:
+        detections (DetectionBatch | list): Detections as returned by run_yolov8_inference.
+        track_ids (list | None): Optional track ID per detection, defaults to the batch's own track IDs or -1.
+
+    Returns:
+        np.ndarray: (N, 7) float32 array laid out as [x1, y1, x2, y2, conf, class_id, track_id].
+    """
+    array = np.full((len(detections), 7), -1, dtype=np.float32)
+    if isinstance(detections, DetectionBatch):
+        array[:, :4] = detections.xyxy
+        array[:, CONF] = detections.conf
+        array[:, CLS] = detections.cls
+        if track_ids is None:
+            track_ids = detections.track_ids
+        if track_ids is not None:
+            array[:, TRACK_ID] = track_ids
+        return array
+    if len(detections):
+        array[:, :6] = [det[:6] for det in detections]
+        if track_ids is not None:
+            array[:, TRACK_ID] = track_ids
+    return array
+
+
+def edge_gaps(target_boxes, object_boxes):
+    """
+    Computes the four signed edge gaps between every target box and every object box.
+
+    A positive gap means the object lies fully on that side of the target, e.g. the "left" gap is
+    x1_target - x2_object and is positive when the object is completely left of the target.
+
+    Args:
+        target_boxes (np.ndarray): (P, >=4) array of [x1, y1, x2, y2, ...].
+        object_boxes (np.ndarray): (O, >=4) array of [x1, y1, x2, y2, ...].
+
+    Returns:
+        np.ndarray: (4, P, O) gaps ordered left, right, top, bottom.
+    """
+    t = target_boxes[:, None, :4]
+    o = object_boxes[None, :, :4]
+    return np.stack((
+        t[..., 0] - o[..., 2],  # object left of target
+        o[..., 0] - t[..., 2],  # object right of target
+        t[..., 1] - o[..., 3],  # object above target
+        o[..., 1] - t[..., 3],  # object below target
+    ))
+
+
+def pairwise_proximity(boxes, target_mask, proximity_threshold):
+    """
+    Evaluates overlap and nearness for all target/object pairs of a frame in one vectorized pass.
+
+    The semantics match utilsNeeded.check_proximity (strict box intersection) and utilsNeeded.check_nearness
+    (the object lies beyond one of the target's edges by at most proximity_threshold pixels).
+
+    Args:
+        boxes (np.ndarray): (N, >=4) detection array, typically the (N, 7) array from detections_to_array.
+        target_mask (np.ndarray): (N,) bool mask selecting the target rows (e.g. all persons).
+        proximity_threshold (float): Maximum edge gap in pixels for two boxes to count as near.
+
+    Returns:
+        ProximityResult: Index arrays of the targets and objects plus the (P, O) overlap/near/gap matrices.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    target_mask = np.asarray(target_mask, dtype=bool)
+    target_idx = np.flatnonzero(target_mask)
+    object_idx = np.flatnonzero(~target_mask)
+
+    gaps = edge_gaps(boxes[target_idx], boxes[object_idx])
+    overlap = (gaps < 0).all(axis=0)
+    near = ((gaps > 0) & (gaps <= proximity_threshold)).any(axis=0)
+    gap = np.where(gaps > 0, gaps, np.inf).min(axis=0)
+    return ProximityResult(target_idx, object_idx, overlap, near, gap)
+
+
+def hazard_pairs(result):
+    """
+    Lists the (target_row, object_row) pairs that overlap or are near each other.
+
+    Args:
+        result (ProximityResult): Output of pairwise_proximity.
+
+    Returns:
+        np.ndarray: (K, 2) array of row indices into the original detection array.
+    """
+    t, o = np.nonzero(result.overlap | result.near)
+    return np.stack((result.target_idx[t], result.object_idx[o]), axis=1)
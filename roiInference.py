@@ -0,0 +1,255 @@
+# roiInference.py
+"""
+Region-of-interest inference around the hazard zones.
+
+The trackers send every full frame to model.predict, although alerts only matter near the robotic arm area
+(any_area) or the hazard zones plus a margin. On a 1920x1080 camera with a 300x300 arm area most of the inference
+pixels are wasted. RoiInference instead:
+
+    - crops one padded window per zone (overlapping windows are merged into their bounding rectangle),
+    - pads the smaller crops to the size of the largest window (bottom / right, with the letterbox gray of
+      ultralytics) and runs all of them in one batched model.predict call at an image size that fits that window,
+      so no crop is upscaled; only windows larger than max_imgsz are scaled down,
+    - shifts the boxes back to frame coordinates,
+    - runs a low-resolution pass over the full frame every full_frame_every frames, so objects entering the scene
+      far from the zones are still seen, and removes the duplicates of crops and full-frame pass with a per-class NMS.
+      The full-pass detections centered outside every window are held for the next hold_frames frames. A held box
+      does not move, so it is dropped early when more objects of its class appear in the windows than at the full
+      pass (it has most likely entered a window and would be duplicated), and it is never replayed for long.
+
+An instance is called like run_yolov8_inference(model, frame) and returns the same DetectionBatch, so it can be
+passed wherever an inference function is expected (TrackerPipeline, detectionRecording.recording_inference) or
+enabled in the thesis trackers with roi_margin.
+"""
+
+import logging
+import math
+
+import numpy as np
+
+from detectionBatch import DetectionBatch
+from hazardZones import zone_bounds
+
+
+def _region_bounds(region, margin):
+    """Returns the padded (x1, y1, x2, y2) of an any_area rectangle or a HazardZone (padded by its threshold too)."""
+    if hasattr(region, "polygon"):
+        (x1, y1), (x2, y2) = zone_bounds(region)
+        margin += region.proximity_threshold or 0  # None: the zone uses the tracker's threshold
+    else:
+        (x1, y1), (x2, y2) = region
+    return x1 - margin, y1 - margin, x2 + margin, y2 + margin
+
+
+def roi_windows(regions, frame_shape, margin=100):
+    """
+    Computes the crop windows of the hazard regions.
+
+    Args:
+        regions (list): any_area rectangles ((x1, y1), (x2, y2)) and / or hazardZones.HazardZone polygons.
+        frame_shape (tuple): (height, width) of the frames.
+        margin (float): Padding around every region in pixels.
+
+    Returns:
+        np.ndarray: (W, 4) int windows [x1, y1, x2, y2] clipped to the frame, overlapping windows merged.
+    """
+    height, width = frame_shape[:2]
+    windows = []
+    for region in regions:
+        x1, y1, x2, y2 = _region_bounds(region, margin)
+        windows.append([max(int(x1), 0), max(int(y1), 0), min(int(math.ceil(x2)), width),
+                        min(int(math.ceil(y2)), height)])
+    merged = True
+    while merged:  # Merge until no two windows overlap, a crop of the union is cheaper than two overlapping crops
+        merged = False
+        for i in range(len(windows)):
+            for j in range(i + 1, len(windows)):
+                a, b = windows[i], windows[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    windows[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del windows[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    windows = [w for w in windows if w[2] > w[0] and w[3] > w[1]]
+    return np.array(windows, int).reshape(-1, 4)
+
+
+def class_nms(data, iou_threshold=0.5):
+    """
+    Greedy per-class non-maximum suppression of merged detections.
+
+    Args:
+        data (np.ndarray): (N, >=6) detections [x1, y1, x2, y2, conf, cls, ...], further columns are kept.
+        iou_threshold (float): Boxes of the same class overlapping a better one by more than this are dropped.
+
+    Returns:
+        np.ndarray: The kept rows, by descending confidence.
+    """
+    data = data[np.argsort(-data[:, 4], kind="stable")]
+    boxes = data[:, :4]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    suppressed = np.zeros(len(data), bool)
+    for i in range(len(data)):
+        if suppressed[i]:
+            continue
+        rest = np.arange(i + 1, len(data))
+        rest = rest[~suppressed[rest] & (data[rest, 5] == data[i, 5])]
+        if not len(rest):
+            continue
+        w = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = w * h
+        suppressed[rest[inter / (areas[i] + areas[rest] - inter + 1e-9) > iou_threshold]] = True
+    return data[~suppressed]
+
+
+class RoiInference:
+    """
+    Inference function that only looks at padded windows around the hazard regions.
+
+    Attributes:
+        regions (list): any_area rectangles and / or HazardZone polygons.
+        margin (float): Padding around every region in pixels.
+        full_frame_every (int): Every how many frames the full frame is checked at low resolution, 0 never.
+        full_frame_imgsz (int): Image size of the full-frame pass.
+        windows (np.ndarray | None): (W, 4) crop windows, computed on the first frame.
+        canvas (tuple | None): (height, width) every crop is padded to, that of the largest window.
+        imgsz (int | None): Image size of the batched crop inference.
+        hold_frames (int): Frames after a full pass its detections outside the windows are still returned.
+        held (np.ndarray): (H, 6) full-pass detections outside the windows, returned for up to hold_frames frames.
+        pixels (int): Inference pixels processed so far (crop and full-frame passes at their image sizes).
+        frame_pixels (int): Pixels of the full frames, i.e. of a full-frame inference at the resolution of the crops.
+
+    Methods:
+        __call__(model, frame): Returns the DetectionBatch of the frame in frame coordinates.
+    """
+
+    def __init__(self, regions, margin=100, full_frame_every=15, full_frame_imgsz=320, iou_threshold=0.5,
+                 max_imgsz=640, classes=None, hold_frames=2):
+        """
+        Args:
+            regions (list): any_area rectangles ((x1, y1), (x2, y2)) and / or hazardZones.HazardZone polygons.
+            margin (float): Padding around every region in pixels, objects within it are detected.
+            full_frame_every (int): Run a low-resolution full-frame pass every this many frames, 0 never.
+            full_frame_imgsz (int): Image size of the full-frame pass.
+            iou_threshold (float): IoU above which duplicate boxes of crops and full-frame pass are merged.
+            max_imgsz (int): Largest image size of the crop inference (the model's training size).
+            classes (list | None): Class IDs passed to model.predict, None detects all classes.
+            hold_frames (int): Return the full-pass detections outside the windows on this many following frames,
+                0 only on the full-pass frame itself.
+        """
+        self.regions = list(regions)
+        self.margin = margin
+        self.full_frame_every = full_frame_every
+        self.full_frame_imgsz = full_frame_imgsz
+        self.iou_threshold = iou_threshold
+        self.max_imgsz = max_imgsz
+        self.classes = classes
+        self.windows = None
+        self.canvas = None
+        self.imgsz = None
+        self.hold_frames = hold_frames
+        self.held = np.zeros((0, 6), np.float32)
+        self._held_age = 0
+        self._held_counts = {}  # Class ID -> crop detections of the class on the full-pass frame
+        self.frames = 0
+        self.pixels = 0
+        self.frame_pixels = 0
+
+    def _setup(self, frame_shape):
+        self.windows = roi_windows(self.regions, frame_shape, self.margin)
+        heights, widths = self.windows[:, 3] - self.windows[:, 1], self.windows[:, 2] - self.windows[:, 0]
+        self.canvas = (int(heights.max(initial=0)), int(widths.max(initial=0)))
+        largest = max(self.canvas) or self.max_imgsz
+        self.imgsz = min(self.max_imgsz, int(math.ceil(largest / 32)) * 32)  # Multiple of the model stride
+        logging.info(f"ROI inference on {len(self.windows)} windows {self.windows.tolist()} at imgsz {self.imgsz}")
+
+    def __call__(self, model, frame):
+        if self.windows is None:
+            self._setup(frame.shape)
+        # Rows carry a 7th column, 1 for the full-pass detections, so they can be told apart after the NMS
+        parts = []
+        crops = [_pad(frame[y1:y2, x1:x2], self.canvas) for x1, y1, x2, y2 in self.windows]
+        if crops:
+            # One batched call for all windows
+            results = model.predict(crops, imgsz=self.imgsz, classes=self.classes, verbose=False)
+            for (x1, y1, x2, y2), result in zip(self.windows, results):
+                data = _to_numpy(result.boxes.data)[:, [0, 1, 2, 3, -2, -1, -1]]
+                data[:, 6] = 0
+                data[:, [0, 2]] = np.clip(data[:, [0, 2]], 0, x2 - x1) + x1  # Boxes reaching into the padding
+                data[:, [1, 3]] = np.clip(data[:, [1, 3]], 0, y2 - y1) + y1
+                parts.append(data)
+            self.pixels += len(crops) * self.imgsz ** 2
+        full_pass = self.full_frame_every and self.frames % self.full_frame_every == 0
+        if full_pass:
+            result = model.predict(frame, imgsz=self.full_frame_imgsz, classes=self.classes, verbose=False)[0]
+            data = _to_numpy(result.boxes.data)[:, [0, 1, 2, 3, -2, -1, -1]]  # Already in frame coordinates
+            data[:, 6] = 1
+            parts.append(data)
+            self.pixels += self.full_frame_imgsz ** 2
+        elif len(self.held):
+            self._held_age += 1
+            self._release_held(parts)
+            if len(self.held):
+                parts.append(np.column_stack((self.held, np.ones(len(self.held), np.float32))))
+        self.frames += 1
+        self.frame_pixels += frame.shape[0] * frame.shape[1]
+        data = np.concatenate(parts) if parts else np.zeros((0, 7), np.float32)
+        if len(parts) > 1:
+            data = class_nms(data, self.iou_threshold)
+        if full_pass:
+            # The crops detect the objects in the windows on every frame, only the others are held
+            kept = data[data[:, 6] == 1, :6]
+            self.held = kept[~_inside_windows((kept[:, :2] + kept[:, 2:4]) / 2, self.windows)]
+            self._held_age = 0
+            self._held_counts = _class_counts(parts[:-1])
+        return DetectionBatch(data[:, :6], model.model.names)
+
+    def _release_held(self, crop_parts):
+        """
+        Drops the held boxes that are too old, and those of the classes the crops now detect more often than on the
+        full-pass frame: a held object of such a class has probably entered a window, where the crop box would be
+        kept next to the stale held one.
+        """
+        if self._held_age > self.hold_frames:
+            self.held = self.held[:0]
+            return
+        counts = _class_counts(crop_parts)
+        entered = [cls for cls, n in counts.items() if n > self._held_counts.get(cls, 0)]
+        self.held = self.held[~np.isin(self.held[:, 5], entered)]
+
+    @property
+    def pixel_ratio(self):
+        """Inference pixels relative to full-frame inference at the same detail, e.g. 0.2 for a five times smaller workload."""
+        return self.pixels / self.frame_pixels if self.frame_pixels else float("nan")
+
+
+def _pad(crop, canvas):
+    """Pads a crop at the bottom and right to the (height, width) canvas with the letterbox gray of ultralytics."""
+    height, width = canvas
+    if crop.shape[:2] == (height, width):
+        return crop
+    padded = np.full((height, width) + crop.shape[2:], 114, crop.dtype)
+    padded[:crop.shape[0], :crop.shape[1]] = crop
+    return padded
+
+
+def _class_counts(parts):
+    """Class ID -> number of rows of the (N, 7) detection arrays."""
+    classes, counts = np.unique(np.concatenate([p[:, 5] for p in parts]) if parts else np.zeros(0), return_counts=True)
+    return dict(zip(classes.tolist(), counts.tolist()))
+
+
+def _inside_windows(points, windows):
+    """(N,) mask of the (N, 2) points lying inside any of the (W, 4) windows."""
+    x, y = points[:, None, 0], points[:, None, 1]
+    return ((x >= windows[:, 0]) & (x < windows[:, 2]) & (y >= windows[:, 1]) & (y < windows[:, 3])).any(axis=1)
+
+
+def _to_numpy(data):
+    """Boxes.data as a float32 NumPy array (a copy, the boxes are shifted in place)."""
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.array(data, np.float32)
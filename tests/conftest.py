@@ -1,9 +1,11 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
 import shutil
+import sys
 from pathlib import Path
 
 TMP = Path(__file__).resolve().parent / "tmp"  # temp directory for test files
+sys.path.insert(0, str(TMP.parents[1]))  # the tracker modules (proximityEngine, kalmanSetUp, ...) live in the repo root
 
 
 def pytest_addoption(parser):
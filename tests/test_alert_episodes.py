@@ -0,0 +1,69 @@
+# test_alert_episodes.py
+"""Per-pair alert episodes with enter/exit hysteresis (alertEpisodes)."""
+
+import pytest
+
+from alertEpisodes import AlertEpisodes, gate_hazards
+
+
+def test_episode_enter_hysteresis():
+    """An episode starts only after enter_frames consecutive entering frames, shorter streaks are dropped."""
+    episodes = AlertEpisodes(enter_frames=3, exit_s=0.5)
+    frames = [(0.0, True), (0.1, True), (0.2, False), (0.3, True), (0.4, True), (0.5, True), (0.6, True)]
+    started_at = []
+    for t, entering in frames:
+        started, _ = episodes.update(t, ["pair"] if entering else [])
+        started_at += [(t, episode) for episode in started]
+    assert len(started_at) == 1
+    t, episode = started_at[0]
+    assert t == 0.5 and episode.start == 0.5
+    assert episode.first_seen == 0.3  # The glitch at 0.0-0.1 was dropped when the key went missing
+    assert episode.response_time == pytest.approx(0.2)
+    assert episodes.episodes == 1 and episodes.active == ["pair"]
+
+
+def test_episode_exit_hysteresis():
+    """Dropouts up to exit_s hold the episode, a longer gap ends it at the last observation."""
+    episodes = AlertEpisodes(exit_s=0.5)
+    assert len(episodes.update(0.0, ["pair"])[0]) == 1
+    for t in (0.1, 0.2, 0.3, 0.4, 0.5):  # Missing for 0.5 s, within exit_s
+        started, ended = episodes.update(t, [])
+        assert not started and not ended
+    started, ended = episodes.update(0.6, ["pair"])
+    assert not started and not ended  # Still the same episode
+    _, ended = episodes.update(1.2, [])
+    assert [(e.key, e.start, e.end, e.frames) for e in ended] == [("pair", 0.0, 0.6, 2)]
+    assert episodes.active == [] and episodes.finished == 1
+
+
+def test_episode_holding_observations_do_not_start():
+    """Observations that only meet the hold condition keep an open episode but never start one."""
+    episodes = AlertEpisodes(exit_s=0.2)
+    started, _ = episodes.update(0.0, ["a", "b"], entering=[True, False])
+    assert [e.key for e in started] == ["a"]
+    for t in (0.1, 0.2, 0.3, 0.4):
+        started, ended = episodes.update(t, ["a", "b"], entering=[False, False])
+        assert not started and not ended
+    assert episodes.active == ["a"]
+
+
+def test_episode_contact_lead_time_and_summary():
+    """The lead time is the time from the alert to the first contact observation."""
+    episodes = AlertEpisodes(exit_s=0.1)
+    episodes.update(1.0, ["pair"], severities=[1])
+    episodes.update(1.3, ["pair"], severities=[2], contact=[True])
+    ended = episodes.close()
+    assert ended[0].contact == 1.3 and ended[0].lead_time == pytest.approx(0.3) and ended[0].peak_severity == 2
+    summary = episodes.summary()
+    assert summary["mean_lead_s"] == pytest.approx(0.3)
+    assert summary["contacts_before_alert"] == 0
+
+
+def test_gate_hazards_alerts_once_per_episode():
+    """Only the frame in which a (object, area) episode starts raises an alert, the hazards are left unchanged."""
+    episodes = AlertEpisodes(exit_s=0.5)
+    area = ((0, 0), (10, 10))
+    hazards = [("Nearness", area), (None, None)]
+    assert gate_hazards(episodes, 0.0, [1, 2], hazards) == [True, False]
+    assert gate_hazards(episodes, 0.1, [1, 2], hazards) == [False, False]
+    assert hazards == [("Nearness", area), (None, None)]
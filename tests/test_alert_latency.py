@@ -0,0 +1,53 @@
+# test_alert_latency.py
+"""Response times of the root trackers' run() loops include the detector."""
+
+import csv
+import time
+
+import numpy as np
+import pytest
+
+from bufferedLogging import close_shared_writers
+from detectionBatch import DetectionBatch
+from detectionRecording import build_replay_tracker
+
+NAMES = {0: "person", 41: "cup"}
+DETECTOR_S = 0.05
+
+
+class FakeCapture:
+    """Video source of a few black frames."""
+
+    def __init__(self, frames=3):
+        self.frames = frames
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        self.frames -= 1
+        return True, np.zeros((480, 640, 3), np.uint8)
+
+    def release(self):
+        pass
+
+
+def slow_inference(model, frame):
+    """A detector taking DETECTOR_S that sees a person holding a cup."""
+    time.sleep(DETECTOR_S)
+    return DetectionBatch.from_list([[100, 100, 200, 300, 0.9, 0, "person"], [180, 150, 220, 190, 0.9, 41, "cup"]],
+                                    NAMES)
+
+
+@pytest.mark.parametrize("name", ["kalman", "dead_reckoning"])
+def test_run_response_time_includes_detector(tmp_path, name):
+    """The hazard time is taken at capture, so the logged response time covers the detector call."""
+    alerts = tmp_path / "alerts.csv"
+    tracker = build_replay_tracker(name, proximity_threshold=20, target="person",
+                                   file_name_predict=str(tmp_path / "predictions.csv"), file_name_alert=str(alerts))
+    tracker.cap, tracker.inference = FakeCapture(), slow_inference
+    tracker.run()
+    close_shared_writers()  # The alert rows go through a shared writer flushed at exit
+    with open(alerts) as f:
+        rows = list(csv.DictReader(f))
+    assert rows
+    assert all(float(row["Response Time"]) >= DETECTOR_S for row in rows)
@@ -0,0 +1,63 @@
+# test_buffered_logging.py
+"""BufferedRowWriter output formats (bufferedLogging)."""
+
+import csv
+
+import numpy as np
+import pytest
+
+from bufferedLogging import BufferedRowWriter, read_ring
+
+HEADER = ["timestamp", "x", "class_name"]
+
+
+def test_csv_rows_and_append(tmp_path):
+    """Rows are written in order and appending to a file keeps its single header."""
+    path = str(tmp_path / "log.csv")
+    writer = BufferedRowWriter(path, HEADER, max_rows=3)
+    writer.writerows([[i, i * 2, "person"] for i in range(10)])
+    writer.close()
+    writer = BufferedRowWriter(path, HEADER, append=True)
+    writer.writerow([10, 20, "cup"])
+    writer.close()
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == HEADER
+    assert [int(row[0]) for row in rows[1:]] == list(range(11))
+
+
+def test_ring_keeps_newest_rows(tmp_path):
+    """A ring file keeps the newest capacity rows in order, strings as category codes."""
+    path = str(tmp_path / "log.ring")
+    writer = BufferedRowWriter(path, HEADER, ring_capacity=5, max_rows=2)
+    for i in range(12):
+        writer.writerow([i, i * 2, "cup" if i % 2 else "person"])
+        if i % 3 == 0:
+            writer.flush()
+    writer.close()
+    rows, columns, categories = read_ring(path)
+    assert columns == HEADER
+    np.testing.assert_array_equal(rows[:, 0], np.arange(7, 12))
+    codes = categories["class_name"]
+    assert [code for code in rows[:, 2]] == [codes["cup" if i % 2 else "person"] for i in range(7, 12)]
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_arrow_schema_is_fixed(tmp_path, suffix):
+    """Columns that start out as None or change type in a later batch keep all their rows."""
+    pa = pytest.importorskip("pyarrow")
+    path = str(tmp_path / f"log{suffix}")
+    writer = BufferedRowWriter(path, ["a", "b", "c"], types={"b": "float64"})
+    writer.writerow([1, None, "x"])
+    writer.flush()
+    writer.writerows([[2.5, 3, 4], ["text", 0.5, None]])
+    writer.close()
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+    else:
+        table = pa.ipc.open_stream(path).read_all()
+    assert table.column("b").to_pylist() == [None, 3.0, 0.5]
+    assert table.column("c").to_pylist() == ["x", "4", None]
+    assert table.column("a").to_pylist() == [1.0, 2.5, None]  # 'text' is not a number
@@ -0,0 +1,37 @@
+# test_detection_batch.py
+"""DetectionBatch views and their conversions to the legacy detection lists (detectionBatch)."""
+
+import numpy as np
+import pytest
+
+from detectionBatch import DetectionBatch, as_boxes, class_names
+
+NAMES = {0: "person", 41: "cup", 43: "knife"}
+
+
+def test_detection_batch_legacy_round_trip():
+    """A batch built from legacy lists gives the same lists back through tolist, iteration and indexing."""
+    detections = [[10, 20, 30, 40, 0.5, 0, "person"], [50, 60, 70, 80, 0.75, 41, "cup"]]
+    batch = DetectionBatch.from_list(detections)
+    assert batch.tolist() == detections
+    assert list(batch) == detections
+    assert batch[1] == detections[1]
+    assert len(batch[np.array([True, False])]) == 1
+    np.testing.assert_array_equal(batch.centers, [[20, 30], [60, 70]])
+    np.testing.assert_array_equal(batch.class_names, ["person", "cup"])
+    np.testing.assert_array_equal(as_boxes(batch), as_boxes(detections))
+    assert list(class_names(detections)) == ["person", "cup"]
+
+
+def test_detection_batch_tracked_layout():
+    """Tracked batches read the track ID from column 4 and conf/cls from the last two columns."""
+    batch = DetectionBatch(np.array([[0, 0, 10, 10, 7, 0.8, 41]], np.float32), NAMES)
+    assert batch.is_track
+    assert batch.track_ids.tolist() == [7]
+    assert batch.tolist() == [[0, 0, 10, 10, pytest.approx(0.8), 41, "cup"]]
+
+
+def test_detection_batch_unknown_class():
+    """A class ID missing from the names is named by its number, by indexing and by tolist alike."""
+    batch = DetectionBatch(np.array([[0, 0, 10, 10, 0.5, 99]], np.float32), NAMES)
+    assert batch[0][6] == batch.tolist()[0][6] == "99"
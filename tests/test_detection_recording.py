@@ -0,0 +1,163 @@
+# test_detection_recording.py
+"""The record/replay round-trip of detectionRecording."""
+
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from alertDispatcher import NullSink
+from alertEpisodes import AlertEpisodes
+from detectionBatch import DetectionBatch
+from detectionRecording import DetectionRecorder, DetectionRecording, build_replay_tracker, replay
+from parameterSweep import DEFAULT_KWARGS
+
+NAMES = {0: "person", 41: "cup", 43: "knife"}
+
+
+def synthetic_frames(frames=20, seed=0):
+    """(timestamp, legacy detection list) per frame, a person walking towards a cup, some frames empty."""
+    rng = np.random.default_rng(seed)
+    result = []
+    for i in range(frames):
+        detections = [] if i % 7 == 6 else [
+            [100 + 10 * i, 200, 160 + 10 * i, 400, 0.9, 0, "person"],
+            [400, 300, 440, 340, float(rng.uniform(0.5, 1)), 41, "cup"],
+        ]
+        result.append((1700000000.0 + i / 30, detections))
+    return result
+
+
+def test_recording_round_trip(tmp_path):
+    """Recorded detections, timestamps and metadata come back unchanged from the memory-mapped recording."""
+    frames = synthetic_frames()
+    path = str(tmp_path / "rec")
+    with DetectionRecorder(path, names=NAMES, fps=30, frame_shape=(480, 640, 3), source="test") as recorder:
+        for i, (timestamp, detections) in enumerate(frames):
+            # Alternate between legacy lists and batches, both are accepted
+            recorder.record(detections if i % 2 else DetectionBatch.from_list(detections, NAMES), timestamp)
+    recording = DetectionRecording(path)
+    assert len(recording) == len(frames)
+    assert recording.names == NAMES and recording.fps == 30 and recording.frame_shape == (480, 640)
+    assert recording.duration == pytest.approx(frames[-1][0] - frames[0][0])
+    for (timestamp, detections), (replayed_time, batch) in zip(frames, recording):
+        assert replayed_time == timestamp
+        assert isinstance(batch, DetectionBatch)
+        assert batch.tolist() == [[*det[:4], pytest.approx(det[4]), *det[5:]] for det in detections]
+
+
+def test_recording_empty(tmp_path):
+    """A recording without frames opens and replays nothing."""
+    path = str(tmp_path / "empty")
+    DetectionRecorder(path, names=NAMES).close()
+    recording = DetectionRecording(path)
+    assert len(recording) == 0 and recording.duration == 0.0
+
+
+class RecordingTracker:
+    """Minimal tracker collecting what replay() feeds it."""
+
+    def __init__(self):
+        self.fps = 0
+        self.frame_shape = None
+        self.start_time = None
+        self.calls = []
+
+    def process_detections(self, detections, frame, timestamp=None, draw=True):
+        self.calls.append((timestamp, detections.tolist(), frame, draw))
+
+
+def test_replay_feeds_tracker(tmp_path):
+    """replay() passes every frame with its timestamp, and rebases the tracker clock on the recording."""
+    frames = synthetic_frames()
+    path = str(tmp_path / "rec")
+    with DetectionRecorder(path, names=NAMES, fps=30, frame_shape=(480, 640)) as recorder:
+        for timestamp, detections in frames:
+            recorder.record(detections, timestamp)
+    tracker = RecordingTracker()
+    assert replay(path, tracker, start=2, stop=10) == 8
+    assert tracker.fps == 30 and tracker.frame_shape == (480, 640)
+    assert tracker.start_time == frames[2][0]
+    assert [call[0] for call in tracker.calls] == [timestamp for timestamp, _ in frames[2:10]]
+    assert all(frame is None and not draw for _, _, frame, draw in tracker.calls)
+
+
+@pytest.mark.parametrize("name, elapsed", [("kalman", True), ("dead_reckoning", False)])
+def test_replay_into_root_trackers(tmp_path, name, elapsed):
+    """
+    The camera-less root trackers process a replayed recording. ObjectTracker_Kalman logs the time since the
+    recording start, DeadReckoningTracker the recorded capture time.
+    """
+    frames = synthetic_frames()
+    path = str(tmp_path / "rec")
+    with DetectionRecorder(path, names=NAMES, fps=30, frame_shape=(480, 640)) as recorder:
+        for timestamp, detections in frames:
+            recorder.record(detections, timestamp)
+    tracker = build_replay_tracker(name, proximity_threshold=20, target="person",
+                                   file_name_predict=str(tmp_path / "predictions.csv"),
+                                   file_name_alert=str(tmp_path / "alerts.csv"))
+    try:
+        assert replay(path, tracker) == len(frames)
+    finally:
+        tracker.close()
+    rows = (tmp_path / "predictions.csv").read_text().splitlines()
+    assert len(rows) > 1
+    first_time = float(rows[1].split(",")[0])
+    if elapsed:
+        assert 0 <= first_time < 10  # Not a wall-clock time
+    else:
+        assert first_time == pytest.approx(frames[0][0])
+
+
+@pytest.mark.parametrize("name", ["kalman", "dead_reckoning", "thesis_kalman", "thesis_dead_reckoning"])
+def test_replay_trackers_are_silent(tmp_path, monkeypatch, name):
+    """Replay trackers dispatch their alerts to a NullSink, the replay would otherwise beep at every alert."""
+    monkeypatch.chdir(tmp_path)  # The thesis trackers also write fixed file names into the working directory
+    tracker = build_replay_tracker(name, file_name_predict=str(tmp_path / "predictions.csv"),
+                                   file_name_alert=str(tmp_path / "alerts.csv"), **DEFAULT_KWARGS[name])
+    try:
+        assert [type(sink) for sink in tracker.alert_dispatcher.sinks] == [NullSink]
+    finally:
+        tracker.close()
+
+
+@pytest.mark.parametrize("name", ["thesis_kalman", "thesis_dead_reckoning"])
+def test_thesis_replay_close_writes_summaries(tmp_path, monkeypatch, name):
+    """Closing a replayed thesis tracker ends its alert episodes and writes the metrics file, as run() does."""
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "rec")
+    with DetectionRecorder(path, names=NAMES, fps=30, frame_shape=(480, 640)) as recorder:
+        for timestamp, detections in synthetic_frames():
+            recorder.record(detections, timestamp)
+    episodes = AlertEpisodes()
+    tracker = build_replay_tracker(name, file_name_predict=str(tmp_path / "predictions.csv"),
+                                   file_name_alert=str(tmp_path / "alerts.csv"),
+                                   metrics_file=str(tmp_path / "metrics.json"), episodes=episodes,
+                                   **DEFAULT_KWARGS[name])
+    replay(path, tracker)
+    tracker.close()
+    assert json.loads((tmp_path / "metrics.json").read_text())["overall"]["count"] > 0
+    assert episodes.active == []
+
+
+@pytest.mark.parametrize("name", ["thesis_kalman", "thesis_dead_reckoning"])
+def test_thesis_open_episode_keeps_hazard_drawn(tmp_path, monkeypatch, name):
+    """A person staying in the arm area alerts once per episode but is drawn as a hazard in every frame."""
+    monkeypatch.chdir(tmp_path)
+    tracker = build_replay_tracker(name, file_name_predict=str(tmp_path / "predictions.csv"),
+                                   file_name_alert=str(tmp_path / "alerts.csv"), episodes=AlertEpisodes(),
+                                   **DEFAULT_KWARGS[name])
+    helper = sys.modules[type(tracker).__module__].utilitiesHelper
+    drawn, alerts = [], []
+    monkeypatch.setattr(helper, "draw_detections",
+                        lambda frame, detections, centers, futures, conditions=None: drawn.append(conditions))
+    monkeypatch.setattr(tracker.alert_dispatcher, "dispatch", lambda **kwargs: alerts.append(kwargs))
+    frame = np.zeros((480, 640, 3), np.uint8)
+    try:
+        for i in range(4):
+            tracker.process_detection([[200, 200, 400, 400, 0.9, 0, "person"]], frame, timestamp=1700000000.0 + i / 30)
+    finally:
+        tracker.close()
+    assert len(drawn) == 4 and all(conditions[0] is not None for conditions in drawn)
+    assert len(alerts) == 1
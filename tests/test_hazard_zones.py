@@ -0,0 +1,96 @@
+# test_hazard_zones.py
+"""Hazard zone lookups (hazardZones) on the rasterised zone map."""
+
+import numpy as np
+import pytest
+
+from detectionBatch import DetectionBatch
+from hazardZones import HazardZone, ZoneMap, rectangle_zone
+
+ZONE = ((200, 100), (400, 300))  # any_area rectangle of the thesis trackers
+
+
+def test_zone_membership_rectangle():
+    """touching, contained and excluded follow the pixel extent of a rectangular zone."""
+    zones = ZoneMap([rectangle_zone(ZONE, proximity_threshold=20)], (480, 640), cell_size=1)
+    boxes = np.array([
+        [250, 150, 300, 200],  # inside
+        [150, 150, 250, 200],  # across the left edge
+        [100, 150, 199, 200],  # one pixel left of the zone
+        [400, 300, 450, 350],  # shares the bottom-right corner pixel
+        [500, 400, 600, 470],  # far away
+    ], np.float32)
+    np.testing.assert_array_equal(zones.touching(boxes)[0], [True, True, False, True, False])
+    np.testing.assert_array_equal(zones.contained(boxes)[0], [True, False, False, False, False])
+    np.testing.assert_array_equal(zones.excluded(boxes), [True, False, False, False, False])
+
+
+@pytest.mark.parametrize("gap, expected", [(1, True), (10, True), (19, True), (25, False), (60, False)])
+def test_zone_near_band(gap, expected):
+    """A box is near when it stays outside the zone and its edge gap is within the proximity threshold."""
+    zones = ZoneMap([rectangle_zone(ZONE, proximity_threshold=20)], (480, 640), cell_size=1)
+    x2 = ZONE[0][0] - gap
+    left = np.array([[x2 - 40, 150, x2, 200]], np.float32)
+    y1 = ZONE[1][1] + gap
+    below = np.array([[250, y1, 300, y1 + 40]], np.float32)
+    assert zones.near(left)[0, 0] == expected
+    assert zones.near(below)[0, 0] == expected
+    assert not zones.touching(left)[0, 0] and not zones.touching(below)[0, 0]
+
+
+def test_zone_polygon_membership():
+    """Boxes are tested against the polygon itself, not its bounding rectangle."""
+    triangle = HazardZone("arm", [(100, 100), (300, 100), (100, 300)], 0, 1)
+    zones = ZoneMap([triangle], (480, 640), cell_size=1)
+    boxes = np.array([[110, 110, 130, 130],  # inside near the right angle
+                      [260, 260, 290, 290]],  # inside the bounding rectangle, outside the triangle
+                     np.float32)
+    np.testing.assert_array_equal(zones.touching(boxes)[0], [True, False])
+
+
+def test_zone_assess_severity_and_classes():
+    """The most severe alerting zone wins and zones only alert on their classes."""
+    zones = ZoneMap([HazardZone("lane", [(0, 0), (320, 0), (320, 480), (0, 480)], 0, 1, False, ("person", "cup")),
+                     HazardZone("arm", [(100, 100), (300, 100), (300, 300), (100, 300)], 30, 3, False, ("person",))],
+                    (480, 640), cell_size=1)
+    detections = DetectionBatch.from_list([[150, 150, 200, 200, 0.9, 0, "person"],  # in the lane and the arm
+                                           [150, 150, 200, 200, 0.9, 1, "cup"],  # the arm ignores cups
+                                           [20, 20, 50, 50, 0.9, 0, "person"],  # lane only
+                                           [500, 20, 550, 50, 0.9, 0, "person"]])  # nowhere
+    assessment = zones.assess(detections)
+    np.testing.assert_array_equal(assessment.zone, [1, 0, 0, -1])
+    np.testing.assert_array_equal(assessment.severity, [3, 1, 1, -1])
+    assert assessment.condition == ["center", "center", "center", None]
+
+
+def test_zone_trajectory_ttc():
+    """The time to collision is the first trajectory offset at which the moved box touches the zone."""
+    zones = ZoneMap([rectangle_zone(ZONE)], (480, 640), cell_size=1)
+    boxes = np.array([[0, 180, 40, 220], [250, 150, 300, 200]], np.float32)
+    offsets = np.array([0.1, 0.2, 0.3, 0.4])
+    # The first box moves right by 60 pixels per step, its right edge reaches x=200 at the third step
+    trajectories = np.stack([np.stack([(20 + 60 * (k + 1), 200) for k in range(4)]),
+                             np.stack([(275, 175)] * 4)]).astype(np.float32)
+    ttc = zones.trajectory_ttc(boxes, trajectories, offsets)
+    assert ttc[0, 0] == pytest.approx(0.3)
+    assert ttc[0, 1] == 0
+
+
+def test_zone_coarse_cells_are_conservative():
+    """With larger cells a rectangular zone still catches every box that touches it at full resolution."""
+    rng = np.random.default_rng(3)
+    corners = rng.integers(0, 600, (200, 2))
+    boxes = np.concatenate((corners, corners + rng.integers(2, 80, (200, 2))), axis=1).astype(np.float32)
+    exact = ZoneMap([rectangle_zone(ZONE)], (480, 640), cell_size=1).touching(boxes)
+    for cell_size in (4, 8):
+        coarse = ZoneMap([rectangle_zone(ZONE)], (480, 640), cell_size=cell_size).touching(boxes)
+        assert not (exact & ~coarse).any()
+
+
+def test_zone_default_threshold():
+    """Zones without their own proximity threshold take the one of the tracker."""
+    zones = ZoneMap([rectangle_zone(ZONE), rectangle_zone(ZONE, name="own", proximity_threshold=5)], (480, 640),
+                    default_threshold=30)
+    np.testing.assert_array_equal(zones.thresholds, [30, 5])
+    box = np.array([[130, 150, 180, 200]], np.float32)  # 20 pixels left of the zone
+    np.testing.assert_array_equal(zones.near(box)[:, 0], [True, False])
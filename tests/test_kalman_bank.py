@@ -0,0 +1,147 @@
+# test_kalman_bank.py
+"""KalmanFilterBank and its motion models (motionModels) against per-object cv2.KalmanFilter instances."""
+
+import cv2
+import numpy as np
+import pytest
+
+from kalmanSetUp import KalmanFilterBank
+from motionModels import ConstantAcceleration, ConstantVelocity, InteractingMultipleModel
+
+
+def reference_filter(model, x, y):
+    """
+    cv2.KalmanFilter with the matrices of a bank row of the given model, started at (x, y). It runs in float64, so
+    it is the exact result the float32 bank is compared to.
+    """
+    kf = cv2.KalmanFilter(model.dim, 2, 0, cv2.CV_64F)
+    kf.measurementMatrix = np.eye(2, model.dim)
+    kf.transitionMatrix = model.F.astype(np.float64)
+    kf.processNoiseCov = model.Q.astype(np.float64)
+    kf.measurementNoiseCov = np.eye(2)
+    kf.errorCovPost = model.P0.astype(np.float64)
+    state = np.zeros((model.dim, 1))
+    state[:2, 0] = x, y
+    kf.statePost = state
+    return kf
+
+
+def random_tracks(seed, objects=6, frames=40):
+    """(frames, objects, 2) noisy measurements of objects moving on parabolas."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames, dtype=np.float32)[:, None, None]
+    start = rng.uniform(0, 600, (1, objects, 2))
+    velocity = rng.uniform(-8, 8, (1, objects, 2))
+    acceleration = rng.uniform(-0.5, 0.5, (1, objects, 2))
+    return (start + velocity * t + acceleration * t * t / 2 + rng.normal(0, 1.5, (frames, objects, 2))).astype(
+        np.float32)
+
+
+@pytest.mark.parametrize("model, atol", [("cv", 1e-2), ("ca", 5e-2)])
+def test_bank_matches_cv2_per_frame(model, atol):
+    """
+    Without timestamps every row follows the predict/correct sequence of its own cv2.KalmanFilter. The large initial
+    acceleration variance of 'ca' costs the float32 bank a few hundredths of a pixel, hence its atol.
+    """
+    tracks = random_tracks(0)
+    bank = KalmanFilterBank(capacity=2, model=model)  # Small capacity to exercise the growth of the arrays
+    keys = list(range(tracks.shape[1]))
+    filters = []
+    for key, (x, y) in zip(keys, tracks[0]):
+        bank.add(key, x, y)
+        filters.append(reference_filter(bank.model, x, y))
+    for measurements in tracks[1:]:
+        predictions = bank.predict_correct(keys, measurements)
+        for kf, prediction, measurement in zip(filters, predictions, measurements):
+            np.testing.assert_allclose(prediction, kf.predict()[:2, 0], rtol=1e-4, atol=atol)
+            kf.correct(measurement.reshape(2, 1).astype(np.float64))
+    for kf, state in zip(filters, bank.x[:len(keys)]):
+        np.testing.assert_allclose(state, kf.statePost[:, 0], rtol=1e-4, atol=atol)
+
+
+@pytest.mark.parametrize("model", [None, ConstantVelocity(initial_std=(1, 100)), ConstantAcceleration()])
+def test_bank_matches_cv2_with_timestamps(model):
+    """With timestamps every row is advanced by its own time step, F(dt) and Q(dt) of the model."""
+    tracks = random_tracks(1, objects=3)
+    times = np.cumsum(np.random.default_rng(1).uniform(0.02, 0.06, len(tracks)))
+    bank = KalmanFilterBank() if model is None else KalmanFilterBank(model=model)
+    model = bank.model
+    keys = ["a", "b", "c"]
+    filters = []
+    for key, (x, y) in zip(keys, tracks[0]):
+        bank.add(key, x, y, timestamp=times[0])
+        filters.append(reference_filter(model, x, y))
+    for timestamp, previous, measurements in zip(times[1:], times[:-1], tracks[1:]):
+        predictions = bank.predict_correct(keys, measurements, timestamp=timestamp)
+        dt = np.array([timestamp - previous], np.float32)
+        for kf, prediction, measurement in zip(filters, predictions, measurements):
+            kf.transitionMatrix = model.transition(dt)[0].astype(np.float64)
+            kf.processNoiseCov = model.noise(dt)[0].astype(np.float64)
+            np.testing.assert_allclose(prediction, kf.predict()[:2, 0], rtol=1e-3, atol=5e-2)
+            kf.correct(measurement.reshape(2, 1).astype(np.float64))
+
+
+def test_bank_trajectory_over_horizon():
+    """trajectory() extrapolates every row over the horizon in milliseconds without changing the states."""
+    bank = KalmanFilterBank()
+    bank.add("a", 100, 200, dx=50, dy=-20, timestamp=0.0)
+    bank.add("b", 0, 0, timestamp=0.0)
+    before = bank.x[:2].copy()
+    trajectory = bank.trajectory(horizon_ms=500, steps=5)
+    offsets = np.array([0.1, 0.2, 0.3, 0.4, 0.5], np.float32)[:, None]
+    np.testing.assert_allclose(trajectory[0], [100, 200] + offsets * [50, -20], atol=1e-4)
+    np.testing.assert_allclose(trajectory[1], 0, atol=1e-6)
+    np.testing.assert_array_equal(bank.x[:2], before)
+
+
+def test_imm_of_identical_models_matches_cv2():
+    """An IMM whose models are all the same reduces to that model, mixing leaves the states unchanged."""
+    tracks = random_tracks(2, objects=4)
+    bank = KalmanFilterBank(model=InteractingMultipleModel([ConstantVelocity(), ConstantVelocity()]))
+    keys = list(range(tracks.shape[1]))
+    filters = []
+    for key, (x, y) in zip(keys, tracks[0]):
+        bank.add(key, x, y)
+        filters.append(reference_filter(ConstantVelocity(), x, y))
+    for measurements in tracks[1:]:
+        predictions = bank.predict_correct(keys, measurements)
+        for kf, prediction, measurement in zip(filters, predictions, measurements):
+            np.testing.assert_allclose(prediction, kf.predict()[:2, 0], rtol=1e-4, atol=1e-2)
+            kf.correct(measurement.reshape(2, 1).astype(np.float64))
+    np.testing.assert_allclose(bank.state["mu"][:len(keys)], 0.5)
+
+
+def test_imm_prefers_acceleration_model_on_parabola():
+    """On a free fall the mode probabilities move to the constant-acceleration model and stay normalised."""
+    bank = KalmanFilterBank(model="imm")
+    t = np.arange(30) / 30
+    fall = np.stack((100 + 200 * t, 50 + 100 * t + 0.5 * 2000 * t * t), axis=1).astype(np.float32)
+    bank.add("ball", *fall[0], timestamp=t[0])
+    for timestamp, measurement in zip(t[1:], fall[1:]):
+        bank.predict_correct(["ball"], measurement[None], timestamp=timestamp)
+    mu = bank.state["mu"][0]
+    assert mu.sum() == pytest.approx(1.0)
+    assert mu[1] > 0.5
+
+
+def test_bank_remove_keeps_rows_contiguous():
+    """Removing a key moves the last row into its slot without changing the other filters."""
+    bank = KalmanFilterBank(capacity=4)
+    for key in range(4):
+        bank.add(key, key * 10, key * 20, dx=key)
+    before = {key: bank.x[bank.index[key]].copy() for key in range(4)}
+    bank.remove(1)
+    assert len(bank) == 3 and 1 not in bank
+    assert sorted(bank.index.values()) == [0, 1, 2]
+    for key in (0, 2, 3):
+        np.testing.assert_array_equal(bank.x[bank.index[key]], before[key])
+
+
+def test_bank_forwards_motion_model_settings():
+    """Settings of a named motion model reach the model, they are rejected for a model instance."""
+    bank = KalmanFilterBank(model="imm", acceleration_noise=100.0, jerk_noise=50.0, switch_prob=0.2)
+    cv, ca = bank.model.models
+    assert cv.acceleration_noise == 100.0 and ca.jerk_noise == 50.0
+    np.testing.assert_allclose(bank.model.transition_matrix, [[0.8, 0.2], [0.2, 0.8]])
+    with pytest.raises(ValueError, match="jerk_noise"):
+        KalmanFilterBank(model=ConstantAcceleration(), jerk_noise=50.0)
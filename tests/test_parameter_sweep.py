@@ -0,0 +1,36 @@
+# test_parameter_sweep.py
+"""Trial scoring and parameter checks of the parameter sweep (parameterSweep) on a synthetic recording."""
+
+import pytest
+
+from detectionRecording import DetectionRecorder
+from parameterSweep import check_params, evaluate
+
+NAMES = {0: "person", 41: "cup"}
+
+
+def two_cups(path, frames=30):
+    """Records two cups moving in opposite directions on parallel lines at 30 FPS."""
+    with DetectionRecorder(path, names=NAMES, fps=30, frame_shape=(480, 640)) as recorder:
+        for i in range(frames):
+            recorder.record([[100 + 5 * i, 100, 140 + 5 * i, 140, 0.9, 41, "cup"],
+                             [500 - 5 * i, 300, 540 - 5 * i, 340, 0.9, 41, "cup"]], 1700000000.0 + i / 30)
+
+
+@pytest.mark.parametrize("tracker", ["kalman", "dead_reckoning"])
+def test_evaluate_scores_every_object_on_its_own(tmp_path, tracker):
+    """Objects of the same class are scored against their own track, not against each other."""
+    path = str(tmp_path / "rec")
+    two_cups(path)
+    result = evaluate([path], tracker, {"proximity_threshold": 20})
+    assert result["predictions"] > 0
+    assert result["mae"] < 20  # Mixing the two cups would give errors of hundreds of pixels
+
+
+def test_check_params_rejects_ignored_parameters():
+    """Bank parameters of trackers without a KalmanFilterBank and unknown trackers are rejected."""
+    check_params("kalman", [{"process_noise": 0.1}])
+    with pytest.raises(ValueError, match="no Kalman filters"):
+        check_params("dead_reckoning", [{"process_noise": 0.1}])
+    with pytest.raises(ValueError, match="Unknown tracker"):
+        check_params("kalman_v2", [{}])
@@ -0,0 +1,104 @@
+# test_prediction_metrics.py
+"""Streaming prediction-accuracy metrics (predictionMetrics) against exact batch computations."""
+
+import numpy as np
+import pytest
+
+from predictionMetrics import QuantileSketch, StreamingMetrics, prediction_errors
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.05])
+@pytest.mark.parametrize("add_one_by_one", [True, False])
+def test_quantile_sketch_error_bound(relative_accuracy, add_one_by_one):
+    """Every quantile is within the relative accuracy of the exact order statistic."""
+    values = np.random.default_rng(0).lognormal(1.0, 1.5, 5000)
+    sketch = QuantileSketch(relative_accuracy)
+    if add_one_by_one:
+        for value in values:
+            sketch.add(value)
+    else:
+        sketch.extend(values)
+    ordered = np.sort(values)
+    for q in (0.01, 0.25, 0.5, 0.9, 0.99, 1.0):
+        exact = ordered[int(np.floor(q * (len(values) - 1)))]
+        assert abs(sketch.quantile(q) - exact) <= relative_accuracy * exact * (1 + 1e-9)
+
+
+def test_quantile_sketch_small_and_empty():
+    """Values below min_value count as zero and an empty sketch has no quantiles."""
+    sketch = QuantileSketch(min_value=0.01)
+    assert np.isnan(sketch.quantile(0.5))
+    sketch.extend([0.0, 0.001, 0.005])
+    assert sketch.quantile(0.5) == 0.0
+
+
+def test_streaming_metrics_next_observation():
+    """Without a horizon every prediction is scored against the next observation of its object."""
+    metrics = StreamingMetrics()
+    rng = np.random.default_rng(1)
+    errors = rng.uniform(0.5, 20, 500)
+    for i, error in enumerate(errors):
+        # Predicted error pixels to the right of where the object is observed next
+        metrics.update("a", "person", i * 0.1, (10.0 * i, 5.0), (10.0 * (i + 1) + error, 5.0))
+    metrics.observe("a", len(errors) * 0.1, (10.0 * len(errors), 5.0))
+    summary = metrics.summary(tracks=True)
+    overall = summary["overall"]
+    assert overall["count"] == len(errors)
+    assert overall["mae"] == pytest.approx(errors.mean())
+    assert overall["max"] == pytest.approx(errors.max())
+    ordered = np.sort(errors)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(np.floor(q * (len(errors) - 1)))]
+        assert overall[f"p{int(q * 100)}"] == pytest.approx(exact, rel=0.01)
+    assert summary["per_class"]["person"]["count"] == len(errors)
+    assert summary["per_track"]["a"]["count"] == len(errors)
+    assert summary["pending"] == 0
+
+
+def test_streaming_metrics_horizon_matches_batch_errors():
+    """With a horizon the errors equal those of the batch prediction_errors over the same log."""
+    times = np.arange(0, 3, 1 / 30)
+    actual = np.stack((100 + 50 * times + 20 * np.sin(3 * times), 80 + 30 * times), axis=1)
+    predicted = actual + np.random.default_rng(2).normal(0, 3, actual.shape)  # Predictions 0.2 s ahead
+    metrics = StreamingMetrics(horizon_s=0.2)
+    for t, position, prediction in zip(times, actual, predicted):
+        metrics.update("cup", "cup", t, position, prediction)
+    expected = prediction_errors(times, actual, predicted, np.zeros(len(times)), horizon_s=0.2)
+    overall = metrics.summary()["overall"]
+    assert overall["count"] == len(expected)
+    assert overall["mae"] == pytest.approx(float(np.mean(expected)), rel=1e-6)
+
+
+def test_streaming_metrics_forget_counts_expired():
+    """Predictions of a track that ended without being scored are counted as expired."""
+    metrics = StreamingMetrics(horizon_s=1.0)
+    metrics.update(1, "person", 0.0, (0, 0), (1, 1))
+    metrics.update(1, "person", 0.1, (0, 0), (1, 1))
+    metrics.forget(1)
+    summary = metrics.summary()
+    assert summary["expired"] == 2
+    assert summary["overall"]["count"] == 0
+
+
+def test_streaming_metrics_forget_bounds_tracks():
+    """Ended tracks leave per_track, their errors stay in the overall and per-class totals."""
+    metrics = StreamingMetrics()
+    for track in range(100):  # Track IDs keep increasing on a live camera
+        for i in range(3):
+            metrics.update(track, "cup", i * 0.1, (float(i), 0.0), (i + 2.0, 0.0))
+        metrics.forget(track)
+    summary = metrics.summary(tracks=True)
+    assert summary["per_track"] == {} and summary["tracks"] == 0
+    assert summary["overall"]["count"] == summary["per_class"]["cup"]["count"] == 200
+    assert summary["overall"]["mae"] == pytest.approx(1.0)
+
+
+def test_prediction_errors_per_object():
+    """Two objects of one class are scored separately, rows of objects sharing a key in a frame are skipped."""
+    times = np.repeat(np.arange(5, dtype=np.float64), 2)
+    actual = np.array([[10.0 * i, 0.0] if k == 0 else [500.0 - 10 * i, 300.0] for i in range(5) for k in range(2)])
+    predicted = actual + [10.0, 0.0] * np.array([[1], [-1]] * 5)  # Both predict their next position exactly
+    groups = ["cup/1", "cup/2"] * 5
+    np.testing.assert_allclose(prediction_errors(times, actual, predicted, groups), 0)
+    untracked = ["cup/-1"] * 10
+    assert len(prediction_errors(times, actual, predicted, untracked)) == 0
@@ -0,0 +1,70 @@
+# test_proximity.py
+"""Vectorized proximity checks (proximityEngine) against the original per-pair loops."""
+
+import numpy as np
+import pytest
+
+import proximityEngine
+from detectionBatch import DetectionBatch
+
+
+def overlap_loop(target, obj):
+    """Box intersection test of the original utilsNeeded.check_proximity loop."""
+    x1_target, y1_target, x2_target, y2_target = target[:4]
+    x1_obj, y1_obj, x2_obj, y2_obj = obj[:4]
+    return x1_obj < x2_target and x2_obj > x1_target and y1_obj < y2_target and y2_obj > y1_target
+
+
+def near_loop(target, obj, proximity_threshold):
+    """Nearness test of the original utilsNeeded.check_nearness loop."""
+    x1_target, y1_target, x2_target, y2_target = target[:4]
+    x1_obj, y1_obj, x2_obj, y2_obj = obj[:4]
+    return bool((x2_obj < x1_target and (x1_target - x2_obj) <= proximity_threshold) or
+                (x1_obj > x2_target and (x1_obj - x2_target) <= proximity_threshold) or
+                (y2_obj < y1_target and (y1_target - y2_obj) <= proximity_threshold) or
+                (y1_obj > y2_target and (y1_obj - y2_target) <= proximity_threshold))
+
+
+def random_detections(rng, n, size=640):
+    """Random legacy detections [x1, y1, x2, y2, conf, class ID, class name], class 0 is 'person'."""
+    detections = []
+    for _ in range(n):
+        x1, y1 = rng.integers(0, size - 50, 2)
+        w, h = rng.integers(5, 120, 2)
+        cls = int(rng.integers(0, 3))
+        detections.append([int(x1), int(y1), int(x1 + w), int(y1 + h), 0.9, cls, ["person", "cup", "knife"][cls]])
+    return detections
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("proximity_threshold", [0, 10, 40])
+def test_pairwise_proximity_matches_loops(seed, proximity_threshold):
+    """Every target/object pair gets the overlap and near flags of the original per-pair loops."""
+    detections = random_detections(np.random.default_rng(seed), 40)
+    boxes = proximityEngine.detections_to_array(detections)
+    target_mask = boxes[:, proximityEngine.CLS] == 0
+    result = proximityEngine.pairwise_proximity(boxes, target_mask, proximity_threshold)
+    for p, t in enumerate(result.target_idx):
+        for o, j in enumerate(result.object_idx):
+            assert result.overlap[p, o] == overlap_loop(detections[t], detections[j])
+            assert result.near[p, o] == near_loop(detections[t], detections[j], proximity_threshold)
+    expected = {(t, j) for t in result.target_idx for j in result.object_idx
+                if overlap_loop(detections[t], detections[j]) or near_loop(detections[t], detections[j],
+                                                                           proximity_threshold)}
+    assert {tuple(pair) for pair in proximityEngine.hazard_pairs(result)} == expected
+
+
+def test_detections_to_array_batch_and_list_agree():
+    """A DetectionBatch and the equivalent legacy list pack into the same array."""
+    detections = random_detections(np.random.default_rng(0), 10)
+    batch = DetectionBatch.from_list(detections)
+    np.testing.assert_array_equal(proximityEngine.detections_to_array(batch),
+                                  proximityEngine.detections_to_array(detections))
+
+
+def test_pairwise_proximity_empty():
+    """Frames without targets or objects give empty result matrices."""
+    boxes = proximityEngine.detections_to_array([[0, 0, 10, 10, 0.9, 0, "person"]])
+    result = proximityEngine.pairwise_proximity(boxes, np.array([True]), 10)
+    assert result.overlap.shape == (1, 0)
+    assert len(proximityEngine.hazard_pairs(result)) == 0
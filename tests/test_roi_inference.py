@@ -0,0 +1,86 @@
+# test_roi_inference.py
+"""Region-of-interest inference (roiInference) with a stand-in model."""
+
+import numpy as np
+
+from hazardZones import rectangle_zone
+from roiInference import RoiInference, roi_windows
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.boxes = type("Boxes", (), {"data": np.array(rows, np.float32).reshape(-1, 6)})()
+
+
+class FakeModel:
+    """
+    Finds a cup at (10, 10, 50, 50) in every crop, and a person far from the zones in the full frame. From the
+    crop call entering_at on, the first crop also finds a person, as if the person had walked into its window.
+    """
+
+    model = type("Model", (), {"names": {0: "person", 41: "cup"}})()
+
+    def __init__(self, entering_at=None):
+        self.entering_at = entering_at
+        self.crop_shapes = []
+        self.full_passes = 0
+
+    def predict(self, source, imgsz, classes, verbose):
+        if isinstance(source, list):
+            self.crop_shapes.append([crop.shape[:2] for crop in source])
+            results = [FakeResult([[10, 10, 50, 50, 0.9, 41]]) for _ in source]
+            if self.entering_at is not None and len(self.crop_shapes) > self.entering_at:
+                results[0] = FakeResult([[10, 10, 50, 50, 0.9, 41], [60, 40, 100, 100, 0.8, 0]])
+            return results
+        self.full_passes += 1
+        return [FakeResult([[900, 500, 960, 560, 0.8, 0], [110, 110, 150, 150, 0.7, 41]])]
+
+
+def test_roi_windows_merge_and_clip():
+    """Overlapping windows are merged and every window is clipped to the frame."""
+    windows = roi_windows([((0, 0), (100, 100)), ((80, 80), (200, 200)), ((600, 400), (700, 470))], (480, 640), 20)
+    assert windows.tolist() == [[0, 0, 220, 220], [580, 380, 640, 480]]
+
+
+def test_roi_windows_zone_threshold():
+    """Zones are padded by their own threshold as well, zones without one by the margin only."""
+    zones = [rectangle_zone(((100, 100), (150, 150))), rectangle_zone(((300, 300), (350, 350)), proximity_threshold=30)]
+    assert roi_windows(zones, (480, 640), 20).tolist() == [[80, 80, 170, 170], [250, 250, 400, 400]]
+
+
+WINDOWS = [((100, 100), (200, 200)), ((500, 100), (540, 130))]
+
+
+def test_roi_inference_holds_full_pass_detections():
+    """Objects only the full-frame pass sees are returned for hold_frames frames after it."""
+    model = FakeModel()
+    roi = RoiInference(WINDOWS, margin=0, full_frame_every=5, hold_frames=2)
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    persons = [int((roi(model, frame).class_names == "person").sum()) for _ in range(6)]
+    assert persons == [1, 1, 1, 0, 0, 1]
+    assert model.full_passes == 2
+    # The full-pass cup inside the first window is merged with the crop's, only the person is held
+    assert roi.held[:, 5].tolist() == [0]
+
+
+def test_roi_inference_drops_held_box_entering_a_window():
+    """A held box is dropped once a crop finds an additional object of its class, there is no stale duplicate."""
+    model = FakeModel(entering_at=2)
+    roi = RoiInference(WINDOWS, margin=0, full_frame_every=15, hold_frames=10)
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    roi(model, frame)  # Full pass
+    batch = roi(model, frame)
+    assert batch.xyxy[batch.class_names == "person"].tolist() == [[900, 500, 960, 560]]  # Held
+    batch = roi(model, frame)  # The person appears in the first window
+    assert batch.xyxy[batch.class_names == "person"].tolist() == [[160, 140, 200, 200]]
+    assert not len(roi.held)
+
+
+def test_roi_inference_pads_instead_of_upscaling():
+    """Smaller crops are padded to the largest window and boxes in the padding are clipped to the crop."""
+    model = FakeModel()
+    roi = RoiInference([((100, 100), (200, 200)), ((500, 100), (540, 130))], margin=0, full_frame_every=0)
+    batch = roi(model, np.zeros((720, 1280, 3), np.uint8))
+    assert model.crop_shapes == [[(100, 100), (100, 100)]]
+    assert roi.imgsz == 128
+    assert batch.xyxy.tolist() == [[110, 110, 150, 150], [510, 110, 540, 130]]
@@ -0,0 +1,271 @@
+# trackingPipeline.py
+"""
+Pipelined capture / inference / tracking / render stages for the safety trackers.
+
+The trackers' run() loops grab a frame, run YOLO, update the predictors, draw and display strictly one after the other,
+so the frame-to-alert latency is the sum of every stage and the camera is not read while the model is busy.
+Here every stage runs in its own thread and the stages are connected by small bounded queues:
+
+    capture --(latest frame wins)--> inference --> tracking/prediction --> render/log (caller thread)
+
+The render stage writes to a frameSinks sink. The tracking stage asks the sink whether it wants the frame before the
+tracker annotates it, so a headless NullSink or a reduced-rate preview skips the drawing entirely.
+
+The capture queue only ever holds the newest frame, so a slow detector always sees the most recent image instead of
+working through a backlog of stale frames. Each item carries the capture timestamp and the time it left every stage,
+which gives per-stage latencies and the capture-to-alert-decision latency that matters for hazard alerting.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from frameSinks import NullSink, WindowSink
+from latencyProbe import NullProbe
+
+
+class LatestFrameQueue:
+    """
+    Single-slot queue where a put() replaces the pending item ("latest frame wins").
+
+    Attributes:
+        dropped (int): Number of items that were overwritten before anyone read them.
+    """
+
+    def __init__(self):
+        self._item = None
+        self._has_item = False
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        """Stores the item, replacing an unread one."""
+        with self._cond:
+            if self._has_item:
+                self.dropped += 1
+            self._item, self._has_item = item, True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Returns the newest item, blocking until one is available. Raises queue.Empty on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._has_item, timeout):
+                raise queue.Empty
+            item, self._item, self._has_item = self._item, None, False
+            return item
+
+
+class StageStats:
+    """
+    Rolling latency statistics of one stage.
+
+    Attributes:
+        name (str): Stage name.
+        count (int): Number of processed items.
+        samples (deque): The most recent latencies in seconds.
+    """
+
+    def __init__(self, name, window=500):
+        self.name = name
+        self.count = 0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        """Records one latency sample."""
+        self.count += 1
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Returns a dict with count, mean, p50, p95 and max latency in milliseconds over the recent window."""
+        if not self.samples:
+            return {"count": self.count}
+        ms = np.asarray(self.samples) * 1000
+        p50, p95 = np.percentile(ms, [50, 95])
+        return {"count": self.count, "mean_ms": round(float(ms.mean()), 2), "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2), "max_ms": round(float(ms.max()), 2)}
+
+
+class FrameItem:
+    """A frame travelling through the pipeline together with its results and per-stage timestamps."""
+
+    __slots__ = ("frame_id", "frame", "capture_time", "timestamp", "detections", "draw", "stamps", "probe_id")
+
+    def __init__(self, frame_id, frame, capture_time, probe_id=None):
+        self.frame_id = frame_id
+        self.probe_id = probe_id  # Frame ID of the tracker's latencyProbe
+        self.frame = frame
+        self.capture_time = capture_time
+        self.timestamp = time.time()  # Wall-clock capture time handed to the predictors
+        self.detections = None
+        self.draw = False  # The sink wants this frame, so the tracker annotates it
+        self.stamps = {}  # stage name -> time.perf_counter() when the stage finished
+
+
+class Stage(threading.Thread):
+    """
+    Worker thread that applies `func` to every item from `in_queue` and forwards it to `out_queue`.
+
+    `func(item)` mutates the FrameItem in place. The stage stops when it receives None and forwards the None so that
+    the following stages stop as well.
+    """
+
+    def __init__(self, name, func, in_queue, out_queue, stats):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.stats = stats
+
+    def run(self):
+        while True:
+            item = self.in_queue.get()
+            if item is None:
+                self.out_queue.put(None)
+                break
+            t0 = time.perf_counter()
+            try:
+                self.func(item)
+            except Exception as e:
+                logging.error(f"Stage {self.name} failed on frame {item.frame_id}: {str(e)}")
+                continue
+            t1 = time.perf_counter()
+            self.stats.add(t1 - t0)
+            item.stamps[self.name] = t1
+            self.out_queue.put(item)
+
+
+class TrackerPipeline:
+    """
+    Runs a tracker (ObjectTracker_Kalman, DeadReckoningTracker, ...) as a staged pipeline.
+
+    The tracker must provide `cap`, `model`, `process_detections(detections, frame, timestamp=None, draw=True,
+    received_at=None)` and `close()`; received_at is the perf_counter() capture time of the frame. A tracker `probe`
+    (latencyProbe.LatencyProbe) gets the capture and detector stamps of every frame.
+
+    Attributes:
+        stats (dict): StageStats per stage plus 'capture_to_decision', the capture-to-alert-decision latency.
+
+    Methods:
+        run(): Runs until the source ends or 'q' is pressed, then logs the latency report.
+        report(): Returns the latency summary of every stage.
+    """
+
+    def __init__(self, tracker, inference_func, window_name="Frame", queue_size=2, show=True, render_func=None,
+                 sink=None):
+        """
+        Args:
+            tracker: Tracker instance with cap, model, process_detections() and close().
+            inference_func (function): inference_func(model, frame) -> detections, e.g. utilsNeeded.run_yolov8_inference.
+            window_name (str): Name of the cv2 window.
+            queue_size (int): Capacity of the queues after the capture stage.
+            show (bool): Display the frames with cv2.imshow, ignored when a sink is given.
+            render_func (function | None): Optional render_func(frame) -> frame applied before display,
+                e.g. to highlight the robotic arm area.
+            sink (frameSinks.FrameSink | None): Output of the annotated frames, defaults to a window (or NullSink
+                when show is False).
+        """
+        self.tracker = tracker
+        self.inference_func = inference_func
+        self.window_name = window_name
+        self.sink = sink if sink is not None else WindowSink(window_name) if show else NullSink()
+        self.render_func = render_func
+        self.probe = getattr(tracker, "probe", None) or NullProbe()
+        self.stats = {name: StageStats(name) for name in ("capture", "inference", "tracking", "render",
+                                                           "capture_to_decision")}
+        self._frames = LatestFrameQueue()
+        self._detected = queue.Queue(maxsize=queue_size)
+        self._tracked = queue.Queue(maxsize=queue_size)
+        self._running = threading.Event()
+
+    def _capture_loop(self):
+        """Reads frames as fast as the camera delivers them; only the newest unread frame is kept."""
+        frame_id = 0
+        while self._running.is_set():
+            t0 = time.perf_counter()
+            ret, frame = self.tracker.cap.read()
+            if not ret:
+                logging.error("Failed to capture frame. Exiting...")
+                break
+            capture_time = time.perf_counter()
+            self.stats["capture"].add(capture_time - t0)
+            probe_id = self.probe.begin(current=False)  # The tracking stage is still on an earlier frame
+            self._frames.put(FrameItem(frame_id, frame, capture_time, probe_id))
+            frame_id += 1
+        self._frames.put(None)
+
+    def _infer(self, item):
+        self.probe.mark("detect_in", item.probe_id)
+        item.detections = self.inference_func(self.tracker.model, item.frame)
+        self.probe.mark("detect_out", item.probe_id)
+
+    def _track(self, item):
+        self.probe.current = item.probe_id  # The tracker's own marks and its alerts refer to this frame
+        item.draw = self.sink.due()
+        self.tracker.process_detections(item.detections, item.frame, timestamp=item.timestamp, draw=item.draw,
+                                        received_at=item.capture_time)
+        # Alerts are decided inside process_detections, so this is the capture-to-alert-decision latency
+        self.stats["capture_to_decision"].add(time.perf_counter() - item.capture_time)
+
+    def run(self):
+        """Starts the capture, inference and tracking threads and renders in the calling thread."""
+        self._running.set()
+        threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            Stage("inference", self._infer, self._frames, self._detected, self.stats["inference"]),
+            Stage("tracking", self._track, self._detected, self._tracked, self.stats["tracking"]),
+        ]
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = self._tracked.get()
+                if item is None:
+                    break
+                if item.draw:
+                    t0 = time.perf_counter()
+                    self.sink.write(self.render_func(item.frame) if self.render_func else item.frame)
+                    self.stats["render"].add(time.perf_counter() - t0)
+                if self.sink.poll():
+                    break
+        finally:
+            self._running.clear()
+            deadline = time.time() + 5
+            while any(t.is_alive() for t in threads) and time.time() < deadline:
+                self._drain()  # Unblock stages waiting on a full queue so they reach the stop sentinel
+                for t in threads:
+                    t.join(0.01)
+            stuck = [t.name for t in threads if t.is_alive()]
+            if stuck:
+                logging.warning(f"Pipeline stages did not stop within 5 s: {', '.join(stuck)}")
+            self.tracker.close()  # After the tracking stage is done, so close() does not race process_detections
+            if self.sink is not getattr(self.tracker, "sink", None):
+                self.sink.close()
+            for name, summary in self.report().items():
+                logging.info(f"{name}: {summary}")
+            logging.info(f"capture frames dropped (latest frame wins): {self._frames.dropped}")
+
+    def _drain(self):
+        """
+        Drops the frames waiting in the bounded queues so that blocked stages can see the stop sentinel. A sentinel
+        that is already queued is kept, the next stage still has to receive it.
+        """
+        for q in (self._detected, self._tracked):
+            while True:
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    q.put(None)  # Only the stage in front of q puts, and it stops after the sentinel
+                    break
+
+    def report(self):
+        """
+        Returns:
+            dict: Latency summary (count, mean/p50/p95/max in ms) of every stage.
+        """
+        return {name: stats.summary() for name, stats in self.stats.items()}
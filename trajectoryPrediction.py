@@ -0,0 +1,46 @@
+# trajectoryPrediction.py
+"""
+Time-based prediction horizon shared by the Kalman and dead-reckoning predictors.
+
+Both predictors originally looked exactly one frame ahead: dead reckoning extrapolated by the measured inter-frame
+time and the Kalman filters used dt = 1 frame. The lookahead therefore shrank as the pipeline got faster. Here the
+horizon is given in milliseconds ("where will this object be 500 ms from now") and the positions of all objects are
+extrapolated over `steps` evenly spaced times up to the horizon in a single vectorized call, so the alert lead time
+is a tunable latency budget instead of an artefact of the frame rate.
+"""
+
+import numpy as np
+
+
+def horizon_offsets(horizon_ms, steps=1):
+    """
+    Returns the look-ahead times of a trajectory.
+
+    Args:
+        horizon_ms (float): Prediction horizon in milliseconds.
+        steps (int): Number of trajectory points, the last one lies at the horizon.
+
+    Returns:
+        np.ndarray: (steps,) float32 offsets in seconds, horizon/steps, 2*horizon/steps, ..., horizon.
+    """
+    if steps < 1:
+        raise ValueError(f"steps must be at least 1, got {steps}")
+    return np.linspace(horizon_ms / 1000 / steps, horizon_ms / 1000, steps, dtype=np.float32)
+
+
+def extrapolate_trajectories(positions, velocities, horizon_ms, steps=1):
+    """
+    Extrapolates the positions of all objects along their velocities (constant-velocity model).
+
+    Args:
+        positions (np.ndarray): (N, 2) current positions in pixels.
+        velocities (np.ndarray): (N, 2) velocities in pixels per second.
+        horizon_ms (float): Prediction horizon in milliseconds.
+        steps (int): Number of trajectory points per object.
+
+    Returns:
+        np.ndarray: (N, steps, 2) predicted positions, [:, -1] is the position at the horizon.
+    """
+    positions = np.asarray(positions, np.float32).reshape(-1, 1, 2)
+    velocities = np.asarray(velocities, np.float32).reshape(-1, 1, 2)
+    return positions + velocities * horizon_offsets(horizon_ms, steps)[None, :, None]
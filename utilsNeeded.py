@@ -1,16 +1,21 @@
 # utilsNeeded.py
-import hashlib
-import os
-
 import cv2
-import csv
 import logging
+import numpy as np
 
-import winsound
+try:
+    import winsound
+except ImportError:  # winsound only exists on Windows, see alertDispatcher for portable sinks
+    winsound = None
 
 from ultralytics import YOLO
 import time
 
+import bufferedLogging
+import proximityEngine
+from detectionBatch import DetectionBatch, class_names
+from frameAnnotator import FrameAnnotator, palette_color
+
 
 # This is helper file used for my both algorithms, functions needed in both
 # Authorship Information
@@ -36,38 +41,41 @@ https://pieriantraining.com/kalman-filter-opencv-python-example/
 """
 
 
-def run_yolov8_inference(model, frame):
+def run_yolov8_inference(model, frame, classes=None):
     """
     Perform object detection on a single image using a preloaded YOLOv8 model.
 
     Parameters:
     - model: An instance of a YOLOv8 model ready for inference.
     - frame: An image in BGR format (numpy array) for object detection.
+    - classes (list, optional): Class IDs to detect (see detectionBatch.resolve_class_ids). The other classes are
+      dropped inside the model's NMS. None detects all classes.
 
     Returns:
-    A list of detections, each represented as a list containing:
+    A DetectionBatch (see detectionBatch.py). Indexing and iterating it yields the detections as lists
     [bounding box coordinates (x1, y1, x2, y2), confidence score, class ID, class name]
     """
     # Perform inference with the YOLOv8 model
-    results = model.predict(frame)
-    detections = []
+    results = model.predict(frame, classes=classes)
 
     # Assuming the first item in results contains the detection information
-    if results:
-        detection_result = results[0]
-        xyxy = detection_result.boxes.xyxy.numpy()  # Bounding box coordinates
-        confidence = detection_result.boxes.conf.numpy()  # Confidence scores
-        class_ids = detection_result.boxes.cls.numpy().astype(int)  # Class IDs
-        class_names = [model.model.names[cls_id] for cls_id in class_ids]  # Class names
-
-        for i in range(len(xyxy)):
-            x1, y1, x2, y2 = map(int, xyxy[i])
-            conf = confidence[i]
-            cls_id = class_ids[i]
-            class_name = class_names[i]
-            detections.append([x1, y1, x2, y2, conf, cls_id, class_name])
+    if not results:
+        return DetectionBatch.from_list([], model.model.names)
+    return detections_from_result(results[0], model.model.names)
 
-    return detections
+
+def detections_from_result(detection_result, names):
+    """
+    Wraps one ultralytics Results object into the detection batch used by the trackers, without per-box work.
+
+    Parameters:
+    - detection_result: A single Results object, e.g. one element of a batched model.predict() call.
+    - names (dict): Class ID to class name mapping of the model.
+
+    Returns:
+    A DetectionBatch whose items are detections [x1, y1, x2, y2, confidence, class ID, class name].
+    """
+    return DetectionBatch.from_result(detection_result, names)
 
 
 # Function to run YOLOv5 inference on a frame and extract detections
@@ -96,6 +104,7 @@ def run_yolov5_inference(model, frame):
 def get_color_by_id(class_id):
     """
     Generates a unique color for each class ID to ensure consistency across runs.
+    The SHA-256 colors are computed once and cached, see frameAnnotator.palette_color.
 
     Parameters:
         class_id (int): Unique identifier for the class.
@@ -103,24 +112,25 @@ def get_color_by_id(class_id):
     Returns:
         list: RGB color values.
     """
-    hash_value = hashlib.sha256(str(class_id).encode()).hexdigest()
-    r = int(hash_value[:2], 16)
-    g = int(hash_value[2:4], 16)
-    b = int(hash_value[4:6], 16)
-    return [r, g, b]
+    return list(palette_color(class_id))
 
 
 
 
 # Function to play a beep sound as an alert
-def beep_alert(frequency=2500, duration=1000):
+def beep_alert(frequency=2500, duration=1000, key=None):
     """
-    Plays a beep sound as an alert.
+    Plays a beep sound as an alert. This blocks for the whole duration, the trackers use
+    alertDispatcher.AlertDispatcher.beep instead, which has the same signature.
 
     Parameters:
         frequency (int, optional): Frequency of the beep sound in Hertz. Default is 2500.
         duration (int, optional): Duration of the beep sound in milliseconds. Default is 1000 (1 second).
+        key (hashable, optional): Identity of the alert. Unused here, accepted for compatibility with AlertDispatcher.beep.
     """
+    if winsound is None:
+        print("\a", end="", flush=True)  # Terminal bell on platforms without winsound
+        return
     winsound.Beep(frequency, duration)
 
 
@@ -165,23 +175,19 @@ def check_proximity(target, specific_object_detections):
     Checks if any specific object detection overlaps with the bounding box of the target.
 
     Args:
-        person_detections (list): List of detections for the target, where each detection is represented as [x1, y1, x2, y2, ...].
+        target (list): List of detections for the target, where each detection is represented as [x1, y1, x2, y2, ...].
         specific_object_detections (list): List of detections for the specific object, where each detection is represented as [x1, y1, x2, y2, ...].
 
     Returns:
         bool: True if any specific object detection overlaps with the bounding box of the target, False otherwise.
-        :param specific_object_detections:
-        :param target:
     """
-    for values in target:
-        x1_target, y1_target, x2_target, y2_target, _, _, _ = values
-        for obj_det in specific_object_detections:
-            x1_obj, y1_obj, x2_obj, y2_obj, _, _, _ = obj_det
-            # Check if there's any intersection between the bounding boxes
-            if (x1_obj < x2_target and x2_obj > x1_target and
-                    y1_obj < y2_target and y2_obj > y1_target):
-                return True
-    return False
+    if not len(target) or not len(specific_object_detections):
+        return False
+    gaps = proximityEngine.edge_gaps(np.asarray([t[:4] for t in target], np.float32),
+                                     np.asarray([o[:4] for o in specific_object_detections], np.float32))
+    return bool((gaps < 0).all(axis=0).any())  # Intersection on both axes for at least one pair
+
+
 def check_nearness(target, specific_object_detections, proximity_threshold=10):
     """
     Checks if any specific object detection is near the bounding box of the target without overlapping.
@@ -194,27 +200,23 @@ def check_nearness(target, specific_object_detections, proximity_threshold=10):
     Returns:
         bool: True if any specific object detection is near the target within the proximity threshold, False otherwise.
     """
-    for t_values in target:
-        x1_target, y1_target, x2_target, y2_target, *_ = t_values
-
-        for obj_det in specific_object_detections:
-            x1_obj, y1_obj, x2_obj, y2_obj, *_ = obj_det
+    if not len(target) or not len(specific_object_detections):
+        return False
+    gaps = proximityEngine.edge_gaps(np.asarray([t[:4] for t in target], np.float32),
+                                     np.asarray([o[:4] for o in specific_object_detections], np.float32))
+    return bool(((gaps > 0) & (gaps <= proximity_threshold)).any())  # Beyond an edge, but within the threshold
 
-            # Check if bounding boxes are near without overlapping
-            if (x2_obj < x1_target and (x1_target - x2_obj) <= proximity_threshold) or \
-                    (x1_obj > x2_target and (x1_obj - x2_target) <= proximity_threshold) or \
-                    (y2_obj < y1_target and (y1_target - y2_obj) <= proximity_threshold) or \
-                    (y1_obj > y2_target and (y1_obj - y2_target) <= proximity_threshold):
-                return True
 
-    return False
 
+# Draws single detections for draw_predictions / draw_predictions2, the trackers annotate whole frames at once
+ANNOTATOR = FrameAnnotator()
 
 
 # utilsNeeded.py
 def draw_predictions(frame, det, current_x, current_y, future_x, future_y):
     """
     Draw bounding boxes, labels, and future position on the frame.
+    To annotate all detections of a frame, FrameAnnotator.draw does the same in one pass.
 
     Args:
         frame: Image on which to draw.
@@ -225,24 +227,7 @@ def draw_predictions(frame, det, current_x, current_y, future_x, future_y):
     Returns:
         None: Modifies the frame directly.
     """
-    x1, y1, x2, y2, _, cls, class_name = det
-    color = get_color_by_id(cls)  # Existing function to get color based on class ID
-
-    # Draw current position circle
-    cv2.circle(frame, (int(current_x), int(current_y)), 10, color, -1)
-    cv2.line(frame, (int(current_x), int(current_y + 20)), (int(current_x + 50), int(current_y + 20)), color, 2, 8)
-
-    # Draw rectangle around detected object
-    cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
-
-    # Put label near the bounding box
-    label = f"{class_name} ({cls})"
-    cv2.putText(frame, label, (int(x1), int(y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    # Draw future position circle in green
-    future_color = (0, 255, 0)  # RGB for green
-    cv2.circle(frame, (int(future_x), int(future_y)), 10, future_color, -1)
-    cv2.line(frame, (int(future_x), int(future_y + 20)), (int(future_x + 50), int(future_y + 20)), future_color, 2, 8)
+    draw_predictions2(frame, det, current_x, current_y, future_x, future_y, palette_color(det[5]))
 
 def draw_predictions2(frame, det, current_x, current_y, future_x, future_y, color):
     """
@@ -259,22 +244,24 @@ def draw_predictions2(frame, det, current_x, current_y, future_x, future_y, colo
         None: Modifies the frame directly.
     """
     x1, y1, x2, y2, _, cls, class_name = det
+    ANNOTATOR.draw(frame, [(x1, y1, x2, y2)], [(current_x, current_y)], [(future_x, future_y)], [color],
+                   [f"{class_name} ({cls})"])
 
-    # Draw current position circle
-    cv2.circle(frame, (int(current_x), int(current_y)), 10, color, -1)
-    cv2.line(frame, (int(current_x), int(current_y + 20)), (int(current_x + 50), int(current_y + 20)), color, 2, 8)
-
-    # Draw rectangle around detected object
-    cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
+def draw_trajectory(frame, points, color):
+    """
+    Draw a predicted trajectory as a polyline ending in a small circle at the prediction horizon.
 
-    # Put label near the bounding box
-    label = f"{class_name} ({cls})"
-    cv2.putText(frame, label, (int(x1), int(y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    Args:
+        frame: Image on which to draw.
+        points: (steps, 2) predicted positions, e.g. one row of KalmanFilterBank.trajectory().
+        color: Color tuple (B, G, R) used for drawing.
 
-    # Draw future position circle in green
-    future_color = (0, 255, 0)  # RGB for green
-    cv2.circle(frame, (int(future_x), int(future_y)), 10, future_color, -1)
-    cv2.line(frame, (int(future_x), int(future_y + 20)), (int(future_x + 50), int(future_y + 20)), future_color, 2, 8)
+    Returns:
+        None: Modifies the frame directly.
+    """
+    points = np.asarray(points).reshape(-1, 1, 2).astype(np.int32)
+    cv2.polylines(frame, [points], False, color, 2)
+    cv2.circle(frame, tuple(int(v) for v in points[-1, 0]), 5, color, -1)
 
 def cleanup(cap, file):
     """
@@ -289,7 +276,10 @@ def cleanup(cap, file):
     """
     if cap:
         cap.release()  # Release the video capture object
-    cv2.destroyAllWindows()  # Close all OpenCV windows
+    try:
+        cv2.destroyAllWindows()  # Close all OpenCV windows
+    except cv2.error:  # Headless OpenCV build, there are no windows
+        pass
     if file:
         file.close()  # Close the CSV file if it's open
 
@@ -339,44 +329,59 @@ def initialize_video_capture(source):
 
 def setup_csv_writer(filename='tracking_and_predictions.csv'):
     """
-    Sets up a CSV writer for logging tracking and predictions data.
+    Sets up a buffered writer for logging tracking and predictions data.
+    Rows are kept in memory and written in batches by a background thread (see bufferedLogging),
+    the file extension selects the format (.csv, .parquet, .arrow or .ring).
 
     Args:
         filename (str): The name of the file where data will be written.
 
     Returns:
-        tuple (file, writer): A tuple containing the file object and the CSV writer.
+        tuple (file, writer): The BufferedRowWriter twice, it acts both as the file (close()) and the writer (writerow()).
 
     Raises:
         logs an error if the file operations fail.
     """
     try:
-        file = open(filename, 'w', newline='')
-        writer = csv.writer(file)
-        writer.writerow(['timestamp', 'det_x', 'det_y', 'pred_x', 'pred_y', 'class_name'])
-        return file, writer
-    except IOError as e:
+        writer = bufferedLogging.BufferedRowWriter(filename, ['timestamp', 'det_x', 'det_y', 'pred_x', 'pred_y', 'class_name', 'track_id'],
+                                                   types={'timestamp': 'float64', 'det_x': 'float64', 'det_y': 'float64',
+                                                          'pred_x': 'float64', 'pred_y': 'float64', 'class_name': 'string',
+                                                          'track_id': 'int64'})
+        return writer, writer
+    except (IOError, ImportError, ValueError) as e:
         logging.error(f"File operations failed: {str(e)}")
         return None, None
 
 
-def check_and_alert(detections, target, file_name, elapsed_time, alert_start_time, start_time, alert_times, proximity_threshold, save_alert_times_func, check_proximity_func, check_nearness_func, beep_alert_func):
+def check_and_alert(detections, target, file_name, elapsed_time, alert_start_time, start_time, alert_times, proximity_threshold, save_alert_times_func, beep_alert_func,
+                    episodes=None, keys=None, received_at=None):
     """
-    Checks each detection against a target to determine if an alert should be issued based on proximity and overlap criteria.
+    Checks all detections of a frame against a target class to determine if an alert should be issued based on
+    proximity and overlap criteria. Every target/object pair is evaluated in one vectorized pass
+    (see proximityEngine.pairwise_proximity), so this should be called once per frame.
 
     Args:
-        detections (list): List of detected objects.
+        detections (list): List of detected objects of the current frame.
         target (str): The class name of the target to check.
         file_name (str): The file name where alert times will be saved.
-        elapsed_time (float): The current elapsed time from the start of detection.
+        elapsed_time (float): Capture time of the frame relative to start_time. The saved response time is the time
+            from the capture of the first hazardous frame to the moment the alert is issued, measured as elapsed_time
+            plus the time the tracker has spent on the frame since received_at.
         alert_start_time (float): The start time of the current alert, if any.
         start_time (float): The start time of the program for overall timing.
         alert_times (list): List of times when alerts have been issued.
         proximity_threshold (int): The proximity threshold for issuing alerts.
         save_alert_times_func (function): The function to call to save alert times.
-        check_proximity_func (function): The function to check for object proximity.
-        check_nearness_func (function): The function to check for object nearness.
-        beep_alert_func (function): The function to execute an audio alert.
+        beep_alert_func (function): The function to execute an audio alert, called with frequency, duration and
+            the (person, object) key of the pair, e.g. AlertDispatcher.beep.
+        episodes (alertEpisodes.AlertEpisodes, optional): Groups the pairs into per-pair episodes. Each episode then
+            beeps and saves one alert row when it starts, instead of every frame, and open episodes are held
+            while the pair stays within episodes.exit_margin times the threshold. None alerts on every frame.
+        keys (list, optional): Identity key per detection (identityTracking.state_keys) so episodes are per
+            tracked pair, the class names are used when omitted.
+        received_at (float, optional): time.perf_counter() when the tracker received the frame, defaults to the
+            call of this function. Replayed frames have a recorded elapsed_time, so the alert time cannot be taken
+            from the wall clock.
 
     Returns:
         tuple: Updated alert_start_time and alert_times.
@@ -384,21 +389,24 @@ def check_and_alert(detections, target, file_name, elapsed_time, alert_start_tim
     Side effects:
         This function can modify alert_times and issue audio alerts based on detection conditions.
     """
-    person_detections = [d for d in detections if d[6] == target]
-    other_objects = [d for d in detections if d[6] != target]
-
-    alert_issued = False
-    for person in person_detections:
-        for obj in other_objects:
-            if check_proximity_func([person], [obj]) or check_nearness_func([person], [obj], proximity_threshold):
-                if alert_start_time is None:
-                    alert_start_time = elapsed_time  # Log the relative time when hazard detected
-                beep_alert_func(frequency=3000, duration=500)
-                alert_issued_at = elapsed_time + (time.time() - start_time) - alert_start_time
-                save_alert_times_func(file_name, person[6], obj[6], alert_start_time, alert_issued_at)
-                alert_issued = True
-
-    if not alert_issued and alert_start_time is not None:
+    received_at = time.perf_counter() if received_at is None else received_at
+    boxes = proximityEngine.detections_to_array(detections)
+    target_mask = class_names(detections) == target
+    if episodes is not None:
+        return _episode_alert(detections, target_mask, boxes, file_name, elapsed_time, received_at, alert_times,
+                              proximity_threshold, save_alert_times_func, beep_alert_func, episodes, keys)
+    result = proximityEngine.pairwise_proximity(boxes, target_mask, proximity_threshold)
+    pairs = proximityEngine.hazard_pairs(result)
+
+    for person_row, obj_row in pairs:
+        person_class, object_class = detections[person_row][6], detections[obj_row][6]
+        if alert_start_time is None:
+            alert_start_time = elapsed_time  # Log the relative time when hazard detected
+        beep_alert_func(frequency=3000, duration=500, key=(person_class, object_class))
+        save_alert_times_func(file_name, person_class, object_class, alert_start_time,
+                              _alert_time(elapsed_time, received_at))
+
+    if not len(pairs) and alert_start_time is not None:
         alert_duration = elapsed_time - alert_start_time
         alert_times.append((alert_start_time, alert_duration))
         alert_start_time = None  # Reset the alert start time
@@ -406,6 +414,36 @@ def check_and_alert(detections, target, file_name, elapsed_time, alert_start_tim
     return alert_start_time, alert_times
 
 
+def _alert_time(elapsed_time, received_at):
+    """When an alert leaves the tracker, on the clock of elapsed_time (frame time plus the time spent on the frame)."""
+    return elapsed_time + (time.perf_counter() - received_at)
+
+
+def _episode_alert(detections, target_mask, boxes, file_name, elapsed_time, received_at, alert_times,
+                   proximity_threshold, save_alert_times_func, beep_alert_func, episodes, keys):
+    """
+    check_and_alert with per-pair episodes: pairs within exit_margin * proximity_threshold are observed, pairs
+    overlapping or within proximity_threshold may start an episode. Returns the start of the earliest open episode
+    and alert_times extended by the (start, duration) of the episodes that ended.
+    """
+    result = proximityEngine.pairwise_proximity(boxes, target_mask, proximity_threshold * episodes.exit_margin)
+    t, o = np.nonzero(result.overlap | result.near)
+    overlap = result.overlap[t, o]
+    rows = np.stack((result.target_idx[t], result.object_idx[o]), axis=1)
+    names = class_names(detections)
+    ids = names if keys is None else keys
+    started, ended = episodes.update(
+        elapsed_time, [(ids[p], ids[q]) for p, q in rows], entering=overlap | (result.gap[t, o] <= proximity_threshold),
+        severities=np.where(overlap, 2, 1), contact=overlap, labels=[(names[p], names[q]) for p, q in rows])
+    for episode in started:
+        person_class, object_class = episode.label
+        beep_alert_func(frequency=3000, duration=500, key=episode.key)
+        save_alert_times_func(file_name, person_class, object_class, episode.first_seen,
+                              _alert_time(elapsed_time, received_at))
+    alert_times.extend((episode.first_seen, episode.end - episode.first_seen) for episode in ended)
+    return episodes.active_since, alert_times
+
+
 def save_alert_times(file_path, person_class, object_class, hazard_time, alert_time):
     """
     Saves the alert times into a CSV file specified by the file path.
@@ -414,25 +452,24 @@ def save_alert_times(file_path, person_class, object_class, hazard_time, alert_t
         file_path (str): Path to the file where alert times will be recorded.
         person_class (str): Class name of the person involved in the alert.
         object_class (str): Class name of the object involved in the alert.
-        hazard_time (float): The time when the hazard was first detected.
-        alert_time (float): The time when the alert was issued.
+        hazard_time (float): Capture time of the frame the hazard was first seen on, relative to the start.
+        alert_time (float): The time the alert was issued, on the same clock.
 
     Raises:
         logs an error if unable to write to the file.
     """
+    # Calculate Response Time as the difference between Alert Time and Hazard Time
+    if hazard_time is not None and alert_time is not None:
+        response_time = alert_time - hazard_time
+    else:
+        response_time = None  # Set to None if either time is missing
+
     try:
-        # Calculate Response Time as the difference between Alert Time and Hazard Time
-        if hazard_time is not None and alert_time is not None:
-            response_time = alert_time - hazard_time
-        else:
-            response_time = None  # Set to None if either time is missing
-
-        needs_header = not os.path.exists(file_path) or os.stat(file_path).st_size == 0
-        with open(file_path, 'a', newline='') as file:
-            writer = csv.writer(file)
-            if needs_header:
-                writer.writerow(['Hazard Time', 'Alert Time', 'Person Class', 'Object Class', 'Response Time'])
-            # Write the full row including the calculated Response Time
-            writer.writerow([hazard_time, alert_time, person_class, object_class, response_time])
-    except IOError as e:
+        # The shared writer keeps the file open and writes the rows in batches
+        writer = bufferedLogging.get_shared_writer(
+            file_path, ['Hazard Time', 'Alert Time', 'Person Class', 'Object Class', 'Response Time'],
+            types={'Hazard Time': 'float64', 'Alert Time': 'float64', 'Person Class': 'string',
+                   'Object Class': 'string', 'Response Time': 'float64'})
+        writer.writerow([hazard_time, alert_time, person_class, object_class, response_time])
+    except (IOError, ImportError, ValueError) as e:
         logging.error(f"Failed to save alert time: {str(e)}")
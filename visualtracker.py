@@ -4,19 +4,26 @@ from PIL import Image, ImageTk
 import numpy as np
 import utilsNeeded
 from ultralytics import YOLO
+from frameSinks import make_sink
 
 class ObjectTrackerApp:
-    def __init__(self, window, window_title):
+    def __init__(self, window, window_title, video_source=0, sink=None):
+        # Without a Tk window the tracker runs headless and hands the frames to a frameSinks sink instead
+        # (e.g. 'none', 'video:out.mp4' or 'mjpeg:8080'), so it also works on machines without a display
         self.window = window
-        self.window.title(window_title)
-
-        self.video_source = 0  # Video capture source
+        self.video_source = video_source  # Video capture source
         self.model = YOLO('yolov8n.pt')
         self.kalman_filters = {}
 
         # Open video source
         self.vid = cv2.VideoCapture(self.video_source)
 
+        if window is None:
+            self.sink = make_sink(sink or "none")
+            self.run_headless()
+            return
+        self.window.title(window_title)
+
         # Create a canvas that can fit the above video source size
         self.canvas = tk.Canvas(window, width=self.vid.get(cv2.CAP_PROP_FRAME_WIDTH), height=self.vid.get(cv2.CAP_PROP_FRAME_HEIGHT))
         self.canvas.pack()
@@ -47,37 +54,58 @@ class ObjectTrackerApp:
         if event.char == 'q':
             self.window.quit()
 
+    def run_headless(self):
+        # Same tracking as update(), but frames are only drawn when the sink wants them
+        try:
+            while True:
+                ret, frame = self.vid.read()
+                if not ret:
+                    break
+                draw = self.sink.due()
+                self.process_frame(frame, draw)
+                if draw:
+                    self.sink.write(frame)
+                if self.sink.poll():
+                    break
+        finally:
+            self.vid.release()
+            self.sink.close()
+
+    def process_frame(self, frame, draw=True):
+        # Run YOLO inference to get detections
+        detections = utilsNeeded.run_yolov8_inference(self.model, frame)
+
+        # Perform Kalman filtering for object tracking
+        for det in detections:
+            _, _, _, _, _, cls, _ = det
+            if cls not in self.kalman_filters:
+                self.kalman_filters[cls] = cv2.KalmanFilter(4, 2)  # 4 dimensions (x, y, dx, dy), 2 measurements (x, y)
+                self.kalman_filters[cls].measurementMatrix = np.array([[1, 0, 0, 0],
+                                                                       [0, 1, 0, 0]], np.float32)
+                self.kalman_filters[cls].transitionMatrix = np.array([[1, 0, 1, 0],
+                                                                      [0, 1, 0, 1],
+                                                                      [0, 0, 1, 0],
+                                                                      [0, 0, 0, 1]], np.float32)
+                self.kalman_filters[cls].processNoiseCov = np.array([[1, 0, 0, 0],
+                                                                     [0, 1, 0, 0],
+                                                                     [0, 0, 1, 0],
+                                                                     [0, 0, 0, 1]], np.float32) * 0.03
+            kf = self.kalman_filters[cls]
+            x1, y1, x2, y2, _, _, _ = det
+            center_x = int((x1 + x2) / 2)
+            center_y = int((y1 + y2) / 2)
+            measurement = np.array([[center_x], [center_y]], np.float32)
+            kf.correct(measurement)
+            prediction = kf.predict()
+            pred_x, pred_y = prediction[0, 0], prediction[1, 0]
+            if draw:
+                cv2.circle(frame, (int(pred_x), int(pred_y)), 10, (0, 255, 0), -1)
+
     def update(self):
         # Get a frame from the video source
         ret, frame = self.vid.read()
         if ret:
-            # Run YOLO inference to get detections
-            detections = utilsNeeded.run_yolov8_inference(self.model, frame)
-
-            # Perform Kalman filtering for object tracking
-            for det in detections:
-                _, _, _, _, _, cls, _ = det
-                if cls not in self.kalman_filters:
-                    self.kalman_filters[cls] = cv2.KalmanFilter(4, 2)  # 4 dimensions (x, y, dx, dy), 2 measurements (x, y)
-                    self.kalman_filters[cls].measurementMatrix = np.array([[1, 0, 0, 0],
-                                                                           [0, 1, 0, 0]], np.float32)
-                    self.kalman_filters[cls].transitionMatrix = np.array([[1, 0, 1, 0],
-                                                                          [0, 1, 0, 1],
-                                                                          [0, 0, 1, 0],
-                                                                          [0, 0, 0, 1]], np.float32)
-                    self.kalman_filters[cls].processNoiseCov = np.array([[1, 0, 0, 0],
-                                                                         [0, 1, 0, 0],
-                                                                         [0, 0, 1, 0],
-                                                                         [0, 0, 0, 1]], np.float32) * 0.03
-                kf = self.kalman_filters[cls]
-                x1, y1, x2, y2, _, _, _ = det
-                center_x = int((x1 + x2) / 2)
-                center_y = int((y1 + y2) / 2)
-                measurement = np.array([[center_x], [center_y]], np.float32)
-                kf.correct(measurement)
-                prediction = kf.predict()
-                pred_x, pred_y = prediction[0], prediction[1]
-                cv2.circle(frame, (int(pred_x), int(pred_y)), 10, (0, 255, 0), -1)
+            self.process_frame(frame)
 
             # Display the resulting frame
             self.photo = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
@@ -88,5 +116,18 @@ class ObjectTrackerApp:
         else:
             self.vid.release()
 
-# Create a window and pass it to the Application object
-ObjectTrackerApp(tk.Tk(), "Object Tracker")
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kalman object tracker with a Tk preview.")
+    parser.add_argument("--source", default="0", help="camera index or video file")
+    parser.add_argument("--sink", default=None,
+                        help="run headless and send the frames to a sink: none, video:<path> or mjpeg[:<port>]")
+    args = parser.parse_args()
+    source = int(args.source) if args.source.isdigit() else args.source
+
+    if args.sink:
+        ObjectTrackerApp(None, "Object Tracker", source, args.sink)
+    else:
+        # Create a window and pass it to the Application object
+        ObjectTrackerApp(tk.Tk(), "Object Tracker", source)